@@ -0,0 +1,213 @@
+"""
+性能ベンチマーク。合成データ (synthetic.py) を 1 / 100 / 1,000 / 10,000 銘柄で用意し、ステージごとに
+ - 経過時間 (wall) / ピーク RSS / 出力バイト数
+を計測して、保存済みのベースラインと比較する (悪化したら終了コード 1)。
+
+ステージ (それぞれ別の子プロセスで計測し、ピーク RSS が他ステージに影響されないようにする):
+ csv_load          : 3 表の CSV 読み込み
+ metrics           : alldata2analysisdata.compute_analysis (銘柄ごと)
+ metrics_universe  : alldata2analysisdata.compute_universe (全銘柄一括)
+ portal_html       : analysisdata2graph.build_portal_html
+ group_portal      : alldata2visualization.build_portal
+計測対象外の下準備 (metrics 以降の CSV 読み込みなど) は時間に含めないが、ピーク RSS には含まれる。
+HTML 生成は 1 銘柄あたりが重いため --max-render 銘柄 (既定 200) で打ち切る (記録にも残す)。
+
+使い方:
+ uv run benchmarks/run_benchmarks.py --sizes 1,100,1000 --save-baseline     (ベースラインを保存)
+ uv run benchmarks/run_benchmarks.py --sizes 1,100,1000                     (比較)
+ uv run benchmarks/run_benchmarks.py --stages metrics,metrics_universe --tolerance 0.15
+baseline.json は参照用の環境 (Linux / 1 CPU / Python 3.13) で記録したものをリポジトリに含めている。
+比較する環境が違う場合は、その環境で --save-baseline し直すか --baseline で別のファイルを指定する。
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import subprocess
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(os.path.dirname(BENCH_DIR), 'src', 'scripts'))
+
+import synthetic
+from instrument import peak_rss_bytes
+
+DEFAULT_SIZES = (1, 100, 1000, 10000)
+STAGES = ('csv_load', 'metrics', 'metrics_universe', 'portal_html', 'group_portal')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'baseline.json')
+DEFAULT_WORKDIR = os.path.join(tempfile.gettempdir(), 'financialanalysis-bench')
+
+
+# ---- 子プロセス側: 1 ステージを計測して JSON を出力 ---------------------------
+
+def _load_frames(tickers):
+	import pandas as pd
+	from columnar_store import STATEMENT_FILES
+	return {t: {name: pd.read_csv(os.path.join('data', t, f), index_col=0) for name, f in STATEMENT_FILES.items()} for t in tickers}
+
+
+def _summaries(frames):
+	import alldata2analysisdata as ad
+	return {t: ad.compute_analysis(st['financials'], st['cashflow'], st['balance_sheet'], report={}) for t, st in frames.items()}
+
+
+def run_stage(stage: str, tickers: list[str], max_render: int) -> dict:
+	"""カレントディレクトリの data/ を対象に 1 ステージを計測する。"""
+	import alldata2analysisdata as ad
+	rendered = tickers[:max_render]
+	output_bytes = 0
+	if stage == 'csv_load':
+		start = time.perf_counter()
+		frames = _load_frames(tickers)
+		wall = time.perf_counter() - start
+		output_bytes = sum(df.memory_usage(deep=True).sum() for st in frames.values() for df in st.values())
+	elif stage == 'metrics':
+		frames = _load_frames(tickers)
+		start = time.perf_counter()
+		summaries = _summaries(frames)
+		wall = time.perf_counter() - start
+		output_bytes = sum(len(df.to_csv().encode('utf-8')) for df in summaries.values())
+	elif stage == 'metrics_universe':
+		uni = ad.load_universe(tickers)
+		start = time.perf_counter()
+		long_df = ad.compute_universe(uni, report={})
+		wall = time.perf_counter() - start
+		output_bytes = len(long_df.to_csv(index=False).encode('utf-8'))
+	elif stage == 'portal_html':
+		import analysisdata2graph
+		summaries = _summaries(_load_frames(rendered))
+		start = time.perf_counter()
+		for t, df in summaries.items():
+			output_bytes += len(analysisdata2graph.build_portal_html(df, t).encode('utf-8'))
+		wall = time.perf_counter() - start
+	elif stage == 'group_portal':
+		import alldata2visualization
+		frames = _load_frames(rendered)
+		start = time.perf_counter()
+		for t, st in frames.items():
+			html = alldata2visualization.build_portal(*alldata2visualization.select_statements(st), t)
+			output_bytes += len(html.encode('utf-8'))
+		wall = time.perf_counter() - start
+	else:
+		raise ValueError(f'未知のステージ: {stage}')
+	n = len(rendered) if stage in ('portal_html', 'group_portal') else len(tickers)
+	return {'wall': wall, 'peak_rss': peak_rss_bytes(), 'output_bytes': int(output_bytes), 'tickers': n}
+
+
+# ---- 親プロセス側 -------------------------------------------------------------
+
+def measure(size: int, stage: str, workdir: str, seed: int, max_render: int) -> dict:
+	out_dir = os.path.join(workdir, f'n{size}')
+	synthetic.generate(size, out_dir, seed)
+	cmd = [sys.executable, os.path.abspath(__file__), '--child', stage, '--child-size', str(size), '--max-render', str(max_render)]
+	proc = subprocess.run(cmd, cwd=out_dir, capture_output=True, text=True, encoding='utf-8')
+	if proc.returncode != 0:
+		raise RuntimeError(f'{size}/{stage} が失敗しました:\n{proc.stderr.strip()}')
+	return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def compare(results: dict, baseline: dict, tolerance: float, rss_tolerance: float) -> list[str]:
+	"""ベースラインより悪化した項目を返す。出力バイト数は生成物の変化として 1% 超の差を報告する。"""
+	problems = []
+	for key, cur in results.items():
+		base = baseline.get(key)
+		if base is None or base.get('tickers') != cur['tickers']:
+			continue
+		if cur['wall'] > base['wall'] * (1 + tolerance) and cur['wall'] - base['wall'] > 0.05:
+			problems.append(f'{key}: 時間 {base["wall"]:.3f}s → {cur["wall"]:.3f}s')
+		if cur['peak_rss'] > base['peak_rss'] * (1 + rss_tolerance):
+			problems.append(f'{key}: ピーク RSS {base["peak_rss"] / 2**20:.0f}MB → {cur["peak_rss"] / 2**20:.0f}MB')
+		if base['output_bytes'] and abs(cur['output_bytes'] - base['output_bytes']) > base['output_bytes'] * 0.01:
+			problems.append(f'{key}: 出力 {base["output_bytes"]:,} → {cur["output_bytes"]:,} bytes')
+	return problems
+
+
+def print_table(results: dict, baseline: dict):
+	print(f'\n{"size/stage":<26}{"wall[s]":>10}{"base":>10}{"rss[MB]":>10}{"out[MB]":>10}{"n":>7}')
+	for key, r in results.items():
+		base = baseline.get(key, {}).get('wall')
+		base_s = f'{base:.3f}' if base is not None else '-'
+		print(f'{key:<26}{r["wall"]:>10.3f}{base_s:>10}{r["peak_rss"] / 2**20:>10.0f}{r["output_bytes"] / 2**20:>10.2f}{r["tickers"]:>7}')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='合成データによるステージ別ベンチマーク')
+	parser.add_argument('--sizes', default=','.join(map(str, DEFAULT_SIZES)), help='銘柄数 (カンマ区切り)')
+	parser.add_argument('--stages', default=','.join(STAGES), help=f'計測するステージ ({",".join(STAGES)})')
+	parser.add_argument('--workdir', default=DEFAULT_WORKDIR, help='合成データの置き場所 (生成済みなら再利用)')
+	parser.add_argument('--seed', type=int, default=0)
+	parser.add_argument('--max-render', type=int, default=200, help='HTML 生成ステージで描画する最大銘柄数')
+	parser.add_argument('--baseline', default=DEFAULT_BASELINE, help='ベースライン JSON')
+	parser.add_argument('--save-baseline', action='store_true', help='今回の結果をベースラインとして保存する')
+	parser.add_argument('--tolerance', type=float, default=0.25, help='時間の悪化とみなす割合')
+	parser.add_argument('--rss-tolerance', type=float, default=0.20, help='ピーク RSS の悪化とみなす割合')
+	parser.add_argument('--output', help='結果 JSON の保存先')
+	parser.add_argument('--child', help=argparse.SUPPRESS)
+	parser.add_argument('--child-size', type=int, help=argparse.SUPPRESS)
+	args = parser.parse_args()
+
+	if args.child:
+		tickers = [synthetic.ticker_name(i) for i in range(args.child_size)]
+		print(json.dumps(run_stage(args.child, tickers, args.max_render)))
+		return
+
+	sizes = [int(s) for s in args.sizes.split(',') if s.strip()]
+	stages = [s.strip() for s in args.stages.split(',') if s.strip()]
+	unknown = [s for s in stages if s not in STAGES]
+	if unknown:
+		parser.error(f'未知のステージ: {", ".join(unknown)}')
+
+	try:
+		with open(args.baseline, encoding='utf-8') as f:
+			saved = json.load(f)
+	except (OSError, ValueError):
+		saved = {}
+	baseline = saved.get('results', {})
+
+	results = {}
+	for size in sizes:
+		t0 = time.perf_counter()
+		synthetic.generate(size, os.path.join(args.workdir, f'n{size}'), args.seed)
+		print(f'{size} 銘柄のデータを用意しました ({time.perf_counter() - t0:.1f}s)')
+		for stage in stages:
+			key = f'{size}/{stage}'
+			results[key] = measure(size, stage, args.workdir, args.seed, args.max_render)
+			print(f'  {key}: {results[key]["wall"]:.3f}s')
+
+	print_table(results, baseline)
+	report = {
+		'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+		'environment': {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count()},
+		'params': {'seed': args.seed, 'max_render': args.max_render},
+		'results': results,
+	}
+	if baseline and not args.save_baseline:
+		# 同梱のベースラインは参照用の環境で記録したもの。別の環境では時間・RSS の差は目安にしかならない
+		for key, label in (('environment', '環境'), ('params', 'パラメータ')):
+			if saved.get(key) != report[key]:
+				print(f'\n注意: ベースラインは別の{label}で記録されています: {saved.get(key)} (今回: {report[key]})')
+	if args.output:
+		with open(args.output, 'w', encoding='utf-8') as f:
+			json.dump(report, f, ensure_ascii=False, indent=2)
+	if args.save_baseline:
+		with open(args.baseline, 'w', encoding='utf-8') as f:
+			json.dump(report, f, ensure_ascii=False, indent=2)
+		print(f'\nベースラインを {args.baseline} に保存しました。')
+		return
+	if not baseline:
+		print(f'\nベースライン {args.baseline} がありません (--save-baseline で作成)。')
+		return
+	problems = compare(results, baseline, args.tolerance, args.rss_tolerance)
+	if problems:
+		print('\n性能の悪化を検出しました:')
+		for p in problems:
+			print(f'  {p}')
+		sys.exit(1)
+	print('\nベースラインからの悪化はありません。')
+
+
+if __name__ == '__main__':
+	main()
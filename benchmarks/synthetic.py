@@ -0,0 +1,79 @@
+"""
+ベンチマーク用の合成データ生成。
+
+data/7203.T/ の実データの行ラベル (yfinance の項目名)・決算期・欠損パターンをそのまま使い、
+値だけを銘柄ごとの規模 (対数正規) とセルごとのゆらぎで変えた yfinance 形式の CSV を作る。
+ <out>/data/S000001.T/{financials,balance_sheet,cashflow,info}.csv
+同じ (銘柄数, seed) の生成済みデータは再利用する。
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+STATEMENT_FILES = ('financials.csv', 'balance_sheet.csv', 'cashflow.csv')
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', '7203.T')
+MARKER = '.synthetic.json'
+VERSION = 2  # 生成方法を変えたら上げる (生成済みのデータを作り直す。2: info.csv の整数・真偽値を型どおりに書く)
+
+
+def ticker_name(i: int) -> str:
+	return f'S{i:06d}.T'
+
+
+def _load_templates(template_dir: str) -> dict[str, pd.DataFrame]:
+	templates = {f: pd.read_csv(os.path.join(template_dir, f), index_col=0) for f in STATEMENT_FILES}
+	templates['info.csv'] = pd.read_csv(os.path.join(template_dir, 'info.csv'))  # 1 行の横長形式
+	return templates
+
+
+def generate(n: int, out_dir: str, seed: int = 0, template_dir: str = TEMPLATE_DIR) -> list[str]:
+	"""n 銘柄分の合成データを out_dir/data/ に書き出し、銘柄一覧を返す。"""
+	data_dir = os.path.join(out_dir, 'data')
+	marker = os.path.join(out_dir, MARKER)
+	tickers = [ticker_name(i) for i in range(n)]
+	spec = {'n': n, 'seed': seed, 'version': VERSION}
+	try:
+		with open(marker, encoding='utf-8') as f:
+			if json.load(f) == spec:
+				return tickers
+	except (OSError, ValueError):
+		pass
+
+	rng = np.random.default_rng(seed)
+	templates = _load_templates(template_dir)
+	# 銘柄の規模 (売上・資産などが同じ比率で動く) × セルごとの小さなゆらぎ
+	scale = rng.lognormal(-1.0, 1.2, size=n)
+	for f in STATEMENT_FILES:
+		tpl = templates[f]
+		base = tpl.to_numpy(dtype=np.float64)
+		noise = rng.lognormal(0.0, 0.15, size=(n,) + base.shape)
+		values = base[None] * noise
+		# 比率系 (Tax Rate 等) は規模に比例させない
+		ratio_rows = np.nanmax(np.abs(base), axis=1) < 10
+		values[:, ~ratio_rows, :] *= scale[:, None, None]
+		# 実データにない欠損も少し混ぜる (欠損処理の経路も通す)
+		values[rng.random(values.shape) < 0.02] = np.nan
+		for i, t in enumerate(tickers):
+			save_dir = os.path.join(data_dir, t)
+			os.makedirs(save_dir, exist_ok=True)
+			pd.DataFrame(values[i], index=tpl.index, columns=tpl.columns).to_csv(os.path.join(save_dir, f))
+
+	info = templates['info.csv']
+	# 真偽値はそのまま、整数は丸めて整数のまま書く (会社情報テーブルの Int64 / boolean 列の経路も通す)
+	floats = [c for c in info.columns if pd.api.types.is_float_dtype(info[c])]
+	ints = [c for c in info.columns if pd.api.types.is_integer_dtype(info[c])]
+	for i, t in enumerate(tickers):
+		row = info.copy()
+		row[floats] = row[floats] * rng.lognormal(0.0, 0.3, size=len(floats))
+		row[ints] = (row[ints] * rng.lognormal(0.0, 0.3, size=len(ints))).round().astype(np.int64)
+		for col in ('symbol', 'shortName', 'longName'):
+			if col in row.columns:
+				row[col] = t if col == 'symbol' else f'Synthetic {i:06d}'
+		row.to_csv(os.path.join(data_dir, t, 'info.csv'), index=False)
+
+	with open(marker, 'w', encoding='utf-8') as f:
+		json.dump(spec, f)
+	return tickers
@@ -1,43 +1,93 @@
-import subprocess, sys, os
-
-def run(cmd: list):
-	print(f"[RUN] {' '.join(cmd)}")
-	r = subprocess.run(cmd, capture_output=True, text=True)
-	if r.returncode != 0:
-		print(r.stdout)
-		print(r.stderr, file=sys.stderr)
-		raise SystemExit(f"コマンド失敗: {' '.join(cmd)}")
-	if r.stdout.strip():
-		print(r.stdout)
-	return r
+import sys, os
+import argparse
+import contextlib
 
-def main():
-	if len(sys.argv) < 2:
-		print("使用法: uv run src/main.py <TICKER>  (例: uv run src/main.py 7203.T)")
-		sys.exit(1)
-	ticker = sys.argv[1]
+# scripts/ 配下の各ステージを関数として呼び出す (サブプロセスは起動しない)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts'))
 
-	base = os.path.dirname(__file__)
-	scripts_dir = os.path.join(base, 'scripts')
+import pipeline
+import yahoo2finance
+import assets
+import instrument
+import providers
+import screener
+import company_info
 
-	# 1. Yahooから財務データ取得
-	run([sys.executable, os.path.join(scripts_dir, 'yahoo2finance.py'), ticker, '--output_dir', 'data'])
 
-	# 2. 分析CSV生成
-	run([sys.executable, os.path.join(scripts_dir, 'alldata2analysisdata.py'), ticker])
+def main():
+	parser = argparse.ArgumentParser(description='取得 → 指標計算 → 分析ポータル → グループ可視化 を一括実行')
+	parser.add_argument('tickers', nargs='*', help='ティッカー (例: 7203.T)。複数指定可')
+	parser.add_argument('--tickers-file', help='ティッカー一覧ファイル (1行1銘柄)')
+	parser.add_argument('--jobs', type=int, default=4, help='並列実行数 (銘柄・独立ステージ)')
+	parser.add_argument('--rate', type=float, default=2.0, help='取得リクエスト上限 (回/秒)。0 で無制限')
+	parser.add_argument('--ttl', type=float, default=24, help='取得データの有効期間 (時間)')
+	parser.add_argument('--retries', type=int, default=2, help='取得失敗時のリトライ回数')
+	parser.add_argument('--quarterly', action='store_true', help='四半期データも取得・追記して TTM 指標を計算する')
+	parser.add_argument('--no-prices', action='store_true', help='日次株価を取得しない (時価総額・PER 等は手元の株価があれば計算)')
+	parser.add_argument('--no-peers', action='store_true', help='同業統計 (セクター中央値・パーセンタイル) を更新せずポータルにも重ねない')
+	providers.add_provider_args(parser)
+	parser.add_argument('--no-fetch', action='store_true', help='取得せず手元の CSV から処理する')
+	parser.add_argument('--force', action='store_true', help='入力が変わっていないステージも再実行する (取得を含む)')
+	parser.add_argument('--no-browser', action='store_true', help='ブラウザを開かない')
+	assets.add_asset_args(parser)
+	parser.add_argument('--images', choices=('png', 'svg'), help='グループ可視化・指標グラフの静的画像も出力する')
+	parser.add_argument('--image-concurrency', type=int, default=2, help='画像レンダラ (Chromium) の同時描画タブ数')
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+
+	tickers = list(args.tickers)
+	if args.tickers_file:
+		tickers += yahoo2finance.read_tickers_file(args.tickers_file)
+	if not tickers:
+		print("使用法: uv run src/main.py <TICKER> [<TICKER> ...]  (例: uv run src/main.py 7203.T)")
+		sys.exit(1)
 
-	# 3. 個別指標グラフ自動HTML (analysisdata2graph_v2 が最新仕様ならそちらでも可)
-	run([sys.executable, os.path.join(scripts_dir, 'analysisdata2graph.py'), ticker])
+	try:
+		ticker_factory = providers.provider_from_args(args)
+	except ValueError as e:
+		parser.error(str(e))
 
-	# 3.5 全体財務可視化まとめ (alldata2visualization)
-	vis_script = os.path.join(scripts_dir, 'alldata2visualization.py')
-	if os.path.exists(vis_script):
-		run([sys.executable, vis_script, ticker])
+	# ステージ・銘柄ごとの所要時間は常に計測し、最後に遅いものを表示する
+	instrument.from_args(args, always=True)
 
-	# 4. 総合ブラウザポータル生成
-	browser_script = os.path.join(scripts_dir, 'analysisdata2graph_browser.py')
-	if os.path.exists(browser_script):
-		run([sys.executable, browser_script, ticker])
+	# 単一銘柄のときは従来どおり生成したポータルをブラウザで開く
+	open_browser = len(tickers) == 1 and not args.no_browser
+	asset_options = assets.options_from_args(args)
+	with contextlib.ExitStack() as stack:
+		exporter = None
+		if args.images:
+			import static_export
+			# レンダラは全銘柄で 1 つを共有する (銘柄ごとに Chromium を起動しない)
+			exporter = stack.enter_context(static_export.StaticExporter(args.images, args.image_concurrency, assets=asset_options))
+		stages = pipeline.default_stages(
+			fetch=not args.no_fetch,
+			open_browser=open_browser,
+			limiter=yahoo2finance.TokenBucket(args.rate) if args.rate else None,
+			ttl=args.ttl * 3600,
+			force_fetch=args.force,
+			ticker_factory=ticker_factory,
+			retries=args.retries,
+			quarterly=args.quarterly,
+			prices=not args.no_prices,
+			peers=not args.no_peers,
+			assets=asset_options,
+			exporter=exporter,
+		)
+		results = pipeline.Pipeline(stages, jobs=args.jobs, force=args.force).run(tickers)
+	pipeline.print_summary(results)
+	# 各銘柄の info.csv を型付きの会社情報テーブルにまとめる (初回は data/ 配下の全銘柄、以降は変わった銘柄だけ)
+	updated, rebuilt = company_info.CompanyInfo().update(tickers)
+	if updated:
+		print(f"会社情報テーブルに {len(updated)} 銘柄を反映しました{' (作り直し)' if rebuilt else ''}。")
+	# スクリーナーのインデックスがあれば処理した銘柄のサマリーだけを差し込む
+	index = screener.ScreenerIndex()
+	if index.exists():
+		updated, _ = index.update(tickers)
+		if updated:
+			print(f"スクリーナーのインデックスに {len(updated)} 銘柄を反映しました。")
+	instrument.finish()
+	if any(r.status in ('failed', 'blocked') for r in results):
+		raise SystemExit("一部の処理が失敗しました。")
 
 	print("一連の処理が完了しました。")
 
@@ -1,214 +1,377 @@
-
+import os
+import json
 import pandas as pd
+import numpy as np
 import sys
+import argparse
 
+import metrics as mx
+import manifest as mf
+import instrument
+import prices as px
+import schema
+from columnar_store import read_statement_frame, ColumnarStore, STATEMENT_FILES
+
+CACHE_NAME = 'analysis_cache.json'
+CACHE_VERSION = 2  # キャッシュ形式・項目の解決方法を変えたら上げる (2: schema の別名で項目を引く)
 
-def main():
-	if len(sys.argv) > 1:
-		symbol = sys.argv[1]
-	else:
-		symbol = '2267.T'
-	base_dir = f'data/{symbol}/'
-	financials_path = base_dir + 'financials.csv'
-	cashflow_path = base_dir + 'cashflow.csv'
-	balancesheet_path = base_dir + 'balance_sheet.csv'
 
-	df_financials = pd.read_csv(financials_path, index_col=0)
-	df_cashflow = pd.read_csv(cashflow_path, index_col=0)
-	df_balancesheet = pd.read_csv(balancesheet_path, index_col=0)
+def _frame_getter(frames: dict[str, pd.DataFrame], periods):
+	# 各表の行を financials の決算期に揃えた配列で返す (単銘柄モードのラベル整列と同じ)。項目が無ければ None
+	# 財務諸表は schema.Statement に 1 回変換し、以降の項目参照は ID の配列添字で引く (別名も同じ項目になる)
+	statements = {name: schema.Statement.from_frame(name, df, periods) for name, df in frames.items() if name in schema.STATEMENTS}
 
+	def get(statement: str, item: str):
+		if statement in statements:
+			return statements[statement].row(item)
+		df = frames.get(statement)  # 株価 (prices.price_frame) は項目名のまま
+		if df is None or item not in df.index:
+			return None
+		return pd.to_numeric(df.loc[item], errors='coerce').reindex(periods).to_numpy(dtype=np.float64)
+	return get
+
+
+def compute_analysis(df_financials: pd.DataFrame, df_cashflow: pd.DataFrame, df_balancesheet: pd.DataFrame,
+		names: list[str] | None = None, report: dict | None = None, df_price: pd.DataFrame | None = None) -> pd.DataFrame:
+	"""3表 (行=項目, 列=年度) から指標表 (行=年度, 列=指標) を作る。
+
+	names で計算する指標を限定できる (省略時は登録済みの全指標)。
+	report に dict を渡すと、入力不足でスキップした指標→欠けていた項目 を書き込む。
+	df_price (prices.price_frame) を渡すと株価を使う指標 (時価総額, PER 等) も計算する。
+	"""
 	years = df_financials.columns.tolist()
-	analysis = pd.DataFrame(index=years)
+	frames = {'financials': df_financials, 'cashflow': df_cashflow, 'balance_sheet': df_balancesheet}
+	if df_price is not None:
+		frames[px.PRICE_STATEMENT] = df_price
+	with instrument.span('metrics') as sp:
+		values, skipped = mx.compute(_frame_getter(frames, years), names)
+		sp.count(rows=len(years))
+	if report is not None:
+		report.update(skipped)
+	analysis = pd.DataFrame(values, index=years)
+	return analysis.round(2)
 
-	# 売上高成長率
-	try:
-		sales = df_financials.loc['Total Revenue']
-		analysis['売上高成長率(%)'] = sales.pct_change() * 100
-	except Exception:
-		pass
-	# 営業利益率
-	try:
-		analysis['営業利益率(%)'] = (df_financials.loc['Operating Income'] / df_financials.loc['Total Revenue']) * 100
-	except Exception:
-		pass
-	# 純利益率
-	try:
-		analysis['純利益率(%)'] = (df_financials.loc['Net Income'] / df_financials.loc['Total Revenue']) * 100
-	except Exception:
-		pass
-	# 営業CFマージン
-	try:
-		analysis['営業CFマージン(%)'] = (df_cashflow.loc['Operating Cash Flow'] / df_financials.loc['Total Revenue']) * 100
-	except Exception:
-		pass
-	# フリーCFマージン
-	try:
-		analysis['フリーCFマージン(%)'] = (df_cashflow.loc['Free Cash Flow'] / df_financials.loc['Total Revenue']) * 100
-	except Exception:
-		pass
-	# 自己資本比率
-	try:
-		analysis['自己資本比率(%)'] = (df_balancesheet.loc['Stockholders Equity'] / df_balancesheet.loc['Total Assets']) * 100
-	except Exception:
-		pass
-	# 流動比率
-	try:
-		analysis['流動比率(%)'] = (df_balancesheet.loc['Current Assets'] / df_balancesheet.loc['Current Liabilities']) * 100
-	except Exception:
-		pass
-	# 有利子負債比率
-	try:
-		analysis['有利子負債比率(%)'] = (df_balancesheet.loc['Total Liabilities Net Minority Interest'] / df_balancesheet.loc['Total Assets']) * 100
-	except Exception:
-		pass
-	# ROA（総資産利益率）
-	try:
-		analysis['ROA(%)'] = (df_financials.loc['Net Income'] / df_balancesheet.loc['Total Assets']) * 100
-	except Exception:
-		pass
-	# ROE（自己資本利益率）
-	try:
-		analysis['ROE(%)'] = (df_financials.loc['Net Income'] / df_balancesheet.loc['Stockholders Equity']) * 100
-	except Exception:
-		pass
-	# インタレストガバレッジレシオ
-	try:
-		if 'Interest Expense' in df_financials.index:
-			analysis['インタレストガバレッジレシオ'] = df_financials.loc['Operating Income'] / abs(df_financials.loc['Interest Expense'])
-	except Exception:
-		pass
-	# 固定長期適合率
-	try:
-		if 'Total Non Current Assets' in df_balancesheet.index and 'Stockholders Equity' in df_balancesheet.index and 'Total Non Current Liabilities Net Minority Interest' in df_balancesheet.index:
-			analysis['固定長期適合率(%)'] = (df_balancesheet.loc['Total Non Current Assets'] / (df_balancesheet.loc['Stockholders Equity'] + df_balancesheet.loc['Total Non Current Liabilities Net Minority Interest'])) * 100
-	except Exception:
-		pass
-	# 企業価値（EV）
-	try:
-		if 'Share Issued' in df_balancesheet.index and 'Stockholders Equity' in df_balancesheet.index and 'Total Debt' in df_balancesheet.index and 'Cash And Cash Equivalents' in df_balancesheet.index:
-			market_cap = df_balancesheet.loc['Stockholders Equity']
-			enterprise_value = market_cap + df_balancesheet.loc['Total Debt'] - df_balancesheet.loc['Cash And Cash Equivalents']
-			analysis['企業価値(EV)'] = enterprise_value
-	except Exception:
-		pass
-	# 理論株価
+
+def save_analysis(symbol: str, analysis: pd.DataFrame) -> str:
+	csv_path = f'data/{symbol}/financial_analysis_summary.csv'
+	analysis.to_csv(csv_path, encoding='utf-8-sig')
+	instrument.count(bytes=os.path.getsize(csv_path))
+	print(f'分析サマリーを {csv_path} に保存しました。')
+	return csv_path
+
+
+def _load_cache(base_dir: str) -> dict:
 	try:
-		if 'Stockholders Equity' in df_balancesheet.index and 'Share Issued' in df_balancesheet.index:
-			bps = df_balancesheet.loc['Stockholders Equity'] / df_balancesheet.loc['Share Issued']
-			analysis['理論株価'] = bps * 1
-	except Exception:
-		pass
+		with open(os.path.join(base_dir, CACHE_NAME), encoding='utf-8') as f:
+			cache = json.load(f)
+	except (OSError, ValueError):
+		return {}
+	return cache if cache.get('version') == CACHE_VERSION else {}
 
-	print('\n財務分析サマリー')
-	print(analysis.round(2))
 
-	output_dir = base_dir
-	csv_path = output_dir + 'financial_analysis_summary.csv'
-	analysis.round(2).to_csv(csv_path, encoding='utf-8-sig')
-	print(f'分析サマリーを {csv_path} に保存しました。')
+def update_analysis(symbol: str, frames: dict[str, pd.DataFrame] | None = None, names: list[str] | None = None,
+		force: bool = False, report: dict | None = None) -> tuple[pd.DataFrame, list[str]]:
+	"""入力CSVと指標定義のハッシュを前回と比べ、変わった分だけ再計算して summary CSV を更新する。
+
+	 - 何も変わっていなければ再計算もファイル書き込みもしない
+	 - financials 以外の表 (株価を含む) だけが変わった場合は、それに依存する指標だけを再計算し残りは既存CSVの値を使う
+	 - names で一部の指標だけを指定しても、サマリーにある他の指標の列 (ポータル・スクリーナー・同業統計が読む) は残す。
+	   入力が変わっていればそれらも計算し直す (古い値を残さない)
+	frames に読み込み済みの3表を渡すとディスクから読み直さない。株価は data/<symbol>/prices/ から決算期末の値を引く。
+	戻り値: (指標表, 再計算した指標名のリスト)
+	"""
+	base_dir = f'data/{symbol}'
+	csv_path = os.path.join(base_dir, 'financial_analysis_summary.csv')
+	requested = mx.metric_names() if names is None else list(names)
+	inputs = {name: mf.file_sha256(os.path.join(base_dir, filename)) for name, filename in STATEMENT_FILES.items()}
+	inputs[px.PRICE_STATEMENT] = px.content_hash(symbol)
+	cache = {} if force else _load_cache(base_dir)
+
+	existing = None
+	if cache and cache.get('output') is not None and mf.file_sha256(csv_path) == cache['output']:
+		existing = pd.read_csv(csv_path, index_col=0)
+	# 指標を絞った実行では、要求外の既存の列も出力に残す (登録済みの指標なら計算対象に含める)
+	carried = [] if names is None or existing is None else [c for c in existing.columns if c not in requested]
+	registered = set(mx.metric_names())
+	targets = requested + [c for c in carried if c in registered]
+	defs = {n: mx.definition_hash(n) for n in targets}
+	if existing is None or 'financials' in {k for k, h in inputs.items() if cache['inputs'].get(k) != h}:
+		# 決算期 (行) は financials で決まるので、financials が変わったら全指標を計算し直す
+		recompute = targets
+	else:
+		changed = {k for k, h in inputs.items() if cache['inputs'].get(k) != h}
+		recompute = [n for n in targets if mx.statements_of(n) & changed or cache['metrics'].get(n) != defs[n]]
+		if not recompute and list(cache.get('names', [])) == requested:
+			return existing, []
+
+	if frames is None:
+		needed = set().union(*(mx.statements_of(n) for n in recompute)) | ({'financials'} if existing is None else set())
+		frames = {name: read_statement_frame(symbol, name) if name in needed else pd.DataFrame() for name in STATEMENT_FILES}
+	years = frames['financials'].columns.tolist() if existing is None else existing.index.tolist()
+	if px.PRICE_STATEMENT not in frames:
+		frames = {**frames, px.PRICE_STATEMENT: px.price_frame(symbol, years)}
+	with instrument.span('metrics', symbol, metrics=len(recompute)) as sp:
+		values, skipped = mx.compute(_frame_getter(frames, years), recompute)
+		sp.count(rows=len(years))
+	if report is not None:
+		report.update(skipped)
+	if existing is not None and existing.index.tolist() != years:
+		# financials が変わって決算期が動いた場合、登録外の残す列は決算期のラベルで揃える
+		existing = existing[~existing.index.duplicated()].reindex(years)
+	order = list(existing.columns) + [n for n in requested if n not in existing.columns] if carried else requested
+	columns = {}
+	for n in order:
+		if n in values:
+			columns[n] = values[n]
+		elif n not in recompute and existing is not None and n in existing.columns:
+			columns[n] = existing[n].to_numpy()
+	analysis = pd.DataFrame(columns, index=years).round(2)
+
+	data = analysis.to_csv().encode('utf-8-sig')
+	if existing is None or mf.file_sha256(csv_path) != mf.sha256_bytes(data):
+		mf.atomic_write(csv_path, data)
+		print(f'分析サマリーを {csv_path} に保存しました。(再計算: {len(recompute)}/{len(requested)} 指標)')
+	cache = {
+		'version': CACHE_VERSION,
+		'inputs': inputs,
+		'metrics': defs,
+		'names': requested,
+		'output': mf.sha256_bytes(data),
+	}
+	mf.atomic_write(os.path.join(base_dir, CACHE_NAME), json.dumps(cache, ensure_ascii=False, indent=2).encode('utf-8'))
+	return analysis, recompute
+
+
+def print_skipped(skipped: dict[str, list[str]]):
+	for name, missing in skipped.items():
+		print(f'  スキップ: {name} (不足: {", ".join(missing)})')
+
+
+# ---- ユニバース (多銘柄一括) モード ------------------------------------------
+
+class Universe:
+	"""多銘柄の財務データを 銘柄 × 項目 × 決算期 の float64 配列に揃えたもの。
+
+	決算期は銘柄ごとに financials.csv の列順 (新しい順) でスロットに詰める。
+	periods[t, k] が銘柄 t のスロット k の決算期ラベル (無ければ None)。
+	"""
+
+	def __init__(self, tickers: list[str], periods: np.ndarray, arrays: dict[str, np.ndarray], items: dict[str, list[str]]):
+		self.tickers = tickers
+		self.periods = periods
+		self.arrays = arrays  # statement -> (銘柄, 項目, 決算期)
+		self.items = {name: {k: i for i, k in enumerate(keys)} for name, keys in items.items()}
+
+	def get(self, statement: str, item: str) -> np.ndarray | None:
+		# 全銘柄で欠けている項目だけ None (スキップ扱い)。一部銘柄の欠損は NaN のまま計算に伝播させる
+		i = self.items.get(statement, {}).get(item)
+		if i is None:
+			return None
+		block = self.arrays[statement][:, i, :]
+		return block if not np.isnan(block).all() else None
+
+
+def _empty_universe(tickers: list[str], n_periods: int, items: dict[str, list[str]]) -> Universe:
+	arrays = {name: np.full((len(tickers), len(keys), n_periods), np.nan) for name, keys in items.items()}
+	return Universe(tickers, np.full((len(tickers), n_periods), None, dtype=object), arrays, items)
+
+
+def universe_items(names: list[str] | None = None) -> dict[str, list[str]]:
+	# 要求された指標が使う項目だけを配列に載せる
+	items = mx.required_items(names)
+	items.setdefault('financials', [])  # 決算期の基準として常に読む
+	return items
+
+
+def load_universe(tickers: list[str], data_dir: str = 'data', store_root: str | None = None,
+		names: list[str] | None = None, quarterly: bool = False) -> Universe:
+	"""quarterly=True なら data/<ticker>/quarterly/ の四半期データを読む (決算期 = 四半期末)。"""
+	items = universe_items(names)
+	if store_root:
+		if quarterly:
+			raise ValueError('列指向ストアは四半期データに未対応です')
+		uni = _load_universe_store(tickers, store_root, items)
+		px.fill_universe(uni, data_dir)
+		return uni
+	frames = []
+	for t in tickers:
+		try:
+			frames.append({name: read_statement_frame(t, name, data_dir, quarterly=quarterly) for name in items if name in STATEMENT_FILES})
+		except FileNotFoundError:
+			print(f'{t}: CSV が揃っていないためスキップします', file=sys.stderr)
+			frames.append(None)
+	uni = frames_universe(tickers, frames, items)
+	px.fill_universe(uni, data_dir)
+	return uni
+
+
+def frames_universe(tickers: list[str], frames: list[dict[str, pd.DataFrame] | None], items: dict[str, list[str]]) -> Universe:
+	"""読み込み済みの表 (銘柄ごとの {statement: DataFrame}, 欠けた銘柄は None) を Universe に詰める。
+
+	f に無い表 (株価など) の配列は NaN のまま残す (prices.fill_universe で埋める)。f に株価の表
+	(prices.price_frame) があれば項目名で引いて詰める。
+	"""
+	n_periods = max((len(f['financials'].columns) for f in frames if f is not None), default=0)
+	uni = _empty_universe(tickers, n_periods, items)
+	# 項目名 → ID の解決は銘柄ごとではなく 1 回だけ
+	ids = {name: [schema.item_id(name, k) for k in keys] for name, keys in items.items() if name in schema.STATEMENTS}
+	for ti, f in enumerate(frames):
+		if f is None:
+			continue
+		periods = f['financials'].columns
+		uni.periods[ti, :len(periods)] = list(periods)
+		for name, keys in ids.items():
+			if name not in f:
+				continue
+			# 列は financials の決算期に揃える (単銘柄モードのラベル整列と同じ)
+			st = schema.Statement.from_frame(name, f[name], periods)
+			uni.arrays[name][ti, :, :len(periods)] = st.take([-1 if i is None else i for i in keys])
+		for name, keys in items.items():
+			# 財務諸表以外 (株価 prices.price_frame) は項目名のまま引く
+			if name in ids or name not in f:
+				continue
+			df = f[name].reindex(index=keys, columns=periods)
+			uni.arrays[name][ti, :, :len(periods)] = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+	return uni
+
+
+def _load_universe_store(tickers: list[str], store_root: str, items: dict[str, list[str]]) -> Universe:
+	# 列指向ストアから必要な項目だけを読み、銘柄・項目・スロットの添字へまとめて散布する
+	store = ColumnarStore(store_root)
+	# 正準名だけでなく別名で保存された項目も読む (ストアの項目名を schema で解決して絞り込む)
+	labels = {}
+	for name, keys in items.items():
+		if name in STATEMENT_FILES:
+			wanted = {schema.item_id(name, k) for k in keys}
+			labels[name] = [k for k in store.items(name) if schema.item_id(name, k) in wanted]
+	tables = {name: store.read(name, tickers=tickers, items=keys).to_pandas() for name, keys in labels.items()}
+	if tables['financials'].empty:
+		# 決算期の基準がないので financials は全項目から決算期を取る
+		tables['financials'] = store.read('financials', tickers=tickers).to_pandas()
+	t_index = {t: i for i, t in enumerate(tickers)}
+	fin = tables['financials']
+	# 各銘柄の (項目, 決算期) 行は CSV の列順で並んでいるので、項目内の出現順がスロット番号になる
+	fin = fin.assign(slot=fin.groupby(['ticker', 'item'], observed=True).cumcount())
+	slots = fin.drop_duplicates(['ticker', 'period'])[['ticker', 'period', 'slot']]
+	n_periods = int(slots['slot'].max()) + 1 if len(slots) else 0
+	uni = _empty_universe(tickers, n_periods, items)
+	ti = slots['ticker'].astype(str).map(t_index).to_numpy()
+	uni.periods[ti, slots['slot'].to_numpy()] = pd.to_datetime(slots['period']).dt.strftime('%Y-%m-%d').to_numpy()
+	for name in tables:
+		df = tables[name].merge(slots, on=['ticker', 'period'], how='inner')
+		if df.empty:
+			continue
+		# ストアの項目名 (カテゴリ) を schema の ID に 1 回だけ解決し、ID → 配列の項目位置の表で引く
+		position = np.full(len(schema.ITEMS) + 1, -1, dtype=np.intp)  # 末尾 = スキーマに無い項目
+		for k, pos in uni.items[name].items():
+			position[schema.item_id(name, k)] = pos
+		cats = df['item'].astype('category')
+		ids, ranks = schema.resolve(name, cats.cat.categories.astype(str))
+		codes = cats.cat.codes.to_numpy()
+		df = df.assign(pos=position[ids.astype(np.intp)][codes], rank=ranks[codes])
+		# 正準名と別名の両方がある場合は正準名 (優先順位の小さい方) を採る
+		df = df[df['pos'] >= 0].sort_values('rank', kind='stable').drop_duplicates(['ticker', 'period', 'pos'])
+		uni.arrays[name][df['ticker'].astype(str).map(t_index).to_numpy(), df['pos'].to_numpy(), df['slot'].to_numpy()] = df['value'].to_numpy()
+	return uni
+
+
+def compute_universe(uni: Universe, names: list[str] | None = None, report: dict | None = None) -> pd.DataFrame:
+	"""全銘柄の指標を NumPy のブロードキャストで一括計算し、ロング形式 (ticker, period, metric, value) で返す。"""
+	with instrument.span('metrics_universe', tickers=len(uni.tickers)) as sp:
+		values, skipped = mx.compute(uni.get, names)
+		sp.count(rows=len(uni.tickers))
+	if report is not None:
+		report.update(skipped)
+	cols = list(values)
+	if not cols:
+		return pd.DataFrame(columns=['ticker', 'period', 'metric', 'value'])
+	stacked = np.stack([values[m] for m in cols], axis=-1)  # (銘柄, 決算期, 指標)
+	T, P, M = stacked.shape
+	out = pd.DataFrame({
+		'ticker': np.repeat(np.array(uni.tickers, dtype=object), P * M),
+		'period': np.repeat(uni.periods.ravel(), M),
+		'metric': np.tile(np.array(cols, dtype=object), T * P),
+		'value': np.round(stacked.ravel(), 2),
+	})
+	# 値が無い (欠損項目・存在しない決算期) 行は出力しない
+	return out[np.isfinite(out['value'].to_numpy()) & out['period'].notna().to_numpy()].reset_index(drop=True)
+
+
+def list_tickers(data_dir: str = 'data') -> list[str]:
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(os.path.join(data_dir, d, 'financials.csv')))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='財務指標を計算して financial_analysis_summary.csv を出力')
+	parser.add_argument('symbols', nargs='*', help='ティッカー (例: 7203.T)。複数指定でユニバースモード')
+	parser.add_argument('--store', help='列指向ストアのディレクトリ (指定時は CSV の代わりに読み込む)')
+	parser.add_argument('--universe', action='store_true', help='全銘柄を一括計算してロング形式の指標表を出力 (銘柄省略時は data/ 配下の全銘柄)')
+	parser.add_argument('--tickers-file', help='ユニバースモードの銘柄一覧ファイル (1行1銘柄)')
+	parser.add_argument('--output', default='data/universe_metrics.csv', help='ユニバースモードの出力先')
+	parser.add_argument('--metrics', help='計算する指標をカンマ区切りで指定 (例: "ROE(%%),自己資本比率(%%)")')
+	parser.add_argument('--list-metrics', action='store_true', help='登録済みの指標と入力項目を表示して終了')
+	parser.add_argument('--force', action='store_true', help='キャッシュを無視して全指標を再計算する')
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	if args.list_metrics:
+		for name in mx.metric_names():
+			m = mx.REGISTRY[name]
+			refs = [f'{r[0]}:{r[1]}' if isinstance(r, tuple) else r for r in m.inputs]
+			print(f'{name}\t{", ".join(refs)}' + (f'\t# {m.description}' if m.description else ''))
+		return
+	names = [n.strip() for n in args.metrics.split(',') if n.strip()] if args.metrics else None
+	if names:
+		try:
+			mx.resolve(names)
+		except KeyError as e:
+			parser.error(str(e.args[0]))
+	skipped = {}
+
+	if args.universe or args.tickers_file or len(args.symbols) > 1:
+		tickers = list(args.symbols)
+		if args.tickers_file:
+			from yahoo2finance import read_tickers_file
+			tickers += read_tickers_file(args.tickers_file)
+		if not tickers:
+			tickers = ColumnarStore(args.store).tickers() if args.store else list_tickers()
+		uni = load_universe(tickers, store_root=args.store, names=names)
+		out = compute_universe(uni, names, report=skipped)
+		out.to_csv(args.output, index=False, encoding='utf-8-sig')
+		instrument.count(bytes=os.path.getsize(args.output))
+		print(f'{len(tickers)} 銘柄 / {len(out)} 行の指標を {args.output} に保存しました。')
+		print_skipped(skipped)
+		return
+
+	symbol = args.symbols[0] if args.symbols else '2267.T'
+
+	if args.store:
+		# ストアには銘柄ごとの内容ハッシュが無いため、ストア読み込み時は常に全指標を計算する
+		df_financials = read_statement_frame(symbol, 'financials', store_root=args.store)
+		df_cashflow = read_statement_frame(symbol, 'cashflow', store_root=args.store)
+		df_balancesheet = read_statement_frame(symbol, 'balance_sheet', store_root=args.store)
+		df_price = px.price_frame(symbol, df_financials.columns.tolist())
+		analysis = compute_analysis(df_financials, df_cashflow, df_balancesheet, names, report=skipped, df_price=df_price)
+		print('\n財務分析サマリー')
+		print(analysis)
+		print_skipped(skipped)
+		save_analysis(symbol, analysis)
+		return
+
+	csv_path = f'data/{symbol}/financial_analysis_summary.csv'
+	before = mf.file_sha256(csv_path)
+	analysis, recomputed = update_analysis(symbol, names=names, force=args.force, report=skipped)
+	if mf.file_sha256(csv_path) == before:
+		# 値が同じでも列の追加・削除があれば書き換えるので、書き換えたかどうかで表示を分ける
+		if recomputed:
+			print(f'{symbol}: 再計算した指標 ({len(recomputed)}) の値に変化がないためサマリーは更新していません。')
+		else:
+			print(f'{symbol}: 入力と指標定義に変更がないため再計算をスキップしました。')
+		return
+	print('\n財務分析サマリー')
+	print(analysis)
+	print_skipped(skipped)
 
 if __name__ == '__main__':
 	main()
-
-# # 売上高成長率
-# try:
-# 	sales = df_financials.loc['Total Revenue']
-# 	analysis['売上高成長率(%)'] = sales.pct_change() * 100
-# except Exception:
-# 	pass
-# # 営業利益率
-# try:
-# 	analysis['営業利益率(%)'] = (df_financials.loc['Operating Income'] / df_financials.loc['Total Revenue']) * 100
-# except Exception:
-# 	pass
-# # 純利益率
-# try:
-# 	analysis['純利益率(%)'] = (df_financials.loc['Net Income'] / df_financials.loc['Total Revenue']) * 100
-# except Exception:
-# 	pass
-# # 営業CFマージン
-# try:
-# 	analysis['営業CFマージン(%)'] = (df_cashflow.loc['Operating Cash Flow'] / df_financials.loc['Total Revenue']) * 100
-# except Exception:
-# 	pass
-# # フリーCFマージン
-# try:
-# 	analysis['フリーCFマージン(%)'] = (df_cashflow.loc['Free Cash Flow'] / df_financials.loc['Total Revenue']) * 100
-# except Exception:
-# 	pass
-# # 自己資本比率
-# try:
-# 	analysis['自己資本比率(%)'] = (df_balancesheet.loc['Stockholders Equity'] / df_balancesheet.loc['Total Assets']) * 100
-# except Exception:
-# 	pass
-# # 流動比率
-# try:
-# 	analysis['流動比率(%)'] = (df_balancesheet.loc['Current Assets'] / df_balancesheet.loc['Current Liabilities']) * 100
-# except Exception:
-# 	pass
-# # 有利子負債比率
-# try:
-# 	analysis['有利子負債比率(%)'] = (df_balancesheet.loc['Total Liabilities Net Minority Interest'] / df_balancesheet.loc['Total Assets']) * 100
-# except Exception:
-# 	pass
-
-# # ROA（総資産利益率）
-# try:
-# 	analysis['ROA(%)'] = (df_financials.loc['Net Income'] / df_balancesheet.loc['Total Assets']) * 100
-# except Exception:
-# 	pass
-
-# # ROE（自己資本利益率）
-# try:
-# 	analysis['ROE(%)'] = (df_financials.loc['Net Income'] / df_balancesheet.loc['Stockholders Equity']) * 100
-# except Exception:
-# 	pass
-
-# # インタレストガバレッジレシオ（Interest Coverage Ratio）
-# try:
-# 	# 営業利益 / 支払利息（支払利息項目がなければ空欄）
-# 	if 'Interest Expense' in df_financials.index:
-# 		analysis['インタレストガバレッジレシオ'] = df_financials.loc['Operating Income'] / abs(df_financials.loc['Interest Expense'])
-# except Exception:
-# 	pass
-
-# # 固定長期適合率
-# try:
-# 	# 固定資産 / (株主資本 + 固定負債)
-# 	if 'Total Non Current Assets' in df_balancesheet.index and 'Stockholders Equity' in df_balancesheet.index and 'Total Non Current Liabilities Net Minority Interest' in df_balancesheet.index:
-# 		analysis['固定長期適合率(%)'] = (df_balancesheet.loc['Total Non Current Assets'] / (df_balancesheet.loc['Stockholders Equity'] + df_balancesheet.loc['Total Non Current Liabilities Net Minority Interest'])) * 100
-# except Exception:
-# 	pass
-
-# # 企業価値（EV: Enterprise Value）
-# try:
-# 	# EV = 時価総額 + 有利子負債 - 現金及び現金同等物
-# 	if 'Share Issued' in df_balancesheet.index and 'Stockholders Equity' in df_balancesheet.index and 'Total Debt' in df_balancesheet.index and 'Cash And Cash Equivalents' in df_balancesheet.index:
-# 		# 仮に株価を取得できない場合は株主資本を時価総額とみなす
-# 		market_cap = df_balancesheet.loc['Stockholders Equity']
-# 		enterprise_value = market_cap + df_balancesheet.loc['Total Debt'] - df_balancesheet.loc['Cash And Cash Equivalents']
-# 		analysis['企業価値(EV)'] = enterprise_value
-# except Exception:
-# 	pass
-
-# # 理論株価（簡易版：BPS×PBR=株価）
-# try:
-# 	# BPS = 株主資本 / 発行済株式数
-# 	if 'Stockholders Equity' in df_balancesheet.index and 'Share Issued' in df_balancesheet.index:
-# 		bps = df_balancesheet.loc['Stockholders Equity'] / df_balancesheet.loc['Share Issued']
-# 		# PBR（仮に1倍とする）
-# 		analysis['理論株価'] = bps * 1
-# except Exception:
-# 	pass
-
-# # 結果表示
-# print('\n財務分析サマリー')
-# print(analysis.round(2))
-
-
-# # 出力先ディレクトリ（元CSVと同じ場所）
-# output_dir = 'data/2267.T/'
-# csv_path = output_dir + 'financial_analysis_summary.csv'
-# analysis.round(2).to_csv(csv_path, encoding='utf-8-sig')
-# print(f'分析サマリーを {csv_path} に保存しました。')
-# # 
\ No newline at end of file
@@ -1,52 +1,43 @@
 
 
-import sys, os
+import os
 import pandas as pd
 import plotly.graph_objs as go
 import plotly.offline as pyo
 
-# 代表項目（日本語ラベル）を各種定義
-financials_items = {
-	'Total Revenue': '売上高',
-	'Operating Revenue': '営業収益',
-	'Gross Profit': '売上総利益',
-	'Operating Income': '営業利益',
-	'EBITDA': 'EBITDA',
-	'EBIT': 'EBIT',
-	'Net Income': '純利益',
-}
-cashflow_items = {
-	'Operating Cash Flow': '営業活動によるCF',
-	'Investing Cash Flow': '投資活動によるCF',
-	'Financing Cash Flow': '財務活動によるCF',
-	'Free Cash Flow': 'フリーCF',
-	'End Cash Position': '期末現金残高',
-}
-balancesheet_items = {
-	'Total Assets': '総資産',
-	'Total Liabilities': '総負債',
-	'Shareholders Equity': '株主資本',
-	'Common Stock Equity': '普通株主資本',
-	'Retained Earnings': '利益剰余金',
-	'Treasury Stock': '自己株式',
-	'Ordinary Shares Number': '普通株式数',
-	'Share Issued': '発行株式数',
-	'Working Capital': '運転資本',
-	'Net Tangible Assets': '純有形資産',
-	'Tangible Book Value': '有形簿価',
-}
+import instrument
+import schema
+from columnar_store import read_statement_frame
+from assets import add_asset_args, options_from_args, plotly_include
+
+# 代表項目 (schema の正準名。日本語ラベルと別名の解決は schema に任せる)
+financials_items = ('Total Revenue', 'Operating Revenue', 'Gross Profit', 'Operating Income', 'EBITDA', 'EBIT', 'Net Income')
+cashflow_items = ('Operating Cash Flow', 'Investing Cash Flow', 'Financing Cash Flow', 'Free Cash Flow', 'End Cash Position')
+balancesheet_items = (
+	'Total Assets', 'Total Liabilities Net Minority Interest', 'Stockholders Equity', 'Common Stock Equity',
+	'Retained Earnings', 'Treasury Stock', 'Ordinary Shares Number', 'Share Issued', 'Working Capital',
+	'Net Tangible Assets', 'Tangible Book Value',
+)
 
-def load_and_select(file_path, items_dict):
-	df = pd.read_csv(file_path, index_col=0)
-	selected = {k: v for k, v in items_dict.items() if k in df.index}
+def load_and_select(file_path, statement, names):
+	return select_items(pd.read_csv(file_path, index_col=0), statement, names)
+
+def select_items(df, statement, names):
+	st = schema.Statement.from_frame(statement, df)
+	ids = [i for i in (schema.item_id(statement, n) for n in names) if i is not None and i in st]
 	# 代表項目がなければ最初の5項目
-	if not selected:
-		selected = {k: k for k in df.index[:5]}
-	df_selected = df.loc[list(selected.keys())]
-	df_selected.index = [selected[k] for k in df_selected.index]
-	return df_selected
+	if not ids:
+		return df.iloc[:5]
+	return st.frame(ids)
+
+def select_statements(statements):
+	# statements: {'financials': df, 'cashflow': df, 'balance_sheet': df} → 代表項目だけの (損益, CF, BS)
+	return (select_items(statements['financials'], 'financials', financials_items),
+		select_items(statements['cashflow'], 'cashflow', cashflow_items),
+		select_items(statements['balance_sheet'], 'balance_sheet', balancesheet_items))
 
-def build_portal(fin_df, cash_df, bs_df, symbol):
+def build_group_figure(fin_df, cash_df, bs_df):
+	"""グループ切替グラフの Figure と、グループ境界 [(グループ名, 終端 trace 番号), ...] を返す。"""
 	colors = ["#00bfae", "#ff6f61", "#ffd600", "#8e24aa", "#43a047", "#039be5", "#f4511e", "#c0ca33", "#5e35b1", "#00897b"]
 	years = fin_df.columns.tolist()
 	traces = []
@@ -94,8 +85,12 @@ def build_portal(fin_df, cash_df, bs_df, symbol):
 	for j, tr in enumerate(fig.data):
 		if j >= n_fin:
 			tr.visible = False
+	return fig, groups
 
-	div = pyo.plot(fig, include_plotlyjs=True, output_type='div', show_link=False)
+def build_portal(fin_df, cash_df, bs_df, symbol, assets=None):
+	fig, groups = build_group_figure(fin_df, cash_df, bs_df)
+	# assets 指定時は plotly.js を埋め込まず共有ファイルを参照する
+	div = pyo.plot(fig, include_plotlyjs=plotly_include(assets, os.path.dirname(portal_path(symbol))), output_type='div', show_link=False)
 
 	style_block = """
 <style>
@@ -159,21 +154,40 @@ function toggleTheme() {
 	return '\n'.join(html_parts)
 
 
-def main():
-	if len(sys.argv) > 1:
-		symbol = sys.argv[1]
-	else:
-		symbol = '2267.T'
-	base_dir = f'data/{symbol}/'
-	fin_df = load_and_select(base_dir + 'financials.csv', financials_items)
-	cash_df = load_and_select(base_dir + 'cashflow.csv', cashflow_items)
-	bs_df = load_and_select(base_dir + 'balance_sheet.csv', balancesheet_items)
-	html = build_portal(fin_df, cash_df, bs_df, symbol)
-	out_path = os.path.join(base_dir, 'all_financials_summary_graph.html')
+def portal_path(symbol):
+	return os.path.join(f'data/{symbol}/', 'all_financials_summary_graph.html')
+
+
+def write_portal(symbol, statements, open_browser=True, assets=None):
+	# statements: {'financials': df, 'cashflow': df, 'balance_sheet': df} (CSV を index_col=0 で読んだ形)
+	fin_df, cash_df, bs_df = select_statements(statements)
+	with instrument.span('group_html', symbol) as sp:
+		html = build_portal(fin_df, cash_df, bs_df, symbol, assets)  # 時間の大半は pyo.plot の図のシリアライズ
+		sp.count(rows=len(fin_df) + len(cash_df) + len(bs_df))
+	out_path = portal_path(symbol)
 	with open(out_path, 'w', encoding='utf-8') as f:
 		f.write(html)
-	print(f'まとめグラフポータルを {out_path} に出力しました。ブラウザを開きます。')
-	import webbrowser; webbrowser.open('file://' + os.path.abspath(out_path))
+	instrument.count(bytes=os.path.getsize(out_path))
+	if open_browser:
+		print(f'まとめグラフポータルを {out_path} に出力しました。ブラウザを開きます。')
+		import webbrowser; webbrowser.open('file://' + os.path.abspath(out_path))
+	else:
+		print(f'まとめグラフポータルを {out_path} に出力しました。')
+	return out_path
+
+
+def main():
+	import argparse
+	parser = argparse.ArgumentParser(description='損益/CF/BS グループ切替ポータルを生成')
+	parser.add_argument('symbol', nargs='?', default='2267.T', help='ティッカー (例: 7203.T)')
+	parser.add_argument('--store', help='列指向ストアのディレクトリ (指定時は CSV の代わりに読み込む)')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+	symbol = args.symbol
+	statements = {name: read_statement_frame(symbol, name, store_root=args.store) for name in ('financials', 'cashflow', 'balance_sheet')}
+	write_portal(symbol, statements, assets=options_from_args(args))
 
 if __name__ == '__main__':
 	main()
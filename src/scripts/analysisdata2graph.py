@@ -1,7 +1,12 @@
+import numpy as np
 import pandas as pd
-import plotly.graph_objs as go
-import plotly.offline as pyo
-import os, sys, html
+from plotly.offline import get_plotlyjs
+import os, sys, html, json
+import argparse
+import webbrowser
+
+import instrument
+from assets import AssetOptions, add_asset_args, options_from_args
 
 r"""
 ブラウザ上で全指標を操作しながら閲覧できるポータル。
@@ -11,56 +16,18 @@ r"""
  - 指標名フィルタ入力
  - 元データテーブル(DataTablesで検索/ソート)
  - 数値は自動数値化 (カンマ/全角マイナス対応)
+ - グラフは埋め込み JSON (指標 × 年度) からチェックした指標だけブラウザ側で生成 (外すと解放)
+ - グリッド表示: 選択中の指標を 1 枚の小さなグラフの並び (small multiples) で表示
+ - 同業比較: 同業統計 (peer_stats.py) があればセクター中央値と全銘柄中のパーセンタイル (右軸) を重ねる
 使い方:
  uv run src\scripts\analysisdata2graph_browser.py 3030.T
+ uv run src\scripts\analysisdata2graph.py 3030.T --grid   (グリッド表示で開く)
+ uv run src\scripts\analysisdata2graph.py 3030.T --no-peers (同業比較の系列を重ねない)
+ uv run src\scripts\analysisdata2graph.py 3030.T --assets (JS/CSS を共有 assets/ から参照。オフライン可)
  出力: data/<symbol>/financial_analysis_portal.html を自動オープン
 """
 
-if len(sys.argv) > 1:
-    symbol = sys.argv[1]
-else:
-    symbol = '2267.T'
-
-csv_path = f'data/{symbol}/financial_analysis_summary.csv'
-if not os.path.exists(csv_path):
-    print(f'ファイルがありません: {csv_path}')
-    sys.exit(1)
-
-# 読み込み
-df = pd.read_csv(csv_path, index_col=0)
-
-# 有効指標抽出
-metrics = [c for c in df.columns if df[c].notna().any()]
-years = df.index.tolist()
-
-# 数値化ヘルパ
-clean_df = pd.DataFrame(index=df.index)
-for m in metrics:
-    ser = df[m].astype(str).str.replace(',', '').str.replace('−', '-').str.strip()
-    clean_df[m] = pd.to_numeric(ser, errors='coerce')
-
-fig_divs = []
-plotly_js_included = False
-for i, m in enumerate(metrics):
-    values = clean_df[m]
-    if values.notna().sum() == 0:
-        continue
-    is_bar = m in ['企業価値(EV)', '理論株価']
-    if is_bar:
-        trace = go.Bar(x=years, y=values, name=m, text=[f'{v:,.2f}' if pd.notna(v) else '' for v in values], textposition='auto')
-    else:
-        trace = go.Scatter(x=years, y=values, mode='lines+markers', name=m, text=[f'{v:.2f}' if pd.notna(v) else '' for v in values], textposition='top center')
-    layout = go.Layout(title=m, xaxis=dict(title='年度', type='category'), yaxis=dict(title=m), margin=dict(l=60, r=20, t=50, b=50))
-    fig = go.Figure(data=[trace], layout=layout)
-    div = pyo.plot(fig, include_plotlyjs=not plotly_js_included, output_type='div', show_link=False)
-    plotly_js_included = True
-    fig_divs.append((m, div))
-
-# Data table (元のdfそのまま / HTMLエスケープ)
-styled_df = df.copy()
-html_table = styled_df.to_html(classes='display compact', border=0)
-
-style_block = f"""
+STYLE_BLOCK = f"""
 <style>
 :root {{ --bg-gradient: linear-gradient(135deg,#1b1f3a,#3a1b4d,#052b45); --panel-bg: rgba(255,255,255,0.65); --panel-border: rgba(255,255,255,0.25); --text-color:#222; --accent:#6a35ff; --accent-grad:linear-gradient(90deg,#7f5cff,#5f9dff); --shadow:0 4px 14px -4px rgba(0,0,0,.35); --chart-card-bg:rgba(255,255,255,0.55); }}
 body.dark {{ --bg-gradient: radial-gradient(circle at 20% 20%,#1e2950,#090d18 60%); --panel-bg: rgba(40,46,66,0.55); --panel-border: rgba(255,255,255,0.08); --text-color:#eee; --accent:#9d7bff; --accent-grad:linear-gradient(90deg,#9d7bff,#46c2ff); --shadow:0 6px 18px -6px rgba(0,0,0,.55); --chart-card-bg:rgba(33,39,58,0.55); }}
@@ -85,83 +52,332 @@ table.dataTable{{width:100%!important;background:transparent;}} table.dataTable
 .theme-toggle{{float:right;margin-top:-4px;}}
 </style>
 """
-html_parts = [
-  '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8" />',
-  f'<title>財務分析ポータル - {html.escape(symbol)}</title>',
-  '<script src="https://cdn.plot.ly/plotly-latest.min.js"></script>',
-  '<script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>',
-  '<link rel="stylesheet" href="https://cdn.datatables.net/1.13.7/css/jquery.dataTables.min.css" />',
-  '<script src="https://cdn.datatables.net/1.13.7/js/jquery.dataTables.min.js"></script>',
-  style_block,
-  '</head><body class="dark">',
-  '<div class="stars"></div>'
-]
-html_parts.append(f'<h1>財務分析ポータル ({html.escape(symbol)})</h1>')
-html_parts.append('<div class="controls">')
-html_parts.append('<div style="margin-bottom:8px;">指標フィルタ: <input id="filterBox" type="text" placeholder="例: ROE" oninput="filterMetrics()" />')
-html_parts.append('<button onclick="checkAll(true)">全選択</button><button onclick="checkAll(false)">全解除</button>')
-html_parts.append('<button onclick="toggleAllCharts(true)">全表示</button><button onclick="toggleAllCharts(false)">全非表示</button>')
-html_parts.append('<button onclick="toggleTable()" id="tblBtn">表を隠す</button>')
-html_parts.append('<button class="theme-toggle" onclick="toggleTheme()" id="themeBtn">LIGHT</button>')
-html_parts.append('</div>')
-html_parts.append('<div class="metric-list" id="metricList">')
-for i, (m, _) in enumerate(fig_divs):
-    checked = 'checked' if i < 6 else ''  # 最初の数個だけ表示
-    safe = html.escape(m)
-    html_parts.append(f'<label class="metric-item"><input type="checkbox" class="metricChk" data-target="chart_{i}" onchange="onMetricToggle(this)" {checked}/> {safe}</label>')
-html_parts.append('</div></div>')
-
-for i, (m, div) in enumerate(fig_divs):
-    style = '' if i < 6 else 'style="display:none;"'
-    html_parts.append(f'<div id="chart_{i}" class="chart-container" {style}>{div}</div>')
-
-html_parts.append('<div class="table-wrap" id="tableWrap"><h2>元データ</h2>')
-html_parts.append(html_table)
-html_parts.append('</div>')
-
-html_parts.append("""
+
+PORTAL_JS = """
 <script>
-function onMetricToggle(cb) {{
-  const id = cb.getAttribute('data-target');
-  const el = document.getElementById(id);
-  if (!el) return;
-  el.style.display = cb.checked ? 'block' : 'none';
-}}
-function checkAll(state) {{
-  document.querySelectorAll('.metricChk').forEach(cb => {{ cb.checked = state; onMetricToggle(cb); }});
-}}
-function toggleAllCharts(state) {{
-  document.querySelectorAll('.metricChk').forEach(cb => {{ cb.checked = state; onMetricToggle(cb); }});
-}}
-function filterMetrics() {{
+// チャートは埋め込み JSON (指標 × 年度) からチェック時にだけ生成し、外したら Plotly.purge で解放する
+const PORTAL = JSON.parse(document.getElementById('portalData').textContent);
+let gridMode = PORTAL.grid;
+let gridPending = false;
+const PLOT_CONFIG = { responsive: true, displaylogo: false };
+function fmtValue(v, bar) {
+  if (v === null) return '';
+  return bar ? v.toLocaleString('en-US', { minimumFractionDigits: 2, maximumFractionDigits: 2 }) : v.toFixed(2);
+}
+function makeTrace(i) {
+  const m = PORTAL.metrics[i], y = PORTAL.values[i], bar = PORTAL.bar[i];
+  const text = y.map(v => fmtValue(v, bar));
+  if (bar) return { type: 'bar', x: PORTAL.years, y: y, name: m, text: text, textposition: 'auto' };
+  return { type: 'scatter', mode: 'lines+markers', x: PORTAL.years, y: y, name: m, text: text, textposition: 'top center' };
+}
+function makeTraces(i, withPct) {
+  // 同業統計があればセクター中央値 (同じ軸) と パーセンタイル (右軸, ホバーに z スコア) を重ねる
+  const traces = [makeTrace(i)], p = PORTAL.peers;
+  if (!p || !p.median[i]) return traces;
+  traces.push({ type: 'scatter', mode: 'lines', x: PORTAL.years, y: p.median[i], name: 'セクター中央値',
+    line: { dash: 'dash', width: 1.5 }, hovertemplate: '%{y:,.2f}<extra>' + p.sector + ' 中央値</extra>' });
+  if (withPct) traces.push({ type: 'scatter', mode: 'lines+markers', x: PORTAL.years, y: p.pct[i], yaxis: 'y2',
+    name: 'パーセンタイル', customdata: p.z[i], line: { dash: 'dot', width: 1 }, marker: { size: 5 },
+    hovertemplate: '%{y:.0f} パーセンタイル (z = %{customdata:.2f})<extra></extra>' });
+  return traces;
+}
+function checkedIndices() {
+  return Array.from(document.querySelectorAll('.metricChk')).filter(cb => cb.checked).map(cb => +cb.dataset.index);
+}
+function showChart(i) {
+  if (document.getElementById('chart_' + i)) return;
+  const card = document.createElement('div');
+  card.id = 'chart_' + i;
+  card.className = 'chart-container';
+  const plot = document.createElement('div');
+  card.appendChild(plot);
+  // 指標順を保って差し込む
+  const host = document.getElementById('charts');
+  const next = Array.from(host.children).find(c => +c.id.slice(6) > i);
+  host.insertBefore(card, next || null);
+  const m = PORTAL.metrics[i];
+  const layout = {
+    title: { text: m }, xaxis: { title: { text: '年度' }, type: 'category' }, yaxis: { title: { text: m } },
+    margin: { l: 60, r: 20, t: 50, b: 50 }
+  };
+  if (PORTAL.peers && PORTAL.peers.median[i]) {
+    layout.yaxis2 = { title: { text: 'パーセンタイル' }, overlaying: 'y', side: 'right', range: [0, 100], showgrid: false };
+    layout.margin.r = 60;
+    layout.legend = { orientation: 'h', y: -0.25 };
+  }
+  Plotly.newPlot(plot, makeTraces(i, true), layout, PLOT_CONFIG);
+}
+function hideChart(i) {
+  const card = document.getElementById('chart_' + i);
+  if (!card) return;
+  Plotly.purge(card.firstChild);
+  card.remove();
+}
+function clearCharts() {
+  Array.from(document.getElementById('charts').children).forEach(c => hideChart(+c.id.slice(6)));
+}
+function renderGrid() {
+  gridPending = false;
+  const card = document.getElementById('gridCard'), plot = document.getElementById('gridChart');
+  Plotly.purge(plot);
+  const sel = checkedIndices();
+  if (!gridMode || !sel.length) { card.style.display = 'none'; return; }
+  card.style.display = 'block';
+  const cols = Math.min(3, sel.length), rows = Math.ceil(sel.length / cols);
+  const layout = {
+    grid: { rows: rows, columns: cols, pattern: 'independent' }, height: 80 + rows * 260,
+    showlegend: false, annotations: [], margin: { l: 50, r: 20, t: 40, b: 40 }
+  };
+  // グリッドでは右軸を持たないため、重ねるのはセクター中央値だけ
+  const traces = sel.flatMap((i, k) => {
+    const ax = k ? String(k + 1) : '';
+    layout['xaxis' + ax] = { type: 'category' };
+    layout.annotations.push({ text: PORTAL.metrics[i], showarrow: false, xref: 'x' + ax + ' domain', yref: 'y' + ax + ' domain',
+      x: 0.5, y: 1, xanchor: 'center', yanchor: 'bottom', font: { size: 12 } });
+    return makeTraces(i, false).map(t => { t.xaxis = 'x' + ax; t.yaxis = 'y' + ax; return t; });
+  });
+  Plotly.newPlot(plot, traces, layout, PLOT_CONFIG);
+}
+function scheduleGrid() {
+  // 全選択などで連続して変わっても再描画は 1 回にまとめる
+  if (gridPending) return;
+  gridPending = true;
+  requestAnimationFrame(renderGrid);
+}
+function onMetricToggle(cb) {
+  if (gridMode) { scheduleGrid(); return; }
+  const i = +cb.dataset.index;
+  if (cb.checked) showChart(i); else hideChart(i);
+}
+function checkAll(state) {
+  document.querySelectorAll('.metricChk').forEach(cb => { cb.checked = state; onMetricToggle(cb); });
+}
+function toggleAllCharts(state) {
+  document.querySelectorAll('.metricChk').forEach(cb => { cb.checked = state; onMetricToggle(cb); });
+}
+function applyMode() {
+  document.getElementById('gridBtn').textContent = gridMode ? '個別表示' : 'グリッド表示';
+  if (gridMode) { clearCharts(); scheduleGrid(); return; }
+  renderGrid();
+  checkedIndices().forEach(showChart);
+}
+function toggleGrid() {
+  gridMode = !gridMode;
+  applyMode();
+}
+function filterMetrics() {
   const q = document.getElementById('filterBox').value.toLowerCase();
-  document.querySelectorAll('#metricList label').forEach(lab => {{
+  document.querySelectorAll('#metricList label').forEach(lab => {
     const txt = lab.textContent.toLowerCase();
     lab.style.display = txt.indexOf(q) !== -1 ? 'inline-block' : 'none';
-  }});
-}}
-function toggleTable() {{
+  });
+}
+function toggleTable() {
   const w = document.getElementById('tableWrap');
   const b = document.getElementById('tblBtn');
-  if (w.style.display === 'none') {{ w.style.display = 'block'; b.textContent='表を隠す'; }} else {{ w.style.display='none'; b.textContent='表を表示'; }}
-}}
-$(document).ready(function() {{
-  $('table.display').DataTable({{ paging:false, searching:true, info:false, order:[] }});
-}});
+  if (w.style.display === 'none') { w.style.display = 'block'; b.textContent='表を隠す'; } else { w.style.display='none'; b.textContent='表を表示'; }
+}
+$(document).ready(function() {
+  $('table.display').DataTable({ paging:false, searching:true, info:false, order:[] });
+});
 function toggleTheme(){
   const b=document.body;const btn=document.getElementById('themeBtn');
   b.classList.toggle('dark');
   btn.textContent = b.classList.contains('dark') ? 'LIGHT' : 'DARK';
 }
+applyMode();
 </script>
-""")
+"""
 
-html_parts.append('</body></html>')
+BAR_METRICS = ['時価総額', '企業価値(EV)', '株価']
+INITIAL_VISIBLE = 6  # 最初に表示する指標数
 
-out_path = f'data/{symbol}/financial_analysis_portal.html'
-with open(out_path, 'w', encoding='utf-8') as f:
-    f.write('\n'.join(html_parts))
 
-print(f'ポータルを {out_path} に出力しました。ブラウザを開きます。')
-import webbrowser
-webbrowser.open('file://' + os.path.abspath(out_path))
+def summary_path(symbol: str) -> str:
+    return f'data/{symbol}/financial_analysis_summary.csv'
+
+
+def portal_path(symbol: str) -> str:
+    return f'data/{symbol}/financial_analysis_portal.html'
+
+
+def head_assets(assets: AssetOptions | None, from_dir: str) -> list[str]:
+    # 既定は plotly.js を埋め込み + jQuery/DataTables は CDN。assets 指定時は共有ファイルを相対参照
+    if assets is None:
+        return [
+          f'<script type="text/javascript">{get_plotlyjs()}</script>',
+          '<script src="https://code.jquery.com/jquery-3.7.1.min.js"></script>',
+          '<link rel="stylesheet" href="https://cdn.datatables.net/1.13.7/css/jquery.dataTables.min.css" />',
+          '<script src="https://cdn.datatables.net/1.13.7/js/jquery.dataTables.min.js"></script>',
+        ]
+    return [
+      f'<script src="{assets.plotly(from_dir)}"></script>',
+      f'<script src="{assets.url("jquery", from_dir)}"></script>',
+      f'<link rel="stylesheet" href="{assets.url("datatables-css", from_dir)}" />',
+      f'<script src="{assets.url("datatables-js", from_dir)}"></script>',
+    ]
+
+
+def _nullable(ser: pd.Series) -> list:
+    # NaN と ±inf (支払利息 0 のインタレストガバレッジ等) は JSON にできないので null
+    return [float(v) if np.isfinite(v) else None for v in ser.to_numpy(dtype=np.float64)]
+
+
+def portal_payload(df: pd.DataFrame, grid: bool = False, peers=None) -> dict:
+    """ポータルに埋め込むデータ (指標 × 年度)。NaN・±inf は null、値の無い指標は除く。
+
+    peers (peer_stats.PeerSeries) を渡すと指標ごとのセクター中央値・パーセンタイル・z スコアも埋め込む。
+    """
+    # 数値化 (カンマ/全角マイナス対応)
+    metrics = []
+    values = []
+    for m in df.columns:
+        ser = df[m].astype(str).str.replace(',', '').str.replace('−', '-').str.strip()
+        num = pd.to_numeric(ser, errors='coerce')
+        if not np.isfinite(num.to_numpy(dtype=np.float64)).any():
+            continue
+        metrics.append(m)
+        values.append(_nullable(num))
+    payload = {
+        'years': [str(y) for y in df.index],
+        'metrics': metrics,
+        'values': values,
+        'bar': [m in BAR_METRICS for m in metrics],
+        'grid': grid,
+        'peers': None,
+    }
+    if peers is not None:
+        # 同業統計に無い指標は null (グラフには重ねない)
+        payload['peers'] = {'sector': peers.sector, **{
+            key: [_nullable(frame[m]) if m in frame.columns else None for m in metrics]
+            for key, frame in (('median', peers.median), ('pct', peers.pct), ('z', peers.z))
+        }}
+    return payload
+
+
+def metric_figure(payload: dict, i: int) -> dict:
+    """payload の i 番目の指標のグラフ (ポータルの JS が生成するものと同じ形の Plotly figure dict)。"""
+    m = payload['metrics'][i]
+    y = payload['values'][i]
+    bar = payload['bar'][i]
+    text = ['' if v is None else (f'{v:,.2f}' if bar else f'{v:.2f}') for v in y]
+    if bar:
+        trace = {'type': 'bar', 'x': payload['years'], 'y': y, 'name': m, 'text': text, 'textposition': 'auto'}
+    else:
+        trace = {'type': 'scatter', 'mode': 'lines+markers', 'x': payload['years'], 'y': y, 'name': m, 'text': text, 'textposition': 'top center'}
+    layout = {'title': {'text': m}, 'xaxis': {'title': {'text': '年度'}, 'type': 'category'}, 'yaxis': {'title': {'text': m}},
+              'margin': {'l': 60, 'r': 20, 't': 50, 'b': 50}}
+    data = [trace]
+    peers = payload.get('peers')
+    if peers and peers['median'][i] is not None:
+        data.append({'type': 'scatter', 'mode': 'lines', 'x': payload['years'], 'y': peers['median'][i], 'name': 'セクター中央値',
+                     'line': {'dash': 'dash', 'width': 1.5}})
+        data.append({'type': 'scatter', 'mode': 'lines+markers', 'x': payload['years'], 'y': peers['pct'][i], 'yaxis': 'y2',
+                     'name': 'パーセンタイル', 'customdata': peers['z'][i], 'line': {'dash': 'dot', 'width': 1}, 'marker': {'size': 5}})
+        layout['yaxis2'] = {'title': {'text': 'パーセンタイル'}, 'overlaying': 'y', 'side': 'right', 'range': [0, 100], 'showgrid': False}
+        layout['margin']['r'] = 60
+        layout['legend'] = {'orientation': 'h', 'y': -0.25}
+    return {'data': data, 'layout': layout}
+
+
+def build_portal_html(df: pd.DataFrame, symbol: str, grid: bool = False, assets: AssetOptions | None = None,
+        peers=None) -> str:
+    # df: financial_analysis_summary.csv を index_col=0 で読んだもの (行=年度, 列=指標)
+    payload = portal_payload(df, grid, peers)
+    # </script> で埋め込みが途切れないようにエスケープ
+    data_json = json.dumps(payload, ensure_ascii=False, allow_nan=False, separators=(',', ':')).replace('</', '<\\/')
+
+    # Data table (元のdfそのまま / HTMLエスケープ)
+    styled_df = df.copy()
+    html_table = styled_df.to_html(classes='display compact', border=0)
+
+    html_parts = [
+      '<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8" />',
+      f'<title>財務分析ポータル - {html.escape(symbol)}</title>',
+      *head_assets(assets, os.path.dirname(portal_path(symbol))),
+      STYLE_BLOCK,
+      '</head><body class="dark">',
+      '<div class="stars"></div>'
+    ]
+    html_parts.append(f'<h1>財務分析ポータル ({html.escape(symbol)})</h1>')
+    if peers is not None:
+        html_parts.append(f'<div class="controls">比較対象: {html.escape(peers.sector)} (破線: セクター中央値 / 点線: 全銘柄中のパーセンタイル)</div>')
+    html_parts.append('<div class="controls">')
+    html_parts.append('<div style="margin-bottom:8px;">指標フィルタ: <input id="filterBox" type="text" placeholder="例: ROE" oninput="filterMetrics()" />')
+    html_parts.append('<button onclick="checkAll(true)">全選択</button><button onclick="checkAll(false)">全解除</button>')
+    html_parts.append('<button onclick="toggleAllCharts(true)">全表示</button><button onclick="toggleAllCharts(false)">全非表示</button>')
+    html_parts.append('<button onclick="toggleGrid()" id="gridBtn">グリッド表示</button>')
+    html_parts.append('<button onclick="toggleTable()" id="tblBtn">表を隠す</button>')
+    html_parts.append('<button class="theme-toggle" onclick="toggleTheme()" id="themeBtn">LIGHT</button>')
+    html_parts.append('</div>')
+    html_parts.append('<div class="metric-list" id="metricList">')
+    for i, m in enumerate(payload['metrics']):
+        checked = 'checked' if i < INITIAL_VISIBLE else ''  # 最初の数個だけ表示
+        safe = html.escape(m)
+        html_parts.append(f'<label class="metric-item"><input type="checkbox" class="metricChk" data-index="{i}" onchange="onMetricToggle(this)" {checked}/> {safe}</label>')
+    html_parts.append('</div></div>')
+
+    html_parts.append('<div id="gridCard" class="chart-container" style="display:none;"><div id="gridChart"></div></div>')
+    html_parts.append('<div id="charts"></div>')
+
+    html_parts.append('<div class="table-wrap" id="tableWrap"><h2>元データ</h2>')
+    html_parts.append(html_table)
+    html_parts.append('</div>')
+
+    html_parts.append(f'<script type="application/json" id="portalData">{data_json}</script>')
+    html_parts.append(PORTAL_JS)
+    html_parts.append('</body></html>')
+    return '\n'.join(html_parts)
+
+
+def write_portal(symbol: str, df: pd.DataFrame | None = None, open_browser: bool = True, grid: bool = False,
+        assets: AssetOptions | None = None, peers=None) -> str:
+    """ポータル HTML を data/<symbol>/ に書き出してパスを返す。df 省略時はサマリーCSVを読む。
+
+    peers (peer_stats.PeerSeries) を渡すと各指標グラフに同業比較の系列を重ねる。
+    """
+    if df is None:
+        df = pd.read_csv(summary_path(symbol), index_col=0)
+    out_path = portal_path(symbol)
+    with instrument.span('portal_html', symbol) as sp:
+        text = build_portal_html(df, symbol, grid, assets, peers)
+        sp.count(rows=len(df))
+    with open(out_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    instrument.count(bytes=os.path.getsize(out_path))
+    if open_browser:
+        print(f'ポータルを {out_path} に出力しました。ブラウザを開きます。')
+        webbrowser.open('file://' + os.path.abspath(out_path))
+    else:
+        print(f'ポータルを {out_path} に出力しました。')
+    return out_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='財務分析ポータル (financial_analysis_portal.html) を生成')
+    parser.add_argument('symbol', nargs='?', default='2267.T', help='ティッカー (例: 7203.T)')
+    parser.add_argument('--grid', action='store_true', help='グリッド表示 (small multiples) で開く')
+    parser.add_argument('--no-peers', action='store_true', help='同業比較 (セクター中央値・パーセンタイル) を重ねない')
+    add_asset_args(parser)
+    instrument.add_instrument_args(parser)
+    args = parser.parse_args()
+    instrument.from_args(args)
+    symbol = args.symbol
+
+    csv_path = summary_path(symbol)
+    if not os.path.exists(csv_path):
+        print(f'ファイルがありません: {csv_path}')
+        sys.exit(1)
+
+    peers = None
+    if not args.no_peers:
+        import peer_stats
+        stats = peer_stats.PeerStats()
+        if stats.load():
+            stats.update([symbol])
+            peers = stats.peer_series(symbol)
+    write_portal(symbol, grid=args.grid, assets=options_from_args(args), peers=peers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""
+生成するポータル HTML が共有する JS/CSS (plotly.js, jQuery, DataTables) を assets/ に 1 度だけ書き出す。
+
+既定では従来どおり各 HTML に plotly.js (約 3.5MB) を埋め込むが、--assets を付けると
+ assets/plotly-<版>/plotly.min.js などバージョン付きのパスに書き出し、各 HTML からは相対パスで参照する。
+銘柄が増えても JS は 1 部だけで済み、書き出し後はネットワーク無しで表示できる。
+
+入手元:
+ - plotly.js : plotly パッケージ同梱のもの (オフラインで書き出せる)
+ - plotly-basic (--plotly-bundle basic): scatter / bar / pie だけを含む公式の部分バンドル (約 1MB)。
+   独自ビルドではなく CDN の配布物そのもの (ポータルで使わない pie も入る)。パッケージに同梱されないため初回のみ CDN から取得
+ - jQuery / DataTables: 初回のみ CDN から取得
+ オフライン環境では `list` に出る取得元のファイルを別途入手し、表示されたパスに置けばよい (置いてあれば取得しない)
+使い方:
+ uv run src\\scripts\\assets.py install --assets assets --plotly-bundle basic
+ uv run src\\scripts\\analysisdata2graph.py 7203.T --assets
+"""
+
+import os
+import sys
+import threading
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+
+import manifest as mf
+
+ASSET_ROOT = 'assets'
+JQUERY_VERSION = '3.7.1'
+DATATABLES_VERSION = '1.13.7'
+PLOTLY_BUNDLES = ('full', 'basic')
+
+_lock = threading.Lock()
+
+
+def asset_files() -> dict[str, tuple[str, str | None]]:
+	"""名前 → (assets/ 内の相対パス, 取得元 URL)。URL が None のものは plotly パッケージから書き出す。"""
+	v = get_plotlyjs_version()
+	return {
+		'plotly': (f'plotly-{v}/plotly.min.js', None),
+		'plotly-basic': (f'plotly-{v}/plotly-basic.min.js', f'https://cdn.plot.ly/plotly-basic-{v}.min.js'),
+		'jquery': (f'jquery-{JQUERY_VERSION}/jquery.min.js', f'https://code.jquery.com/jquery-{JQUERY_VERSION}.min.js'),
+		'datatables-js': (f'datatables-{DATATABLES_VERSION}/jquery.dataTables.min.js',
+			f'https://cdn.datatables.net/{DATATABLES_VERSION}/js/jquery.dataTables.min.js'),
+		'datatables-css': (f'datatables-{DATATABLES_VERSION}/jquery.dataTables.min.css',
+			f'https://cdn.datatables.net/{DATATABLES_VERSION}/css/jquery.dataTables.min.css'),
+	}
+
+
+def ensure_asset(name: str, root: str = ASSET_ROOT) -> str:
+	"""assets/ に無ければ書き出して (取得して) パスを返す。既にあれば何もしない。"""
+	relpath, url = asset_files()[name]
+	path = os.path.join(root, relpath)
+	if os.path.exists(path):
+		return path
+	with _lock:
+		if os.path.exists(path):
+			return path
+		if url is None:
+			data = get_plotlyjs().encode('utf-8')
+		else:
+			try:
+				with urllib.request.urlopen(url, timeout=30) as res:
+					data = res.read()
+			except OSError as e:
+				raise RuntimeError(f'{name} を取得できません ({e})。{url} を {path} に配置してください') from e
+			if not data:
+				raise RuntimeError(f'{name} の取得結果が空です: {url}')
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		mf.atomic_write(path, data)
+		print(f'{path} を書き出しました。')
+	return path
+
+
+def relative_url(path: str, from_dir: str) -> str:
+	try:
+		return os.path.relpath(path, from_dir).replace(os.sep, '/')
+	except ValueError:  # Windows でドライブが異なる場合
+		return Path(os.path.abspath(path)).as_uri()
+
+
+@dataclass(frozen=True)
+class AssetOptions:
+	root: str = ASSET_ROOT
+	plotly_bundle: str = 'full'  # full / basic
+
+	def url(self, name: str, from_dir: str) -> str:
+		"""from_dir (HTML の出力先) から見た共有ファイルの相対 URL。"""
+		return relative_url(ensure_asset(name, self.root), from_dir)
+
+	def plotly(self, from_dir: str) -> str:
+		return self.url('plotly' if self.plotly_bundle == 'full' else 'plotly-basic', from_dir)
+
+	def key(self) -> str:
+		# パイプラインのステージ版数に含め、出力モードが変わったら作り直させる
+		return f'assets:{os.path.abspath(self.root)}:{self.plotly_bundle}'
+
+
+def plotly_include(assets: AssetOptions | None, from_dir: str):
+	"""plotly の include_plotlyjs 引数。assets 未指定なら従来どおり埋め込み (True)。"""
+	return True if assets is None else assets.plotly(from_dir)
+
+
+def add_asset_args(parser):
+	parser.add_argument('--assets', nargs='?', const=ASSET_ROOT, metavar='DIR',
+		help=f'JS/CSS を埋め込まず共有ディレクトリ (既定: {ASSET_ROOT}) から参照する')
+	parser.add_argument('--plotly-bundle', choices=PLOTLY_BUNDLES, default='full',
+		help='--assets 時の plotly.js (basic = scatter/bar/pie のみの軽量版)')
+
+
+def options_from_args(args) -> AssetOptions | None:
+	if args.assets is None:
+		return None
+	return AssetOptions(args.assets, args.plotly_bundle)
+
+
+def install(options: AssetOptions, names: list[str] | None = None) -> list[str]:
+	if names is None:
+		names = ['plotly' if options.plotly_bundle == 'full' else 'plotly-basic', 'jquery', 'datatables-js', 'datatables-css']
+	return [ensure_asset(n, options.root) for n in names]
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='ポータル共有アセット (plotly.js / jQuery / DataTables) の書き出し')
+	parser.add_argument('command', choices=['install', 'list'])
+	add_asset_args(parser)
+	args = parser.parse_args()
+	options = options_from_args(args) or AssetOptions(plotly_bundle=args.plotly_bundle)
+	if args.command == 'list':
+		for name, (relpath, url) in asset_files().items():
+			path = os.path.join(options.root, relpath)
+			state = f'{os.path.getsize(path):,} bytes' if os.path.exists(path) else '未配置'
+			print(f'{name}: {path} ({state}) <- {url or "plotly パッケージ"}')
+	else:
+		try:
+			install(options)
+		except RuntimeError as e:
+			print(e, file=sys.stderr)
+			sys.exit(1)
+		print(f'アセットを {options.root} に用意しました。')
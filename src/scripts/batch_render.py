@@ -0,0 +1,169 @@
+"""
+全銘柄 × 全ポータルをプロセスプールで一括描画する。
+
+各可視化スクリプトを銘柄ごと・スクリプトごとに起動する代わりに、ワーカープロセスで関数として呼び出す。
+plotly などの import はワーカーごとに 1 回で済み、銘柄は CPU コア数に応じて並列に処理される。
+既定ではブラウザを開かない (--open を付け、かつ 1 銘柄のときだけ開く)。
+使い方:
+ uv run src\\scripts\\batch_render.py 7203.T 6758.T
+ uv run src\\scripts\\batch_render.py --tickers-file tickers.txt --workers 8 --kinds portal,group --assets
+ uv run src\\scripts\\batch_render.py --all          (data/ 配下の全銘柄)
+"""
+
+import io
+import os
+import sys
+import time
+import argparse
+import contextlib
+from dataclasses import dataclass, field
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import instrument
+import analysisdata2graph
+import alldata2visualization
+import statements2visualization
+from assets import AssetOptions, add_asset_args, options_from_args
+from columnar_store import STATEMENT_FILES
+from alldata2analysisdata import list_tickers
+from yahoo2finance import read_tickers_file
+
+
+def _render_portal(ticker, assets, open_browser):
+	return analysisdata2graph.write_portal(ticker, open_browser=open_browser, assets=assets)
+
+
+def _render_group(ticker, assets, open_browser):
+	statements = {name: pd.read_csv(os.path.join('data', ticker, filename), index_col=0) for name, filename in STATEMENT_FILES.items()}
+	return alldata2visualization.write_portal(ticker, statements, open_browser=open_browser, assets=assets)
+
+
+def _render_statements(ticker, assets, open_browser):
+	# 3 ステートメントを 1 回読み、切替式の 1 ページにまとめる
+	return statements2visualization.write_page(ticker, statements2visualization.load_statements(ticker), assets, open_browser)
+
+
+# 名前 → (ticker, assets, open_browser) -> 出力パス
+RENDERERS = {
+	'portal': _render_portal,
+	'group': _render_group,
+	'statements': _render_statements,
+}
+
+
+@dataclass
+class RenderResult:
+	ticker: str
+	elapsed: float = 0.0
+	timings: dict = field(default_factory=dict)  # 種類 → 秒
+	outputs: list = field(default_factory=list)
+	errors: dict = field(default_factory=dict)   # 種類 → エラー
+	events: list = field(default_factory=list)   # ワーカーで記録した計測イベント (計測有効時)
+
+	@property
+	def ok(self) -> bool:
+		return not self.errors
+
+
+def render_ticker(ticker: str, kinds: list[str], assets: AssetOptions | None = None, open_browser: bool = False) -> RenderResult:
+	"""1 銘柄の指定ポータルをすべて描画する (ワーカープロセス内で実行)。1 種類の失敗で他を止めない。"""
+	result = RenderResult(ticker)
+	rec = instrument.recorder()
+	first_event = len(rec.events) if rec is not None else 0
+	start = time.perf_counter()
+	for kind in kinds:
+		t0 = time.perf_counter()
+		try:
+			# 各スクリプトの「出力しました」表示はバッチでは冗長なので捨てる
+			with contextlib.redirect_stdout(io.StringIO()), instrument.span(kind, ticker):
+				result.outputs.append(RENDERERS[kind](ticker, assets, open_browser))
+		except Exception as e:
+			result.errors[kind] = f'{type(e).__name__}: {e}'
+		result.timings[kind] = time.perf_counter() - t0
+	result.elapsed = time.perf_counter() - start
+	result.events = instrument.take_events(first_event)
+	return result
+
+
+def render_many(tickers: list[str], kinds: list[str] | None = None, workers: int | None = None,
+		assets: AssetOptions | None = None, open_browser: bool = False) -> list[RenderResult]:
+	"""銘柄をプロセスプールに分配して描画し、入力順で結果を返す。"""
+	kinds = list(RENDERERS) if kinds is None else kinds
+	tickers = list(dict.fromkeys(tickers))
+	workers = workers or os.cpu_count() or 1
+	results = {}
+	if workers == 1 or len(tickers) == 1:
+		for t in tickers:
+			results[t] = render_ticker(t, kinds, assets, open_browser)
+			_print_result(results[t])
+	else:
+		rec = instrument.recorder()
+		# ワーカーでも同じ設定で計測し、イベントは結果と一緒に親へ返して記録する
+		with ProcessPoolExecutor(max_workers=min(workers, len(tickers)), initializer=instrument.configure_child,
+				initargs=(rec.config() if rec is not None else None,)) as pool:
+			futures = {pool.submit(render_ticker, t, kinds, assets, open_browser): t for t in tickers}
+			for fut in as_completed(futures):
+				t = futures[fut]
+				try:
+					results[t] = fut.result()
+				except Exception as e:  # ワーカー自体の異常終了など
+					results[t] = RenderResult(t, errors={'worker': f'{type(e).__name__}: {e}'})
+				instrument.ingest(results[t].events)
+				_print_result(results[t])
+	return [results[t] for t in tickers]
+
+
+def _print_result(r: RenderResult):
+	detail = ', '.join(f'{k} {v:.2f}s' for k, v in r.timings.items())
+	print(f'[{"OK" if r.ok else "FAILED"}] {r.ticker} {r.elapsed:.2f}s ({detail})')
+	for kind, err in r.errors.items():
+		print(f'    {kind}: {err}')
+
+
+def print_summary(results: list[RenderResult], wall: float):
+	failed = [r for r in results if not r.ok]
+	total = sum(r.elapsed for r in results)
+	print(f'\n描画: 成功 {len(results) - len(failed)} / 失敗 {len(failed)} 銘柄, 経過 {wall:.1f}s (処理時間合計 {total:.1f}s)')
+	if results:
+		slowest = max(results, key=lambda r: r.elapsed)
+		print(f'  最も遅い銘柄: {slowest.ticker} {slowest.elapsed:.2f}s')
+	for r in failed:
+		print(f'  失敗 {r.ticker}: ' + '; '.join(f'{k}: {v}' for k, v in r.errors.items()))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='全銘柄のポータル/グラフをプロセスプールで一括描画')
+	parser.add_argument('tickers', nargs='*', help='ティッカー (例: 7203.T)')
+	parser.add_argument('--tickers-file', help='ティッカー一覧ファイル (1行1銘柄)')
+	parser.add_argument('--all', action='store_true', help='data/ 配下の全銘柄を対象にする')
+	parser.add_argument('--kinds', default=','.join(RENDERERS), help=f'描画する種類 (カンマ区切り: {",".join(RENDERERS)})')
+	parser.add_argument('--workers', type=int, default=os.cpu_count(), help='ワーカープロセス数 (既定: CPU コア数)')
+	parser.add_argument('--open', action='store_true', help='1 銘柄のときは描画後にブラウザで開く (既定はヘッドレス)')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	tickers = list(args.tickers)
+	if args.tickers_file:
+		tickers += read_tickers_file(args.tickers_file)
+	if args.all:
+		tickers += list_tickers()
+	kinds = [k.strip() for k in args.kinds.split(',') if k.strip()]
+	unknown = [k for k in kinds if k not in RENDERERS]
+	if unknown:
+		parser.error(f'未知の種類: {", ".join(unknown)}')
+	if not tickers:
+		parser.error('ティッカーを指定してください (または --tickers-file / --all)')
+
+	start = time.perf_counter()
+	results = render_many(tickers, kinds, args.workers, options_from_args(args), open_browser=args.open and len(set(tickers)) == 1)
+	print_summary(results, time.perf_counter() - start)
+	if any(not r.ok for r in results):
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,259 @@
+"""
+財務諸表の列指向ストア (Apache Arrow IPC)。pyarrow がある場合のみ利用可能なオプション機能。
+
+レイアウト:
+ <store>/<statement>.arrow   (statement = financials / balance_sheet / cashflow)
+  - 1銘柄 = 1 RecordBatch (ticker でパーティション)
+  - 列: item (int32, 項目コード) / period (date32, 決算期末) / value (float64)
+  - スキーマメタデータ: tickers (バッチ順の銘柄一覧), items (項目コード→yfinance ラベル)
+
+読み込みは memory map によるゼロコピー。ticker 条件は該当バッチだけを読む形で、
+item 条件はコード比較でプッシュダウンする (CSV の再パースが不要になる)。
+Parquet は圧縮が効く反面ゼロコピーの mmap 読み込みができないため、ここでは IPC を採用。
+
+使い方:
+ uv run src\\scripts\\columnar_store.py import --data-dir data --store store        (CSV → ストア)
+ uv run src\\scripts\\columnar_store.py import --store store 7203.T 6758.T        (銘柄指定で差し替え)
+ uv run src\\scripts\\columnar_store.py export --store store --data-dir data_out  (ストア → CSV)
+ uv run src\\scripts\\columnar_store.py info --store store
+"""
+
+import os
+import sys
+import json
+
+import numpy as np
+import pandas as pd
+
+import instrument
+
+try:
+	import pyarrow as pa
+	import pyarrow.compute as pc
+	import pyarrow.ipc as ipc
+except ImportError:  # pragma: no cover - オプション依存
+	pa = None
+
+STATEMENT_FILES = {
+	'financials': 'financials.csv',
+	'balance_sheet': 'balance_sheet.csv',
+	'cashflow': 'cashflow.csv',
+}
+QUARTERLY_DIR = 'quarterly'  # data/<ticker>/quarterly/ に同じファイル名で四半期データを置く
+
+
+def _require_pyarrow():
+	if pa is None:
+		raise ImportError('列指向ストアには pyarrow が必要です: uv add pyarrow (または pip install "financialanalysis[store]")')
+
+
+def _schema(tickers: list[str], items: list[str]):
+	return pa.schema(
+		[('item', pa.int32()), ('period', pa.date32()), ('value', pa.float64())],
+		metadata={
+			b'tickers': json.dumps(tickers, ensure_ascii=False).encode('utf-8'),
+			b'items': json.dumps(items, ensure_ascii=False).encode('utf-8'),
+		},
+	)
+
+
+def _wide_to_batch(df: pd.DataFrame, item_codes: dict[str, int], schema):
+	# 行=項目 / 列=決算期 のワイド表を (item, period, value) のロング形式へ。NaN も保持して往復可能にする
+	n_items, n_periods = df.shape
+	codes = np.fromiter((item_codes[k] for k in df.index), dtype=np.int32, count=n_items)
+	periods = pd.to_datetime(pd.Index(df.columns), errors='coerce').values.astype('datetime64[D]')
+	values = df.to_numpy(dtype=np.float64, na_value=np.nan)
+	return pa.record_batch([
+		pa.array(np.repeat(codes, n_periods), pa.int32()),
+		pa.array(np.tile(periods, n_items), pa.date32()),
+		pa.array(values.ravel(), pa.float64()),
+	], schema=schema)
+
+
+class ColumnarStore:
+	def __init__(self, root: str = 'store'):
+		_require_pyarrow()
+		self.root = root
+
+	def path(self, statement: str) -> str:
+		if statement not in STATEMENT_FILES:
+			raise ValueError(f'未知のステートメント: {statement}')
+		return os.path.join(self.root, f'{statement}.arrow')
+
+	def _open(self, statement: str):
+		path = self.path(statement)
+		if not os.path.exists(path):
+			return None
+		return ipc.open_file(pa.memory_map(path, 'r'))
+
+	def _meta(self, reader) -> tuple[list[str], list[str]]:
+		md = reader.schema.metadata or {}
+		return json.loads(md.get(b'tickers', b'[]')), json.loads(md.get(b'items', b'[]'))
+
+	def tickers(self, statement: str = 'financials') -> list[str]:
+		reader = self._open(statement)
+		return [] if reader is None else self._meta(reader)[0]
+
+	def items(self, statement: str) -> list[str]:
+		# ストアに現れる項目名 (全銘柄の和集合, 書き込み順)
+		reader = self._open(statement)
+		return [] if reader is None else self._meta(reader)[1]
+
+	def write_statement(self, statement: str, frames: dict[str, pd.DataFrame]):
+		"""銘柄→ワイド表 の dict を書き込む。既存銘柄は差し替え、それ以外の銘柄は保持する。"""
+		path = self.path(statement)
+		source = pa.memory_map(path, 'r') if os.path.exists(path) else None
+		reader = ipc.open_file(source) if source is not None else None
+		old_tickers, items = self._meta(reader) if reader is not None else ([], [])
+		item_codes = {k: i for i, k in enumerate(items)}
+		for df in frames.values():
+			for k in df.index:
+				if k not in item_codes:
+					item_codes[k] = len(items)
+					items.append(k)
+		tickers = [t for t in old_tickers if t not in frames] + list(frames)
+		schema = _schema(tickers, items)
+		batches = []
+		# 既存バッチはコピーせずにそのまま書き戻す (項目コードは追記のみなので互換)
+		for i, t in enumerate(old_tickers):
+			if t not in frames:
+				batches.append(reader.get_batch(i).replace_schema_metadata(schema.metadata))
+		for t, df in frames.items():
+			batches.append(_wide_to_batch(df, item_codes, schema))
+		os.makedirs(self.root, exist_ok=True)
+		tmp = f'{path}.tmp{os.getpid()}'
+		with pa.OSFile(tmp, 'wb') as sink, ipc.new_file(sink, schema) as writer:
+			for b in batches:
+				writer.write_batch(b)
+		# 既存バッチは旧ファイルの mmap を参照しているため、reader と合わせて参照を手放して mmap を閉じてから置き換える
+		# (Windows では mmap 中のファイルを置き換えられない)
+		b = batches = reader = None
+		if source is not None:
+			source.close()
+		os.replace(tmp, path)
+
+	def read(self, statement: str, tickers: list[str] | None = None, items: list[str] | None = None):
+		"""ロング形式 (ticker, item, period, value) の pyarrow.Table を返す。
+
+		tickers / items を指定すると該当バッチ・該当項目だけを読む。
+		"""
+		reader = self._open(statement)
+		if reader is None:
+			return pa.table({'ticker': pa.array([], pa.string()), 'item': pa.array([], pa.string()),
+				'period': pa.array([], pa.date32()), 'value': pa.array([], pa.float64())})
+		all_tickers, all_items = self._meta(reader)
+		positions = {t: i for i, t in enumerate(all_tickers)}
+		wanted = all_tickers if tickers is None else [t for t in tickers if t in positions]
+		item_filter = None
+		if items is not None:
+			code_of = {k: i for i, k in enumerate(all_items)}
+			item_filter = pa.array([code_of[k] for k in items if k in code_of], pa.int32())
+		parts = []
+		for t in wanted:
+			batch = reader.get_batch(positions[t])  # mmap 上のバッファをそのまま参照 (ゼロコピー)
+			if item_filter is not None:
+				batch = batch.filter(pc.is_in(batch.column(0), value_set=item_filter))
+			parts.append((t, batch))
+		ticker_codes = np.repeat(np.arange(len(parts), dtype=np.int32), [b.num_rows for _, b in parts])
+		item_dict = pa.array(all_items, pa.string())
+		if parts:
+			table = pa.Table.from_batches([b for _, b in parts])
+			item_col = pa.DictionaryArray.from_arrays(table.column('item').combine_chunks(), item_dict)
+			period_col, value_col = table.column('period'), table.column('value')
+		else:
+			item_col = pa.DictionaryArray.from_arrays(pa.array([], pa.int32()), item_dict)
+			period_col, value_col = pa.array([], pa.date32()), pa.array([], pa.float64())
+		ticker_col = pa.DictionaryArray.from_arrays(pa.array(ticker_codes, pa.int32()), pa.array([t for t, _ in parts], pa.string()))
+		return pa.table({'ticker': ticker_col, 'item': item_col, 'period': period_col, 'value': value_col})
+
+	def read_wide(self, ticker: str, statement: str, items: list[str] | None = None) -> pd.DataFrame:
+		"""pd.read_csv(<statement>.csv, index_col=0) と同じ形 (行=項目, 列=決算期文字列) で返す。"""
+		table = self.read(statement, tickers=[ticker], items=items)
+		if table.num_rows == 0:
+			raise FileNotFoundError(f'ストアに {ticker} の {statement} がありません: {self.root}')
+		item_codes = table.column('item').combine_chunks().indices.to_numpy()
+		labels = table.column('item').combine_chunks().dictionary.to_pylist()
+		periods = table.column('period').to_numpy().astype('datetime64[D]').astype(str)
+		values = table.column('value').to_numpy()
+		# 行の並びは書き込み時の (項目, 決算期) 順なので reshape だけで元のワイド表に戻る
+		_, first = np.unique(item_codes, return_index=True)
+		row_codes = item_codes[np.sort(first)]
+		n_periods = len(values) // len(row_codes)
+		return pd.DataFrame(
+			values.reshape(len(row_codes), n_periods),
+			index=pd.Index([labels[c] for c in row_codes]),
+			columns=list(periods[:n_periods]),
+		)
+
+
+def read_statement_frame(symbol: str, statement: str, data_dir: str = 'data', store_root: str | None = None,
+		quarterly: bool = False) -> pd.DataFrame:
+	# 各ステージ共通の読み込み口。store_root 指定時は列指向ストア、未指定なら従来の CSV
+	# quarterly=True なら四半期データ (data/<ticker>/quarterly/) の CSV
+	if store_root and quarterly:
+		raise ValueError('列指向ストアは四半期データに未対応です')
+	with instrument.span('read_store' if store_root else 'read_csv', symbol, statement=statement) as sp:
+		if store_root:
+			df = ColumnarStore(store_root).read_wide(symbol, statement)
+		else:
+			base = os.path.join(data_dir, symbol, QUARTERLY_DIR) if quarterly else os.path.join(data_dir, symbol)
+			df = pd.read_csv(os.path.join(base, STATEMENT_FILES[statement]), index_col=0)
+		sp.count(rows=len(df))
+	return df
+
+
+def import_csv_tree(data_dir: str = 'data', store_root: str = 'store', tickers: list[str] | None = None) -> int:
+	if tickers is None:
+		tickers = sorted(d for d in os.listdir(data_dir) if os.path.isdir(os.path.join(data_dir, d)))
+	store = ColumnarStore(store_root)
+	count = 0
+	for statement, filename in STATEMENT_FILES.items():
+		frames = {}
+		for t in tickers:
+			path = os.path.join(data_dir, t, filename)
+			if os.path.exists(path):
+				frames[t] = pd.read_csv(path, index_col=0)
+		if frames:
+			store.write_statement(statement, frames)
+			count = max(count, len(frames))
+	return count
+
+
+def export_csv_tree(store_root: str = 'store', data_dir: str = 'data', tickers: list[str] | None = None) -> int:
+	store = ColumnarStore(store_root)
+	written = set()
+	for statement, filename in STATEMENT_FILES.items():
+		for t in (tickers or store.tickers(statement)):
+			if t not in store.tickers(statement):
+				continue
+			save_dir = os.path.join(data_dir, t)
+			os.makedirs(save_dir, exist_ok=True)
+			store.read_wide(t, statement).to_csv(os.path.join(save_dir, filename))
+			written.add(t)
+	return len(written)
+
+
+if __name__ == '__main__':
+	import argparse
+	parser = argparse.ArgumentParser(description='財務諸表CSVと列指向ストア (Arrow IPC) の相互変換')
+	parser.add_argument('command', choices=['import', 'export', 'info'])
+	parser.add_argument('tickers', nargs='*', help='対象ティッカー (省略時は全銘柄)')
+	parser.add_argument('--data-dir', default='data', help='CSV ディレクトリ (data/<ticker>/*.csv)')
+	parser.add_argument('--store', default='store', help='ストアのディレクトリ')
+	args = parser.parse_intermixed_args()
+	try:
+		if args.command == 'import':
+			n = import_csv_tree(args.data_dir, args.store, args.tickers or None)
+			print(f'{n} 銘柄を {args.store} に取り込みました。')
+		elif args.command == 'export':
+			n = export_csv_tree(args.store, args.data_dir, args.tickers or None)
+			print(f'{n} 銘柄を {args.data_dir} に書き出しました。')
+		else:
+			store = ColumnarStore(args.store)
+			for statement in STATEMENT_FILES:
+				path = store.path(statement)
+				size = os.path.getsize(path) if os.path.exists(path) else 0
+				print(f'{statement}: {len(store.tickers(statement))} 銘柄, {size:,} bytes')
+	except ImportError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
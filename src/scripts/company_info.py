@@ -0,0 +1,454 @@
+"""
+会社情報テーブル。各銘柄の info.csv (yfinance の stock.info を 1 行にした 160 列前後の横長 CSV) を
+全銘柄ぶん 1 つの型付きの表にまとめる。
+
+保存形式 (data/company_info/, 数値と符号は memory map で読む):
+ - numbers.npy  (銘柄, 数値列)  float64。整数列・真偽値列も同じ配列に持ち、frame() で Int64 / boolean に戻す
+ - codes.npy    (銘柄, 分類列)  int32 の辞書符号 (-1 = 欠損)。sector / industry / currency / exchange など
+ - text.json    銘柄ごとにほぼ一意な文字列列 (社名・住所・事業概要など)。必要になったときだけ読む
+ - index.json   銘柄の並び (行番号)、列ごとの型、分類列の辞書、銘柄ごとの info.csv の mtime / サイズ / ハッシュ
+列の型: 分類列・文字列列は CATEGORY_FIELDS / TEXT_FIELDS で固定し、それ以外は作り直すときに全銘柄の値から
+ 真偽値 → 整数 → 実数 → (異なる値が少なければ) 分類 → 文字列 の順に決める。
+更新: info.csv の mtime / サイズが変わった銘柄だけを読み直す (内容ハッシュが同じなら何もしない)。
+ 分類列は辞書の末尾に新しい値を足すだけで既存の符号は変えない。銘柄の削除・新しい列の出現・型に合わない値・
+ 大量の変更のときだけ作り直す。
+同じセクター・業種の銘柄は符号の比較 1 回で引ける (info.csv を銘柄数だけ開かない)。
+
+使い方:
+ uv run src\\scripts\\company_info.py update              (data/ 配下を走査して変わった銘柄だけ反映。初回は作成)
+ uv run src\\scripts\\company_info.py update 7203.T 6758.T
+ uv run src\\scripts\\company_info.py build               (作り直し)
+ uv run src\\scripts\\company_info.py show 7203.T         (1 銘柄の値)
+ uv run src\\scripts\\company_info.py peers 7203.T --level industry
+ uv run src\\scripts\\company_info.py columns             (列と型・辞書の大きさ)
+ uv run src\\scripts\\company_info.py export companies.csv --columns shortName sector industry marketCap
+"""
+
+import io
+import os
+import re
+import csv
+import sys
+import json
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import manifest as mf
+import instrument
+
+INFO_NAME = 'info.csv'
+DEFAULT_ROOT = os.path.join('data', 'company_info')
+INDEX_VERSION = 1
+REBUILD_FRACTION = 0.25  # 変更銘柄がこの割合を超えたら差し込みより作り直しの方が速い
+CATEGORY_FRACTION = 0.5  # 異なる値の数が値のある銘柄数のこの割合以下の文字列列は分類列にする
+
+# 常に分類列 (辞書符号) にする列。同業比較・絞り込みに使う
+CATEGORY_FIELDS = (
+	'sector', 'sectorKey', 'sectorDisp', 'industry', 'industryKey', 'industryDisp',
+	'country', 'currency', 'financialCurrency', 'exchange', 'fullExchangeName', 'quoteType', 'typeDisp',
+	'market', 'region', 'language', 'exchangeTimezoneName', 'exchangeTimezoneShortName', 'recommendationKey',
+)
+# 常に文字列列にする列 (銘柄ごとにほぼ一意で、辞書にしても小さくならない)
+TEXT_FIELDS = (
+	'symbol', 'shortName', 'longName', 'displayName', 'address1', 'address2', 'zip', 'phone', 'fax',
+	'website', 'irWebsite', 'longBusinessSummary', 'companyOfficers', 'executiveTeam', 'messageBoardId',
+)
+NAME_FIELDS = ('shortName', 'longName')  # 表示名に使う順
+
+_INT = re.compile(r'^[-+]?\d+$')
+_BOOL = {'True': 1.0, 'False': 0.0}
+
+
+def info_path(symbol: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, symbol, INFO_NAME)
+
+
+def list_infos(data_dir: str = 'data') -> list[str]:
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(info_path(d, data_dir)))
+
+
+def _stat(path: str) -> tuple[int, int] | None:
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+def read_info(symbol: str, data_dir: str = 'data') -> dict[str, str] | None:
+	"""info.csv (ヘッダー + 1 行) を {列: 文字列} で読む。空欄の列は含めない。読めなければ None。"""
+	try:
+		with open(info_path(symbol, data_dir), newline='', encoding='utf-8') as f:
+			rows = list(csv.reader(f))
+	except (OSError, UnicodeDecodeError, csv.Error):
+		return None
+	if len(rows) < 2:
+		return None
+	return {k: v for k, v in zip(rows[0], rows[1]) if v != ''}
+
+
+def infer_kind(name: str, values: list[str]) -> str:
+	"""列の全銘柄の値 (空欄を除いた文字列) から型を決める。"""
+	if name in CATEGORY_FIELDS:
+		return 'category'
+	if name in TEXT_FIELDS or not values:
+		return 'text'
+	if all(v in _BOOL for v in values):
+		return 'bool'
+	if all(_INT.match(v) for v in values) and all(abs(int(v)) <= 2 ** 53 for v in values):
+		return 'int'  # float64 に誤差なく入る範囲 (時価総額・エポック秒など)
+	try:
+		for v in values:
+			float(v)
+		return 'float'
+	except ValueError:
+		pass
+	return 'category' if len(set(values)) <= max(1, len(values) * CATEGORY_FRACTION) else 'text'
+
+
+def _fits(kind: str, value: str) -> bool:
+	# 既存の列の型に値が入るか (入らなければ作り直して型を決め直す)
+	if kind == 'bool':
+		return value in _BOOL
+	if kind == 'int':
+		return bool(_INT.match(value)) and abs(int(value)) <= 2 ** 53
+	if kind == 'float':
+		try:
+			float(value)
+		except ValueError:
+			return False
+	return True
+
+
+def _number(kind: str, value: str) -> float:
+	return _BOOL[value] if kind == 'bool' else float(value)
+
+
+def _npy_bytes(arr: np.ndarray) -> bytes:
+	buf = io.BytesIO()
+	np.save(buf, np.ascontiguousarray(arr), allow_pickle=False)
+	return buf.getvalue()
+
+
+class CompanyInfo:
+	"""全銘柄の会社情報の型付きテーブル。load() で開き、update() で差分を反映、get() / peers() で引く。"""
+
+	def __init__(self, root: str = DEFAULT_ROOT, data_dir: str = 'data'):
+		self.root = root
+		self.data_dir = data_dir
+		self.tickers: list[str] = []
+		self.files: dict[str, dict] = {}
+		self.kinds: dict[str, str] = {}            # 列 → 型 (列の並びは info.csv で最初に現れた順)
+		self.categories: dict[str, list[str]] = {}  # 分類列 → 辞書 (符号 = 位置)
+		self.numbers = np.empty((0, 0))
+		self.codes = np.empty((0, 0), dtype=np.int32)
+		self._text: dict[str, list] | None = {}
+		self._rows: dict[str, int] = {}
+		self._num_cols: dict[str, int] = {}
+		self._cat_cols: dict[str, int] = {}
+		self._lookup: dict[str, dict[str, int]] = {}
+
+	# ---- 読み書き ----------------------------------------------------------------
+
+	def exists(self) -> bool:
+		return os.path.exists(os.path.join(self.root, 'index.json'))
+
+	def load(self, mmap: bool = True) -> bool:
+		"""保存済みのテーブルを開く。無い・形式が古い場合は False。文字列列は text() で初めて読む。"""
+		try:
+			with open(os.path.join(self.root, 'index.json'), encoding='utf-8') as f:
+				meta = json.load(f)
+		except (OSError, ValueError):
+			return False
+		if meta.get('version') != INDEX_VERSION:
+			return False
+		mode = 'r' if mmap else None
+		try:
+			self.numbers, self.codes = (np.load(os.path.join(self.root, f'{name}.npy'), mmap_mode=mode)
+				for name in ('numbers', 'codes'))
+		except (OSError, ValueError):
+			return False
+		self._set_meta(meta['tickers'], meta['kinds'], meta['categories'], meta['files'])
+		self._text = None
+		return True
+
+	def _set_meta(self, tickers: list[str], kinds: dict[str, str], categories: dict[str, list[str]], files: dict[str, dict]):
+		self.tickers, self.kinds, self.files = list(tickers), dict(kinds), dict(files)
+		self.categories = {c: list(categories[c]) for c in kinds if kinds[c] == 'category'}
+		self._rows = {t: i for i, t in enumerate(self.tickers)}
+		self._num_cols = {c: i for i, c in enumerate(c for c, k in kinds.items() if k in ('int', 'float', 'bool'))}
+		self._cat_cols = {c: i for i, c in enumerate(self.categories)}
+		self._lookup = {c: {v: i for i, v in enumerate(values)} for c, values in self.categories.items()}
+
+	def text(self) -> dict[str, list]:
+		"""文字列列 {列: 銘柄順の値 (欠損は None)}。"""
+		if self._text is None:
+			try:
+				with open(os.path.join(self.root, 'text.json'), encoding='utf-8') as f:
+					self._text = json.load(f)
+			except (OSError, ValueError):
+				self._text = {}
+		return self._text
+
+	def save(self):
+		os.makedirs(self.root, exist_ok=True)
+		for name in ('numbers', 'codes'):
+			mf.atomic_write(os.path.join(self.root, f'{name}.npy'), _npy_bytes(getattr(self, name)))
+		mf.atomic_write(os.path.join(self.root, 'text.json'), json.dumps(self.text(), ensure_ascii=False).encode('utf-8'))
+		meta = {'version': INDEX_VERSION, 'tickers': self.tickers, 'kinds': self.kinds,
+			'categories': self.categories, 'files': self.files}
+		# index.json を最後に書く (途中で止まっても npy と食い違った index.json は残らない)
+		mf.atomic_write(os.path.join(self.root, 'index.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+	# ---- 構築・差分更新 -------------------------------------------------------------
+
+	def build(self, tickers: list[str] | None = None) -> int:
+		"""全銘柄の info.csv を読んで型を決め直し、テーブルを作り直す。登録した銘柄数を返す。"""
+		tickers = list_infos(self.data_dir) if tickers is None else list(dict.fromkeys(tickers))
+		rows, files = {}, {}
+		with instrument.span('company_info_build', tickers=len(tickers)) as sp:
+			for t in tickers:
+				path = info_path(t, self.data_dir)
+				st = _stat(path)
+				row = read_info(t, self.data_dir)
+				if row is None:
+					continue
+				rows[t] = row
+				files[t] = {'stat': st, 'sha256': mf.file_sha256(path)}
+			columns = {}
+			for row in rows.values():
+				for c, v in row.items():
+					columns.setdefault(c, []).append(v)
+			kinds = {c: infer_kind(c, values) for c, values in columns.items()}
+			# 辞書は値の多い順 (同数なら名前順) にしておくと、符号の小さいほど大きなグループになる
+			categories = {c: [v for v, _ in sorted(pd.Series(columns[c]).value_counts().items(), key=lambda x: (-x[1], x[0]))]
+				for c, k in kinds.items() if k == 'category'}
+			self._set_meta([], kinds, categories, {})
+			self.numbers = np.empty((0, len(self._num_cols)))
+			self.codes = np.empty((0, len(self._cat_cols)), dtype=np.int32)
+			self._text = {c: [] for c, k in kinds.items() if k == 'text'}
+			self._apply(rows, files)
+			sp.count(rows=len(rows))
+		self.save()
+		return len(rows)
+
+	def update(self, tickers: list[str] | None = None) -> tuple[list[str], bool]:
+		"""info.csv が変わった銘柄だけを反映する。tickers 省略時は data/ 配下を走査 (mtime / サイズで判定)。
+
+		戻り値: (反映した銘柄, 作り直したか)
+		"""
+		if not self.load(mmap=False):
+			self.build()
+			return list(self.tickers), True
+		scan = list_infos(self.data_dir) if tickers is None else list(dict.fromkeys(tickers))
+		removed = [t for t in (self.tickers if tickers is None else scan) if t in self._rows and not os.path.exists(info_path(t, self.data_dir))]
+		changed, files, touched = {}, {}, False
+		for t in scan:
+			path = info_path(t, self.data_dir)
+			st = _stat(path)
+			prev = self.files.get(t)
+			if st is None or (prev is not None and prev['stat'] is not None and tuple(prev['stat']) == st):
+				continue
+			digest = mf.file_sha256(path)
+			if prev is not None and prev['sha256'] == digest:
+				prev['stat'] = st  # 内容は同じ (touch だけ)
+				touched = True
+				continue
+			row = read_info(t, self.data_dir)
+			if row is not None:
+				changed[t] = row
+				files[t] = {'stat': st, 'sha256': digest}
+		misfit = any(c not in self.kinds or not _fits(self.kinds[c], v) for row in changed.values() for c, v in row.items())
+		if removed or misfit or len(changed) > max(1, len(self.tickers)) * REBUILD_FRACTION:
+			self.build(None if tickers is None else sorted((set(self.tickers) | set(scan)) - set(removed)))
+			return sorted(set(changed) | set(removed)), True
+		if not changed:
+			if touched:
+				self.save()  # touch だけの銘柄の stat を記録し直す
+			return [], False
+		with instrument.span('company_info_update', tickers=len(changed)):
+			self._apply(changed, files)
+		self.save()
+		return sorted(changed), False
+
+	def _apply(self, changed: dict[str, dict[str, str]], files: dict[str, dict]):
+		# 既存銘柄は行を書き換え、新しい銘柄は末尾に行を足す。分類列の新しい値は辞書の末尾に足す
+		new = [t for t in changed if t not in self._rows]
+		numbers = np.vstack([np.asarray(self.numbers), np.full((len(new), len(self._num_cols)), np.nan)])
+		codes = np.vstack([np.asarray(self.codes), np.full((len(new), len(self._cat_cols)), -1, dtype=np.int32)])
+		text = self.text()
+		for values in text.values():
+			values.extend([None] * len(new))
+		self._set_meta(self.tickers + new, self.kinds, self.categories, self.files)
+		for t, row in changed.items():
+			r = self._rows[t]
+			numbers[r] = np.nan
+			codes[r] = -1
+			for c in text:
+				text[c][r] = None
+			for c, v in row.items():
+				kind = self.kinds[c]
+				if kind == 'category':
+					lookup = self._lookup[c]
+					if v not in lookup:
+						lookup[v] = len(self.categories[c])
+						self.categories[c].append(v)
+					codes[r, self._cat_cols[c]] = lookup[v]
+				elif kind == 'text':
+					text[c][r] = v
+				else:
+					numbers[r, self._num_cols[c]] = _number(kind, v)
+			self.files[t] = files[t]
+		self.numbers, self.codes = numbers, codes
+
+	# ---- 参照 ---------------------------------------------------------------------
+
+	def __len__(self) -> int:
+		return len(self.tickers)
+
+	def __contains__(self, ticker: str) -> bool:
+		return ticker in self._rows
+
+	def is_current(self, ticker: str) -> bool:
+		"""ticker の info.csv が登録時から変わっていなければ True (mtime / サイズだけで判定する)。"""
+		prev = self.files.get(ticker)
+		return prev is not None and prev['stat'] is not None and tuple(prev['stat']) == _stat(info_path(ticker, self.data_dir))
+
+	def get(self, ticker: str, column: str, default=None):
+		"""1 銘柄の 1 列の値 (Python の型)。登録外の銘柄・列や欠損は default。"""
+		r, kind = self._rows.get(ticker), self.kinds.get(column)
+		if r is None or kind is None:
+			return default
+		if kind == 'category':
+			code = int(self.codes[r, self._cat_cols[column]])
+			return self.categories[column][code] if code >= 0 else default
+		if kind == 'text':
+			v = self.text()[column][r]
+			return default if v is None else v
+		v = float(self.numbers[r, self._num_cols[column]])
+		if np.isnan(v):
+			return default
+		return bool(v) if kind == 'bool' else int(v) if kind == 'int' else v
+
+	def row(self, ticker: str) -> dict:
+		"""1 銘柄の値のある列だけを {列: 値} で返す。"""
+		marker = object()
+		values = {c: self.get(ticker, c, marker) for c in self.kinds}
+		return {c: v for c, v in values.items() if v is not marker}
+
+	def name(self, ticker: str) -> str:
+		"""表示名 (shortName → longName の順。無ければ空)。"""
+		for column in NAME_FIELDS:
+			v = self.get(ticker, column)
+			if v:
+				return str(v)
+		return ''
+
+	def members(self, column: str, value: str) -> list[str]:
+		"""分類列 column が value の銘柄 (行の順)。"""
+		code = self._lookup.get(column, {}).get(value)
+		if code is None:
+			return []
+		return [self.tickers[r] for r in np.flatnonzero(np.asarray(self.codes[:, self._cat_cols[column]]) == code)]
+
+	def peers(self, ticker: str, level: str = 'industry') -> list[str]:
+		"""ticker と同じ level (sector / industry など) の銘柄 (ticker 自身を除く)。"""
+		value = self.get(ticker, level)
+		return [] if value is None else [t for t in self.members(level, value) if t != ticker]
+
+	def counts(self, column: str) -> pd.Series:
+		"""分類列の値ごとの銘柄数 (多い順)。"""
+		codes = np.asarray(self.codes[:, self._cat_cols[column]])
+		n = np.bincount(codes[codes >= 0], minlength=len(self.categories[column]))
+		return pd.Series(n, index=self.categories[column], name=column).sort_values(ascending=False, kind='stable')
+
+	def frame(self, columns: list[str] | None = None) -> pd.DataFrame:
+		"""銘柄を索引にした型付きの DataFrame (分類列は category、整数列は Int64、真偽値列は boolean)。"""
+		columns = list(self.kinds) if columns is None else [c for c in columns if c in self.kinds]
+		out = {}
+		for c in columns:
+			kind = self.kinds[c]
+			if kind == 'category':
+				out[c] = pd.Categorical.from_codes(np.asarray(self.codes[:, self._cat_cols[c]]), categories=self.categories[c])
+			elif kind == 'text':
+				out[c] = pd.array(self.text()[c], dtype='string')
+			else:
+				v = pd.Series(np.asarray(self.numbers[:, self._num_cols[c]]))
+				out[c] = v.astype({'int': 'Int64', 'bool': 'boolean'}.get(kind, 'float64')).array
+		return pd.DataFrame(out, index=pd.Index(self.tickers, name='ticker'))
+
+	@property
+	def nbytes(self) -> int:
+		"""数値・符号の配列と辞書の大きさ (文字列列は読み込み済みなら含める)。"""
+		size = self.numbers.nbytes + self.codes.nbytes + sum(len(v.encode('utf-8')) for vs in self.categories.values() for v in vs)
+		if self._text:
+			size += sum(len(v.encode('utf-8')) for vs in self._text.values() for v in vs if v is not None)
+		return size
+
+
+def open_table(data_dir: str = 'data', root: str = DEFAULT_ROOT) -> CompanyInfo | None:
+	"""保存済みのテーブルを開く (無ければ None)。銘柄ごとに is_current() で新しさを確かめてから使う。"""
+	table = CompanyInfo(root, data_dir)
+	return table if table.load() else None
+
+
+def main():
+	parser = argparse.ArgumentParser(description='全銘柄の info.csv を型付きの会社情報テーブルにまとめる')
+	parser.add_argument('--root', default=DEFAULT_ROOT, help='テーブルの保存先')
+	parser.add_argument('--data-dir', default='data')
+	instrument.add_instrument_args(parser)
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('build', help='作り直す')
+	p.add_argument('tickers', nargs='*', help='対象銘柄 (省略時は data/ 配下の全銘柄)')
+	p = sub.add_parser('update', help='info.csv が変わった銘柄だけを反映する (無ければ作成)')
+	p.add_argument('tickers', nargs='*', help='対象銘柄 (省略時は data/ 配下を走査)')
+	p = sub.add_parser('show', help='1 銘柄の値を表示する')
+	p.add_argument('ticker')
+	p = sub.add_parser('peers', help='同じセクター・業種の銘柄を表示する')
+	p.add_argument('ticker')
+	p.add_argument('--level', default='industry', help='比べる分類列 (sector / industry など)')
+	sub.add_parser('columns', help='列と型の一覧')
+	p = sub.add_parser('export', help='型付きの表を CSV に書き出す')
+	p.add_argument('output')
+	p.add_argument('--columns', nargs='+', help='書き出す列 (省略時は全列)')
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	table = CompanyInfo(args.root, args.data_dir)
+	if args.command == 'build':
+		n = table.build(args.tickers or None)
+		print(f'{args.root} に {n} 銘柄 / {len(table.kinds)} 列の会社情報テーブルを作成しました。')
+	elif args.command == 'update':
+		updated, rebuilt = table.update(args.tickers or None)
+		print(f'{len(updated)} 銘柄を反映しました{" (作り直し)" if rebuilt else ""}。')
+	else:
+		if not table.load():
+			sys.exit(f'{args.root} に会社情報テーブルがありません (company_info.py build)')
+		if args.command == 'show':
+			if args.ticker not in table:
+				sys.exit(f'{args.ticker} は登録されていません')
+			for c, v in table.row(args.ticker).items():
+				print(f'{c:<36} {v}')
+		elif args.command == 'peers':
+			if args.level not in table.categories:
+				sys.exit(f'分類列ではありません: {args.level}')
+			value = table.get(args.ticker, args.level)
+			peers = table.peers(args.ticker, args.level)
+			print(f'{args.ticker}  {args.level}: {value}  同業 {len(peers)} 銘柄')
+			for t in peers:
+				print(f'  {t:<10} {table.name(t)}')
+		elif args.command == 'columns':
+			for c, kind in table.kinds.items():
+				extra = f'  ({len(table.categories[c])} 値)' if kind == 'category' else ''
+				print(f'{c:<36} {kind}{extra}')
+			print(f'{len(table)} 銘柄 / {len(table.kinds)} 列')
+		elif args.command == 'export':
+			table.frame(args.columns).to_csv(args.output, encoding='utf-8-sig')
+			print(f'{args.output} に書き出しました。')
+	instrument.finish()
+
+
+if __name__ == '__main__':
+	main()
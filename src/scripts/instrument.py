@@ -0,0 +1,356 @@
+"""
+ステージ別の計測 (構造化イベント + cProfile)。
+
+処理の区間を span で囲むと、終了時に 1 件の JSON イベントを記録する:
+ {"event": "span", "name": "metrics", "ticker": "7203.T", "parent": "analyze", "wall": 0.012, "cpu": 0.011,
+  "peak_rss": 152043520, "rss_growth": 0, "rows": 4, "bytes": 1830, "status": "ok", ...}
+ - wall / cpu   : 経過時間 / そのスレッドの CPU 時間 (秒)
+ - peak_rss     : 区間終了時点のプロセスのピーク RSS (bytes)。rss_growth はその区間でピークが伸びた量
+                  (並列実行時は他スレッドの分も含む。ステージ単位で見るなら --jobs 1 で計測する)
+ - rows / bytes : 区間内で count() された処理行数 / 書き込みバイト数 (入れ子の区間の分も含む)
+計測を有効にしていないときの span は何もしない (通常実行のオーバーヘッドはほぼ無い)。
+
+各スクリプト共通のオプション (add_instrument_args):
+ --events PATH       イベントを JSON Lines で PATH に追記する
+ --profile [NAMES]   指定した区間 (カンマ区切り, 省略時は全区間) を cProfile で計測し .prof を保存、
+                     終了時に区間ごとの上位関数を表示する (計測中の区間は直列に実行される)
+ --timings           終了時に遅いステージ・銘柄のサマリーを表示する
+使い方:
+ uv run src\\main.py 7203.T 6758.T --events run.jsonl --profile analyze,portal
+ uv run src\\scripts\\batch_render.py --all --timings
+ uv run python -m pstats profiles\\portal.7203.T.prof
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import pstats
+import cProfile
+import threading
+import itertools
+
+DEFAULT_PROFILE_DIR = 'profiles'
+
+_recorder = None
+_local = threading.local()
+
+
+def peak_rss_bytes() -> int:
+	"""プロセスのピーク RSS (bytes)。"""
+	try:
+		import resource
+	except ImportError:  # Windows
+		import ctypes
+		from ctypes import wintypes
+
+		class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+			_fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+				('PeakWorkingSetSize', ctypes.c_size_t), ('WorkingSetSize', ctypes.c_size_t),
+				('QuotaPeakPagedPoolUsage', ctypes.c_size_t), ('QuotaPagedPoolUsage', ctypes.c_size_t),
+				('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t), ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+				('PagefileUsage', ctypes.c_size_t), ('PeakPagefileUsage', ctypes.c_size_t)]
+
+		counters = PROCESS_MEMORY_COUNTERS()
+		counters.cb = ctypes.sizeof(counters)
+		handle = ctypes.windll.kernel32.GetCurrentProcess()
+		ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+		return int(counters.PeakWorkingSetSize)
+	rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+	return int(rss if sys.platform == 'darwin' else rss * 1024)  # Linux は KB 単位
+
+
+def _stack() -> list:
+	stack = getattr(_local, 'stack', None)
+	if stack is None:
+		stack = _local.stack = []
+	return stack
+
+
+class Recorder:
+	"""イベントの収集先。プロセスに 1 つ (configure で作る)。
+
+	events_path: JSON Lines の出力先 (None ならメモリ上にだけ保持)
+	profile    : cProfile を掛ける区間名の集合 ('*' で全区間)。None なら掛けない
+	"""
+
+	def __init__(self, events_path: str | None = None, profile: set[str] | None = None,
+			profile_dir: str = DEFAULT_PROFILE_DIR):
+		self.events = []
+		self.events_path = events_path
+		self.profile = profile
+		self.profile_dir = profile_dir
+		self.stats = {}  # 区間名 → pstats.Stats (全銘柄分を合算)
+		self._lock = threading.Lock()
+		# cProfile は同時に 1 つしか有効にできないため、計測対象の区間は直列に実行する
+		self.profile_lock = threading.Lock()
+		self._seq = itertools.count(1)
+		self._file = open(events_path, 'a', encoding='utf-8') if events_path else None
+
+	def config(self) -> dict:
+		# 子プロセスで同じ設定の Recorder を作るための値 (イベントファイルには親がまとめて書く)
+		return {'profile': sorted(self.profile) if self.profile is not None else None, 'profile_dir': self.profile_dir}
+
+	def wants_profile(self, name: str) -> bool:
+		return self.profile is not None and ('*' in self.profile or name in self.profile)
+
+	def emit(self, event: dict):
+		with self._lock:
+			self.events.append(event)
+			if self._file is not None:
+				self._file.write(json.dumps(event, ensure_ascii=False) + '\n')
+				self._file.flush()
+
+	def add_profile(self, name: str, ticker: str | None, profiler: cProfile.Profile) -> str:
+		os.makedirs(self.profile_dir, exist_ok=True)
+		label = name if ticker is None else f'{name}.{ticker}'
+		path = os.path.join(self.profile_dir, f'{label}.{os.getpid()}.{next(self._seq)}.prof')
+		profiler.dump_stats(path)
+		self.add_stats(name, path)
+		return path
+
+	def add_stats(self, name: str, path: str):
+		with self._lock:
+			if name in self.stats:
+				self.stats[name].add(path)
+			else:
+				self.stats[name] = pstats.Stats(path)
+
+	def close(self):
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+
+class _Span:
+	def __init__(self, rec: Recorder, name: str, ticker: str | None, fields: dict):
+		self.rec = rec
+		self.name = name
+		self.ticker = ticker
+		self.fields = fields
+		self.rows = 0
+		self.bytes = 0
+		self._profiler = None
+
+	def count(self, rows: int = 0, bytes: int = 0):
+		self.rows += rows
+		self.bytes += bytes
+
+	def __enter__(self):
+		stack = _stack()
+		parent = stack[-1] if stack else None
+		if self.ticker is None and parent is not None:
+			self.ticker = parent.ticker
+		self._parent = parent
+		self.parent = parent.name if parent is not None else None
+		stack.append(self)
+		if self.rec.wants_profile(self.name) and not getattr(_local, 'profiling', False):
+			self.rec.profile_lock.acquire()
+			_local.profiling = True
+			self._profiler = cProfile.Profile()
+			self._profiler.enable()
+		self._rss0 = peak_rss_bytes()
+		self._cpu0 = time.thread_time()
+		self._wall0 = time.perf_counter()
+		return self
+
+	def __exit__(self, exc_type, exc, tb):
+		wall = time.perf_counter() - self._wall0
+		cpu = time.thread_time() - self._cpu0
+		rss = peak_rss_bytes()
+		event = {
+			'event': 'span',
+			'name': self.name,
+			'ticker': self.ticker,
+			'parent': self.parent,
+			'wall': round(wall, 6),
+			'cpu': round(cpu, 6),
+			'peak_rss': rss,
+			'rss_growth': rss - self._rss0,
+			'rows': self.rows,
+			'bytes': self.bytes,
+			'status': 'ok' if exc_type is None else 'error',
+			'ts': round(time.time(), 3),
+			'pid': os.getpid(),
+			'thread': threading.current_thread().name,
+		}
+		if exc_type is not None:
+			event['error'] = f'{exc_type.__name__}: {exc}'
+		event.update(self.fields)
+		if self._profiler is not None:
+			self._profiler.disable()
+			try:
+				event['profile'] = self.rec.add_profile(self.name, self.ticker, self._profiler)
+			finally:
+				_local.profiling = False
+				self.rec.profile_lock.release()
+		_stack().pop()
+		if self._parent is not None:
+			# 入れ子の区間の行数・バイト数は外側の区間にも含める
+			self._parent.count(self.rows, self.bytes)
+		self.rec.emit(event)
+		return False
+
+
+class _NullSpan:
+	rows = 0
+	bytes = 0
+
+	@property
+	def fields(self) -> dict:
+		# 計測しないときは書き込んでも捨てる (共有の _NULL に値を溜めない)
+		return {}
+
+	def count(self, rows: int = 0, bytes: int = 0):
+		pass
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		return False
+
+
+_NULL = _NullSpan()
+
+
+def configure(events_path: str | None = None, profile: set[str] | list[str] | None = None,
+		profile_dir: str = DEFAULT_PROFILE_DIR) -> Recorder:
+	"""計測を有効にする。以後の span がイベントを記録する。"""
+	global _recorder
+	if _recorder is not None:
+		_recorder.close()
+	_recorder = Recorder(events_path, set(profile) if profile is not None else None, profile_dir)
+	return _recorder
+
+
+def configure_child(config: dict | None):
+	# ProcessPoolExecutor の initializer 用 (config が None なら計測しない)
+	if config is not None:
+		configure(profile=config['profile'], profile_dir=config['profile_dir'])
+
+
+def recorder() -> Recorder | None:
+	return _recorder
+
+
+def enabled() -> bool:
+	return _recorder is not None
+
+
+def span(name: str, ticker: str | None = None, **fields):
+	"""区間を計測するコンテキストマネージャ。ticker を省略すると外側の区間のものを引き継ぐ。"""
+	if _recorder is None:
+		return _NULL
+	return _Span(_recorder, name, ticker, fields)
+
+
+def count(rows: int = 0, bytes: int = 0):
+	"""実行中の (最も内側の) 区間に処理行数・書き込みバイト数を加算する。"""
+	stack = _stack() if _recorder is not None else None
+	if stack:
+		stack[-1].count(rows, bytes)
+
+
+def take_events(start: int = 0) -> list[dict]:
+	"""start 件目以降の記録済みイベント (子プロセスから親へ返す用)。"""
+	return list(_recorder.events[start:]) if _recorder is not None else []
+
+
+def ingest(events: list[dict]):
+	"""子プロセスで記録したイベントを取り込む (プロファイルは子が保存した .prof を合算する)。"""
+	if _recorder is None:
+		return
+	for e in events:
+		_recorder.emit(e)
+		if e.get('profile') and os.path.exists(e['profile']):
+			_recorder.add_stats(e['name'], e['profile'])
+
+
+def summarize(events: list[dict], top: int = 10) -> str:
+	"""区間名ごとの集計と、遅い銘柄の一覧を文字列で返す。"""
+	spans = [e for e in events if e.get('event') == 'span']
+	if not spans:
+		return '計測イベントはありません。'
+	by_name = {}
+	for e in spans:
+		a = by_name.setdefault(e['name'], {'n': 0, 'wall': 0.0, 'max': 0.0, 'cpu': 0.0, 'rows': 0, 'bytes': 0, 'rss': 0, 'errors': 0})
+		a['n'] += 1
+		a['wall'] += e['wall']
+		a['max'] = max(a['max'], e['wall'])
+		a['cpu'] += e['cpu']
+		a['rows'] += e['rows']
+		a['bytes'] += e['bytes']
+		a['rss'] = max(a['rss'], e['peak_rss'])
+		a['errors'] += e['status'] != 'ok'
+	lines = ['', '== 計測サマリー ==', 'ステージ別 (合計時間の長い順):',
+		f'  {"name":<18}{"count":>7}{"wall計[s]":>11}{"最大[s]":>9}{"cpu計[s]":>10}{"rows":>10}{"書込[MB]":>10}{"RSS[MB]":>9}']
+	for name, a in sorted(by_name.items(), key=lambda kv: -kv[1]['wall'])[:max(top, 20)]:
+		lines.append(f'  {name:<18}{a["n"]:>7}{a["wall"]:>11.3f}{a["max"]:>9.3f}{a["cpu"]:>10.3f}{a["rows"]:>10}'
+			f'{a["bytes"] / 2**20:>10.2f}{a["rss"] / 2**20:>9.0f}' + (f'  (失敗 {a["errors"]})' if a['errors'] else ''))
+
+	# 銘柄ごとの合計は最上位の区間だけで数える (入れ子の区間を二重に数えない)
+	by_ticker = {}
+	for e in spans:
+		if e['ticker'] is None or e['parent'] is not None:
+			continue
+		t = by_ticker.setdefault(e['ticker'], {'wall': 0.0, 'worst': None})
+		t['wall'] += e['wall']
+		if t['worst'] is None or e['wall'] > t['worst']['wall']:
+			t['worst'] = e
+	if by_ticker:
+		lines.append(f'遅い銘柄 (上位 {min(top, len(by_ticker))}):')
+		for ticker, t in sorted(by_ticker.items(), key=lambda kv: -kv[1]['wall'])[:top]:
+			w = t['worst']
+			lines.append(f'  {ticker:<12}{t["wall"]:>9.3f}s  (最も遅い: {w["name"]} {w["wall"]:.3f}s)')
+	return '\n'.join(lines)
+
+
+def print_profiles(limit: int = 15):
+	if _recorder is None:
+		return
+	for name, stats in sorted(_recorder.stats.items()):
+		print(f'\n== プロファイル: {name} (累積時間の上位 {limit}) ==')
+		stats.stream = sys.stdout
+		stats.sort_stats('cumulative').print_stats(limit)
+	if _recorder.stats:
+		print(f'.prof ファイル: {os.path.abspath(_recorder.profile_dir)}')
+
+
+def add_instrument_args(parser):
+	parser.add_argument('--events', metavar='PATH', help='ステージごとの計測イベントを JSON Lines で追記する')
+	parser.add_argument('--profile', nargs='?', const='*', metavar='NAMES',
+		help='cProfile を掛ける区間 (カンマ区切り, 省略時は全区間)')
+	parser.add_argument('--profile-dir', default=DEFAULT_PROFILE_DIR, help='.prof の保存先')
+	parser.add_argument('--timings', action='store_true', help='終了時に遅いステージ・銘柄のサマリーを表示する')
+
+
+_finish_state = {'summary': False, 'done': False}
+
+
+def from_args(args, always: bool = False) -> Recorder | None:
+	"""add_instrument_args のオプションから計測を有効にし、終了時にサマリーを表示するよう登録する。
+
+	always=True なら オプション無しでも計測する (main.py はサマリーを常に表示する)。
+	"""
+	profile = None
+	if args.profile:
+		profile = {p.strip() for p in args.profile.split(',') if p.strip()}
+	if not (always or args.events or profile or args.timings):
+		return None
+	rec = configure(args.events, profile, args.profile_dir)
+	_finish_state.update(summary=True, done=False)
+	atexit.register(finish)
+	return rec
+
+
+def finish(top: int = 10):
+	"""サマリー (と --profile の結果) を表示してイベントファイルを閉じる。2 回目以降は何もしない。"""
+	if _recorder is None or _finish_state['done']:
+		return
+	_finish_state['done'] = True
+	if _finish_state['summary']:
+		print(summarize(_recorder.events, top))
+		print_profiles()
+	_recorder.close()
@@ -0,0 +1,573 @@
+"""
+銘柄 × ステージ のジョブキュー (SQLite)。全銘柄の更新が途中で止まっても (レート制限・異常終了・再起動)
+続きから再開でき、複数のワーカープロセス (ファイルシステムを共有する複数のマシンでも可) で同時に処理できる。
+
+ - タスク = (銘柄, ステージ)。ステージは main.py と同じ pipeline.default_stages で、依存ステージのタスクが
+   済んだものから取り出す。ワーカーは 1 タスクごとに pipeline.Pipeline.run_one で実行する
+ - 取り出しは BEGIN IMMEDIATE の中で 1 件ずつ行い、リース (期限付きの占有) を付ける。ワーカーは実行中の
+   タスクのリースを定期的に延長し、落ちたワーカーのタスクは期限切れ後に別のワーカーが取り直す
+ - 失敗したタスクは間隔を倍にしながら max_attempts 回まで再試行し、超えたら failed として残す (retry で戻す)。
+   failed のタスクに依存するタスクは blocked として表示し、取り出さない
+ - 同業統計 (peers) は全銘柄で共有するファイルを読み書きするため、全ワーカーで同時に 1 タスクだけ実行する
+ - キューを空にしたワーカーが 1 回だけ、会社情報テーブルとスクリーナーのインデックスに反映する
+保存先は data/jobqueue.sqlite (WAL)。ネットワークファイルシステム上で複数のマシンから使うときは WAL の
+共有メモリが使えないため、最初の enqueue に --no-wal を付けてロールバックジャーナルで作る。
+リースの期限は各マシンの時計で判定するので、マシン間の時刻は同期しておく。取得の --rate はワーカーごと。
+
+使い方:
+ uv run src\\scripts\\jobqueue.py enqueue --tickers-file tickers.txt          (全ステージを登録。済んだタスクはそのまま)
+ uv run src\\scripts\\jobqueue.py enqueue --all --stages fetch,prices --reset  (取得だけを最初からやり直す)
+ uv run src\\scripts\\jobqueue.py work --jobs 4                                (別のターミナル・マシンでも同時に起動できる)
+ uv run src\\scripts\\jobqueue.py status                                       (進捗・スループット・失敗タスク)
+ uv run src\\scripts\\jobqueue.py retry                                        (failed のタスクを再試行に戻す)
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+import contextlib
+from dataclasses import dataclass
+
+import instrument
+import pipeline
+import providers
+import yahoo2finance
+import company_info
+import screener
+from assets import add_asset_args, options_from_args
+from alldata2analysisdata import list_tickers
+from yahoo2finance import read_tickers_file
+
+DEFAULT_DB = os.path.join('data', 'jobqueue.sqlite')
+DEFAULT_LEASE = 300.0    # リースの長さ (秒)。ワーカーはこの 1/3 ごとに延長する
+DEFAULT_ATTEMPTS = 3
+RETRY_BACKOFF = 30.0     # 1 回目の失敗から再試行までの待ち (秒)。失敗のたびに倍
+POLL_INTERVAL = 2.0      # 取り出せるタスクが無いときに待つ間隔 (秒)
+EXCLUSIVE_STAGES = ('peers',)
+CONFIG_KEYS = ('fetch', 'prices', 'peers', 'quarterly')  # enqueue 時に決めてワーカーが従うステージ構成
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+	id INTEGER PRIMARY KEY,
+	ticker TEXT NOT NULL,
+	stage TEXT NOT NULL,
+	status TEXT NOT NULL DEFAULT 'pending',  -- pending / running / done / failed
+	attempts INTEGER NOT NULL DEFAULT 0,
+	max_attempts INTEGER NOT NULL,
+	not_before REAL NOT NULL DEFAULT 0,      -- 再試行の待ち (この時刻まで取り出さない)
+	lease_owner TEXT,
+	lease_expires REAL,
+	enqueued REAL NOT NULL,
+	started REAL,
+	finished REAL,
+	elapsed REAL,
+	result TEXT,                             -- ran / skipped
+	error TEXT,
+	UNIQUE (ticker, stage)
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, not_before);
+CREATE TABLE IF NOT EXISTS deps (stage TEXT NOT NULL, dep TEXT NOT NULL, PRIMARY KEY (stage, dep));
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+# 取り出せるタスク: 待ちの明けた pending か、リースの切れた running。依存ステージのタスクが全て done で、
+# 排他ステージなら同じステージを実行中のワーカーが他にいないもの
+_CLAIMABLE = """
+SELECT t.id, t.ticker, t.stage, t.status, t.attempts, t.max_attempts FROM tasks t
+WHERE ((t.status = 'pending' AND t.not_before <= :now) OR (t.status = 'running' AND t.lease_expires < :now))
+	AND NOT EXISTS (SELECT 1 FROM deps d JOIN tasks u ON u.ticker = t.ticker AND u.stage = d.dep
+		WHERE d.stage = t.stage AND u.status != 'done')
+	AND (t.stage NOT IN ({exclusive}) OR NOT EXISTS (SELECT 1 FROM tasks r
+		WHERE r.stage = t.stage AND r.status = 'running' AND r.lease_expires >= :now AND r.id != t.id))
+ORDER BY t.id LIMIT 1
+""".format(exclusive=', '.join(f"'{s}'" for s in EXCLUSIVE_STAGES))
+
+
+@dataclass(frozen=True)
+class Task:
+	id: int
+	ticker: str
+	stage: str
+	attempt: int  # 今回が何回目か (1 始まり)
+
+
+@contextlib.contextmanager
+def _immediate(conn: sqlite3.Connection):
+	# 書き込みロックを先に取る (複数のワーカーが同じタスクを取り出さない)
+	conn.execute('BEGIN IMMEDIATE')
+	try:
+		yield
+	except BaseException:
+		conn.execute('ROLLBACK')
+		raise
+	conn.execute('COMMIT')
+
+
+def _ancestors(stages: dict[str, pipeline.Stage], name: str) -> set[str]:
+	out, stack = set(), list(stages[name].deps)
+	while stack:
+		n = stack.pop()
+		if n not in out:
+			out.add(n)
+			stack.extend(stages[n].deps)
+	return out
+
+
+class JobQueue:
+	"""SQLite のタスク表。接続はスレッドごとに 1 つ (JobQueue をスレッドごとに作る)。"""
+
+	def __init__(self, path: str = DEFAULT_DB, wal: bool = True):
+		self.path = path
+		created = not os.path.exists(path)
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+		self.conn.row_factory = sqlite3.Row
+		if created:
+			# ジャーナルの方式はファイルに残るので、作成時だけ決める
+			self.conn.execute(f'PRAGMA journal_mode={"WAL" if wal else "DELETE"}')
+		self.conn.execute('PRAGMA synchronous=NORMAL')
+		self.conn.executescript(SCHEMA)
+
+	def close(self):
+		self.conn.close()
+
+	# ---- 設定 ---------------------------------------------------------------------
+
+	def get_meta(self, key: str, default=None):
+		row = self.conn.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+		return default if row is None else json.loads(row['value'])
+
+	def _set_meta(self, key: str, value):
+		self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+	def config(self) -> dict:
+		return self.get_meta('config', {})
+
+	def stage_order(self) -> list[str]:
+		return self.get_meta('stages', [])
+
+	# ---- 登録 ---------------------------------------------------------------------
+
+	def enqueue(self, tickers: list[str], stages: list[pipeline.Stage], config: dict, names: list[str] | None = None,
+			max_attempts: int = DEFAULT_ATTEMPTS, reset: bool = False) -> int:
+		"""tickers × names (省略時は全ステージ) を登録し、新たに pending になったタスク数を返す。
+
+		登録済みのタスクはそのまま (中断した更新を同じコマンドでやり直しても済んだ分は繰り返さない)。
+		reset=True なら done / failed のタスクも pending に戻す (更新を最初からやり直す)。
+		"""
+		by_name = {s.name: s for s in stages}
+		names = [s.name for s in stages] if names is None else [n for n in by_name if n in names]
+		now = time.time()
+		with _immediate(self.conn):
+			self._set_meta('config', {k: config[k] for k in CONFIG_KEYS})
+			self._set_meta('stages', [s.name for s in stages])
+			# キューの依存はキューにあるステージ同士で (間のステージが無ければ、その先の祖先を待つ)
+			present = {r[0] for r in self.conn.execute('SELECT DISTINCT stage FROM tasks')} | set(names)
+			self.conn.execute('DELETE FROM deps')
+			self.conn.executemany('INSERT INTO deps (stage, dep) VALUES (?, ?)',
+				[(n, d) for n in by_name if n in present for d in sorted(_ancestors(by_name, n)) if d in present])
+			before = self.conn.total_changes
+			self.conn.executemany('INSERT OR IGNORE INTO tasks (ticker, stage, max_attempts, enqueued) VALUES (?, ?, ?, ?)',
+				[(t, n, max_attempts, now) for t in dict.fromkeys(tickers) for n in names])
+			if reset:
+				self.conn.executemany(
+					"UPDATE tasks SET status = 'pending', attempts = 0, not_before = 0, max_attempts = ?, enqueued = ?,"
+					" started = NULL, finished = NULL, elapsed = NULL, result = NULL, error = NULL"
+					" WHERE ticker = ? AND stage = ? AND status IN ('done', 'failed')",
+					[(max_attempts, now, t, n) for t in dict.fromkeys(tickers) for n in names])
+			return self.conn.total_changes - before
+
+	def retry(self, tickers: list[str] | None = None, stage: str | None = None) -> int:
+		"""failed のタスクを pending に戻す (試行回数も 0 から)。戻したタスク数を返す。"""
+		sql = "UPDATE tasks SET status = 'pending', attempts = 0, not_before = 0, error = NULL WHERE status = 'failed'"
+		params = []
+		if stage:
+			sql += ' AND stage = ?'
+			params.append(stage)
+		if tickers:
+			sql += f' AND ticker IN ({", ".join("?" * len(tickers))})'
+			params += tickers
+		with _immediate(self.conn):
+			return self.conn.execute(sql, params).rowcount
+
+	# ---- ワーカー側 -----------------------------------------------------------------
+
+	def claim(self, owner: str, lease: float = DEFAULT_LEASE) -> Task | None:
+		"""取り出せるタスクを 1 件リース付きで取り出す。無ければ None。"""
+		while True:
+			now = time.time()
+			with _immediate(self.conn):
+				row = self.conn.execute(_CLAIMABLE, {'now': now}).fetchone()
+				if row is None:
+					return None
+				if row['status'] == 'running' and row['attempts'] >= row['max_attempts']:
+					# 実行中にワーカーが落ち続けるタスク (リース切れのまま試行回数を使い切った)
+					self.conn.execute("UPDATE tasks SET status = 'failed', lease_owner = NULL, finished = ?, error = ? WHERE id = ?",
+						(now, 'リースの期限切れ (ワーカーが応答しなくなった)', row['id']))
+					continue
+				self.conn.execute("UPDATE tasks SET status = 'running', attempts = attempts + 1, lease_owner = ?, lease_expires = ?,"
+					' started = ? WHERE id = ?', (owner, now + lease, now, row['id']))
+				return Task(row['id'], row['ticker'], row['stage'], row['attempts'] + 1)
+
+	def renew(self, owner: str, lease: float = DEFAULT_LEASE) -> int:
+		"""owner が実行中のタスクのリースを延長する。"""
+		with _immediate(self.conn):
+			return self.conn.execute("UPDATE tasks SET lease_expires = ? WHERE lease_owner = ? AND status = 'running'",
+				(time.time() + lease, owner)).rowcount
+
+	def complete(self, task: Task, owner: str, result: str, elapsed: float) -> bool:
+		"""done にする。リースを失っていた (別のワーカーが取り直した) ら False。"""
+		with _immediate(self.conn):
+			return self.conn.execute("UPDATE tasks SET status = 'done', lease_owner = NULL, finished = ?, elapsed = ?, result = ?,"
+				" error = NULL WHERE id = ? AND lease_owner = ? AND status = 'running'",
+				(time.time(), elapsed, result, task.id, owner)).rowcount == 1
+
+	def fail(self, task: Task, owner: str, error: str, elapsed: float, backoff: float = RETRY_BACKOFF) -> str:
+		"""失敗を記録する。試行回数が残っていれば待ちを付けて pending に戻す。新しい状態を返す。"""
+		now = time.time()
+		with _immediate(self.conn):
+			row = self.conn.execute('SELECT attempts, max_attempts FROM tasks WHERE id = ? AND lease_owner = ?',
+				(task.id, owner)).fetchone()
+			if row is None:
+				return 'lost'
+			status = 'pending' if row['attempts'] < row['max_attempts'] else 'failed'
+			self.conn.execute('UPDATE tasks SET status = ?, lease_owner = NULL, not_before = ?, finished = ?, elapsed = ?,'
+				' error = ? WHERE id = ?', (status, now + backoff * 2 ** (row['attempts'] - 1), now, elapsed, error, task.id))
+			return status
+
+	def release(self, owner: str) -> int:
+		"""中断したワーカーの実行中タスクを、試行回数を数えずに pending に戻す。"""
+		with _immediate(self.conn):
+			return self.conn.execute("UPDATE tasks SET status = 'pending', attempts = attempts - 1, lease_owner = NULL"
+				" WHERE lease_owner = ? AND status = 'running'", (owner,)).rowcount
+
+	def outstanding(self) -> int:
+		"""依存タスクが済んでいて、これから終わる見込みのあるタスク数 (実行中・取り出せる・再試行待ち)。
+
+		0 なら残りは failed に依存して進めないタスクだけ (依存待ちの pending は依存先の方が数えられる)。
+		"""
+		return self.conn.execute("""SELECT COUNT(*) FROM tasks t WHERE t.status IN ('pending', 'running')
+			AND NOT EXISTS (SELECT 1 FROM deps d JOIN tasks u ON u.ticker = t.ticker AND u.stage = d.dep
+				WHERE d.stage = t.stage AND u.status != 'done')""").fetchone()[0]
+
+	def try_finalize(self) -> bool:
+		"""キューが空になった後の反映を引き受けるなら True (同じ状態に対して全ワーカーで 1 回だけ)。"""
+		with _immediate(self.conn):
+			if self.outstanding():
+				return False
+			mark = self.conn.execute("SELECT MAX(finished) FROM tasks WHERE status = 'done'").fetchone()[0]
+			if mark is None or self.get_meta('finalized') == mark:
+				return False
+			self._set_meta('finalized', mark)
+			return True
+
+	# ---- 状態 ---------------------------------------------------------------------
+
+	def snapshot(self, window: float = 600.0) -> dict:
+		"""status 用の集計。ステージ別の件数 (blocked を含む)、直近 window 秒のスループット、ワーカー、失敗タスク。"""
+		now = time.time()
+		order = self.stage_order()
+		deps = {}
+		for r in self.conn.execute('SELECT stage, dep FROM deps'):
+			deps.setdefault(r['stage'], []).append(r['dep'])
+		rows = self.conn.execute('SELECT ticker, stage, status, result, attempts, lease_expires FROM tasks').fetchall()
+		status = {(r['ticker'], r['stage']): r['status'] for r in rows}
+		# 依存先が failed / blocked の pending は進めない (ステージ定義順に見れば依存先が先に決まる)
+		rank = {n: i for i, n in enumerate(order)}
+		for r in sorted(rows, key=lambda r: rank.get(r['stage'], len(rank))):
+			key = (r['ticker'], r['stage'])
+			if status[key] == 'pending' and any(status.get((r['ticker'], d)) in ('failed', 'blocked') for d in deps.get(r['stage'], ())):
+				status[key] = 'blocked'
+		stages = {}
+		for r in rows:
+			s = stages.setdefault(r['stage'], dict.fromkeys(('pending', 'running', 'done', 'failed', 'blocked', 'ran', 'skipped', 'retrying'), 0))
+			st = status[(r['ticker'], r['stage'])]
+			if st == 'running' and r['lease_expires'] < now:
+				st = 'pending'  # 期限切れ (取り直し待ち)
+			s[st] += 1
+			if st == 'done' and r['result'] in ('ran', 'skipped'):
+				s[r['result']] += 1
+			if st == 'pending' and r['attempts'] > 0:
+				s['retrying'] += 1
+		recent = self.conn.execute("SELECT COUNT(*), MIN(started), SUM(elapsed) FROM tasks WHERE status = 'done' AND finished >= ?",
+			(now - window,)).fetchone()
+		span = min(window, now - recent[1]) if recent[0] else window
+		avg = {r['stage']: r['avg'] for r in self.conn.execute(
+			"SELECT stage, AVG(elapsed) AS avg FROM tasks WHERE status = 'done' GROUP BY stage")}
+		workers = [dict(r) for r in self.conn.execute("SELECT lease_owner AS owner, COUNT(*) AS tasks, MIN(lease_expires) AS expires"
+			" FROM tasks WHERE status = 'running' GROUP BY lease_owner ORDER BY lease_owner")]
+		failed = [dict(r) for r in self.conn.execute("SELECT ticker, stage, attempts, error FROM tasks WHERE status = 'failed'"
+			' ORDER BY finished DESC')]
+		return {
+			'stages': {n: stages[n] for n in [*order, *sorted(set(stages) - set(order))] if n in stages},
+			'recent': recent[0], 'span': max(span, 1e-9), 'avg': avg, 'workers': workers, 'failed': failed, 'now': now,
+		}
+
+
+def worker_id() -> str:
+	return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Worker:
+	"""キューからタスクを取り出して実行する。jobs 本のスレッドが各自の接続で取り出し、1 本のスレッドがリースを延長する。"""
+
+	def __init__(self, path: str, runner: pipeline.Pipeline, jobs: int = 4, lease: float = DEFAULT_LEASE,
+			owner: str | None = None, max_tasks: int | None = None):
+		self.path = path
+		self.runner = runner
+		self.jobs = jobs
+		self.lease = lease
+		self.owner = owner or worker_id()
+		self.max_tasks = max_tasks
+		self.stop = threading.Event()
+		self.counts = dict.fromkeys(('ran', 'skipped', 'retry', 'failed', 'lost'), 0)
+		self.tickers: set[str] = set()
+		self._lock = threading.Lock()
+		self._active: dict[str, int] = {}  # 銘柄 → このプロセスで実行中のタスク数
+		self._taken = 0
+
+	def _take(self) -> bool:
+		with self._lock:
+			if self.max_tasks is not None and self._taken >= self.max_tasks:
+				return False
+			self._taken += 1
+			return True
+
+	def _untake(self):
+		with self._lock:
+			self._taken -= 1
+
+	def _count(self, key: str, ticker: str):
+		with self._lock:
+			self.counts[key] += 1
+			self.tickers.add(ticker)
+
+	def _loop(self):
+		queue = JobQueue(self.path)
+		try:
+			while not self.stop.is_set():
+				if not self._take():
+					return
+				task = queue.claim(self.owner, self.lease)
+				if task is None:
+					self._untake()
+					if not queue.outstanding():
+						return  # 残りは failed に依存するタスクだけ
+					self.stop.wait(POLL_INTERVAL)  # 他のワーカーの依存タスク・再試行の待ちを待つ
+					continue
+				self._execute(queue, task)
+		finally:
+			queue.close()
+
+	def _execute(self, queue: JobQueue, task: Task):
+		with self._lock:
+			self._active[task.ticker] = self._active.get(task.ticker, 0) + 1
+		start = time.perf_counter()
+		try:
+			result = self.runner.run_one(task.ticker, task.stage)
+		except Exception as e:
+			elapsed = time.perf_counter() - start
+			error = f'{type(e).__name__}: {e}'
+			status = queue.fail(task, self.owner, error, elapsed)
+			key = {'pending': 'retry', 'failed': 'failed'}.get(status, 'lost')
+			print(f'[{key.upper()}] {task.ticker} {task.stage} {elapsed:.2f}s ({task.attempt} 回目: {error})')
+		else:
+			elapsed = time.perf_counter() - start
+			key = result.status if queue.complete(task, self.owner, result.status, elapsed) else 'lost'
+			print(f'[{key.upper()}] {task.ticker} {task.stage} {elapsed:.2f}s')
+		finally:
+			with self._lock:
+				self._active[task.ticker] -= 1
+				last = not self._active[task.ticker]
+				if last:
+					del self._active[task.ticker]
+			if last:
+				self.runner.forget(task.ticker)
+		self._count(key, task.ticker)
+
+	def _heartbeat(self):
+		queue = JobQueue(self.path)
+		try:
+			while not self.stop.wait(self.lease / 3):
+				queue.renew(self.owner, self.lease)
+		finally:
+			queue.close()
+
+	def run(self) -> dict[str, int]:
+		"""キューが空になる (または max_tasks 件を処理する) まで実行する。Ctrl+C では実行中のタスクを pending に戻して終わる。"""
+		threads = [threading.Thread(target=self._loop, name=f'jobqueue-{i}', daemon=True) for i in range(self.jobs)]
+		beat = threading.Thread(target=self._heartbeat, name='jobqueue-lease', daemon=True)
+		beat.start()
+		for t in threads:
+			t.start()
+		try:
+			while any(t.is_alive() for t in threads):
+				for t in threads:
+					t.join(0.5)
+		except KeyboardInterrupt:
+			self.stop.set()
+			queue = JobQueue(self.path)
+			released = queue.release(self.owner)
+			queue.close()
+			print(f'中断しました (実行中だった {released} タスクを pending に戻しました)。', file=sys.stderr)
+			raise
+		finally:
+			self.stop.set()
+		return self.counts
+
+
+def finalize(data_dir: str = 'data'):
+	# main.py の実行後と同じ反映 (変わった銘柄だけ)
+	updated, rebuilt = company_info.CompanyInfo(company_info.DEFAULT_ROOT, data_dir).update()
+	if updated:
+		print(f"会社情報テーブルに {len(updated)} 銘柄を反映しました{' (作り直し)' if rebuilt else ''}。")
+	index = screener.ScreenerIndex(screener.DEFAULT_ROOT, data_dir)
+	if index.exists():
+		updated, _ = index.update()
+		if updated:
+			print(f'スクリーナーのインデックスに {len(updated)} 銘柄を反映しました。')
+
+
+def _duration(seconds: float) -> str:
+	seconds = int(seconds)
+	return f'{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}'
+
+
+def print_status(snap: dict, limit: int = 20):
+	stages = snap['stages']
+	if not stages:
+		print('タスクはありません (jobqueue.py enqueue で登録)。')
+		return
+	print(f'{"ステージ":<16}{"pending":>9}{"running":>9}{"done":>9}{"failed":>9}{"blocked":>9}   平均(秒)  内訳')
+	total = dict.fromkeys(('pending', 'running', 'done', 'failed', 'blocked'), 0)
+	for name, c in stages.items():
+		for k in total:
+			total[k] += c[k]
+		avg = snap['avg'].get(name)
+		detail = f'ran {c["ran"]} / skipped {c["skipped"]}' + (f' / 再試行待ち {c["retrying"]}' if c['retrying'] else '')
+		print(f'{name:<16}' + ''.join(f'{c[k]:>9}' for k in total) + f'{"" if avg is None else f"{avg:.2f}":>11}  {detail}')
+	n = sum(total.values())
+	print(f'{"合計":<16}' + ''.join(f'{total[k]:>9}' for k in total) + f'\n進捗: {total["done"]}/{n} ({total["done"] / n:.1%})')
+	rate = snap['recent'] / snap['span']
+	remaining = total['pending'] + total['running']
+	eta = f'  残り {remaining} タスク ≈ {_duration(remaining / rate)}' if rate > 0 and remaining else ''
+	print(f'スループット (直近 {_duration(snap["span"])}): {rate * 60:.1f} タスク/分{eta}')
+	for w in snap['workers']:
+		left = w['expires'] - snap['now']
+		state = f'リース残り {left:.0f} 秒' if left >= 0 else f'リース切れ {-left:.0f} 秒 (取り直し待ち)'
+		print(f'ワーカー {w["owner"]}: 実行中 {w["tasks"]} ({state})')
+	if snap['failed']:
+		print(f'失敗タスク {len(snap["failed"])} 件 (jobqueue.py retry で再試行):')
+		for f in snap['failed'][:limit]:
+			print(f'  {f["ticker"]:<10} {f["stage"]:<16} {f["attempts"]} 回  {f["error"]}')
+		if len(snap['failed']) > limit:
+			print(f'  ... ほか {len(snap["failed"]) - limit} 件 (--limit で表示件数を変更)')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='銘柄 × ステージ のジョブキュー (中断しても続きから、複数ワーカーで並行処理)')
+	parser.add_argument('--db', default=DEFAULT_DB, help='キューの SQLite ファイル')
+	instrument.add_instrument_args(parser)
+	sub = parser.add_subparsers(dest='command', required=True)
+
+	p = sub.add_parser('enqueue', help='銘柄 × ステージ のタスクを登録する')
+	p.add_argument('tickers', nargs='*', help='ティッカー (例: 7203.T)')
+	p.add_argument('--tickers-file', help='ティッカー一覧ファイル (1行1銘柄)')
+	p.add_argument('--all', action='store_true', help='data/ 配下の全銘柄')
+	p.add_argument('--stages', help='登録するステージ (カンマ区切り。省略時は全ステージ)')
+	p.add_argument('--quarterly', action='store_true', help='四半期データの取得と TTM 指標のステージを含める')
+	p.add_argument('--no-prices', action='store_true', help='日次株価を取得しない')
+	p.add_argument('--no-peers', action='store_true', help='同業統計を更新しない')
+	p.add_argument('--no-fetch', action='store_true', help='取得せず手元の CSV から処理する')
+	p.add_argument('--max-attempts', type=int, default=DEFAULT_ATTEMPTS, help='1 タスクの最大試行回数')
+	p.add_argument('--reset', action='store_true', help='done / failed のタスクも pending に戻す (最初からやり直す)')
+	p.add_argument('--no-wal', action='store_true', help='キューを新しく作るときロールバックジャーナルにする (ネットワークファイルシステム用)')
+
+	p = sub.add_parser('work', help='タスクを取り出して実行する (キューが空になったら終了)')
+	p.add_argument('--jobs', type=int, default=4, help='このワーカーで同時に実行するタスク数')
+	p.add_argument('--lease', type=float, default=DEFAULT_LEASE, help='リースの長さ (秒)')
+	p.add_argument('--max-tasks', type=int, help='このワーカーが処理するタスク数の上限')
+	p.add_argument('--rate', type=float, default=2.0, help='このワーカーの取得リクエスト上限 (回/秒)。0 で無制限')
+	p.add_argument('--ttl', type=float, default=24, help='取得データの有効期間 (時間)')
+	p.add_argument('--retries', type=int, default=2, help='取得失敗時のその場でのリトライ回数 (キューの再試行とは別)')
+	p.add_argument('--no-finalize', action='store_true', help='キューが空になっても会社情報テーブル・スクリーナーに反映しない')
+	providers.add_provider_args(p)
+	add_asset_args(p)
+
+	p = sub.add_parser('status', help='進捗・スループット・失敗タスクを表示する')
+	p.add_argument('--window', type=float, default=10, help='スループットを求める直近の時間 (分)')
+	p.add_argument('--limit', type=int, default=20, help='表示する失敗タスクの件数')
+
+	p = sub.add_parser('retry', help='failed のタスクを pending に戻す')
+	p.add_argument('tickers', nargs='*', help='対象銘柄 (省略時は全銘柄)')
+	p.add_argument('--stage', help='対象ステージ')
+	args = parser.parse_args()
+
+	if args.command == 'enqueue':
+		tickers = list(args.tickers)
+		if args.tickers_file:
+			tickers += read_tickers_file(args.tickers_file)
+		if args.all:
+			tickers += list_tickers()
+		if not tickers:
+			parser.error('ティッカーを指定してください (または --tickers-file / --all)')
+		config = {'fetch': not args.no_fetch, 'prices': not args.no_prices, 'peers': not args.no_peers, 'quarterly': args.quarterly}
+		stages = pipeline.default_stages(fetch=config['fetch'], prices=config['prices'], peers=config['peers'], quarterly=config['quarterly'])
+		names = None
+		if args.stages:
+			names = [n.strip() for n in args.stages.split(',') if n.strip()]
+			unknown = set(names) - {s.name for s in stages}
+			if unknown:
+				parser.error(f'未知のステージ: {", ".join(sorted(unknown))} (使えるステージ: {", ".join(s.name for s in stages)})')
+		queue = JobQueue(args.db, wal=not args.no_wal)
+		added = queue.enqueue(tickers, stages, config, names, args.max_attempts, args.reset)
+		print(f'{args.db} に {added} タスクを登録しました ({len(set(tickers))} 銘柄)。')
+		return
+
+	queue = JobQueue(args.db)
+	if args.command == 'status':
+		print_status(queue.snapshot(args.window * 60), args.limit)
+	elif args.command == 'retry':
+		print(f'{queue.retry(args.tickers or None, args.stage)} タスクを pending に戻しました。')
+	elif args.command == 'work':
+		config = queue.config()
+		if not config:
+			sys.exit(f'{args.db} にタスクがありません (jobqueue.py enqueue で登録)')
+		try:
+			ticker_factory = providers.provider_from_args(args)
+		except ValueError as e:
+			parser.error(str(e))
+		instrument.from_args(args, always=True)
+		stages = pipeline.default_stages(
+			fetch=config['fetch'],
+			limiter=yahoo2finance.TokenBucket(args.rate) if args.rate else None,
+			ttl=args.ttl * 3600,
+			ticker_factory=ticker_factory,
+			retries=args.retries,
+			quarterly=config['quarterly'],
+			prices=config['prices'],
+			peers=config['peers'],
+			assets=options_from_args(args),
+		)
+		worker = Worker(args.db, pipeline.Pipeline(stages, jobs=args.jobs), args.jobs, args.lease, max_tasks=args.max_tasks)
+		print(f'ワーカー {worker.owner} を開始します ({args.db}, 並列 {args.jobs})。')
+		try:
+			counts = worker.run()
+		except KeyboardInterrupt:
+			sys.exit(130)
+		print('このワーカーの処理: ' + (' / '.join(f'{k} {v}' for k, v in counts.items() if v) or 'なし'))
+		if not args.no_finalize and queue.try_finalize():
+			finalize()
+		instrument.finish()
+		if not queue.outstanding() and any(c['failed'] or c['blocked'] for c in queue.snapshot()['stages'].values()):
+			raise SystemExit('失敗したタスクがあります (jobqueue.py status で確認、retry で再試行)。')
+	queue.close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,96 @@
+"""
+data/<ticker>/manifest.json の読み書きヘルパ。
+取得時刻・TTL・ファイルごとの内容ハッシュ (sha256) と決算期を記録し、
+ - 再実行時に鮮度が残っている銘柄の取得をスキップ
+ - 内容が変わったファイルだけを書き換え (mtime を保つ)
+ - 後続ステージがハッシュで入力の変化を判定
+できるようにする。
+"""
+
+import os
+import json
+import hashlib
+import time
+from datetime import datetime, timezone
+
+import instrument
+
+MANIFEST_NAME = 'manifest.json'
+DEFAULT_TTL = 24 * 60 * 60  # 秒
+
+
+def sha256_bytes(data: bytes) -> str:
+	return hashlib.sha256(data).hexdigest()
+
+
+def file_sha256(path: str) -> str | None:
+	if not os.path.exists(path):
+		return None
+	h = hashlib.sha256()
+	with open(path, 'rb') as f:
+		for chunk in iter(lambda: f.read(1 << 20), b''):
+			h.update(chunk)
+	return h.hexdigest()
+
+
+def load_manifest(save_dir: str) -> dict:
+	path = os.path.join(save_dir, MANIFEST_NAME)
+	if not os.path.exists(path):
+		return {}
+	try:
+		with open(path, encoding='utf-8') as f:
+			return json.load(f)
+	except (OSError, ValueError):
+		# 壊れたマニフェストは無いものとして扱う (次回取得で作り直す)
+		return {}
+
+
+def atomic_write(path: str, data: bytes):
+	tmp = f'{path}.tmp{os.getpid()}'
+	with open(tmp, 'wb') as f:
+		f.write(data)
+	os.replace(tmp, path)
+	instrument.count(bytes=len(data))
+
+
+def write_manifest(save_dir: str, manifest: dict):
+	data = json.dumps(manifest, ensure_ascii=False, indent=2).encode('utf-8')
+	atomic_write(os.path.join(save_dir, MANIFEST_NAME), data)
+
+
+def is_fresh(manifest: dict, now: float | None = None, ttl: float | None = None) -> bool:
+	"""取得から ttl 秒以内なら True。ttl を省略したときは取得時に記録した ttl_seconds で判定する。"""
+	fetched = manifest.get('fetched_at_epoch')
+	if fetched is None:
+		return False
+	now = time.time() if now is None else now
+	if ttl is None:
+		ttl = manifest.get('ttl_seconds', DEFAULT_TTL)
+	return now - fetched < ttl
+
+
+def write_if_changed(save_dir: str, filename: str, data: bytes, manifest: dict, periods: list[str] | None = None) -> bool:
+	"""内容ハッシュが前回と同じならファイルを書き換えない。書き込んだら True。
+
+	manifest['files'][filename] を更新する (書き込み有無に関わらず)。
+	"""
+	path = os.path.join(save_dir, filename)
+	digest = sha256_bytes(data)
+	files = manifest.setdefault('files', {})
+	prev = files.get(filename, {})
+	changed = prev.get('sha256') != digest or not os.path.exists(path)
+	if changed:
+		atomic_write(path, data)
+	entry = {
+		'sha256': digest,
+		'bytes': len(data),
+		'changed_at': now_iso() if changed else prev.get('changed_at', now_iso()),
+	}
+	if periods is not None:
+		entry['periods'] = periods
+	files[filename] = entry
+	return changed
+
+
+def now_iso() -> str:
+	return datetime.now(timezone.utc).isoformat(timespec='seconds')
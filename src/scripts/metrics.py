@@ -0,0 +1,186 @@
+"""
+財務指標の宣言的レジストリと計算エンジン。
+
+各指標は「入力 (財務諸表の項目 or 他の指標/中間値)」と「式」を登録するだけで追加できる。
+compute() は要求された指標に必要なものだけを依存順に計算し、
+ - 同じ項目の参照 (Total Revenue 等) は 1 回だけ取得して使い回す
+ - 中間値 (長期資本 等) も 1 回だけ計算して共有する
+ - 入力が欠けている指標は例外にせずスキップし、欠けていた入力を報告する
+値は NumPy 配列 (最後の軸 = 決算期)。単銘柄 (P,) でも多銘柄 (T, P) でも同じ式で計算できる。
+財務諸表のほかに、決算期末時点の株価 ('price', prices.py の as-of 結合) を入力にできる。
+"""
+
+import hashlib
+from dataclasses import dataclass
+from typing import Callable
+
+import numpy as np
+
+import schema
+
+
+def FIN(item: str) -> tuple[str, str]:
+	return ('financials', item)
+
+
+def CF(item: str) -> tuple[str, str]:
+	return ('cashflow', item)
+
+
+def BS(item: str) -> tuple[str, str]:
+	return ('balance_sheet', item)
+
+
+def PX(item: str) -> tuple[str, str]:
+	# 決算期末 (直前の取引日) の終値 'Close' / 期末までの直近 1 年の 1 株配当 'Trailing Dividends'
+	return ('price', item)
+
+
+@dataclass(frozen=True)
+class Metric:
+	name: str
+	inputs: tuple  # ('statement', 'item') のタプル、または他の指標/中間値の名前
+	formula: Callable
+	intermediate: bool = False  # True なら出力表には出さない (共有用の中間値)
+	description: str = ''
+
+
+REGISTRY: dict[str, Metric] = {}
+
+
+def register(name: str, inputs, formula: Callable, intermediate: bool = False, description: str = '') -> Metric:
+	for ref in inputs:
+		if not isinstance(ref, tuple) and ref not in REGISTRY:
+			raise KeyError(f'{name}: 未登録の依存 {ref} (依存先を先に登録してください)')
+		if isinstance(ref, tuple) and ref[0] in schema.STATEMENTS and schema.item_id(*ref) is None:
+			raise KeyError(f'{name}: スキーマに無い項目 {ref[0]}:{ref[1]} (schema.py に追加してください)')
+	m = Metric(name, tuple(inputs), formula, intermediate, description)
+	REGISTRY[name] = m
+	return m
+
+
+def metric_names() -> list[str]:
+	return [n for n, m in REGISTRY.items() if not m.intermediate]
+
+
+def resolve(names: list[str] | None = None) -> list[Metric]:
+	"""要求された指標とその依存を、計算可能な順 (登録順) に並べて返す。"""
+	names = metric_names() if names is None else names
+	unknown = [n for n in names if n not in REGISTRY]
+	if unknown:
+		raise KeyError(f'未登録の指標: {", ".join(unknown)}')
+	needed = set()
+	stack = list(names)
+	while stack:
+		n = stack.pop()
+		if n in needed:
+			continue
+		needed.add(n)
+		stack.extend(r for r in REGISTRY[n].inputs if not isinstance(r, tuple))
+	# 登録時に依存先が先に登録済みであることを保証しているので、登録順がそのまま位相順になる
+	return [m for n, m in REGISTRY.items() if n in needed]
+
+
+def required_items(names: list[str] | None = None) -> dict[str, list[str]]:
+	items = {}
+	for m in resolve(names):
+		for ref in m.inputs:
+			if isinstance(ref, tuple) and ref[1] not in items.setdefault(ref[0], []):
+				items[ref[0]].append(ref[1])
+	return items
+
+
+def statements_of(name: str) -> set[str]:
+	"""指標が (中間値を経由して) 依存する財務諸表の集合。"""
+	out = set()
+	for ref in REGISTRY[name].inputs:
+		out |= {ref[0]} if isinstance(ref, tuple) else statements_of(ref)
+	return out
+
+
+def definition_hash(name: str) -> str:
+	"""指標定義 (入力・式のバイトコード・依存する中間値の定義) のハッシュ。式を変えると値が変わる。"""
+	m = REGISTRY[name]
+	code = m.formula.__code__
+	h = hashlib.sha256()
+	h.update(repr((m.name, [r if isinstance(r, tuple) else definition_hash(r) for r in m.inputs])).encode('utf-8'))
+	h.update(code.co_code)
+	h.update(repr(code.co_consts).encode('utf-8'))
+	h.update(repr(code.co_names).encode('utf-8'))
+	return h.hexdigest()
+
+
+def compute(get: Callable, names: list[str] | None = None) -> tuple[dict[str, np.ndarray], dict[str, list[str]]]:
+	"""get(statement, item) -> 配列 or None (項目なし) を使って指標を計算する。
+
+	戻り値: (指標名→配列 [要求順], スキップした指標名→欠けていた入力)
+	"""
+	requested = metric_names() if names is None else list(names)
+	values = {}
+	skipped = {}
+	items = {}
+	for m in resolve(requested):
+		args = []
+		missing = []
+		for ref in m.inputs:
+			if isinstance(ref, tuple):
+				if ref not in items:
+					items[ref] = get(*ref)
+				v = items[ref]
+				if v is None:
+					missing.append(f'{ref[0]}:{ref[1]}')
+			else:
+				v = values.get(ref)
+				if v is None:
+					missing.extend(skipped.get(ref, [ref]))
+			args.append(v)
+		if missing:
+			skipped[m.name] = missing
+			continue
+		with np.errstate(divide='ignore', invalid='ignore'):
+			values[m.name] = np.asarray(m.formula(*args), dtype=np.float64)
+	results = {n: values[n] for n in requested if n in values}
+	return results, {n: v for n, v in skipped.items() if n in requested}
+
+
+def _growth(x: np.ndarray) -> np.ndarray:
+	# 列順 (CSV の決算期順) で 1 つ前の列との変化率。pandas の pct_change と同じ向き
+	out = np.full(x.shape, np.nan)
+	out[..., 1:] = (x[..., 1:] / x[..., :-1] - 1) * 100
+	return out
+
+
+# ---- 標準指標 ------------------------------------------------------------------
+
+register('長期資本', [BS('Stockholders Equity'), BS('Total Non Current Liabilities Net Minority Interest')],
+	lambda eq, ncl: eq + ncl, intermediate=True, description='株主資本 + 固定負債')
+
+register('売上高成長率(%)', [FIN('Total Revenue')], _growth)
+register('営業利益率(%)', [FIN('Operating Income'), FIN('Total Revenue')], lambda op, rev: op / rev * 100)
+register('純利益率(%)', [FIN('Net Income'), FIN('Total Revenue')], lambda ni, rev: ni / rev * 100)
+register('営業CFマージン(%)', [CF('Operating Cash Flow'), FIN('Total Revenue')], lambda ocf, rev: ocf / rev * 100)
+register('フリーCFマージン(%)', [CF('Free Cash Flow'), FIN('Total Revenue')], lambda fcf, rev: fcf / rev * 100)
+register('自己資本比率(%)', [BS('Stockholders Equity'), BS('Total Assets')], lambda eq, ta: eq / ta * 100)
+register('流動比率(%)', [BS('Current Assets'), BS('Current Liabilities')], lambda ca, cl: ca / cl * 100)
+register('有利子負債比率(%)', [BS('Total Liabilities Net Minority Interest'), BS('Total Assets')], lambda tl, ta: tl / ta * 100)
+register('ROA(%)', [FIN('Net Income'), BS('Total Assets')], lambda ni, ta: ni / ta * 100, description='総資産利益率')
+register('ROE(%)', [FIN('Net Income'), BS('Stockholders Equity')], lambda ni, eq: ni / eq * 100, description='自己資本利益率')
+register('インタレストガバレッジレシオ', [FIN('Operating Income'), FIN('Interest Expense')],
+	lambda op, ie: op / np.abs(ie), description='営業利益 / |支払利息|')
+register('固定長期適合率(%)', [BS('Total Non Current Assets'), '長期資本'], lambda nca, lc: nca / lc * 100,
+	description='固定資産 / (株主資本 + 固定負債)')
+
+# ---- 株価を使う指標 (株価が未取得の銘柄ではスキップ) ------------------------------
+# 株価は分割修正前の当時の値なので、その期の株式数 (自己株式を除く) を掛ければ当時の時価総額になる
+register('株価', [PX('Close')], lambda close: close, description='決算期末 (直前の取引日) の終値')
+register('時価総額', [PX('Close'), BS('Ordinary Shares Number')], lambda close, shares: close * shares,
+	description='期末株価 × 期末の発行済株式数 (自己株式を除く)')
+register('企業価値(EV)', ['時価総額', BS('Total Debt'), BS('Cash And Cash Equivalents')],
+	lambda mcap, debt, cash: mcap + debt - cash, description='時価総額 + 有利子負債 - 現金')
+register('PER(倍)', ['時価総額', FIN('Net Income')], lambda mcap, ni: np.where(ni > 0, mcap / ni, np.nan),
+	description='時価総額 / 純利益 (赤字の期は空欄)')
+register('PBR(倍)', ['時価総額', BS('Stockholders Equity')], lambda mcap, eq: np.where(eq > 0, mcap / eq, np.nan),
+	description='時価総額 / 株主資本')
+register('EV/EBITDA(倍)', ['企業価値(EV)', FIN('EBITDA')], lambda ev, ebitda: np.where(ebitda > 0, ev / ebitda, np.nan))
+register('配当利回り(%)', [PX('Trailing Dividends'), PX('Close')], lambda dps, close: dps / close * 100,
+	description='期末までの直近 1 年の 1 株配当 / 期末株価')
@@ -0,0 +1,481 @@
+"""
+同業比較の統計。各銘柄の financial_analysis_summary.csv と info.csv のセクター・業種を結合し、
+年度 (決算期末の年) ごとに全銘柄中のパーセンタイル順位・z スコア・セクター/業種の中央値を求める。
+分析ポータルの各指標グラフに「セクター中央値」「パーセンタイル」の系列として重ねて表示する。
+
+保存先 (data/peer_stats/):
+ - sectors/<sector>.csv  セクターごとの構成銘柄の指標値 (ticker, industry, year, 指標...)
+ - group_stats.csv       セクター/業種 × 年度の中央値と社数
+ - universe_moments.csv  年度 × 指標の件数・合計・二乗和 (z スコア用)
+ - meta.json             銘柄ごとのセクター・業種とサマリー/info の内容ハッシュ
+build は全銘柄を 1 回の groupby で集計する。update は変わった銘柄の属するセクターのファイルだけを
+読み書きし、そのセクター (と業種) の中央値を計算し直し、全体の件数・合計・二乗和は差分で更新する。
+
+使い方:
+ uv run src\\scripts\\peer_stats.py build
+ uv run src\\scripts\\peer_stats.py update 7203.T 6758.T
+ uv run src\\scripts\\peer_stats.py show 7203.T --metric ROE
+ uv run src\\scripts\\peer_stats.py export   (全銘柄×年度のパーセンタイル/z スコアを peer_ranks.csv に出力)
+"""
+
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import metrics as mx
+import manifest as mf
+import instrument
+import company_info
+from yahoo2finance import read_tickers_file
+
+SUMMARY_NAME = 'financial_analysis_summary.csv'
+INFO_NAME = 'info.csv'
+PEER_DIR = os.path.join('data', 'peer_stats')
+SECTORS_DIR = 'sectors'
+GROUP_STATS = 'group_stats.csv'
+MOMENTS = 'universe_moments.csv'
+RANKS = 'peer_ranks.csv'
+STATE_VERSION = 1
+LEVELS = ('sector', 'industry')
+UNKNOWN = '(不明)'
+MOMENT_STATS = ('n', 'sum', 'sumsq')
+
+_LOCK = threading.RLock()  # パイプラインの各銘柄スレッドから同じ保存先を更新する
+
+
+def summary_path(symbol: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, symbol, SUMMARY_NAME)
+
+
+def info_path(symbol: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, symbol, INFO_NAME)
+
+
+def list_summaries(data_dir: str = 'data') -> list[str]:
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(summary_path(d, data_dir)))
+
+
+def read_sector(symbol: str, data_dir: str = 'data', table: company_info.CompanyInfo | None = None) -> tuple[str, str]:
+	"""info.csv の (sector, industry)。無ければ (不明)。
+
+	table (会社情報テーブル) に info.csv が変わっていない状態で登録済みなら、CSV を開かずにそこから引く。
+	"""
+	if table is not None and table.is_current(symbol):
+		return tuple((table.get(symbol, level) or '').strip() or UNKNOWN for level in LEVELS)
+	try:
+		info = pd.read_csv(info_path(symbol, data_dir), usecols=lambda c: c in LEVELS, nrows=1)
+	except (OSError, ValueError):
+		return UNKNOWN, UNKNOWN
+	out = []
+	for level in LEVELS:
+		v = info[level].iloc[0] if level in info.columns and len(info) else None
+		out.append(str(v).strip() if pd.notna(v) and str(v).strip() else UNKNOWN)
+	return out[0], out[1]
+
+
+def read_years(symbol: str, data_dir: str = 'data') -> pd.DataFrame:
+	"""サマリーを年度 (決算期末の年) 行にする。同じ年に 2 期あれば新しい方 (先頭側) を使う。"""
+	df = pd.read_csv(summary_path(symbol, data_dir), index_col=0, float_precision='round_trip')
+	df = df.apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan)
+	df.index = [str(p)[:4] for p in df.index]
+	return df[~df.index.duplicated(keep='first')]
+
+
+def period_years(index) -> list[str]:
+	return [str(p)[:4] for p in index]
+
+
+def _sector_file(sector: str) -> str:
+	# 表示名にはスペースや & が入るため、英数字の slug + 名前のハッシュ (衝突回避) をファイル名にする
+	slug = re.sub(r'[^0-9A-Za-z]+', '-', sector).strip('-').lower() or 'sector'
+	return f'{slug}-{hashlib.sha1(sector.encode("utf-8")).hexdigest()[:8]}.csv'
+
+
+def _group_medians(members: pd.DataFrame, metrics: list[str], level: str) -> pd.DataFrame:
+	g = members.groupby([level, 'year'], sort=True)
+	out = g[metrics].median()
+	out.insert(0, 'count', g['ticker'].nunique())
+	out = out.reset_index().rename(columns={level: 'group'})
+	out.insert(0, 'level', level)
+	return out
+
+
+def _moments(members: pd.DataFrame, metrics: list[str]) -> dict[str, pd.DataFrame]:
+	v = members[metrics]
+	g = v.groupby(members['year'])
+	return {'n': g.count().astype(float), 'sum': g.sum(), 'sumsq': (v ** 2).groupby(members['year']).sum()}
+
+
+@dataclass
+class PeerSeries:
+	"""1 銘柄の同業比較系列。median / pct / z はサマリーと同じ行 (決算期)・列 (指標) の表。"""
+	sector: str
+	median: pd.DataFrame  # セクター中央値
+	pct: pd.DataFrame     # 全銘柄中のパーセンタイル (0〜100)
+	z: pd.DataFrame       # z スコア
+
+	def digest(self) -> str:
+		h = hashlib.sha256(self.sector.encode('utf-8'))
+		for frame in (self.median, self.pct, self.z):
+			h.update(frame.to_csv().encode('utf-8'))
+		return h.hexdigest()
+
+
+class PeerStats:
+	"""セクター別に分けて保存した構成銘柄の指標値と、その集計 (中央値・件数・合計・二乗和)。"""
+
+	def __init__(self, root: str = PEER_DIR, data_dir: str = 'data'):
+		self.root = root
+		self.data_dir = data_dir
+		self.metrics: list[str] = []
+		self.tickers: dict[str, dict] = {}
+		self._universe = None  # (meta.json の mtime, 全構成銘柄の表)。自分の更新では表をその場で差し替える
+		self._info = None      # 会社情報テーブル (無ければ False)
+
+	# ---- 読み書き ----------------------------------------------------------------
+
+	def _path(self, *parts: str) -> str:
+		return os.path.join(self.root, *parts)
+
+	def exists(self) -> bool:
+		return os.path.exists(self._path('meta.json'))
+
+	def info_table(self) -> company_info.CompanyInfo | None:
+		# セクター・業種は会社情報テーブルがあればそこから引く (初回だけ開く。古い銘柄は read_sector が info.csv を読む)
+		if self._info is None:
+			self._info = company_info.open_table(self.data_dir) or False
+		return self._info or None
+
+	def load(self) -> bool:
+		with _LOCK:
+			try:
+				with open(self._path('meta.json'), encoding='utf-8') as f:
+					meta = json.load(f)
+			except (OSError, ValueError):
+				return False
+			if meta.get('version') != STATE_VERSION:
+				return False
+			self.metrics, self.tickers = meta['metrics'], meta['tickers']
+			return True
+
+	def _save_meta(self):
+		meta = {'version': STATE_VERSION, 'metrics': self.metrics, 'tickers': self.tickers}
+		mf.atomic_write(self._path('meta.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+	def _meta_stamp(self) -> int | None:
+		try:
+			return os.stat(self._path('meta.json')).st_mtime_ns
+		except OSError:
+			return None
+
+	def _write_csv(self, name: str, df: pd.DataFrame, index: bool = False):
+		mf.atomic_write(self._path(name), df.to_csv(index=index).encode('utf-8'))
+
+	def _sectors(self) -> set[str]:
+		return {v['sector'] for v in self.tickers.values()}
+
+	def read_sector_members(self, sector: str) -> pd.DataFrame:
+		path = self._path(SECTORS_DIR, _sector_file(sector))
+		if not os.path.exists(path):
+			return pd.DataFrame(columns=['ticker', 'industry', 'year', *self.metrics])
+		# 保存した値と同じ値を読み戻す (既定の高速パーサは最下位桁がずれ、同値の順位が変わる)
+		df = pd.read_csv(path, dtype={'ticker': str, 'industry': str, 'year': str}, float_precision='round_trip')
+		df.insert(1, 'sector', sector)
+		return df
+
+	def _write_sector_members(self, sector: str, members: pd.DataFrame):
+		path = self._path(SECTORS_DIR, _sector_file(sector))
+		if members.empty:
+			if os.path.exists(path):
+				os.remove(path)
+			return
+		os.makedirs(os.path.dirname(path), exist_ok=True)
+		self._write_csv(os.path.join(SECTORS_DIR, _sector_file(sector)), members.drop(columns='sector'))
+
+	def members(self) -> pd.DataFrame:
+		"""全構成銘柄の表 (ticker, sector, industry, year, 指標...)。
+
+		update() / build() は保持している表をその場で差し替えるため、読み直すのは初回と
+		別のプロセスが統計を更新した (meta.json が変わった) ときだけ。
+		"""
+		with _LOCK:
+			stamp = self._meta_stamp()
+			if self._universe is None or self._universe[0] != stamp:
+				parts = [self.read_sector_members(s) for s in sorted(self._sectors())]
+				uni = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['ticker', 'sector', 'industry', 'year', *self.metrics])
+				self._universe = (stamp, uni)
+			return self._universe[1]
+
+	def group_stats(self) -> pd.DataFrame:
+		return pd.read_csv(self._path(GROUP_STATS), dtype={'level': str, 'group': str, 'year': str}, float_precision='round_trip')
+
+	def moments(self) -> dict[str, pd.DataFrame]:
+		df = pd.read_csv(self._path(MOMENTS), dtype={'year': str, 'stat': str}, float_precision='round_trip')
+		return {s: part.drop(columns='stat').set_index('year') for s, part in df.groupby('stat')}
+
+	def _write_moments(self, moments: dict[str, pd.DataFrame]):
+		n = moments['n']
+		keep = n.index[n.sum(axis=1) > 0]  # 全指標で件数 0 になった年度は落とす
+		parts = [moments[s].reindex(keep).assign(stat=s) for s in MOMENT_STATS]
+		df = pd.concat(parts).rename_axis('year').reset_index()
+		self._write_csv(MOMENTS, df[['year', 'stat', *self.metrics]].sort_values(['year', 'stat']))
+
+	# ---- 構築・差分更新 -------------------------------------------------------------
+
+	def _read_ticker(self, t: str) -> tuple[pd.DataFrame, dict] | None:
+		path = summary_path(t, self.data_dir)
+		if not os.path.exists(path):
+			return None
+		sector, industry = read_sector(t, self.data_dir, self.info_table())
+		df = read_years(t, self.data_dir)
+		rows = df.rename_axis('year').reset_index()
+		rows.insert(0, 'ticker', t)
+		rows.insert(1, 'sector', sector)
+		rows.insert(2, 'industry', industry)
+		info = {'sector': sector, 'industry': industry, 'summary': mf.file_sha256(path),
+			'info': mf.file_sha256(info_path(t, self.data_dir))}
+		return rows, info
+
+	def build(self, tickers: list[str] | None = None) -> int:
+		"""全銘柄を読み直し、中央値・件数・合計・二乗和を 1 回の groupby で集計して保存する。"""
+		with _LOCK, instrument.span('peer_build') as sp:
+			tickers = list_summaries(self.data_dir) if tickers is None else list(dict.fromkeys(tickers))
+			parts, infos = [], {}
+			for t in tickers:
+				r = self._read_ticker(t)
+				if r is not None:
+					parts.append(r[0])
+					infos[t] = r[1]
+			members = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=['ticker', 'sector', 'industry', 'year'])
+			seen = set(members.columns) - {'ticker', 'sector', 'industry', 'year'}
+			# 列は登録順 → 登録外の列 (旧サマリー等) の順
+			self.metrics = [n for n in mx.metric_names() if n in seen] + sorted(seen - set(mx.metric_names()))
+			self.tickers = infos
+			members = members[['ticker', 'sector', 'industry', 'year', *self.metrics]]
+			os.makedirs(self._path(SECTORS_DIR), exist_ok=True)
+			for name in os.listdir(self._path(SECTORS_DIR)):
+				os.remove(self._path(SECTORS_DIR, name))
+			for sector, part in members.groupby('sector', sort=False):
+				self._write_sector_members(sector, part)
+			stats = pd.concat([_group_medians(members, self.metrics, level) for level in LEVELS], ignore_index=True)
+			self._write_csv(GROUP_STATS, stats)
+			self._write_moments(_moments(members, self.metrics))
+			self._save_meta()
+			self._universe = (self._meta_stamp(), members.reset_index(drop=True))
+			sp.count(rows=len(members))
+			return len(infos)
+
+	def is_current(self, ticker: str) -> bool:
+		"""ticker のサマリーと info.csv が登録済みの内容と同じなら True。"""
+		with _LOCK:
+			if not self.metrics and not self.load():
+				return False
+			prev = self.tickers.get(ticker)
+			return (prev is not None
+				and prev['summary'] == mf.file_sha256(summary_path(ticker, self.data_dir))
+				and prev['info'] == mf.file_sha256(info_path(ticker, self.data_dir)))
+
+	def update(self, tickers: list[str]) -> list[str]:
+		"""サマリー・info の変わった銘柄だけを反映し、反映した銘柄を返す。
+
+		読み書きするのは変わった銘柄の (新旧の) セクターのファイルだけ。全体の件数・合計・二乗和は
+		古い行を引いて新しい行を足す。保存済みの状態が無い、または新しい指標列が現れたら作り直す。
+		"""
+		with _LOCK:
+			if not self.load():
+				self.build()
+				return sorted(self.tickers)
+			changed = {}
+			for t in dict.fromkeys(tickers):
+				if self.is_current(t):
+					continue
+				r = self._read_ticker(t)
+				if r is None and t not in self.tickers:
+					continue
+				changed[t] = r
+			if not changed:
+				return []
+			if any(set(r[0].columns) - {'ticker', 'sector', 'industry', 'year'} - set(self.metrics)
+					for r in changed.values() if r is not None):
+				self.build(sorted((set(self.tickers) | set(changed)) - {t for t, r in changed.items() if r is None}))
+				return sorted(changed)
+			with instrument.span('peer_update', tickers=len(changed)) as sp:
+				self._apply(changed)
+				sp.count(rows=len(changed))
+			return sorted(changed)
+
+	def _apply(self, changed: dict):
+		cached = self._universe is not None and self._universe[0] == self._meta_stamp()
+		old = {t: self.tickers[t] for t in changed if t in self.tickers}
+		new_rows = [r[0] for r in changed.values() if r is not None]
+		new = pd.concat(new_rows, ignore_index=True).reindex(columns=['ticker', 'sector', 'industry', 'year', *self.metrics]) \
+			if new_rows else pd.DataFrame(columns=['ticker', 'sector', 'industry', 'year', *self.metrics])
+		for t, r in changed.items():
+			if r is None:
+				self.tickers.pop(t, None)
+			else:
+				self.tickers[t] = r[1]
+		# 変わった銘柄の新旧の業種を含むセクターまで読む (業種の中央値を正しく求めるため)
+		industries = {v['industry'] for v in old.values()} | set(new['industry'])
+		sectors = {v['sector'] for v in old.values()} | set(new['sector'])
+		sectors |= {v['sector'] for v in self.tickers.values() if v['industry'] in industries}
+		loaded = pd.concat([self.read_sector_members(s) for s in sorted(sectors)], ignore_index=True)
+		removed = loaded[loaded['ticker'].isin(list(changed))]
+		members = pd.concat([loaded[~loaded['ticker'].isin(list(changed))], new], ignore_index=True)
+		for c in self.metrics:
+			members[c] = pd.to_numeric(members[c], errors='coerce')
+		for sector in sectors:
+			self._write_sector_members(sector, members[members['sector'] == sector])
+
+		stats = self.group_stats()
+		affected = {'sector': sectors, 'industry': industries}
+		keep = ~pd.concat([(stats['level'] == level) & stats['group'].isin(list(groups)) for level, groups in affected.items()], axis=1).any(axis=1)
+		fresh = [_group_medians(members[members[level].isin(list(groups))], self.metrics, level) for level, groups in affected.items()]
+		stats = pd.concat([stats[keep], *fresh], ignore_index=True).sort_values(['level', 'group', 'year'], kind='stable')
+		self._write_csv(GROUP_STATS, stats)
+
+		moments = self.moments()
+		plus, minus = _moments(new, self.metrics), _moments(removed, self.metrics)
+		for s in MOMENT_STATS:
+			moments[s] = moments[s].add(plus[s], fill_value=0).sub(minus[s], fill_value=0)
+		self._write_moments(moments)
+		self._save_meta()
+		if cached:
+			# 全構成銘柄の表は変わった銘柄の行だけ差し替える (セクターのファイルを読み直さない)
+			uni = self._universe[1]
+			uni = pd.concat([uni[~uni['ticker'].isin(list(changed))], new], ignore_index=True)
+			for c in self.metrics:
+				uni[c] = pd.to_numeric(uni[c], errors='coerce')
+			self._universe = (self._meta_stamp(), uni)
+
+	# ---- 参照 ---------------------------------------------------------------------
+
+	def peer_series(self, ticker: str, df: pd.DataFrame | None = None) -> PeerSeries:
+		"""ticker の各期のセクター中央値・全銘柄中のパーセンタイル・z スコア (df はサマリー。省略時は読み込む)。"""
+		with _LOCK:
+			if not self.metrics and not self.load():
+				raise FileNotFoundError(f'{self.root} に同業比較の統計がありません (peer_stats.py build)')
+			if df is None:
+				df = pd.read_csv(summary_path(ticker, self.data_dir), index_col=0, float_precision='round_trip')
+			values = df.apply(pd.to_numeric, errors='coerce').replace([np.inf, -np.inf], np.nan)
+			cols = [c for c in values.columns if c in self.metrics]
+			years = period_years(values.index)
+			values = values[cols]
+			sector = self.tickers.get(ticker, {}).get('sector') or read_sector(ticker, self.data_dir, self.info_table())[0]
+
+			stats = self.group_stats()
+			med = stats[(stats['level'] == 'sector') & (stats['group'] == sector)].set_index('year')
+			median = med.reindex(years)[cols].set_axis(values.index)
+
+			m = self.moments()
+			n, mean = m['n'].reindex(years)[cols].to_numpy(), None
+			with np.errstate(invalid='ignore', divide='ignore'):
+				mean = m['sum'].reindex(years)[cols].to_numpy() / n
+				var = np.maximum(m['sumsq'].reindex(years)[cols].to_numpy() / n - mean ** 2, 0)
+				std = np.sqrt(var)
+				z = np.where((n >= 2) & (std > 0), (values.to_numpy() - mean) / std, np.nan)
+
+			# パーセンタイル: 同じ年度の全銘柄の中での平均順位 / 件数 (pandas の rank(pct=True) と同じ定義)
+			uni = self.members()
+			pct = np.full(values.shape, np.nan)
+			by_year = uni.groupby('year').indices
+			x_all = values.to_numpy()
+			pool_all = uni[cols].to_numpy(dtype=np.float64)
+			for i, y in enumerate(years):
+				if y not in by_year:
+					continue
+				pool = pool_all[by_year[y]]
+				x = x_all[i]
+				with np.errstate(invalid='ignore'):
+					less = (pool < x).sum(axis=0)
+					eq = (pool == x).sum(axis=0)
+				count = (~np.isnan(pool)).sum(axis=0)
+				if self.tickers.get(ticker) is None:
+					# 未登録の銘柄は自身を加えた場合の順位
+					eq, count = eq + 1, count + 1
+				with np.errstate(invalid='ignore', divide='ignore'):
+					pct[i] = np.where(np.isnan(x) | (count == 0), np.nan, (less + (eq + 1) / 2) / count * 100)
+			frame = lambda a: pd.DataFrame(a, index=values.index, columns=cols)
+			return PeerSeries(sector, median, frame(pct), frame(z))
+
+	def ranks(self) -> pd.DataFrame:
+		"""全銘柄×年度のパーセンタイル・z スコア・セクター中央値 (1 回の groupby で計算)。"""
+		with instrument.span('peer_ranks') as sp:
+			uni = self.members()
+			v = uni[self.metrics].apply(pd.to_numeric, errors='coerce')
+			g = v.groupby(uni['year'])
+			pct = g.rank(pct=True) * 100
+			z = (v - g.transform('mean')) / g.transform('std', ddof=0)
+			med = v.groupby([uni['sector'], uni['year']]).transform('median')
+			keys = uni[['ticker', 'sector', 'industry', 'year']]
+			out = pd.concat([keys, pct.add_suffix(' pct'), z.add_suffix(' z'), med.add_suffix(' セクター中央値')], axis=1)
+			sp.count(rows=len(out))
+			return out.sort_values(['ticker', 'year'], ascending=[True, False], kind='stable')
+
+
+def main():
+	parser = argparse.ArgumentParser(description='セクター/業種の中央値と全銘柄中の順位 (パーセンタイル・z スコア)')
+	parser.add_argument('--root', default=PEER_DIR, help='統計の保存先')
+	parser.add_argument('--data-dir', default='data')
+	sub = parser.add_subparsers(dest='command', required=True)
+	sub.add_parser('build', help='全銘柄から作り直す')
+	u = sub.add_parser('update', help='変わった銘柄だけを反映する')
+	u.add_argument('symbols', nargs='*')
+	u.add_argument('--tickers-file', help='銘柄一覧ファイル (1行1銘柄)')
+	s = sub.add_parser('show', help='銘柄の指標をセクター中央値・順位と並べて表示する')
+	s.add_argument('symbol')
+	s.add_argument('--metric', help='表示する指標 (部分一致)')
+	e = sub.add_parser('export', help='全銘柄×年度の順位表を CSV に出力する')
+	e.add_argument('--output', help=f'出力先 (既定: <root>/{RANKS})')
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	stats = PeerStats(args.root, args.data_dir)
+	if args.command == 'build':
+		n = stats.build()
+		print(f'{n} 銘柄 / {len(stats._sectors())} セクターの統計を {args.root} に作成しました。')
+		return
+	if args.command == 'update':
+		symbols = list(args.symbols) + (read_tickers_file(args.tickers_file) if args.tickers_file else [])
+		updated = stats.update(symbols or list_summaries(args.data_dir))
+		print(f'反映: {len(updated)} 銘柄' + (f' ({", ".join(updated[:10])}{" ..." if len(updated) > 10 else ""})' if updated else ''))
+		return
+	if not stats.load():
+		stats.build()
+	if args.command == 'export':
+		out = args.output or os.path.join(args.root, RANKS)
+		stats.ranks().to_csv(out, index=False, encoding='utf-8-sig')
+		print(f'{out} に出力しました。')
+		return
+
+	stats.update([args.symbol])
+	if not os.path.exists(summary_path(args.symbol, args.data_dir)):
+		print(f'ファイルがありません: {summary_path(args.symbol, args.data_dir)}')
+		sys.exit(1)
+	df = pd.read_csv(summary_path(args.symbol, args.data_dir), index_col=0)
+	peers = stats.peer_series(args.symbol, df)
+	info = stats.tickers.get(args.symbol, {})
+	print(f'{args.symbol}  セクター: {peers.sector} / 業種: {info.get("industry", UNKNOWN)}')
+	cols = [c for c in peers.pct.columns if not args.metric or args.metric in c]
+	for c in cols:
+		table = pd.DataFrame({
+			'値': pd.to_numeric(df[c], errors='coerce'),
+			'セクター中央値': peers.median[c],
+			'パーセンタイル': peers.pct[c],
+			'zスコア': peers.z[c],
+		})
+		print(f'\n[{c}]')
+		print(table.round(2).to_string())
+
+
+if __name__ == '__main__':
+	main()
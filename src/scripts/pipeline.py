@@ -0,0 +1,384 @@
+"""
+取得 → 指標計算 → 分析ポータル → グループ可視化 を 1 プロセス内で実行する DAG ランナー。
+
+ - ステージ間は DataFrame をメモリで受け渡す (直前のステージが書いた CSV を読み直さない)
+ - 入力のフィンガープリントが前回実行時と同じで出力ファイルが揃っていればステージをスキップ
+   (スキップしたステージの結果は、後続が実際に必要としたときだけディスクから読む)
+ - 銘柄・独立ステージはスレッドプールで並列実行
+状態は data/<ticker>/pipeline_state.json に保存する。
+"""
+
+import os
+import json
+import time
+import hashlib
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import pandas as pd
+
+import manifest as mf
+import instrument
+import yahoo2finance
+import alldata2analysisdata
+import analysisdata2graph
+import alldata2visualization
+import quarterly as qt
+import prices as px
+import peer_stats
+from assets import AssetOptions
+from columnar_store import STATEMENT_FILES, read_statement_frame
+
+STATE_NAME = 'pipeline_state.json'
+
+
+class Stage:
+	"""パイプラインの 1 ステージ。
+
+	run(ticker, inputs) -> 値 : inputs は依存ステージ名→値 (参照時に遅延ロード)
+	load(ticker) -> 値        : スキップ時に後続へ渡す値をディスクから復元する
+	outputs                   : スキップ判定で存在を確認する data/<ticker>/ 内のファイル
+	fresh(ticker) -> bool     : 指定時はフィンガープリントの代わりにこれで最新判定 (取得ステージ用)
+	fingerprint(ticker) -> str: 指定時は出力フィンガープリントを実行後にこれで求める
+	version                   : ステージの処理内容を変えたら上げる (既存の状態を無効化)
+	"""
+
+	def __init__(self, name: str, run, deps: tuple[str, ...] = (), load=None, outputs: tuple[str, ...] = (),
+			fresh=None, fingerprint=None, version: str = '1'):
+		self.name = name
+		self.run = run
+		self.deps = tuple(deps)
+		self.load = load
+		self.outputs = tuple(outputs)
+		self.fresh = fresh
+		self.fingerprint = fingerprint
+		self.version = version
+
+
+@dataclass
+class StageResult:
+	ticker: str
+	stage: str
+	status: str  # ran / skipped / failed / blocked
+	elapsed: float = 0.0
+	error: str = ''
+
+
+def _digest(*parts: str) -> str:
+	h = hashlib.sha256()
+	for p in parts:
+		h.update(p.encode('utf-8'))
+		h.update(b'\0')
+	return h.hexdigest()
+
+
+class _Inputs:
+	# 依存ステージの値を参照時にだけ読み込む (スキップ済みステージの CSV を無駄に読まない)
+	def __init__(self, runner, ticker: str, deps: tuple[str, ...]):
+		self._runner = runner
+		self._ticker = ticker
+		self._deps = deps
+
+	def __getitem__(self, name: str):
+		if name not in self._deps:
+			raise KeyError(name)
+		return self._runner._value(self._ticker, name)
+
+
+class Pipeline:
+	def __init__(self, stages: list[Stage], data_dir: str = 'data', jobs: int = 4, force: bool = False):
+		self.stages = {s.name: s for s in stages}
+		for s in stages:
+			for d in s.deps:
+				if d not in self.stages:
+					raise ValueError(f'{s.name} の依存ステージ {d} が未定義です')
+		self.data_dir = data_dir
+		self.jobs = jobs
+		self.force = force
+		self._values = {}
+		self._fps = {}
+		self._lock = threading.Lock()
+		self._ticker_locks = {}
+
+	def _state_path(self, ticker: str) -> str:
+		return os.path.join(self.data_dir, ticker, STATE_NAME)
+
+	def _ticker_lock(self, ticker: str) -> threading.Lock:
+		with self._lock:
+			return self._ticker_locks.setdefault(ticker, threading.Lock())
+
+	def _load_state(self, ticker: str) -> dict:
+		try:
+			with open(self._state_path(ticker), encoding='utf-8') as f:
+				return json.load(f)
+		except (OSError, ValueError):
+			return {}
+
+	def _save_state(self, ticker: str, stage: str, fp: str):
+		with self._ticker_lock(ticker):
+			state = self._load_state(ticker)
+			state[stage] = fp
+			os.makedirs(os.path.join(self.data_dir, ticker), exist_ok=True)
+			mf.atomic_write(self._state_path(ticker), json.dumps(state, indent=2).encode('utf-8'))
+
+	def _value(self, ticker: str, name: str):
+		key = (ticker, name)
+		with self._ticker_lock(ticker):
+			if key not in self._values:
+				stage = self.stages[name]
+				if stage.load is None:
+					raise RuntimeError(f'{name} の結果を復元できません')
+				self._values[key] = stage.load(ticker)
+			return self._values[key]
+
+	def _run_node(self, ticker: str, stage: Stage) -> StageResult:
+		with instrument.span(stage.name, ticker) as sp:
+			result = self._run_stage(ticker, stage)
+			sp.fields['result'] = result.status
+		return result
+
+	def _run_stage(self, ticker: str, stage: Stage) -> StageResult:
+		start = time.perf_counter()
+		input_fp = _digest(stage.name, stage.version, *(self._fps[(ticker, d)] for d in stage.deps))
+		if stage.fresh is not None:
+			up_to_date = not self.force and stage.fresh(ticker)
+		else:
+			base = os.path.join(self.data_dir, ticker)
+			up_to_date = (not self.force
+				and self._load_state(ticker).get(stage.name) == input_fp
+				and all(os.path.exists(os.path.join(base, o)) for o in stage.outputs))
+		if up_to_date:
+			status = 'skipped'
+		else:
+			value = stage.run(ticker, _Inputs(self, ticker, stage.deps))
+			with self._ticker_lock(ticker):
+				self._values[(ticker, stage.name)] = value
+			status = 'ran'
+		# 出力フィンガープリント: 明示関数があればそれ (取得など入力から決まらないもの)、無ければ入力と同じ
+		fp = stage.fingerprint(ticker) if stage.fingerprint is not None else input_fp
+		self._fps[(ticker, stage.name)] = fp
+		if status == 'ran':
+			self._save_state(ticker, stage.name, input_fp)
+		return StageResult(ticker, stage.name, status, time.perf_counter() - start)
+
+	def run(self, tickers: list[str]) -> list[StageResult]:
+		"""全銘柄×全ステージを依存順に実行し、結果を (銘柄, ステージ定義順) で返す。"""
+		tickers = list(dict.fromkeys(tickers))
+		pending = {(t, name): set(s.deps) for t in tickers for name, s in self.stages.items()}
+		results = {}
+		running = {}
+		with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+			while pending or running:
+				ready = [k for k, deps in pending.items() if not deps]
+				for key in ready:
+					del pending[key]
+					running[pool.submit(self._run_node, key[0], self.stages[key[1]])] = key
+				if not running:
+					break
+				done, _ = wait(running, return_when=FIRST_COMPLETED)
+				for fut in done:
+					t, name = running.pop(fut)
+					try:
+						r = fut.result()
+					except Exception as e:
+						r = StageResult(t, name, 'failed', error=f'{type(e).__name__}: {e}')
+					results[(t, name)] = r
+					print(f'[{r.status.upper()}] {t} {name} {r.elapsed:.2f}s' + (f' ({r.error})' if r.error else ''))
+					for key, deps in list(pending.items()):
+						if key[0] != t or name not in deps:
+							continue
+						if r.status == 'failed' or r.status == 'blocked':
+							# 依存が失敗した後続ステージは実行しない (さらにその後続も連鎖的に)
+							del pending[key]
+							results[key] = StageResult(t, key[1], 'blocked', error=f'{name} が失敗')
+							self._block_dependents(t, key[1], pending, results)
+						else:
+							deps.discard(name)
+		return [results[(t, name)] for t in tickers for name in self.stages if (t, name) in results]
+
+	def lineage(self, name: str) -> list[str]:
+		"""name とその依存ステージ (推移的) をステージ定義順に並べたもの。"""
+		need, stack = set(), [name]
+		while stack:
+			n = stack.pop()
+			if n not in need:
+				need.add(n)
+				stack.extend(self.stages[n].deps)
+		return [n for n in self.stages if n in need]
+
+	def run_one(self, ticker: str, name: str) -> StageResult:
+		"""ticker の 1 ステージだけを実行する (ジョブキューのワーカー用)。
+
+		依存ステージは先に順に通す。最新ならスキップされ、フィンガープリントと (後続が使えば) 値だけが求まる。
+		依存ステージの失敗は例外のまま呼び出し元に返す。
+		"""
+		for n in self.lineage(name):
+			result = self._run_node(ticker, self.stages[n])
+		return result
+
+	def forget(self, ticker: str):
+		# 銘柄の処理が済んだら受け渡し用の値を捨てる (長く動くワーカーでメモリが増え続けないように)
+		for cache in (self._values, self._fps):
+			for key in [k for k in list(cache) if k[0] == ticker]:
+				cache.pop(key, None)
+
+	def _block_dependents(self, ticker: str, name: str, pending: dict, results: dict):
+		for key, deps in list(pending.items()):
+			if key[0] == ticker and name in deps:
+				del pending[key]
+				results[key] = StageResult(ticker, key[1], 'blocked', error=f'{name} が失敗')
+				self._block_dependents(ticker, key[1], pending, results)
+
+
+def print_summary(results: list[StageResult]):
+	counts = {}
+	for r in results:
+		counts[r.status] = counts.get(r.status, 0) + 1
+	print('\n実行結果: ' + ' / '.join(f'{k} {v}' for k, v in sorted(counts.items())))
+	for r in results:
+		if r.status in ('failed', 'blocked'):
+			print(f'  {r.status} {r.ticker} {r.stage}: {r.error}')
+
+
+# ---- 標準ステージ定義 -------------------------------------------------------
+
+def _read_statements(data_dir: str, ticker: str) -> dict[str, pd.DataFrame]:
+	return {name: read_statement_frame(ticker, name, data_dir) for name in STATEMENT_FILES}
+
+
+def default_stages(data_dir: str = 'data', fetch: bool = True, open_browser: bool = False,
+		limiter: yahoo2finance.TokenBucket | None = None, ttl: float = mf.DEFAULT_TTL, force_fetch: bool = False,
+		assets: AssetOptions | None = None, exporter=None, ticker_factory=None,
+		retries: int = 0, backoff: float = 1.0, quarterly: bool = False, prices: bool = True,
+		peers: bool = True) -> list[Stage]:
+	"""(fetch, prices) → analyze → (portal, group) の標準 DAG。portal と group は互いに独立で並列に走る。
+
+	exporter (static_export.StaticExporter) を渡すと静的画像の出力ステージ images を追加する。
+	ticker_factory で取得元を差し替えられる (providers.make_provider。省略時は yfinance)。
+	quarterly=True なら四半期データの取得・追記 (fetch_quarterly) と TTM 指標 (ttm) のステージを追加する。
+	prices=True なら日次株価の取得・追記 (prices) を analyze (時価総額・PER 等) と ttm の前に行う。
+	peers=True なら analyze の後で同業統計 (peer_stats) に銘柄を反映し、ポータルにセクター中央値・順位を重ねる。
+	"""
+	if data_dir != 'data':
+		# 各スクリプトは data/<ticker>/ 固定のため、別ディレクトリでの利用は未対応
+		raise ValueError('現在 data_dir は "data" のみ対応しています')
+
+	def fetch_run(ticker, inputs):
+		if not fetch:
+			return _read_statements(data_dir, ticker)  # --force 指定時も取得しないモードでは手元の CSV を使う
+		data, _ = yahoo2finance.download_with_retry(ticker, ticker_factory or yahoo2finance.yf.Ticker, limiter, retries, backoff)
+		changed = yahoo2finance.save_fundamentals(ticker, data, data_dir, ttl=ttl)
+		print(f'{ticker}: 取得完了 (更新: {", ".join(changed) if changed else "なし"})')
+		return {name: yahoo2finance.as_saved_frame(data[name]) for name in STATEMENT_FILES}
+
+	def fetch_fresh(ticker):
+		if not fetch:
+			return True  # 取得しないモード: 手元の CSV をそのまま使う
+		return not force_fetch and yahoo2finance.is_fresh(ticker, data_dir, ttl=ttl)
+
+	def fetch_fingerprint(ticker):
+		save_dir = os.path.join(data_dir, ticker)
+		files = mf.load_manifest(save_dir).get('files', {})
+		hashes = []
+		for filename in STATEMENT_FILES.values():
+			h = files.get(filename, {}).get('sha256') or mf.file_sha256(os.path.join(save_dir, filename))
+			if h is None:
+				raise FileNotFoundError(f'{os.path.join(save_dir, filename)} がありません')
+			hashes.append(h)
+		return _digest(*hashes)
+
+	def analyze_run(ticker, inputs):
+		st = inputs['fetch']
+		frames = {name: st[name] for name in STATEMENT_FILES}
+		analysis, _ = alldata2analysisdata.update_analysis(ticker, frames=frames)
+		return analysis
+
+	def portal_run(ticker, inputs):
+		return analysisdata2graph.write_portal(ticker, inputs['analyze'], open_browser=open_browser, assets=assets,
+			peers=inputs['peers'] if peers else None)
+
+	# 同業統計は全銘柄で共有する (更新は peer_stats 側でロックする)
+	peer_store = peer_stats.PeerStats(peer_stats.PEER_DIR, data_dir)
+
+	def peers_run(ticker, inputs):
+		peer_store.update([ticker])
+		return peer_store.peer_series(ticker, inputs['analyze'])
+
+	def group_run(ticker, inputs):
+		return alldata2visualization.write_portal(ticker, inputs['fetch'], open_browser=open_browser, assets=assets)
+
+	def fetch_quarterly_run(ticker, inputs):
+		if fetch:
+			data, _ = yahoo2finance.download_with_retry(ticker, ticker_factory or yahoo2finance.yf.Ticker, limiter, retries,
+				backoff, quarterly=True)
+			frames = {name: yahoo2finance.as_saved_frame(data[name]) for name in STATEMENT_FILES}
+			_, added = qt.save_quarterly(ticker, frames, data_dir, ttl=ttl)
+			print(f'{ticker}: 四半期データ取得完了 (新しい四半期: {", ".join(added) if added else "なし"})')
+		return None
+
+	def quarterly_fingerprint(ticker):
+		q_dir = qt.quarterly_dir(ticker, data_dir)
+		hashes = [mf.file_sha256(os.path.join(q_dir, filename)) for filename in STATEMENT_FILES.values()]
+		if None in hashes:
+			raise FileNotFoundError(f'{q_dir} に四半期データがありません')
+		return _digest(*hashes)
+
+	def prices_run(ticker, inputs):
+		if fetch:
+			_, added, _ = yahoo2finance.update_prices(ticker, data_dir, ticker_factory or yahoo2finance.yf.Ticker, limiter,
+				retries, backoff, ttl)
+			print(f'{ticker}: 株価取得完了 (追加: {added} 日)')
+		return None
+
+	def prices_fingerprint(ticker):
+		# 株価が無い (取得しないモードで未取得) なら株価を使う指標はスキップされるだけ
+		return px.content_hash(ticker, data_dir) or 'none'
+
+	def ttm_run(ticker, inputs):
+		analysis, _ = qt.update_ttm(ticker, data_dir)
+		return analysis
+
+	def images_run(ticker, inputs):
+		r = exporter.export_ticker(ticker, inputs['fetch'], inputs['analyze'])
+		if r.error:
+			raise RuntimeError(r.error)
+		return r
+
+	# HTML の出力モード (埋め込み / 共有アセット) が変わったらポータルを作り直す
+	html_version = '1' if assets is None else f'1:{assets.key()}'
+	price_deps = ('prices',) if prices else ()
+	stages = [
+		Stage('fetch', fetch_run, load=lambda t: _read_statements(data_dir, t),
+			fresh=fetch_fresh, fingerprint=fetch_fingerprint),
+		Stage('analyze', analyze_run, deps=('fetch', *price_deps),
+			load=lambda t: pd.read_csv(analysisdata2graph.summary_path(t), index_col=0),
+			outputs=('financial_analysis_summary.csv',),
+			# 出力内容のハッシュを後続に渡し、指標が変わらなければポータルを作り直さない
+			fingerprint=lambda t: mf.file_sha256(analysisdata2graph.summary_path(t))),
+		Stage('portal', portal_run, deps=('analyze', *(('peers',) if peers else ())), outputs=('financial_analysis_portal.html',),
+			version=html_version),
+		Stage('group', group_run, deps=('fetch',), outputs=('all_financials_summary_graph.html',), version=html_version),
+	]
+	if prices:
+		stages.insert(1, Stage('prices', prices_run, load=lambda t: None,
+			fresh=lambda t: not fetch or (not force_fetch and px.is_fresh(t, data_dir, ttl=ttl)),
+			fingerprint=prices_fingerprint))
+	if peers:
+		# 自銘柄が反映済みなら再実行しないが、他銘柄の更新で中央値・順位が動いたらポータルを作り直す
+		stages.insert(stages.index(next(s for s in stages if s.name == 'portal')), Stage('peers', peers_run, deps=('analyze',),
+			load=peer_store.peer_series, fresh=peer_store.is_current,
+			fingerprint=lambda t: peer_store.peer_series(t).digest()))
+	if quarterly:
+		stages += [
+			Stage('fetch_quarterly', fetch_quarterly_run, load=lambda t: None,
+				fresh=lambda t: not fetch or (not force_fetch and yahoo2finance.is_fresh(t, data_dir, quarterly=True, ttl=ttl)),
+				fingerprint=quarterly_fingerprint),
+			Stage('ttm', ttm_run, deps=('fetch_quarterly', *price_deps),
+				load=lambda t: pd.read_csv(os.path.join(qt.quarterly_dir(t, data_dir), qt.TTM_NAME), index_col=0),
+				outputs=(os.path.join(qt.QUARTERLY_DIR, qt.TTM_NAME),)),
+		]
+	if exporter is not None:
+		stages.append(Stage('images', images_run, deps=('fetch', 'analyze'), outputs=('images/images.json',),
+			version=f'1:{exporter.fmt}:{exporter.scale}'))
+	return stages
@@ -0,0 +1,240 @@
+"""
+日次株価の保存と、決算期末時点の株価・配当の as-of 結合。
+
+保存: data/<ticker>/prices/ に列ごとの .npy (読み込みは memory map)
+ - date.npy     int32   1970-01-01 からの日数 (昇順)
+ - close.npy    float64 終値
+ - dividend.npy float32 1 株配当 (権利落ち日)
+ - split.npy    float32 株式分割の比率 (分割の無い日は 0)
+ yfinance の Close / Dividends は、後から行われた株式分割で過去の値も修正される。
+ 保存時に取得範囲内の分割比率で当時の表記に戻しておくことで、
+  - 決算期末の終値 × その期の balance_sheet の株式数 = その時点の時価総額 になる
+  - 後で分割があっても保存済みの値を書き換えずに追記だけで済む
+ 取得 (yahoo2finance.py --prices) は保存済みの最終日以降だけを取り寄せて追記する。
+as-of 結合: 各決算期末 (休日なら直前の取引日, MAX_STALE_DAYS 日以内) の終値と、期末までの直近 1 年の配当合計を
+ searchsorted でまとめて引く。銘柄ごとに memory map で開いて必要な位置だけを読むため、
+ 全銘柄・全期間の株価を一度にメモリへ載せることはない。
+使い方:
+ uv run src\\scripts\\yahoo2finance.py 7203.T 6758.T --prices   (株価を取得・追記)
+ uv run src\\scripts\\prices.py 7203.T                          (保存状況と決算期末の株価)
+"""
+
+import io
+import os
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+import manifest as mf
+import instrument
+
+PRICES_DIR = 'prices'
+COLUMNS = {'date': np.int32, 'close': np.float64, 'dividend': np.float32, 'split': np.float32}
+# metrics.py の入力 ('price', 項目名)。値は決算期に揃えた配列
+PRICE_STATEMENT = 'price'
+PRICE_ITEMS = ('Close', 'Trailing Dividends')
+MAX_STALE_DAYS = 7  # 決算期末からこの日数以上前の終値しか無ければ欠損扱い
+DIVIDEND_WINDOW_DAYS = 365
+
+
+def prices_dir(ticker: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, ticker, PRICES_DIR)
+
+
+def _to_days(dates) -> tuple[np.ndarray, np.ndarray]:
+	# 日付 (文字列/Timestamp) → (1970-01-01 からの日数, 有効か)。解釈できない日付は無効
+	d = pd.to_datetime(pd.Series(np.asarray(dates, dtype=object).ravel()), errors='coerce').to_numpy(dtype='datetime64[D]')
+	valid = ~np.isnat(d)
+	days = np.where(valid, d.astype(np.int64), 0).astype(np.int32)
+	return days.reshape(np.shape(dates)), valid.reshape(np.shape(dates))
+
+
+def _empty_columns() -> dict[str, np.ndarray]:
+	return {name: np.empty(0, dtype=dtype) for name, dtype in COLUMNS.items()}
+
+
+def history_columns(hist: pd.DataFrame) -> dict[str, np.ndarray]:
+	"""yfinance の history(auto_adjust=False) を保存形式の列 (分割修正を戻した当時の値) にする。"""
+	if hist is None or hist.empty:
+		return _empty_columns()
+	index = pd.DatetimeIndex(hist.index)
+	if index.tz is not None:
+		index = index.tz_localize(None)  # 取引所の現地日付のまま
+	date = index.to_numpy(dtype='datetime64[D]').astype(np.int64)
+	split = pd.to_numeric(hist['Stock Splits'], errors='coerce').fillna(0).to_numpy(np.float64) if 'Stock Splits' in hist else np.zeros(len(hist))
+	dividend = pd.to_numeric(hist['Dividends'], errors='coerce').fillna(0).to_numpy(np.float64) if 'Dividends' in hist else np.zeros(len(hist))
+	close = pd.to_numeric(hist['Close'], errors='coerce').to_numpy(np.float64)
+	order = np.argsort(date, kind='stable')
+	date, split, dividend, close = date[order], split[order], dividend[order], close[order]
+	# その日より後の分割比率の積。分割日当日の値は分割後の表記なので含めない
+	ratio = np.where(split > 0, split, 1.0)
+	after = np.append(np.cumprod(ratio[::-1])[::-1][1:], 1.0)
+	# 同じ日付が重複していたら後の行を使う
+	last = np.append(date[1:] != date[:-1], True)
+	cols = {'date': date, 'close': close * after, 'dividend': dividend * after, 'split': split}
+	return {name: cols[name][last].astype(dtype) for name, dtype in COLUMNS.items()}
+
+
+def load_prices(ticker: str, data_dir: str = 'data', mmap: bool = True) -> dict[str, np.ndarray] | None:
+	"""保存済みの列を返す (mmap=True なら memory map。読んだ位置だけがメモリに載る)。未取得なら None。"""
+	save_dir = prices_dir(ticker, data_dir)
+	if not os.path.exists(os.path.join(save_dir, 'date.npy')):
+		return None
+	return {name: np.load(os.path.join(save_dir, f'{name}.npy'), mmap_mode='r' if mmap else None) for name in COLUMNS}
+
+
+def _npy_bytes(arr: np.ndarray) -> bytes:
+	buf = io.BytesIO()
+	np.save(buf, np.ascontiguousarray(arr), allow_pickle=False)
+	return buf.getvalue()
+
+
+def save_prices(ticker: str, hist: pd.DataFrame, output_dir: str = 'data', ttl: float = mf.DEFAULT_TTL) -> tuple[list[str], int]:
+	"""取得した日足を保存済みの列に追記する。取得範囲と重なる日は新しい値で置き換える。
+
+	内容が変わった列だけを書き換え、prices/manifest.json を更新する。戻り値: (書き換えたファイル名, 増えた日数)
+	"""
+	with instrument.span('save_prices', ticker) as sp:
+		save_dir = prices_dir(ticker, output_dir)
+		os.makedirs(save_dir, exist_ok=True)
+		manifest = mf.load_manifest(save_dir)
+		new = history_columns(hist)
+		# 書き換え対象のファイルを map したままにしないよう、既存分は通常の読み込み
+		old = load_prices(ticker, output_dir, mmap=False) or _empty_columns()
+		if len(new['date']):
+			keep = old['date'] < new['date'][0]
+			cols = {name: np.concatenate([old[name][keep], new[name]]) for name in COLUMNS}
+		else:
+			cols = old
+		sp.count(rows=len(new['date']))
+		changed = [f'{name}.npy' for name, arr in cols.items()
+			if mf.write_if_changed(save_dir, f'{name}.npy', _npy_bytes(arr), manifest)]
+		dates = cols['date'].astype('datetime64[D]')
+		manifest.update({
+			'ticker': ticker,
+			'fetched_at': mf.now_iso(),
+			'fetched_at_epoch': time.time(),
+			'ttl_seconds': ttl,
+			'rows': int(len(dates)),
+			'first': str(dates[0]) if len(dates) else None,
+			'last': str(dates[-1]) if len(dates) else None,
+		})
+		mf.write_manifest(save_dir, manifest)
+	return changed, len(cols['date']) - len(old['date'])
+
+
+def last_date(ticker: str, data_dir: str = 'data') -> str | None:
+	"""保存済みの最終日 (YYYY-MM-DD)。未取得なら None。"""
+	return mf.load_manifest(prices_dir(ticker, data_dir)).get('last')
+
+
+def is_fresh(ticker: str, data_dir: str = 'data', ttl: float | None = None) -> bool:
+	return mf.is_fresh(mf.load_manifest(prices_dir(ticker, data_dir)), ttl=ttl)
+
+
+def content_hash(ticker: str, data_dir: str = 'data') -> str | None:
+	"""保存済みの株価の内容ハッシュ (manifest 記録のもの)。未取得なら None。"""
+	files = mf.load_manifest(prices_dir(ticker, data_dir)).get('files', {})
+	hashes = [files.get(f'{name}.npy', {}).get('sha256') for name in COLUMNS]
+	return None if None in hashes else mf.sha256_bytes('\0'.join(hashes).encode('utf-8'))
+
+
+# ---- as-of 結合 -----------------------------------------------------------------
+
+def asof(cols: dict[str, np.ndarray], days: np.ndarray, valid: np.ndarray | None = None) -> dict[str, np.ndarray]:
+	"""days (1970-01-01 からの日数) 時点の終値と、その日までの直近 1 年の 1 株配当合計を返す。
+
+	終値はその日以前の最後の取引日 (MAX_STALE_DAYS 日以内) のもの。株価の履歴が 1 年分に満たない日の配当は NaN。
+	"""
+	days = np.asarray(days, dtype=np.int64)
+	valid = np.ones(days.shape, dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+	date = cols['date']
+	out = {item: np.full(days.shape, np.nan) for item in PRICE_ITEMS}
+	if len(date) == 0 or not valid.any():
+		return out
+	# 二分探索で触れるのは数ページだけ (memory map のまま)
+	hi = np.searchsorted(date, days, side='right')
+	idx = np.maximum(hi - 1, 0)
+	ok = valid & (hi > 0) & (days - date[idx] <= MAX_STALE_DAYS)
+	out['Close'] = np.where(ok, cols['close'][idx], np.nan)
+	lo = np.searchsorted(date, days - DIVIDEND_WINDOW_DAYS, side='right')
+	covered = ok & (int(date[0]) <= days - DIVIDEND_WINDOW_DAYS)
+	if covered.any():
+		# 必要な範囲だけの累積和から窓ごとの合計を引く。窓内に分割があれば、各配当をその日時点の株数ベースに換算する
+		# (f = 範囲内の分割比率の累積積。配当 j の日 → 基準日 h の換算は f[j] / f[h])
+		start, stop = int(lo[covered].min()), int(hi[covered].max())
+		split = np.asarray(cols['split'][start:stop], dtype=np.float64)
+		f = np.cumprod(np.where(split > 0, split, 1.0))
+		cum = np.concatenate([[0.0], np.cumsum(np.asarray(cols['dividend'][start:stop], dtype=np.float64) * f)])
+		a = np.clip(lo - start, 0, len(cum) - 1)
+		b = np.clip(hi - start, 1, len(cum) - 1)
+		out['Trailing Dividends'] = np.where(covered, (cum[b] - cum[a]) / f[b - 1], np.nan)
+	return out
+
+
+def price_frame(ticker: str, periods: list, data_dir: str = 'data') -> pd.DataFrame:
+	"""決算期ごとの株価入力 (行=PRICE_ITEMS, 列=periods)。株価が未取得なら空の表 (指標はスキップされる)。"""
+	cols = load_prices(ticker, data_dir)
+	if cols is None:
+		return pd.DataFrame()
+	with instrument.span('price_asof', ticker):
+		days, valid = _to_days(list(periods))
+		values = asof(cols, days, valid)
+	return pd.DataFrame([values[item] for item in PRICE_ITEMS], index=list(PRICE_ITEMS), columns=list(periods))
+
+
+def fill_universe(uni, data_dir: str = 'data'):
+	"""alldata2analysisdata.Universe の price 配列を、各銘柄・各決算期末の as-of 値で埋める。"""
+	arr = uni.arrays.get(PRICE_STATEMENT)
+	if arr is None:
+		return
+	rows = {item: uni.items[PRICE_STATEMENT].get(item) for item in PRICE_ITEMS}
+	with instrument.span('price_asof', tickers=len(uni.tickers)) as sp:
+		days, valid = _to_days(uni.periods)
+		for ti, ticker in enumerate(uni.tickers):
+			if not valid[ti].any():
+				continue
+			cols = load_prices(ticker, data_dir)
+			if cols is None:
+				continue
+			for item, v in asof(cols, days[ti], valid[ti]).items():
+				if rows[item] is not None:
+					arr[ti, rows[item], :] = v
+			sp.count(rows=1)
+
+
+def history_frame(cols: dict[str, np.ndarray]) -> pd.DataFrame:
+	"""保存形式の列を yfinance の history() と同じ形 (分割修正済みの Close / Dividends / Stock Splits) に戻す。"""
+	split = np.asarray(cols['split'], dtype=np.float64)
+	ratio = np.where(split > 0, split, 1.0)
+	after = np.append(np.cumprod(ratio[::-1])[::-1][1:], 1.0) if len(ratio) else ratio
+	index = pd.DatetimeIndex(np.asarray(cols['date'], dtype=np.int64).astype('datetime64[D]'), name='Date')
+	return pd.DataFrame({
+		'Close': np.asarray(cols['close'], dtype=np.float64) / after,
+		'Dividends': np.asarray(cols['dividend'], dtype=np.float64) / after,
+		'Stock Splits': split,
+	}, index=index)
+
+
+def main():
+	parser = argparse.ArgumentParser(description='保存済みの日次株価と決算期末の株価を表示')
+	parser.add_argument('symbols', nargs='+', help='ティッカー (例: 7203.T)')
+	parser.add_argument('--data-dir', default='data')
+	args = parser.parse_args()
+	for symbol in args.symbols:
+		cols = load_prices(symbol, args.data_dir)
+		if cols is None:
+			print(f'{symbol}: 株価が未取得です (uv run src\\scripts\\yahoo2finance.py {symbol} --prices)')
+			continue
+		dates = cols['date'].astype('datetime64[D]')
+		print(f'{symbol}: {len(dates)} 日 ({dates[0]} 〜 {dates[-1]})')
+		fin = os.path.join(args.data_dir, symbol, 'financials.csv')
+		if os.path.exists(fin):
+			periods = pd.read_csv(fin, index_col=0, nrows=0).columns.tolist()
+			print(price_frame(symbol, periods, args.data_dir).T.round(2).to_string())
+
+
+if __name__ == '__main__':
+	main()
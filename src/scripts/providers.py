@@ -0,0 +1,415 @@
+"""
+財務データの取得元 (プロバイダ)。
+
+取得処理 (yahoo2finance.download_fundamentals) は「ティッカー → yf.Ticker 互換オブジェクト」を返す
+ticker_factory を受け取る。ここではそれを差し替え可能なプロバイダとして用意する。
+ - yfinance            : 既定。yf.Ticker そのもの
+ - fixtures:DIR        : 記録済みの data/<ticker>/ 形式の CSV を返す (ネットワーク不要)
+ - synthetic[:DIR]     : DIR (既定 data) の 1 銘柄をひな形に、ティッカーごとに規模を変えた合成データを返す
+ - http://HOST:PORT    : 下記の疑似 API サーバから取得する
+どのローカルプロバイダも遅延・エラー率・スロットリング (429 相当) を設定でき、
+ネットワークの無い CI でも大規模取得の並列数・リトライを決まった条件で調整できる。
+エラーの発生は (seed, ティッカー, 項目, 試行回数) から決まるため、スレッドの実行順によらず再現する。
+
+使い方:
+ uv run src\\scripts\\providers.py serve --fixtures data --port 8765 --latency 0.2 --error-rate 0.05 --rps 20
+ uv run src\\scripts\\yahoo2finance.py --tickers-file tickers.txt --provider http://127.0.0.1:8765
+ uv run src\\scripts\\yahoo2finance.py --tickers-file tickers.txt --provider synthetic --latency 0.1 --error-rate 0.1
+ uv run src\\main.py 7203.T --provider fixtures:tests_data
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import zlib
+import random
+import argparse
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+import prices as px
+
+# yf.Ticker の属性名 → 保存ファイル名 (yahoo2finance.STATEMENTS と同じ並び)
+STATEMENT_FILES = {
+	'financials': 'financials.csv',
+	'balance_sheet': 'balance_sheet.csv',
+	'cashflow': 'cashflow.csv',
+}
+QUARTERLY_PREFIX = 'quarterly_'  # quarterly_financials 等は root/<ticker>/quarterly/ の同名ファイル
+ATTRIBUTES = (*STATEMENT_FILES, 'info', *(QUARTERLY_PREFIX + name for name in STATEMENT_FILES), 'history')
+DEFAULT_TEMPLATE = '7203.T'
+
+
+class ProviderError(Exception):
+	"""取得元のエラー (疑似的な 5xx など)。"""
+
+
+class ThrottledError(ProviderError):
+	"""取得元がリクエスト過多で拒否した (HTTP 429 相当)。retry_after 秒待ってから再試行する。"""
+
+	def __init__(self, message: str, retry_after: float = 1.0):
+		super().__init__(message)
+		self.retry_after = retry_after
+
+
+@dataclass
+class Faults:
+	"""疑似的な遅延・障害の設定。
+
+	latency    : 1 リクエストあたりの遅延 (秒)。jitter の割合で揺らす
+	error_rate : リクエストが失敗する確率
+	rps        : 1 秒あたりの許容リクエスト数。超えた分はスロットリング (0 なら無制限)
+	seed       : エラー発生の乱数の種
+	"""
+	latency: float = 0.0
+	jitter: float = 0.5
+	error_rate: float = 0.0
+	rps: float = 0.0
+	seed: int = 0
+
+	def __post_init__(self):
+		self._lock = threading.Lock()
+		self._attempts = {}
+		self._window = []  # 直近 1 秒のリクエスト時刻
+
+	def _draw(self, *key) -> float:
+		# (seed, key, 何回目か) から決まる [0, 1) の値
+		with self._lock:
+			n = self._attempts[key] = self._attempts.get(key, 0) + 1
+		return random.Random(zlib.crc32(json.dumps([self.seed, *key, n]).encode('utf-8'))).random()
+
+	def _throttled(self) -> bool:
+		if self.rps <= 0:
+			return False
+		with self._lock:
+			now = time.monotonic()
+			self._window = [t for t in self._window if now - t < 1.0]
+			if len(self._window) >= self.rps:
+				return True
+			self._window.append(now)
+			return False
+
+	def apply(self, ticker: str, attr: str):
+		"""1 リクエスト分の遅延を入れ、設定に応じて ThrottledError / ProviderError を送出する。"""
+		if self._throttled():
+			raise ThrottledError(f'{ticker} {attr}: Too Many Requests', retry_after=1.0)
+		draw = self._draw(ticker, attr)
+		if self.latency > 0:
+			time.sleep(self.latency * (1 + self.jitter * (2 * draw - 1)))
+		if draw < self.error_rate:
+			raise ProviderError(f'{ticker} {attr}: 疑似エラー')
+
+
+# ---- ローカルのデータ源 ------------------------------------------------------
+
+def _yf_frame(df: pd.DataFrame) -> pd.DataFrame:
+	# yfinance と同じく列を決算期末日の Timestamp にする
+	out = df.copy()
+	out.columns = pd.to_datetime(out.columns)
+	return out
+
+
+def _since(hist: pd.DataFrame, start: str | None) -> pd.DataFrame:
+	# history(start=...) と同じく start 以降の日足だけにする
+	return hist if not start or hist.empty else hist[hist.index >= pd.Timestamp(start)]
+
+
+class FixtureSource:
+	"""記録済みの root/<ticker>/{financials,balance_sheet,cashflow,info}.csv と prices/ (日足) を返す。"""
+
+	def __init__(self, root: str = 'data'):
+		self.root = root
+
+	def tickers(self) -> list[str]:
+		return sorted(d for d in os.listdir(self.root) if os.path.exists(os.path.join(self.root, d, 'financials.csv')))
+
+	def get(self, ticker: str, attr: str):
+		base = os.path.join(self.root, ticker)
+		if not os.path.exists(os.path.join(base, 'financials.csv')):
+			raise KeyError(ticker)
+		if attr == 'info':
+			path = os.path.join(base, 'info.csv')
+			if not os.path.exists(path):
+				return {'symbol': ticker}
+			row = pd.read_csv(path).iloc[0]  # info は 1 行の横長形式
+			return {k: (None if pd.isna(v) else v.item() if hasattr(v, 'item') else v) for k, v in row.items()}
+		if attr.startswith(QUARTERLY_PREFIX):
+			path = os.path.join(base, 'quarterly', STATEMENT_FILES[attr[len(QUARTERLY_PREFIX):]])
+			# 四半期データを記録していない銘柄は yfinance と同じく空の表
+			return _yf_frame(pd.read_csv(path, index_col=0)) if os.path.exists(path) else pd.DataFrame()
+		if attr == 'history':
+			cols = px.load_prices(ticker, self.root, mmap=False)
+			return px.history_frame(cols) if cols is not None else pd.DataFrame()
+		return _yf_frame(pd.read_csv(os.path.join(base, STATEMENT_FILES[attr]), index_col=0))
+
+
+class SyntheticSource(FixtureSource):
+	"""ひな形銘柄の行ラベル・決算期を使い、値をティッカーごとの規模とゆらぎで変えた合成データを返す。
+
+	同じティッカーには常に同じデータを返す (乱数の種はティッカー名から決める)。
+	四半期データは年次のひな形から作る (各決算期を 4 四半期に分け、フロー項目は 1/4 ずつ)。
+	日足はランダムウォークで作り、最新の決算期末で PBR がティッカーごとの値になるよう水準を合わせる。
+	"""
+
+	def __init__(self, root: str = 'data', template: str = DEFAULT_TEMPLATE):
+		super().__init__(root)
+		self.template = template
+		self._cache = {}
+
+	def tickers(self) -> list[str]:
+		return []  # どのティッカーでも返せる
+
+	def get(self, ticker: str, attr: str):
+		if attr == 'info':
+			info = super().get(self.template, 'info')
+			info.update(symbol=ticker, shortName=f'Synthetic {ticker}', longName=f'Synthetic {ticker}')
+			return info
+		if attr == 'history':
+			return self._history(ticker)
+		if attr not in self._cache:
+			self._cache[attr] = self._template(attr)
+		tpl = self._cache[attr]
+		rng = np.random.default_rng(zlib.crc32(f'{ticker}:{attr}'.encode('utf-8')))
+		scale = np.random.default_rng(zlib.crc32(ticker.encode('utf-8'))).lognormal(-1.0, 1.2)
+		base = tpl.to_numpy(dtype=np.float64)
+		values = base * rng.lognormal(0.0, 0.15, size=base.shape)
+		# 比率系の行 (Tax Rate 等) は規模に比例させない
+		values[np.nanmax(np.abs(np.nan_to_num(base)), axis=1) >= 10] *= scale
+		return pd.DataFrame(values, index=tpl.index, columns=tpl.columns)
+
+	def _template(self, attr: str) -> pd.DataFrame:
+		if not attr.startswith(QUARTERLY_PREFIX):
+			return super().get(self.template, attr)
+		name = attr[len(QUARTERLY_PREFIX):]
+		annual = super().get(self.template, name)
+		columns, blocks = [], []
+		for end in annual.columns:
+			for q in range(4):
+				columns.append(end - pd.DateOffset(months=3 * q) + pd.offsets.MonthEnd(0))
+				blocks.append(annual[end] / 4 if name != 'balance_sheet' else annual[end])
+		return pd.DataFrame(dict(zip(range(len(blocks)), blocks))).set_axis(columns, axis=1)
+
+	def _history(self, ticker: str) -> pd.DataFrame:
+		bs = self.get(ticker, 'balance_sheet')
+		end = bs.columns.max()
+		latest = bs[end]
+		bps = 1000.0
+		if 'Stockholders Equity' in bs.index and 'Ordinary Shares Number' in bs.index:
+			bps = float(latest['Stockholders Equity'].max() / latest['Ordinary Shares Number'].max())
+		rng = np.random.default_rng(zlib.crc32(f'{ticker}:history'.encode('utf-8')))
+		dates = pd.bdate_range(end - pd.DateOffset(years=15), end + pd.DateOffset(months=6), name='Date')
+		path = np.exp(np.cumsum(rng.normal(0.0002, 0.018, len(dates))))
+		close = path / path[min(dates.searchsorted(end), len(dates) - 1)] * bps * rng.lognormal(0.0, 0.5)
+		# 3 月末・9 月末の最終営業日に株価の約 1.2% の配当
+		month_end = (dates.month != np.roll(dates.month, -1)) & np.isin(dates.month, (3, 9))
+		return pd.DataFrame({
+			'Close': close.round(1),
+			'Dividends': np.where(month_end, (close * 0.012).round(1), 0.0),
+			'Stock Splits': 0.0,
+		}, index=dates)
+
+
+# ---- yf.Ticker 互換オブジェクト ----------------------------------------------
+
+class LocalTicker:
+	"""属性参照ごとに 1 リクエスト (遅延・障害つき) を模擬する yf.Ticker 互換オブジェクト。"""
+
+	def __init__(self, ticker: str, source: FixtureSource, faults: Faults):
+		self.ticker = ticker
+		self._source = source
+		self._faults = faults
+
+	def _get(self, attr: str):
+		self._faults.apply(self.ticker, attr)
+		try:
+			return self._source.get(self.ticker, attr)
+		except KeyError:
+			# yfinance と同じく、存在しない銘柄は例外ではなく空の表を返す
+			return {} if attr == 'info' else pd.DataFrame()
+
+	def history(self, start: str | None = None, **kwargs) -> pd.DataFrame:
+		# auto_adjust=False 相当 (分割修正のみ) の日足。period 等の他の引数は無視して全期間を返す
+		return _since(self._get('history'), start)
+
+	financials = property(lambda self: self._get('financials'))
+	balance_sheet = property(lambda self: self._get('balance_sheet'))
+	cashflow = property(lambda self: self._get('cashflow'))
+	info = property(lambda self: self._get('info'))
+	quarterly_financials = property(lambda self: self._get('quarterly_financials'))
+	quarterly_balance_sheet = property(lambda self: self._get('quarterly_balance_sheet'))
+	quarterly_cashflow = property(lambda self: self._get('quarterly_cashflow'))
+
+
+class HttpTicker:
+	"""疑似 API サーバ (serve) から属性ごとに取得する yf.Ticker 互換オブジェクト。"""
+
+	def __init__(self, ticker: str, base_url: str, timeout: float = 30):
+		self.ticker = ticker
+		self._base_url = base_url.rstrip('/')
+		self._timeout = timeout
+
+	def _get(self, attr: str, query: dict | None = None):
+		url = f'{self._base_url}/v1/{urllib.parse.quote(self.ticker)}/{attr}'
+		if query:
+			url += '?' + urllib.parse.urlencode(query)
+		try:
+			with urllib.request.urlopen(url, timeout=self._timeout) as res:
+				body = res.read()
+		except urllib.error.HTTPError as e:
+			if e.code == 429:
+				raise ThrottledError(f'{self.ticker} {attr}: HTTP 429', float(e.headers.get('Retry-After') or 1)) from None
+			if e.code == 404:
+				return {} if attr == 'info' else pd.DataFrame()
+			raise ProviderError(f'{self.ticker} {attr}: HTTP {e.code}') from None
+		if attr == 'info':
+			return json.loads(body)
+		if attr == 'history':
+			return pd.read_csv(io.BytesIO(body), index_col=0, parse_dates=True)
+		return _yf_frame(pd.read_csv(io.BytesIO(body), index_col=0))
+
+	def history(self, start: str | None = None, **kwargs) -> pd.DataFrame:
+		return self._get('history', {'start': start} if start else None)
+
+	financials = property(lambda self: self._get('financials'))
+	balance_sheet = property(lambda self: self._get('balance_sheet'))
+	cashflow = property(lambda self: self._get('cashflow'))
+	info = property(lambda self: self._get('info'))
+	quarterly_financials = property(lambda self: self._get('quarterly_financials'))
+	quarterly_balance_sheet = property(lambda self: self._get('quarterly_balance_sheet'))
+	quarterly_cashflow = property(lambda self: self._get('quarterly_cashflow'))
+
+
+def local_provider(source: FixtureSource, faults: Faults | None = None):
+	faults = faults or Faults()
+	return lambda ticker: LocalTicker(ticker, source, faults)
+
+
+def http_provider(base_url: str, timeout: float = 30):
+	return lambda ticker: HttpTicker(ticker, base_url, timeout)
+
+
+def yfinance_provider():
+	import yfinance as yf
+	return yf.Ticker
+
+
+def make_provider(spec: str = 'yfinance', faults: Faults | None = None):
+	"""プロバイダ指定文字列から ticker_factory を作る (yfinance / fixtures:DIR / synthetic[:DIR] / http://...)。"""
+	kind, _, arg = spec.partition(':')
+	if spec.startswith(('http://', 'https://')):
+		return http_provider(spec)
+	if kind == 'yfinance':
+		return yfinance_provider()
+	if kind == 'fixtures':
+		return local_provider(FixtureSource(arg or 'data'), faults)
+	if kind == 'synthetic':
+		return local_provider(SyntheticSource(arg or 'data'), faults)
+	raise ValueError(f'未知のプロバイダ: {spec} (yfinance / fixtures:DIR / synthetic[:DIR] / http://HOST:PORT)')
+
+
+def add_fault_args(parser):
+	parser.add_argument('--latency', type=float, default=0.0, help='ローカルプロバイダ: 1 リクエストの遅延 (秒)')
+	parser.add_argument('--error-rate', type=float, default=0.0, help='ローカルプロバイダ: リクエストが失敗する確率')
+	parser.add_argument('--rps', type=float, default=0.0, help='ローカルプロバイダ: 許容リクエスト数/秒 (超過分は 429 相当)')
+	parser.add_argument('--seed', type=int, default=0, help='ローカルプロバイダ: 障害発生の乱数の種')
+
+
+def add_provider_args(parser):
+	parser.add_argument('--provider', default='yfinance',
+		help='取得元: yfinance (既定) / fixtures:DIR / synthetic[:DIR] / http://HOST:PORT (providers.py serve)')
+	add_fault_args(parser)
+
+
+def faults_from_args(args) -> Faults:
+	return Faults(latency=args.latency, error_rate=args.error_rate, rps=args.rps, seed=args.seed)
+
+
+def provider_from_args(args):
+	return make_provider(args.provider, faults_from_args(args))
+
+
+# ---- 疑似 API サーバ ---------------------------------------------------------
+
+def make_server(source: FixtureSource, faults: Faults, host: str = '127.0.0.1', port: int = 8765) -> ThreadingHTTPServer:
+	"""GET /v1/<ticker>/<financials|balance_sheet|cashflow|info|...> に CSV / JSON で応答するサーバ。
+
+	日足は GET /v1/<ticker>/history?start=YYYY-MM-DD (start 以降、省略時は全期間)。
+
+	障害は HTTP で返す (スロットリング: 429 + Retry-After, エラー: 503, 未知の銘柄: 404)。
+	"""
+
+	class Handler(BaseHTTPRequestHandler):
+		def do_GET(self):
+			url = urllib.parse.urlparse(self.path)
+			parts = [urllib.parse.unquote(p) for p in url.path.strip('/').split('/')]
+			if parts == ['v1', 'tickers']:
+				return self._send(200, json.dumps(source.tickers()).encode('utf-8'), 'application/json')
+			if len(parts) != 3 or parts[0] != 'v1' or parts[2] not in ATTRIBUTES:
+				return self._send(404, b'not found', 'text/plain')
+			ticker, attr = parts[1], parts[2]
+			try:
+				faults.apply(ticker, attr)
+				value = source.get(ticker, attr)
+			except ThrottledError as e:
+				return self._send(429, str(e).encode('utf-8'), 'text/plain', {'Retry-After': str(int(max(1, e.retry_after)))})
+			except ProviderError as e:
+				return self._send(503, str(e).encode('utf-8'), 'text/plain')
+			except (KeyError, OSError):
+				return self._send(404, f'unknown ticker: {ticker}'.encode('utf-8'), 'text/plain')
+			if attr == 'info':
+				return self._send(200, json.dumps(value, ensure_ascii=False, default=str).encode('utf-8'), 'application/json')
+			if attr == 'history':
+				value = _since(value, urllib.parse.parse_qs(url.query).get('start', [None])[0])
+			return self._send(200, value.to_csv().encode('utf-8'), 'text/csv')
+
+		def _send(self, code: int, body: bytes, content_type: str, headers: dict | None = None):
+			self.send_response(code)
+			self.send_header('Content-Type', f'{content_type}; charset=utf-8')
+			self.send_header('Content-Length', str(len(body)))
+			for k, v in (headers or {}).items():
+				self.send_header(k, v)
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			pass  # リクエストごとのログは負荷試験では多すぎるので出さない
+
+	server = ThreadingHTTPServer((host, port), Handler)
+	server.daemon_threads = True
+	return server
+
+
+def main():
+	parser = argparse.ArgumentParser(description='オフライン試験用の財務データ取得元 (疑似 API サーバ)')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('serve', help='記録済み/合成データを HTTP で配信する')
+	p.add_argument('--fixtures', default='data', help='data/<ticker>/ 形式の記録済みデータのディレクトリ')
+	p.add_argument('--synthetic', action='store_true', help='任意のティッカーに合成データを返す (--fixtures の銘柄をひな形に使う)')
+	p.add_argument('--template', default=DEFAULT_TEMPLATE, help='合成データのひな形銘柄')
+	p.add_argument('--host', default='127.0.0.1')
+	p.add_argument('--port', type=int, default=8765)
+	add_fault_args(p)
+	args = parser.parse_args()
+
+	source = SyntheticSource(args.fixtures, args.template) if args.synthetic else FixtureSource(args.fixtures)
+	server = make_server(source, faults_from_args(args), args.host, args.port)
+	print(f'http://{args.host}:{server.server_port} で配信中 (Ctrl+C で終了)', file=sys.stderr)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,299 @@
+"""
+四半期データの保存と TTM (直近 12 か月) 指標。
+
+保存: data/<ticker>/quarterly/{financials,balance_sheet,cashflow}.csv (年次と同じ 行=項目, 列=四半期末 の形式, 新しい順)
+ yfinance が返す四半期は直近数期分だけなので、取得のたびに既存の履歴へ新しい四半期を追記する
+ (同じ四半期は新しい取得値で上書き、取得範囲から外れた古い四半期は残す)。
+TTM: 連続する 4 四半期の窓で
+ - 損益・CF (フロー) は合計
+ - BS (ストック) は平均 (--balance latest で四半期末の値)
+ - 株価 (prices.py) は四半期末の値
+を全銘柄の配列に対して一括で計算し、年次と同じ指標定義 (metrics.py) を当てはめる。
+四半期が欠けて窓が 12 か月にならない期は NaN。売上高成長率は TTM 売上の前四半期比になる。
+出力: data/<ticker>/quarterly/ttm_summary.csv (行=四半期末, 列=指標)。
+ 新しい四半期・内容が変わった四半期を含む窓の行だけを計算し直し、残りは既存の行を使う。
+使い方:
+ uv run src\\scripts\\yahoo2finance.py 7203.T 6758.T --quarterly     (四半期データを取得・追記)
+ uv run src\\scripts\\quarterly.py 7203.T                            (TTM サマリー)
+ uv run src\\scripts\\quarterly.py --universe                        (全銘柄 → data/universe_ttm_metrics.csv)
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+import metrics as mx
+import manifest as mf
+import instrument
+import prices as px
+from alldata2analysisdata import Universe, universe_items, frames_universe, load_universe, compute_universe, print_skipped
+from columnar_store import STATEMENT_FILES, QUARTERLY_DIR, read_statement_frame
+
+TTM_NAME = 'ttm_summary.csv'
+TTM_CACHE_NAME = 'ttm_cache.json'
+TTM_CACHE_VERSION = 2
+WINDOW = 4
+FLOW_STATEMENTS = ('financials', 'cashflow')
+BALANCE_MODES = ('average', 'latest')
+# 4 四半期の窓の先頭と末尾の四半期末の間隔 (約 9 か月) として認める日数
+WINDOW_SPAN_DAYS = (240, 310)
+
+
+def quarterly_dir(ticker: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, ticker, QUARTERLY_DIR)
+
+
+# ---- 保存 (追記) ----------------------------------------------------------------
+
+def merge_quarters(existing: pd.DataFrame | None, new: pd.DataFrame) -> pd.DataFrame:
+	"""既存の四半期履歴に新しく取得した四半期を重ねる。同じ (項目, 四半期) は new の値を使う。
+
+	行は既存の並び → new にだけある項目の順、列は四半期末の新しい順。
+	"""
+	new = new[~new.index.duplicated()]
+	if existing is None or existing.empty:
+		merged = new
+	else:
+		existing = existing[~existing.index.duplicated()]
+		rows = existing.index.append(new.index.difference(existing.index, sort=False))
+		merged = new.combine_first(existing).reindex(rows)
+	return merged[sorted(merged.columns, reverse=True)]
+
+
+def save_quarterly(ticker: str, data: dict[str, pd.DataFrame], output_dir: str = 'data',
+		ttl: float = mf.DEFAULT_TTL) -> tuple[list[str], list[str]]:
+	"""取得した四半期の 3 表 (列=四半期末の文字列, 値=float) を既存の履歴に追記する。
+
+	内容が変わったファイルだけを書き換え、quarterly/manifest.json を更新する。
+	戻り値: (書き換えたファイル名, 新たに加わった四半期)
+	"""
+	with instrument.span('save_quarterly', ticker):
+		save_dir = quarterly_dir(ticker, output_dir)
+		os.makedirs(save_dir, exist_ok=True)
+		manifest = mf.load_manifest(save_dir)
+		changed = []
+		added = set()
+		for name, filename in STATEMENT_FILES.items():
+			path = os.path.join(save_dir, filename)
+			existing = pd.read_csv(path, index_col=0) if os.path.exists(path) else None
+			merged = merge_quarters(existing, data[name])
+			added |= set(merged.columns) - set(existing.columns if existing is not None else ())
+			if mf.write_if_changed(save_dir, filename, merged.to_csv().encode('utf-8'), manifest, periods=list(merged.columns)):
+				changed.append(filename)
+		manifest.update({
+			'ticker': ticker,
+			'fetched_at': mf.now_iso(),
+			'fetched_at_epoch': time.time(),
+			'ttl_seconds': ttl,
+		})
+		mf.write_manifest(save_dir, manifest)
+	return changed, sorted(added, reverse=True)
+
+
+# ---- TTM ------------------------------------------------------------------------
+
+def _period_dates(periods: np.ndarray) -> np.ndarray:
+	flat = pd.to_datetime(pd.Series(periods.ravel()), errors='coerce')
+	return flat.to_numpy(dtype='datetime64[D]').reshape(periods.shape)
+
+
+def ttm_universe(uni: Universe, window: int = WINDOW, balance: str = 'average') -> Universe:
+	"""四半期の Universe を、各四半期末時点の TTM 値の Universe に変換する (全銘柄・全項目を一括)。
+
+	スロット k の TTM は四半期 k..k+window-1 (k が最新) から作る。
+	窓内の四半期末の間隔が 12 か月分でない (四半期が欠けている) 期は決算期ごと無効にする。
+	"""
+	if balance not in BALANCE_MODES:
+		raise ValueError(f'balance は {" / ".join(BALANCE_MODES)} のいずれか')
+	n = uni.periods.shape[1] - window + 1
+	items = {name: list(keys) for name, keys in uni.items.items()}
+	if n <= 0:
+		return Universe(uni.tickers, np.full((len(uni.tickers), 0), None, dtype=object),
+			{name: arr[..., :0] for name, arr in uni.arrays.items()}, items)
+	dates = _period_dates(uni.periods)
+	gap = (dates[:, :n] - dates[:, window - 1:]).astype('timedelta64[D]')
+	lo, hi = WINDOW_SPAN_DAYS
+	span = (window - 1) / 3  # 窓の先頭と末尾の間隔 (WINDOW=4 なら 9 か月) に合わせて許容範囲を伸縮
+	valid = ~np.isnat(gap) & (gap >= np.timedelta64(int(lo * span), 'D')) & (gap <= np.timedelta64(int(hi * span), 'D'))
+	arrays = {}
+	for name, arr in uni.arrays.items():
+		windows = sliding_window_view(arr, window, axis=-1)  # (銘柄, 項目, n, window) のビュー (コピーしない)
+		if name in FLOW_STATEMENTS:
+			agg = windows.sum(axis=-1)  # 欠けた四半期があれば NaN
+		elif balance == 'average' and name != px.PRICE_STATEMENT:
+			agg = windows.mean(axis=-1)
+		else:
+			agg = arr[..., :n].copy()
+		agg[~np.broadcast_to(valid[:, None, :], agg.shape)] = np.nan
+		arrays[name] = agg
+	periods = uni.periods[:, :n].copy()
+	periods[~valid] = None
+	return Universe(uni.tickers, periods, arrays, items)
+
+
+def _quarter_hashes(frames: dict[str, pd.DataFrame]) -> dict[str, str]:
+	# 四半期 (列) ごとの内容ハッシュ。どの表 (四半期末の株価を含む) のどの値が変わってもその四半期だけが変わる
+	out = {}
+	for period in frames['financials'].columns:
+		parts = []
+		for name in sorted(frames):
+			df = frames[name]
+			col = df[period] if period in df.columns else pd.Series(dtype=np.float64)
+			parts.append(pd.to_numeric(col, errors='coerce').to_csv(header=False))
+		out[str(period)] = mf.sha256_bytes('\0'.join(parts).encode('utf-8'))
+	return out
+
+
+def _load_cache(save_dir: str) -> dict:
+	try:
+		with open(os.path.join(save_dir, TTM_CACHE_NAME), encoding='utf-8') as f:
+			cache = json.load(f)
+	except (OSError, ValueError):
+		return {}
+	return cache if cache.get('version') == TTM_CACHE_VERSION else {}
+
+
+def _ttm_frame(uni: Universe, names: list[str], balance: str, report: dict | None = None) -> pd.DataFrame:
+	# 1 銘柄の Universe → TTM 指標表 (行=四半期末, 列=指標)。12 か月に満たない行は落とす
+	ttm = ttm_universe(uni, balance=balance)
+	values, skipped = mx.compute(ttm.get, names)
+	if report is not None:
+		report.update(skipped)
+	keep = np.array([p is not None for p in ttm.periods[0]], dtype=bool)
+	index = [p for p in ttm.periods[0] if p is not None]
+	return pd.DataFrame({n: v[0][keep] for n, v in values.items()}, index=index).round(2)
+
+
+def update_ttm(symbol: str, data_dir: str = 'data', names: list[str] | None = None, balance: str = 'average',
+		force: bool = False, report: dict | None = None) -> tuple[pd.DataFrame, list[str]]:
+	"""四半期 CSV から TTM サマリーを更新する。戻り値: (TTM 指標表, 計算し直した四半期末)。
+
+	前回から内容が変わっていない四半期だけで作られる行 (とその前四半期比) は既存の値をそのまま使う。
+	"""
+	save_dir = quarterly_dir(symbol, data_dir)
+	csv_path = os.path.join(save_dir, TTM_NAME)
+	requested = mx.metric_names() if names is None else list(names)
+	items = universe_items(requested)
+	frames = {name: read_statement_frame(symbol, name, data_dir, quarterly=True) for name in items if name in STATEMENT_FILES}
+	for name in STATEMENT_FILES:
+		frames.setdefault(name, pd.DataFrame())
+	if px.PRICE_STATEMENT in items:
+		frames[px.PRICE_STATEMENT] = px.price_frame(symbol, frames['financials'].columns.tolist(), data_dir)
+	quarters = _quarter_hashes(frames)
+	defs = {n: mx.definition_hash(n) for n in requested}
+	cache = {} if force else _load_cache(save_dir)
+
+	existing = None
+	if (cache and cache.get('metrics') == defs and cache.get('balance') == balance and cache.get('window') == WINDOW
+			and cache.get('output') is not None and mf.file_sha256(csv_path) == cache['output']):
+		existing = pd.read_csv(csv_path, index_col=0)
+	periods = list(quarters)
+	# 行 k は四半期 k..k+WINDOW-1 と、前四半期比 (metrics._growth は列順で 1 つ前 = 1 つ新しい行と比べる) のために
+	# 行 k-1 (四半期 k-1 から) に依存する。四半期 q が変わると行 q-WINDOW+1..q+1 が変わる
+	dirty_q = [i for i, p in enumerate(periods) if existing is None or cache.get('quarters', {}).get(p) != quarters[p]]
+	dirty_rows = sorted({r for q in dirty_q for r in range(max(0, q - WINDOW + 1), q + 2)})
+	dirty_rows = [r for r in dirty_rows if r < len(periods)]
+	if existing is not None and not dirty_rows and set(existing.index.astype(str)) <= set(periods):
+		return existing, []
+
+	uni = frames_universe([symbol], [frames], items)
+	if existing is None:
+		analysis = _ttm_frame(uni, requested, balance, report)
+		recomputed = list(analysis.index)
+	else:
+		# 変わった行の計算に必要な四半期だけを切り出して計算する
+		# 先頭の変わった行の成長率の比較相手 (1 つ新しい行) も含めて切り出す
+		lo, hi = max(0, dirty_rows[0] - 1), min(len(periods), dirty_rows[-1] + WINDOW)
+		part = Universe(uni.tickers, uni.periods[:, lo:hi], {k: a[..., lo:hi] for k, a in uni.arrays.items()}, items)
+		fresh = _ttm_frame(part, requested, balance, report)
+		recomputed = [periods[r] for r in dirty_rows if periods[r] in fresh.index]
+		keep = existing[existing.index.astype(str).isin(periods) & ~existing.index.astype(str).isin(recomputed)]
+		keep.index = keep.index.astype(str)
+		analysis = pd.concat([fresh.loc[recomputed], keep])
+		analysis = analysis.loc[[p for p in periods if p in analysis.index]]
+
+	data = analysis.to_csv().encode('utf-8-sig')
+	if mf.file_sha256(csv_path) != mf.sha256_bytes(data):
+		mf.atomic_write(csv_path, data)
+		print(f'TTM サマリーを {csv_path} に保存しました。(再計算: {len(recomputed)} 四半期)')
+	cache = {
+		'version': TTM_CACHE_VERSION,
+		'window': WINDOW,
+		'balance': balance,
+		'metrics': defs,
+		'quarters': quarters,
+		'output': mf.sha256_bytes(data),
+	}
+	mf.atomic_write(os.path.join(save_dir, TTM_CACHE_NAME), json.dumps(cache, ensure_ascii=False, indent=2).encode('utf-8'))
+	return analysis, recomputed
+
+
+def compute_ttm_universe(tickers: list[str], data_dir: str = 'data', names: list[str] | None = None,
+		balance: str = 'average', report: dict | None = None) -> pd.DataFrame:
+	"""全銘柄の TTM 指標をロング形式 (ticker, period, metric, value) で返す。"""
+	uni = load_universe(tickers, data_dir, names=names, quarterly=True)
+	with instrument.span('ttm_universe', tickers=len(tickers)):
+		ttm = ttm_universe(uni, balance=balance)
+	return compute_universe(ttm, names, report=report)
+
+
+def list_quarterly_tickers(data_dir: str = 'data') -> list[str]:
+	# 四半期だけ取得した銘柄 (年次の financials.csv が無い) も含める
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(os.path.join(quarterly_dir(d, data_dir), 'financials.csv')))
+
+
+def main():
+	parser = argparse.ArgumentParser(description='四半期データから TTM (直近 12 か月) 指標を計算')
+	parser.add_argument('symbols', nargs='*', help='ティッカー (例: 7203.T)')
+	parser.add_argument('--universe', action='store_true', help='全銘柄を一括計算してロング形式で出力 (銘柄省略時は四半期データのある全銘柄)')
+	parser.add_argument('--output', default='data/universe_ttm_metrics.csv', help='ユニバースモードの出力先')
+	parser.add_argument('--metrics', help='計算する指標をカンマ区切りで指定')
+	parser.add_argument('--balance', choices=BALANCE_MODES, default='average', help='BS 項目を 4 四半期の平均にするか直近四半期末の値にするか')
+	parser.add_argument('--force', action='store_true', help='キャッシュを無視して全四半期を再計算する')
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	names = [n.strip() for n in args.metrics.split(',') if n.strip()] if args.metrics else None
+	if names:
+		try:
+			mx.resolve(names)
+		except KeyError as e:
+			parser.error(str(e.args[0]))
+	skipped = {}
+	if args.universe:
+		tickers = list(args.symbols) or list_quarterly_tickers()
+		out = compute_ttm_universe(tickers, names=names, balance=args.balance, report=skipped)
+		out.to_csv(args.output, index=False, encoding='utf-8-sig')
+		instrument.count(bytes=os.path.getsize(args.output))
+		print(f'{len(tickers)} 銘柄 / {len(out)} 行の TTM 指標を {args.output} に保存しました。')
+		print_skipped(skipped)
+		return
+	if not args.symbols:
+		parser.error('ティッカーを指定してください (または --universe)')
+	failed = False
+	for symbol in args.symbols:
+		try:
+			analysis, recomputed = update_ttm(symbol, names=names, balance=args.balance, force=args.force, report=skipped)
+		except FileNotFoundError as e:
+			print(f'{symbol}: 四半期データがありません ({e.filename})。yahoo2finance.py --quarterly で取得してください。', file=sys.stderr)
+			failed = True
+			continue
+		if not recomputed:
+			print(f'{symbol}: 四半期データに変更がないため再計算をスキップしました。')
+			continue
+		print(f'\n{symbol} TTM サマリー')
+		print(analysis)
+	print_skipped(skipped)
+	if failed:
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
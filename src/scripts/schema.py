@@ -0,0 +1,282 @@
+"""
+財務諸表の項目 (行ラベル) の正準スキーマ。
+
+ - yfinance の項目名と別名 (旧版 yfinance の名前、空白なしの生キーなど) を、表ごとに整数 ID へ対応付ける
+ - ラベル文字列の解決は読み込み時に 1 回だけ行い、以降は Statement.values[行] の配列添字で引く
+ - Statement は 1 銘柄 1 表の 項目 × 決算期 の float64 配列 (__slots__)。スキーマに無い項目は持たない
+ - 日本語ラベルもここで一元管理する (可視化ごとに対応表を持たない)
+ID は ITEMS の並び順。保存した ID の意味が変わらないよう、項目は末尾に追加する。
+使い方:
+ uv run src\\scripts\\schema.py list [financials|balance_sheet|cashflow]
+ uv run src\\scripts\\schema.py coverage 7203.T 6758.T   (スキーマに対応付かなかった項目を表示)
+"""
+
+import re
+import sys
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+STATEMENTS = ('financials', 'balance_sheet', 'cashflow')
+
+
+@dataclass(frozen=True, slots=True)
+class LineItem:
+	id: int
+	statement: str
+	name: str  # 正準名 (現行 yfinance の項目名)
+	ja: str
+	synonyms: tuple[str, ...] = ()
+
+
+# (表, 正準名, 日本語ラベル, 別名)。表ごとの並びが可視化の項目順になる
+_DEFINITIONS = (
+	# 損益計算書
+	('financials', 'Total Revenue', '売上高', ()),
+	('financials', 'Operating Revenue', '営業収益', ()),
+	('financials', 'Gross Profit', '売上総利益', ()),
+	('financials', 'Operating Income', '営業利益', ()),
+	('financials', 'EBITDA', 'EBITDA', ()),
+	('financials', 'EBIT', 'EBIT', ()),
+	('financials', 'Net Income', '純利益', ()),
+	('financials', 'Net Income Including Noncontrolling Interests', '非支配株主持分含む純利益', ()),
+	('financials', 'Net Income Continuous Operations', '継続事業純利益', ('Net Income From Continuing Ops',)),
+	('financials', 'Pretax Income', '税引前利益', ('Income Before Tax',)),
+	('financials', 'Tax Provision', '税金', ('Income Tax Expense',)),
+	('financials', 'Diluted EPS', '希薄化後EPS', ()),
+	('financials', 'Basic EPS', '基本EPS', ()),
+	('financials', 'Diluted Average Shares', '希薄化後平均株式数', ()),
+	('financials', 'Basic Average Shares', '基本平均株式数', ()),
+	('financials', 'Total Expenses', '総費用', ()),
+	('financials', 'Operating Expense', '営業費用', ()),
+	('financials', 'Selling General And Administration', '販売費及び一般管理費', ('Selling General Administrative',)),
+	('financials', 'Selling And Marketing Expense', '販売及びマーケティング費用', ()),
+	('financials', 'General And Administrative Expense', '一般管理費', ()),
+	('financials', 'Cost Of Revenue', '売上原価', ()),
+	('financials', 'Reconciled Cost Of Revenue', '調整後売上原価', ()),
+	('financials', 'Reconciled Depreciation', '調整後減価償却費', ()),
+	('financials', 'Net Interest Income', '純利息収入', ()),
+	('financials', 'Interest Expense', '支払利息', ()),
+	('financials', 'Interest Income', '受取利息', ()),
+	('financials', 'Minority Interests', '少数株主持分', ('Minority Interest',)),
+	('financials', 'Total Unusual Items', '特別項目合計', ()),
+	('financials', 'Total Unusual Items Excluding Goodwill', 'のれん除く特別項目合計', ()),
+	('financials', 'Tax Effect Of Unusual Items', '特別項目の税効果', ()),
+	('financials', 'Normalized EBITDA', '正規化EBITDA', ()),
+	('financials', 'Normalized Income', '正規化利益', ()),
+	# 貸借対照表
+	('balance_sheet', 'Total Assets', '総資産', ()),
+	('balance_sheet', 'Total Liabilities Net Minority Interest', '総負債', ('Total Liabilities', 'Total Liab')),
+	('balance_sheet', 'Stockholders Equity', '株主資本', ('Shareholders Equity', 'Total Stockholder Equity')),
+	('balance_sheet', 'Common Stock Equity', '普通株主資本', ()),
+	('balance_sheet', 'Retained Earnings', '利益剰余金', ()),
+	('balance_sheet', 'Treasury Stock', '自己株式', ()),
+	('balance_sheet', 'Ordinary Shares Number', '普通株式数', ()),
+	('balance_sheet', 'Share Issued', '発行株式数', ()),
+	('balance_sheet', 'Working Capital', '運転資本', ()),
+	('balance_sheet', 'Net Tangible Assets', '純有形資産', ()),
+	('balance_sheet', 'Tangible Book Value', '有形簿価', ()),
+	('balance_sheet', 'Invested Capital', '投下資本', ()),
+	('balance_sheet', 'Total Debt', '有利子負債', ()),
+	('balance_sheet', 'Long Term Debt', '長期負債', ()),
+	('balance_sheet', 'Current Liabilities', '流動負債', ('Total Current Liabilities',)),
+	('balance_sheet', 'Current Assets', '流動資産', ('Total Current Assets',)),
+	('balance_sheet', 'Total Non Current Assets', '固定資産', ()),
+	('balance_sheet', 'Total Non Current Liabilities Net Minority Interest', '固定負債', ()),
+	('balance_sheet', 'Cash And Cash Equivalents', '現金及び現金同等物', ('Cash',)),
+	('balance_sheet', 'Inventory', '在庫', ()),
+	('balance_sheet', 'Accounts Receivable', '売掛金', ()),
+	('balance_sheet', 'Accounts Payable', '買掛金', ()),
+	('balance_sheet', 'Gross PPE', '総有形固定資産', ()),
+	('balance_sheet', 'Net PPE', '純有形固定資産', ('Property Plant Equipment',)),
+	('balance_sheet', 'Accumulated Depreciation', '減価償却累計', ()),
+	('balance_sheet', 'Land And Improvements', '土地・改良', ()),
+	('balance_sheet', 'Buildings And Improvements', '建物・改良', ()),
+	('balance_sheet', 'Machinery Furniture Equipment', '機械・備品', ()),
+	('balance_sheet', 'Other Current Assets', 'その他流動資産', ()),
+	('balance_sheet', 'Other Current Liabilities', 'その他流動負債', ()),
+	# キャッシュフロー
+	('cashflow', 'Operating Cash Flow', '営業活動によるキャッシュフロー', ('Total Cash From Operating Activities',)),
+	('cashflow', 'Investing Cash Flow', '投資活動によるキャッシュフロー', ('Total Cashflows From Investing Activities',)),
+	('cashflow', 'Financing Cash Flow', '財務活動によるキャッシュフロー', ('Total Cash From Financing Activities',)),
+	('cashflow', 'End Cash Position', '期末現金残高', ()),
+	('cashflow', 'Beginning Cash Position', '期首現金残高', ()),
+	('cashflow', 'Free Cash Flow', 'フリーキャッシュフロー', ()),
+	('cashflow', 'Capital Expenditure', '設備投資', ('Capital Expenditures',)),
+	('cashflow', 'Depreciation And Amortization', '減価償却費', ('Depreciation',)),
+	('cashflow', 'Changes In Cash', '現金増減', ('Change In Cash',)),
+	('cashflow', 'Net Income From Continuing Operations', '純利益', ('Net Income',)),
+	('cashflow', 'Net Other Investing Changes', 'その他投資活動キャッシュフロー合計', ('Other Investing Cash Flow Items Total', 'Other Cashflows From Investing Activities')),
+	('cashflow', 'Net Other Financing Charges', 'その他財務活動キャッシュフロー合計', ('Other Financing Cash Flow Items Total', 'Other Cashflows From Financing Activities')),
+	('cashflow', 'Other Non Cash Items', 'その他営業活動キャッシュフロー合計', ('Other Operating Cash Flow Items Total',)),
+)
+
+ITEMS: tuple[LineItem, ...] = tuple(LineItem(i, st, name, ja, syn) for i, (st, name, ja, syn) in enumerate(_DEFINITIONS))
+
+
+def normalize(label) -> str:
+	# 大文字小文字・空白・記号の違いは同じ項目とみなす ('Total Revenue' == 'TotalRevenue')
+	return re.sub(r'[^0-9a-z]', '', str(label).lower())
+
+
+def _build_lookup() -> dict[str, dict[str, tuple[int, int]]]:
+	# 表 → 正規化ラベル → (ID, 優先順位)。優先順位は 正準名 0、別名は宣言順に 1, 2, ...
+	lookup = {st: {} for st in STATEMENTS}
+	for item in ITEMS:
+		for rank, label in enumerate((item.name, *item.synonyms)):
+			key = normalize(label)
+			prev = lookup[item.statement].get(key)
+			if prev is not None and prev[0] != item.id:
+				raise ValueError(f'{item.statement}: ラベル {label!r} が {ITEMS[prev[0]].name!r} と {item.name!r} の両方に対応しています')
+			lookup[item.statement][key] = (item.id, rank)
+	return lookup
+
+
+_LOOKUP = _build_lookup()
+# 生ラベル → (ID, 優先順位) の解決結果。同じラベルは銘柄をまたいで正規化し直さない
+_RESOLVED: dict[tuple[str, str], tuple[int, int]] = {}
+
+
+def _resolve_one(statement: str, label) -> tuple[int, int]:
+	key = (statement, label)
+	hit = _RESOLVED.get(key)
+	if hit is None:
+		hit = _RESOLVED[key] = _LOOKUP[statement].get(normalize(label), (-1, 0))
+	return hit
+
+
+def item_id(statement: str, label) -> int | None:
+	"""表内の項目名 (正準名・別名) の ID。スキーマに無ければ None。"""
+	if statement not in _LOOKUP:
+		return None
+	i = _resolve_one(statement, label)[0]
+	return None if i < 0 else i
+
+
+def resolve(statement: str, labels) -> tuple[np.ndarray, np.ndarray]:
+	"""ラベル列を (ID 配列, 優先順位配列) にまとめて解決する。スキーマに無いラベルの ID は -1。"""
+	pairs = [_resolve_one(statement, label) for label in labels]
+	ids = np.fromiter((p[0] for p in pairs), dtype=np.int16, count=len(pairs))
+	ranks = np.fromiter((p[1] for p in pairs), dtype=np.int16, count=len(pairs))
+	return ids, ranks
+
+
+def items_of(statement: str) -> list[LineItem]:
+	return [item for item in ITEMS if item.statement == statement]
+
+
+def ja_label(i: int) -> str:
+	return ITEMS[i].ja
+
+
+class Statement:
+	"""1 銘柄 1 表の 項目 × 決算期 の値。行は ID の昇順で、_rows[ID] が行番号 (無ければ -1)。"""
+
+	__slots__ = ('kind', 'periods', 'ids', 'values', '_rows')
+
+	def __init__(self, kind: str, periods, ids: np.ndarray, values: np.ndarray):
+		self.kind = kind
+		self.periods = tuple(periods)
+		self.ids = ids
+		self.values = values
+		self._rows = np.full(len(ITEMS), -1, dtype=np.int16)
+		self._rows[ids] = np.arange(len(ids), dtype=np.int16)
+
+	@classmethod
+	def from_frame(cls, kind: str, df: pd.DataFrame, periods=None) -> 'Statement':
+		"""CSV を index_col=0 で読んだ表 (行 = 項目, 列 = 決算期) から作る。periods を渡すとその列順に揃える。
+
+		同じ項目に複数の行 (正準名と別名、重複行) があれば 正準名 → 別名の宣言順 → 先に出てきた行 を採る。
+		"""
+		ids, ranks = resolve(kind, df.index)
+		pos = np.flatnonzero(ids >= 0)
+		pos = pos[np.lexsort((pos, ranks[pos], ids[pos]))]
+		if len(pos):
+			first = np.r_[True, ids[pos][1:] != ids[pos][:-1]]
+			pos = pos[first]
+		# pandas の行・列選択は銘柄数だけ繰り返すと重いので、配列にしてから添字で取る
+		if all(t.kind in 'biuf' for t in df.dtypes):
+			values = df.to_numpy(dtype=np.float64)[pos]
+		else:
+			values = df.iloc[pos].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+		columns = df.columns
+		if periods is not None and not columns.equals(pd.Index(periods)):
+			if not columns.is_unique:
+				keep = ~columns.duplicated()
+				columns, values = columns[keep], values[:, keep]
+			# 無い決算期 (読み込まなかった空の表を含む) は NaN
+			cols = columns.get_indexer(periods)
+			found = cols >= 0
+			aligned = np.full((len(values), len(cols)), np.nan)
+			aligned[:, found] = values[:, cols[found]]
+			values, columns = aligned, periods
+		return cls(kind, columns, ids[pos], values)
+
+	def __len__(self) -> int:
+		return len(self.ids)
+
+	def __contains__(self, item) -> bool:
+		i = item if isinstance(item, (int, np.integer)) else item_id(self.kind, item)
+		return i is not None and self._rows[i] >= 0
+
+	def row(self, item) -> np.ndarray | None:
+		"""ID または項目名 (別名可) の行。無ければ None。"""
+		i = item if isinstance(item, (int, np.integer)) else item_id(self.kind, item)
+		if i is None or self._rows[i] < 0:
+			return None
+		return self.values[self._rows[i]]
+
+	def take(self, ids) -> np.ndarray:
+		"""ID 列の行を (len(ids), 決算期) で返す。無い項目 (ID が負の場合も) の行は NaN。"""
+		ids = np.asarray(ids, dtype=np.intp)
+		rows = np.where(ids >= 0, self._rows[ids], -1)
+		out = np.full((len(rows), len(self.periods)), np.nan)
+		found = rows >= 0
+		out[found] = self.values[rows[found]]
+		return out
+
+	@property
+	def nbytes(self) -> int:
+		return self.values.nbytes + self.ids.nbytes + self._rows.nbytes
+
+	def frame(self, ids=None, labels: str = 'ja') -> pd.DataFrame:
+		"""表示用の DataFrame。labels='ja' なら日本語ラベル、'name' なら正準名を行名にする。"""
+		ids = self.ids if ids is None else np.asarray(ids, dtype=np.intp)
+		index = [ITEMS[i].ja if labels == 'ja' else ITEMS[i].name for i in ids]
+		return pd.DataFrame(self.take(ids), index=index, columns=list(self.periods))
+
+	def __repr__(self) -> str:
+		return f'Statement({self.kind!r}, items={len(self.ids)}, periods={len(self.periods)})'
+
+
+def main():
+	parser = argparse.ArgumentParser(description='財務諸表の正準項目スキーマを表示/確認')
+	sub = parser.add_subparsers(dest='command', required=True)
+	p = sub.add_parser('list', help='正準項目と別名を表示')
+	p.add_argument('statement', nargs='?', choices=STATEMENTS)
+	p = sub.add_parser('coverage', help='銘柄の CSV でスキーマに対応付かなかった項目を表示')
+	p.add_argument('tickers', nargs='+')
+	p.add_argument('--data-dir', default='data')
+	args = parser.parse_args()
+
+	if args.command == 'list':
+		for item in ITEMS:
+			if args.statement in (None, item.statement):
+				print(f'{item.id}\t{item.statement}\t{item.name}\t{item.ja}' + (f'\t(別名: {", ".join(item.synonyms)})' if item.synonyms else ''))
+		return
+	from columnar_store import read_statement_frame
+	for t in args.tickers:
+		for name in STATEMENTS:
+			try:
+				df = read_statement_frame(t, name, args.data_dir)
+			except FileNotFoundError:
+				print(f'{t} {name}: CSV がありません', file=sys.stderr)
+				continue
+			ids, _ = resolve(name, df.index)
+			print(f'{t} {name}: {int((ids >= 0).sum())}/{len(ids)} 行がスキーマに対応 ({len(set(ids[ids >= 0].tolist()))}/{len(items_of(name))} 項目)')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,402 @@
+"""
+指標スクリーナー。各銘柄の financial_analysis_summary.csv (最新決算期 = 先頭行) を横断して
+「ROE(%) > 10 かつ 自己資本比率(%) > 50 を ROE の高い順に 20 件」のような条件検索をする。
+
+インデックス (data/screener/, 読み込みは memory map):
+ - values.npy  (銘柄, 指標)  最新決算期の値
+ - order.npy   (指標, 銘柄)  指標ごとに値の昇順に並べた銘柄番号 (NaN は末尾)
+ - sorted.npy  (指標, 銘柄)  order の順に並べた値 (二分探索用)
+ - index.json  指標・銘柄の一覧と、銘柄ごとのサマリーの mtime / サイズ / ハッシュ
+検索: 範囲条件は sorted の二分探索で該当区間を求め、最も絞り込める条件の区間を候補として
+ 残りの条件は values で判定する。並べ替えは条件なしなら order の端から k 件を取るだけ。
+更新: サマリーの mtime / サイズが変わった銘柄だけを読み直し (内容ハッシュが同じなら何もしない)、
+ 各指標の並びから古い位置を除いて新しい値を二分探索の位置へ差し込む (全体の並べ替えはしない)。
+ 銘柄の削除・新しい指標列の出現・大量の変更時だけ作り直す。
+
+使い方:
+ uv run src\\scripts\\screener.py query --where "ROE(%) > 10" --where "自己資本比率(%) > 50" --sort "ROE(%)" --top 20
+ uv run src\\scripts\\screener.py query --where "PER(倍) < 15, 配当利回り(%) >= 3" --sort "配当利回り(%)" --output hits.csv
+ uv run src\\scripts\\screener.py update 7203.T          (指定銘柄だけ反映。省略時は data/ 配下を走査)
+ uv run src\\scripts\\screener.py build                  (作り直し)
+ uv run src\\scripts\\screener.py metrics                (検索できる指標の一覧)
+"""
+
+import os
+import re
+import json
+import time
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import metrics as mx
+import manifest as mf
+import instrument
+from yahoo2finance import read_tickers_file
+
+SUMMARY_NAME = 'financial_analysis_summary.csv'
+DEFAULT_ROOT = os.path.join('data', 'screener')
+INDEX_VERSION = 1
+REBUILD_FRACTION = 0.25  # 変更銘柄がこの割合を超えたら差し込みより作り直しの方が速い
+
+OPS = {
+	'>': np.greater,
+	'>=': np.greater_equal,
+	'<': np.less,
+	'<=': np.less_equal,
+	'==': np.equal,
+	'=': np.equal,
+}
+_CONDITION = re.compile(r'^\s*(?P<metric>.+?)\s*(?P<op>>=|<=|==|=|>|<)\s*(?P<value>[-+]?[\d.]+(?:[eE][-+]?\d+)?)\s*$')
+
+
+@dataclass(frozen=True)
+class Condition:
+	metric: str
+	op: str
+	value: float
+
+	def __str__(self):
+		return f'{self.metric} {self.op} {self.value:g}'
+
+
+def parse_conditions(text: str) -> list[Condition]:
+	"""'ROE(%) > 10, 自己資本比率(%) >= 50' (区切りは , または and) を条件のリストにする。"""
+	out = []
+	for clause in re.split(r',|\s+and\s+', text):
+		if not clause.strip():
+			continue
+		m = _CONDITION.match(clause)
+		if m is None:
+			raise ValueError(f'条件を解釈できません: {clause.strip()} (例: "ROE(%) > 10")')
+		out.append(Condition(m['metric'], m['op'], float(m['value'])))
+	return out
+
+
+def summary_path(symbol: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, symbol, SUMMARY_NAME)
+
+
+def list_summaries(data_dir: str = 'data') -> list[str]:
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(summary_path(d, data_dir)))
+
+
+def _stat(path: str) -> tuple[int, int] | None:
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+def _read_latest(symbol: str, data_dir: str) -> tuple[str, pd.Series] | None:
+	# サマリーの先頭行 (最新決算期) だけを読む
+	try:
+		df = pd.read_csv(summary_path(symbol, data_dir), index_col=0, nrows=1)
+	except (OSError, ValueError):
+		return None
+	if df.empty:
+		return None
+	row = pd.to_numeric(df.iloc[0], errors='coerce')
+	return str(df.index[0]), row
+
+
+def _npy_bytes(arr: np.ndarray) -> bytes:
+	import io
+	buf = io.BytesIO()
+	np.save(buf, np.ascontiguousarray(arr), allow_pickle=False)
+	return buf.getvalue()
+
+
+class ScreenerIndex:
+	"""永続化した指標別ソート済みインデックス。load() で開き、update() で差分を反映、query() で検索する。"""
+
+	def __init__(self, root: str = DEFAULT_ROOT, data_dir: str = 'data'):
+		self.root = root
+		self.data_dir = data_dir
+		self.metrics: list[str] = []
+		self.tickers: list[str] = []
+		self.files: dict[str, dict] = {}
+		self.values = np.empty((0, 0))
+		self.order = np.empty((0, 0), dtype=np.int32)
+		self.sorted = np.empty((0, 0))
+		self._rows: dict[str, int] = {}
+		self._cols: dict[str, int] = {}
+
+	# ---- 読み書き ----------------------------------------------------------------
+
+	def exists(self) -> bool:
+		return os.path.exists(os.path.join(self.root, 'index.json'))
+
+	def load(self, mmap: bool = True) -> bool:
+		"""保存済みのインデックスを開く。無い・形式が古い場合は False。"""
+		try:
+			with open(os.path.join(self.root, 'index.json'), encoding='utf-8') as f:
+				meta = json.load(f)
+		except (OSError, ValueError):
+			return False
+		if meta.get('version') != INDEX_VERSION:
+			return False
+		mode = 'r' if mmap else None
+		try:
+			self.values, self.order, self.sorted = (np.load(os.path.join(self.root, f'{name}.npy'), mmap_mode=mode)
+				for name in ('values', 'order', 'sorted'))
+		except (OSError, ValueError):
+			return False
+		self._set_meta(meta['metrics'], meta['tickers'], meta['files'])
+		return True
+
+	def _set_meta(self, metrics: list[str], tickers: list[str], files: dict[str, dict]):
+		self.metrics, self.tickers, self.files = list(metrics), list(tickers), dict(files)
+		self._cols = {m: i for i, m in enumerate(self.metrics)}
+		self._rows = {t: i for i, t in enumerate(self.tickers)}
+
+	def save(self):
+		os.makedirs(self.root, exist_ok=True)
+		for name in ('values', 'order', 'sorted'):
+			mf.atomic_write(os.path.join(self.root, f'{name}.npy'), _npy_bytes(getattr(self, name)))
+		meta = {'version': INDEX_VERSION, 'metrics': self.metrics, 'tickers': self.tickers, 'files': self.files}
+		# index.json を最後に書く (途中で止まっても npy と食い違った index.json は残らない)
+		mf.atomic_write(os.path.join(self.root, 'index.json'), json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+	# ---- 構築・差分更新 -------------------------------------------------------------
+
+	def build(self, tickers: list[str] | None = None) -> int:
+		"""全銘柄のサマリーを読んでインデックスを作り直す。登録した銘柄数を返す。"""
+		tickers = list_summaries(self.data_dir) if tickers is None else list(dict.fromkeys(tickers))
+		rows, files = {}, {}
+		with instrument.span('screener_build', tickers=len(tickers)) as sp:
+			for t in tickers:
+				path = summary_path(t, self.data_dir)
+				latest = _read_latest(t, self.data_dir)
+				if latest is None:
+					continue
+				rows[t] = latest[1]
+				files[t] = {'stat': _stat(path), 'sha256': mf.file_sha256(path), 'period': latest[0]}
+			seen = {c for row in rows.values() for c in row.index}
+			# 列は登録順 → 登録外の列 (旧サマリー等) の順
+			metrics = [n for n in mx.metric_names() if n in seen] + sorted(seen - set(mx.metric_names()))
+			values = np.full((len(rows), len(metrics)), np.nan)
+			for i, row in enumerate(rows.values()):
+				values[i] = row.reindex(metrics).to_numpy(dtype=np.float64)
+			self._set_meta(metrics, list(rows), files)
+			self.values = values
+			self._sort_all()
+			sp.count(rows=len(rows))
+		self.save()
+		return len(rows)
+
+	def _sort_all(self):
+		# 昇順 (NaN は argsort で末尾に来る)
+		self.order = np.argsort(self.values.T, axis=1, kind='stable').astype(np.int32)
+		self.sorted = np.take_along_axis(self.values.T, self.order.astype(np.intp), axis=1)
+
+	def update(self, tickers: list[str] | None = None) -> tuple[list[str], bool]:
+		"""サマリーが変わった銘柄だけを反映する。tickers 省略時は data/ 配下を走査 (mtime / サイズで判定)。
+
+		戻り値: (反映した銘柄, 作り直したか)
+		"""
+		if not self.load(mmap=False):
+			self.build()
+			return list(self.tickers), True
+		scan = list_summaries(self.data_dir) if tickers is None else list(dict.fromkeys(tickers))
+		removed = [t for t in (self.tickers if tickers is None else scan) if t in self._rows and not os.path.exists(summary_path(t, self.data_dir))]
+		changed = {}
+		for t in scan:
+			path = summary_path(t, self.data_dir)
+			st = _stat(path)
+			prev = self.files.get(t)
+			if st is None or (prev is not None and prev['stat'] is not None and tuple(prev['stat']) == st):
+				continue
+			digest = mf.file_sha256(path)
+			if prev is not None and prev['sha256'] == digest:
+				prev['stat'] = st  # 内容は同じ (touch だけ)
+				continue
+			latest = _read_latest(t, self.data_dir)
+			if latest is not None:
+				changed[t] = (latest, {'stat': st, 'sha256': digest, 'period': latest[0]})
+		new_columns = {c for (_, row), _ in changed.values() for c in row.index} - set(self.metrics)
+		if removed or new_columns or len(changed) > max(1, len(self.tickers)) * REBUILD_FRACTION:
+			self.build(None if tickers is None else sorted((set(self.tickers) | set(scan)) - set(removed)))
+			return sorted(set(changed) | set(removed)), True
+		if not changed:
+			if any(self.files.get(t, {}).get('stat') is not None for t in scan):
+				self.save()  # touch だけの銘柄の stat を記録し直す
+			return [], False
+		with instrument.span('screener_update', tickers=len(changed)):
+			self._apply(changed)
+		self.save()
+		return sorted(changed), False
+
+	def _apply(self, changed: dict):
+		# 既存銘柄は行を書き換え、新しい銘柄は末尾に行を足す
+		new = [t for t in changed if t not in self._rows]
+		values = np.vstack([np.asarray(self.values), np.full((len(new), len(self.metrics)), np.nan)])
+		tickers = self.tickers + new
+		self._set_meta(self.metrics, tickers, self.files)
+		rows = np.array([self._rows[t] for t in changed], dtype=np.int32)
+		for t, ((period, row), info) in changed.items():
+			values[self._rows[t]] = row.reindex(self.metrics).to_numpy(dtype=np.float64)
+			self.files[t] = info
+		order, srt = [], []
+		for m in range(len(self.metrics)):
+			o, s = np.asarray(self.order[m]), np.asarray(self.sorted[m])
+			keep = ~np.isin(o, rows)
+			o, s = o[keep], s[keep]
+			n_valid = int(np.searchsorted(s, np.inf, side='right'))  # NaN より前 (有限値と inf) の数
+			v = values[rows, m]
+			fin = ~np.isnan(v)
+			ins = np.argsort(v[fin], kind='stable')
+			r_f, v_f = rows[fin][ins], v[fin][ins]
+			pos = np.searchsorted(s[:n_valid], v_f, side='right')
+			o = np.insert(o, pos, r_f)
+			s = np.insert(s, pos, v_f)
+			order.append(np.concatenate([o, rows[~fin]]))
+			srt.append(np.concatenate([s, v[~fin]]))
+		self.values = values
+		self.order = np.vstack(order).astype(np.int32) if order else np.empty((0, len(tickers)), dtype=np.int32)
+		self.sorted = np.vstack(srt) if srt else np.empty((0, len(tickers)))
+
+	# ---- 検索 ---------------------------------------------------------------------
+
+	def resolve(self, name: str) -> str:
+		"""指標名を解決する (完全一致、無ければ一意な前方一致。例: 'ROE' → 'ROE(%)')。"""
+		if name in self._cols:
+			return name
+		hits = [m for m in self.metrics if m.startswith(name)]
+		if len(hits) == 1:
+			return hits[0]
+		raise KeyError(f'指標 {name} が{"曖昧です: " + ", ".join(hits) if hits else "インデックスにありません"}')
+
+	def _range(self, c: Condition) -> tuple[int, int]:
+		# 条件を満たす sorted 上の区間 [lo, hi)
+		s = self.sorted[self._cols[c.metric]]
+		n = int(np.searchsorted(s, np.inf, side='right'))
+		s = s[:n]
+		if c.op == '>':
+			return int(np.searchsorted(s, c.value, side='right')), n
+		if c.op == '>=':
+			return int(np.searchsorted(s, c.value, side='left')), n
+		if c.op == '<':
+			return 0, int(np.searchsorted(s, c.value, side='left'))
+		if c.op == '<=':
+			return 0, int(np.searchsorted(s, c.value, side='right'))
+		return int(np.searchsorted(s, c.value, side='left')), int(np.searchsorted(s, c.value, side='right'))
+
+	def query(self, conditions: list[Condition] = (), sort: str | None = None, descending: bool = True,
+			top: int | None = 50, columns: list[str] | None = None) -> tuple[pd.DataFrame, int]:
+		"""条件をすべて満たす銘柄を sort の順に top 件返す。戻り値: (結果の表, 条件に合う銘柄数)。"""
+		conditions = [Condition(self.resolve(c.metric), c.op, c.value) for c in conditions]
+		sort = self.resolve(sort) if sort else None
+		with instrument.span('screener_query') as sp:
+			if conditions:
+				ranges = [self._range(c) for c in conditions]
+				# 最も区間の狭い条件の区間を候補にし、残りの条件は値を直接比べる
+				best = int(np.argmin([hi - lo for lo, hi in ranges]))
+				lo, hi = ranges[best]
+				rows = np.asarray(self.order[self._cols[conditions[best].metric], lo:hi])
+				for i, c in enumerate(conditions):
+					if i != best and len(rows):
+						rows = rows[OPS[c.op](self.values[rows, self._cols[c.metric]], c.value)]
+				total = len(rows)
+				if sort:
+					v = np.asarray(self.values[rows, self._cols[sort]])
+					key = np.where(np.isnan(v), np.inf, -v if descending else v)
+					if top is not None and top < len(rows):
+						part = np.argpartition(key, top - 1)[:top]
+						rows, key = rows[part], key[part]
+					rows = rows[np.argsort(key, kind='stable')]
+				elif top is not None:
+					rows = np.sort(rows)[:top]
+			elif sort:
+				m = self._cols[sort]
+				n = int(np.searchsorted(self.sorted[m], np.inf, side='right'))
+				total = len(self.tickers)
+				k = n if top is None else min(top, n)
+				# 並べ替え済みなので端から k 件 (値の無い銘柄は末尾)
+				rows = np.asarray(self.order[m, n - k:n][::-1] if descending else self.order[m, :k])
+				if top is None or k < top:
+					rows = np.concatenate([rows, np.asarray(self.order[m, n:])])[:top]
+			else:
+				total = len(self.tickers)
+				rows = np.arange(total if top is None else min(top, total))
+			sp.count(rows=len(rows))
+		cols = list(dict.fromkeys(([sort] if sort else []) + [c.metric for c in conditions]
+			+ [self.resolve(c) for c in (columns or [])]))
+		out = pd.DataFrame({
+			'ticker': [self.tickers[r] for r in rows],
+			'period': [self.files[self.tickers[r]]['period'] for r in rows],
+		})
+		for c in cols:
+			out[c] = np.asarray(self.values[rows, self._cols[c]]) if len(rows) else np.empty(0)
+		return out, total
+
+
+def main():
+	parser = argparse.ArgumentParser(description='計算済み指標のスクリーナー (指標別ソート済みインデックス)')
+	parser.add_argument('--root', default=DEFAULT_ROOT, help='インデックスの保存先')
+	parser.add_argument('--data-dir', default='data')
+	sub = parser.add_subparsers(dest='command', required=True)
+	q = sub.add_parser('query', help='条件・並べ替え・上位 k 件で検索する')
+	q.add_argument('--where', action='append', default=[], help='条件 (例: "ROE(%%) > 10")。, / and 区切りや複数指定は AND')
+	q.add_argument('--sort', help='並べ替える指標 (既定は降順)')
+	q.add_argument('--asc', action='store_true', help='昇順に並べる')
+	q.add_argument('--top', type=int, default=50, help='表示する件数 (0 で全件)')
+	q.add_argument('--columns', help='追加で表示する指標 (カンマ区切り)')
+	q.add_argument('--output', help='結果を CSV に保存する')
+	q.add_argument('--no-refresh', action='store_true', help='検索前にサマリーの変更を反映しない')
+	u = sub.add_parser('update', help='変わったサマリーだけをインデックスに反映する')
+	u.add_argument('symbols', nargs='*', help='反映する銘柄 (省略時は data/ 配下を走査)')
+	u.add_argument('--tickers-file', help='銘柄一覧ファイル (1行1銘柄)')
+	sub.add_parser('build', help='インデックスを作り直す')
+	sub.add_parser('metrics', help='インデックスにある指標を表示する')
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	index = ScreenerIndex(args.root, args.data_dir)
+	if args.command == 'build':
+		start = time.perf_counter()
+		n = index.build()
+		print(f'{n} 銘柄 / {len(index.metrics)} 指標のインデックスを {args.root} に作成しました ({time.perf_counter() - start:.2f}s)。')
+		return
+	if args.command == 'update':
+		symbols = list(args.symbols) + (read_tickers_file(args.tickers_file) if args.tickers_file else [])
+		updated, rebuilt = index.update(symbols or None)
+		print(f'{"作り直し" if rebuilt else "差分更新"}: {len(updated)} 銘柄' + (f' ({", ".join(updated[:10])}{" ..." if len(updated) > 10 else ""})' if updated else ''))
+		return
+	if args.command == 'metrics':
+		if not index.load():
+			index.build()
+		for m in index.metrics:
+			n = int(np.searchsorted(index.sorted[index._cols[m]], np.inf, side='right'))
+			print(f'{m}\t{n} 銘柄')
+		return
+
+	if args.no_refresh:
+		if not index.load():
+			index.build()
+	else:
+		index.update()
+		index.load()  # 検索は memory map で
+	try:
+		conditions = [c for w in args.where for c in parse_conditions(w)]
+		columns = [c.strip() for c in args.columns.split(',') if c.strip()] if args.columns else None
+		start = time.perf_counter()
+		result, total = index.query(conditions, args.sort, not args.asc, args.top or None, columns)
+		elapsed = time.perf_counter() - start
+	except (ValueError, KeyError) as e:
+		parser.error(str(e.args[0]))
+	with pd.option_context('display.max_rows', None, 'display.width', 200):
+		print(result.round(2).to_string(index=False) if len(result) else '(該当なし)')
+	cond = ' かつ '.join(map(str, conditions)) or '条件なし'
+	print(f'\n{cond}: {total} / {len(index.tickers)} 銘柄 ({elapsed * 1000:.1f} ms)')
+	if args.output:
+		result.to_csv(args.output, index=False, encoding='utf-8-sig')
+		print(f'{args.output} に保存しました。')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,461 @@
+"""
+多銘柄スクリーニングポータル。各銘柄の financial_analysis_summary.csv を 1 枚の HTML にまとめる。
+
+ - 1 行 = 1 銘柄 (最新決算期の指標値)。表は仮想スクロールで、見えている行だけを描画する (5,000 行超でも軽い)
+ - 指標値は型付き配列 (Float32Array, base64) として埋め込み、ソート/範囲フィルタはその配列上で行う
+ - 列ごとのヒストグラム (全体 = 薄色 / フィルタ後 = 濃色)。棒をクリックするとその範囲で絞り込む
+ - 行をクリックすると、その銘柄の全決算期のグラフをその場で生成する
+使い方:
+ uv run src\\scripts\\screening_portal.py                       (data/ 配下の全銘柄)
+ uv run src\\scripts\\screening_portal.py 7203.T 6758.T --assets
+ uv run src\\scripts\\screening_portal.py --tickers-file tickers.txt --output data/screening_portal.html
+ 出力: data/screening_portal.html
+"""
+
+import os
+import sys
+import json
+import html
+import base64
+import argparse
+import webbrowser
+
+import numpy as np
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+import metrics as mt
+import instrument
+import company_info
+from assets import AssetOptions, add_asset_args, options_from_args
+from analysisdata2graph import STYLE_BLOCK, BAR_METRICS
+from yahoo2finance import read_tickers_file
+
+SUMMARY_NAME = 'financial_analysis_summary.csv'
+DEFAULT_OUTPUT = 'data/screening_portal.html'
+
+SCREENING_STYLE = """
+<style>
+#viewport{position:relative;z-index:1;height:62vh;overflow:auto;border-radius:14px;border:1px solid var(--panel-border);background:var(--panel-bg);font-size:12px;}
+.grid-row{display:grid;grid-template-columns:var(--cols);align-items:center;}
+#head{position:sticky;top:0;z-index:2;background:#1c2236;color:#eee;}
+body:not(.dark) #head{background:#dfe3f3;color:#222;}
+#head .cell{padding:4px 6px;border-right:1px solid rgba(255,255,255,.08);align-self:stretch;}
+#head .name{cursor:pointer;font-weight:600;height:30px;overflow:hidden;}
+#head canvas{display:block;width:100%;height:34px;cursor:crosshair;}
+#head input{width:46%;box-sizing:border-box;font-size:11px;padding:1px 2px;background:rgba(255,255,255,.8);border:1px solid #888;border-radius:4px;}
+#body{position:relative;}
+#body .grid-row{position:absolute;left:0;right:0;height:24px;cursor:pointer;border-bottom:1px solid rgba(255,255,255,.05);}
+#body .grid-row:hover{background:rgba(157,123,255,.18);}
+#body .grid-row.sel{background:rgba(157,123,255,.35);}
+#body .cell{padding:0 6px;text-align:right;white-space:nowrap;overflow:hidden;text-overflow:ellipsis;}
+#body .cell:first-child{text-align:left;font-weight:600;}
+.nan{opacity:.35;}
+#detail{margin-top:22px;}
+</style>
+"""
+
+SCREENING_JS = """
+<script>
+// 表は見えている行だけを描画する仮想スクロール。ソート/フィルタは Float32Array 上のインデックス操作のみ
+const D = JSON.parse(document.getElementById('screenData').textContent);
+const T = D.tickers.length, M = D.metrics.length, P = D.n_periods;
+function decode(b64) {
+  const bin = atob(b64), bytes = new Uint8Array(bin.length);
+  for (let i = 0; i < bin.length; i++) bytes[i] = bin.charCodeAt(i);
+  return new Float32Array(bytes.buffer);
+}
+const LATEST = decode(D.latest);    // (M, T) 最新決算期の値
+const HISTORY = decode(D.history);  // (M, T, P) 全決算期 (CSV の並び順, 足りない期は NaN)
+const ROW_H = 24, OVERSCAN = 8, BINS = 24;
+const col = m => LATEST.subarray(m * T, (m + 1) * T);
+let view = new Uint32Array(T);      // フィルタ・ソート後の行 (銘柄番号)
+let sortKey = -1, sortDir = 1, selected = -1;
+const ranges = D.metrics.map(() => [NaN, NaN]);
+const hist = [];
+
+function fmt(v) {
+  if (Number.isNaN(v)) return '—';
+  return Math.abs(v) >= 1e6 ? v.toLocaleString('en-US', { maximumFractionDigits: 0 }) : v.toFixed(2);
+}
+
+// ---- ヒストグラム (ビン範囲は全体の 2%〜98% 点で固定し、外れ値は端のビンに寄せる) ----
+function initHistograms() {
+  for (let m = 0; m < M; m++) {
+    const s = Float32Array.from(col(m)).sort();  // NaN は末尾
+    let n = 0; while (n < s.length && !Number.isNaN(s[n])) n++;
+    let lo = n ? s[Math.floor(n * 0.02)] : 0, hi = n ? s[Math.max(0, Math.ceil(n * 0.98) - 1)] : 1;
+    if (!(hi > lo)) { lo = n ? s[0] : 0; hi = n ? s[n - 1] : 1; if (!(hi > lo)) hi = lo + 1; }
+    hist.push({ lo: lo, hi: hi, all: binCounts(m, null, lo, hi) });
+  }
+}
+function binOf(v, h) {
+  const b = Math.floor((v - h.lo) / (h.hi - h.lo) * BINS);
+  return b < 0 ? 0 : (b >= BINS ? BINS - 1 : b);
+}
+function binCounts(m, rows, lo, hi) {
+  const c = new Uint32Array(BINS), x = col(m), h = { lo: lo, hi: hi };
+  const n = rows ? rows.length : T;
+  for (let k = 0; k < n; k++) {
+    const v = x[rows ? rows[k] : k];
+    if (!Number.isNaN(v)) c[binOf(v, h)]++;
+  }
+  return c;
+}
+function drawHistograms() {
+  const dark = document.body.classList.contains('dark');
+  for (let m = 0; m < M; m++) {
+    const cv = document.getElementById('hist_' + m), ctx = cv.getContext('2d');
+    const h = hist[m], cur = binCounts(m, view, h.lo, h.hi);
+    let max = 1; for (let b = 0; b < BINS; b++) max = Math.max(max, h.all[b]);
+    const w = cv.width / BINS;
+    ctx.clearRect(0, 0, cv.width, cv.height);
+    for (let b = 0; b < BINS; b++) {
+      ctx.fillStyle = dark ? 'rgba(255,255,255,.18)' : 'rgba(0,0,0,.15)';
+      ctx.fillRect(b * w, cv.height * (1 - h.all[b] / max), w - 1, cv.height * h.all[b] / max);
+      ctx.fillStyle = '#9d7bff';
+      ctx.fillRect(b * w, cv.height * (1 - cur[b] / max), w - 1, cv.height * cur[b] / max);
+    }
+  }
+}
+function onHistClick(ev, m) {
+  // クリックしたビンの範囲でその列を絞り込む (もう一度同じビンで解除)
+  const cv = ev.currentTarget, h = hist[m];
+  const b = Math.floor(ev.offsetX / cv.clientWidth * BINS);
+  const step = (h.hi - h.lo) / BINS;
+  let lo = b === 0 ? NaN : h.lo + b * step, hi = b === BINS - 1 ? NaN : h.lo + (b + 1) * step;
+  const r = ranges[m];
+  if (Object.is(r[0], lo) && Object.is(r[1], hi)) { lo = NaN; hi = NaN; }
+  setRange(m, lo, hi);
+}
+function setRange(m, lo, hi) {
+  ranges[m] = [lo, hi];
+  document.getElementById('min_' + m).value = Number.isNaN(lo) ? '' : +lo.toPrecision(4);
+  document.getElementById('max_' + m).value = Number.isNaN(hi) ? '' : +hi.toPrecision(4);
+  refresh();
+}
+
+// ---- フィルタ / ソート ----
+function applyFilter() {
+  const q = document.getElementById('tickerBox').value.trim().toLowerCase();
+  const active = [];
+  for (let m = 0; m < M; m++) if (!Number.isNaN(ranges[m][0]) || !Number.isNaN(ranges[m][1])) active.push(m);
+  const out = new Uint32Array(T);
+  let n = 0;
+  for (let t = 0; t < T; t++) {
+    if (q && D.search[t].indexOf(q) === -1) continue;
+    let ok = true;
+    for (const m of active) {
+      const v = LATEST[m * T + t], r = ranges[m];
+      if (Number.isNaN(v) || v < r[0] || v > r[1]) { ok = false; break; }
+    }
+    if (ok) out[n++] = t;
+  }
+  view = out.slice(0, n);
+}
+function applySort() {
+  if (sortKey < 0) return;
+  if (sortKey === M) {
+    view.sort((a, b) => sortDir * (D.tickers[a] < D.tickers[b] ? -1 : D.tickers[a] > D.tickers[b] ? 1 : 0));
+    return;
+  }
+  const x = col(sortKey);
+  view.sort((a, b) => {
+    const va = x[a], vb = x[b];
+    if (Number.isNaN(va)) return Number.isNaN(vb) ? 0 : 1;  // NaN は常に末尾
+    if (Number.isNaN(vb)) return -1;
+    return sortDir * (va - vb);
+  });
+}
+function sortBy(m) {
+  sortDir = sortKey === m ? -sortDir : (m === M ? 1 : -1);
+  sortKey = m;
+  document.querySelectorAll('#head .name').forEach(el => {
+    const k = +el.dataset.key;
+    el.dataset.mark = k === sortKey ? (sortDir > 0 ? ' ▲' : ' ▼') : '';
+    el.textContent = el.dataset.label + el.dataset.mark;
+  });
+  applySort();
+  renderRows(true);
+}
+let refreshTimer = 0;
+function refresh() {
+  clearTimeout(refreshTimer);
+  refreshTimer = setTimeout(() => {
+    applyFilter(); applySort();
+    document.getElementById('count').textContent = `${view.length.toLocaleString()} / ${T.toLocaleString()} 銘柄`;
+    drawHistograms();
+    renderRows(true);
+  }, 120);
+}
+function onRangeInput(m) {
+  const lo = parseFloat(document.getElementById('min_' + m).value), hi = parseFloat(document.getElementById('max_' + m).value);
+  ranges[m] = [lo, hi];
+  refresh();
+}
+function resetFilters() {
+  document.getElementById('tickerBox').value = '';
+  for (let m = 0; m < M; m++) { ranges[m] = [NaN, NaN]; document.getElementById('min_' + m).value = ''; document.getElementById('max_' + m).value = ''; }
+  refresh();
+}
+
+// ---- 仮想スクロール: 行 DOM は可視行数ぶんだけ作って使い回す ----
+const pool = [];
+function ensurePool(n) {
+  const body = document.getElementById('body');
+  while (pool.length < n) {
+    const row = document.createElement('div');
+    row.className = 'grid-row';
+    for (let c = 0; c <= M; c++) row.appendChild(document.createElement('div')).className = 'cell';
+    row.addEventListener('click', () => selectTicker(+row.dataset.t));
+    body.appendChild(row);
+    pool.push(row);
+  }
+}
+function renderRows(force) {
+  const vp = document.getElementById('viewport'), headH = document.getElementById('head').offsetHeight;
+  document.getElementById('body').style.height = (view.length * ROW_H) + 'px';
+  const first = Math.max(0, Math.floor((vp.scrollTop - headH) / ROW_H) - OVERSCAN);
+  const count = Math.ceil(vp.clientHeight / ROW_H) + OVERSCAN * 2;
+  ensurePool(count);
+  for (let k = 0; k < pool.length; k++) {
+    const row = pool[k], i = first + k;
+    if (k >= count || i >= view.length) { row.style.display = 'none'; continue; }
+    const t = view[i];
+    row.style.display = '';
+    row.style.top = (i * ROW_H) + 'px';
+    if (!force && +row.dataset.t === t && row.dataset.i === String(i)) continue;
+    row.dataset.t = t; row.dataset.i = i;
+    row.classList.toggle('sel', t === selected);
+    const cells = row.children;
+    cells[0].textContent = D.tickers[t];
+    cells[0].title = D.names[t] || D.tickers[t];
+    for (let m = 0; m < M; m++) {
+      const v = LATEST[m * T + t];
+      cells[m + 1].textContent = fmt(v);
+      cells[m + 1].classList.toggle('nan', Number.isNaN(v));
+    }
+  }
+}
+let scrollPending = false;
+function onScroll() {
+  if (scrollPending) return;
+  scrollPending = true;
+  requestAnimationFrame(() => { scrollPending = false; renderRows(false); });
+}
+
+// ---- 行クリックでその銘柄のグラフを生成 (直前のものは Plotly.purge で解放) ----
+function selectTicker(t) {
+  selected = t;
+  renderRows(true);
+  const plot = document.getElementById('detailChart');
+  Plotly.purge(plot);
+  document.getElementById('detail').style.display = 'block';
+  document.getElementById('detailTitle').textContent = D.tickers[t] + (D.names[t] ? ' ' + D.names[t] : '');
+  const periods = D.periods[t], cols = 4;
+  const shown = [];
+  for (let m = 0; m < M; m++) {
+    const y = Array.from(HISTORY.subarray((m * T + t) * P, (m * T + t) * P + periods.length), v => Number.isNaN(v) ? null : v);
+    if (y.some(v => v !== null)) shown.push([m, y]);
+  }
+  if (!shown.length) { plot.textContent = 'データなし'; return; }
+  const rows = Math.ceil(shown.length / cols);
+  const layout = { grid: { rows: rows, columns: cols, pattern: 'independent' }, height: 60 + rows * 230, showlegend: false,
+    annotations: [], margin: { l: 50, r: 20, t: 30, b: 30 }, template: document.body.classList.contains('dark') ? 'plotly_dark' : undefined };
+  const traces = shown.map(([m, y], k) => {
+    const ax = k ? String(k + 1) : '';
+    layout['xaxis' + ax] = { type: 'category' };
+    layout.annotations.push({ text: D.metrics[m], showarrow: false, xref: 'x' + ax + ' domain', yref: 'y' + ax + ' domain',
+      x: 0.5, y: 1, xanchor: 'center', yanchor: 'bottom', font: { size: 12 } });
+    const base = { x: periods, y: y, name: D.metrics[m], xaxis: 'x' + ax, yaxis: 'y' + ax };
+    return D.bar[m] ? Object.assign(base, { type: 'bar' }) : Object.assign(base, { type: 'scatter', mode: 'lines+markers' });
+  });
+  Plotly.newPlot(plot, traces, layout, { responsive: true, displaylogo: false });
+  document.getElementById('detail').scrollIntoView({ behavior: 'smooth' });
+}
+function toggleTheme() {
+  const b = document.body, btn = document.getElementById('themeBtn');
+  b.classList.toggle('dark');
+  btn.textContent = b.classList.contains('dark') ? 'LIGHT' : 'DARK';
+  drawHistograms();
+}
+
+document.getElementById('viewport').addEventListener('scroll', onScroll);
+window.addEventListener('resize', () => renderRows(true));
+for (let m = 0; m < M; m++) document.getElementById('hist_' + m).addEventListener('click', ev => onHistClick(ev, m));
+initHistograms();
+for (let t = 0; t < T; t++) view[t] = t;
+refresh();
+</script>
+"""
+
+
+def summary_path(symbol: str, data_dir: str = 'data') -> str:
+	return os.path.join(data_dir, symbol, SUMMARY_NAME)
+
+
+def list_summaries(data_dir: str = 'data') -> list[str]:
+	return sorted(d for d in os.listdir(data_dir) if os.path.exists(summary_path(d, data_dir)))
+
+
+def _company_name(symbol: str, data_dir: str, table: company_info.CompanyInfo | None = None) -> str:
+	# info.csv の shortName / longName があれば表示名に使う (無ければ空)。会社情報テーブルに最新の状態で
+	# 登録済みの銘柄は CSV を開かずにそこから引く
+	if table is not None and table.is_current(symbol):
+		return table.name(symbol)
+	path = os.path.join(data_dir, symbol, 'info.csv')
+	if not os.path.exists(path):
+		return ''
+	try:
+		info = pd.read_csv(path).iloc[0]  # info.csv は 1 行 = 1 銘柄の横長形式
+	except (ValueError, IndexError):
+		return ''
+	for key in ('shortName', 'longName'):
+		if key in info.index and pd.notna(info[key]):
+			return str(info[key])
+	return ''
+
+
+def load_screening_data(tickers: list[str], data_dir: str = 'data', read_summary=None, company_name=None) -> dict:
+	"""各銘柄のサマリーを (指標, 銘柄, 決算期) の配列にまとめる。読めない銘柄は除外して報告する。
+
+	read_summary(ticker) / company_name(ticker) を渡すと CSV を読む代わりに使う (サーバのメモリ上のキャッシュなど)。
+	"""
+	frames = {}
+	for t in tickers:
+		try:
+			df = read_summary(t) if read_summary else pd.read_csv(summary_path(t, data_dir), index_col=0)
+		except (OSError, ValueError) as e:
+			print(f'{t}: サマリーを読めないためスキップします ({e})', file=sys.stderr)
+			continue
+		if df.empty:
+			continue
+		# alldata2analysisdata が書いたサマリーは数値列のみ。手編集などで文字列になった列だけ数値化する
+		if not all(pd.api.types.is_numeric_dtype(df[c]) for c in df.columns):
+			df = df.copy()  # 渡された (キャッシュの) 表は書き換えない
+		for c in df.columns:
+			if not pd.api.types.is_numeric_dtype(df[c]):
+				df[c] = pd.to_numeric(df[c].astype(str).str.replace(',', '').str.replace('−', '-'), errors='coerce')
+		frames[t] = df
+	# 列は登録順 → 登録外の列 (旧サマリー等) の順に並べる
+	seen = {c for df in frames.values() for c in df.columns}
+	metric_cols = [n for n in mt.metric_names() if n in seen] + sorted(seen - set(mt.metric_names()))
+	n_periods = max((len(df) for df in frames.values()), default=0)
+	symbols = list(frames)
+	table = None if company_name else company_info.open_table(data_dir)
+	history = np.full((len(metric_cols), len(symbols), n_periods), np.nan, dtype=np.float32)
+	for j, t in enumerate(symbols):
+		df = frames[t].reindex(columns=metric_cols)
+		history[:, j, :len(df)] = df.to_numpy(dtype=np.float32, na_value=np.nan).T
+	return {
+		'tickers': symbols,
+		'names': [company_name(t) if company_name else _company_name(t, data_dir, table) for t in symbols],
+		'metrics': metric_cols,
+		'periods': [[str(p) for p in frames[t].index] for t in symbols],
+		'history': history,
+	}
+
+
+def _b64(arr: np.ndarray) -> str:
+	return base64.b64encode(np.ascontiguousarray(arr, dtype='<f4').tobytes()).decode('ascii')
+
+
+def build_screening_html(data: dict, assets: AssetOptions | None = None, out_dir: str = 'data') -> str:
+	history = data['history']
+	metric_cols = data['metrics']
+	payload = {
+		'tickers': data['tickers'],
+		'names': data['names'],
+		'search': [f'{t} {n}'.lower() for t, n in zip(data['tickers'], data['names'])],
+		'metrics': metric_cols,
+		'bar': [m in BAR_METRICS for m in metric_cols],
+		'periods': data['periods'],
+		'n_periods': history.shape[2],
+		# 表は各銘柄の先頭行 (CSV の並びで最新の決算期)
+		'latest': _b64(history[:, :, 0] if history.shape[2] else np.empty((len(metric_cols), 0))),
+		'history': _b64(history),
+	}
+	data_json = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+	plotly_tag = (f'<script type="text/javascript">{get_plotlyjs()}</script>' if assets is None
+		else f'<script src="{assets.plotly(out_dir)}"></script>')
+
+	cols = '110px ' + ' '.join(['minmax(96px,1fr)'] * len(metric_cols))
+	head = [f'<div class="cell"><div class="name" data-key="{len(metric_cols)}" data-label="銘柄" data-mark="" onclick="sortBy({len(metric_cols)})">銘柄</div></div>']
+	for m, name in enumerate(metric_cols):
+		safe = html.escape(name)
+		head.append(
+			f'<div class="cell"><div class="name" title="{safe}" data-key="{m}" data-label="{safe}" data-mark="" onclick="sortBy({m})">{safe}</div>'
+			f'<canvas id="hist_{m}" width="120" height="34" title="クリックでその範囲に絞り込み"></canvas>'
+			f'<input id="min_{m}" type="number" step="any" placeholder="min" oninput="onRangeInput({m})" /> '
+			f'<input id="max_{m}" type="number" step="any" placeholder="max" oninput="onRangeInput({m})" /></div>'
+		)
+
+	html_parts = [
+		'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8" />',
+		'<title>スクリーニングポータル</title>',
+		plotly_tag,
+		STYLE_BLOCK,
+		SCREENING_STYLE,
+		'</head><body class="dark">',
+		'<div class="stars"></div>',
+		f'<h1>スクリーニングポータル ({len(data["tickers"]):,} 銘柄)</h1>',
+		'<div class="controls">銘柄フィルタ: <input id="tickerBox" type="text" placeholder="例: 7203 / トヨタ" oninput="refresh()" style="width:230px;padding:8px 10px;border-radius:10px;border:1px solid var(--panel-border);" /> '
+		'<button onclick="resetFilters()">フィルタ解除</button> <span id="count"></span>'
+		'<button class="theme-toggle" onclick="toggleTheme()" id="themeBtn">LIGHT</button>'
+		'<div style="font-size:11px;opacity:.7;margin-top:6px;">列名クリックでソート / ヒストグラムの棒クリックでその範囲に絞り込み / 行クリックでグラフ表示</div></div>',
+		f'<div id="viewport" style="--cols:{cols}"><div id="head" class="grid-row">{"".join(head)}</div><div id="body"></div></div>',
+		'<div id="detail" class="chart-container" style="display:none;"><h2 id="detailTitle"></h2><div id="detailChart"></div></div>',
+		f'<script type="application/json" id="screenData">{data_json}</script>',
+		SCREENING_JS,
+		'</body></html>',
+	]
+	return '\n'.join(html_parts)
+
+
+def write_screening_portal(tickers: list[str], output: str = DEFAULT_OUTPUT, data_dir: str = 'data',
+		assets: AssetOptions | None = None, open_browser: bool = True) -> str:
+	with instrument.span('screening_load') as sp:
+		data = load_screening_data(tickers, data_dir)
+		sp.count(rows=len(data['tickers']))
+	if not data['tickers']:
+		raise ValueError('サマリー (financial_analysis_summary.csv) のある銘柄がありません')
+	out_dir = os.path.dirname(output) or '.'
+	os.makedirs(out_dir, exist_ok=True)
+	with instrument.span('screening_html') as sp:
+		text = build_screening_html(data, assets, out_dir)
+		sp.count(rows=len(data['tickers']))
+	with open(output, 'w', encoding='utf-8') as f:
+		f.write(text)
+	instrument.count(bytes=os.path.getsize(output))
+	print(f'スクリーニングポータル ({len(data["tickers"])} 銘柄) を {output} に出力しました。')
+	if open_browser:
+		webbrowser.open('file://' + os.path.abspath(output))
+	return output
+
+
+def main():
+	parser = argparse.ArgumentParser(description='多銘柄スクリーニングポータルを生成')
+	parser.add_argument('symbols', nargs='*', help='ティッカー (省略時は data/ 配下でサマリーのある全銘柄)')
+	parser.add_argument('--tickers-file', help='銘柄一覧ファイル (1行1銘柄)')
+	parser.add_argument('--output', default=DEFAULT_OUTPUT, help='出力先 HTML')
+	parser.add_argument('--no-browser', action='store_true', help='ブラウザを開かない')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	tickers = list(args.symbols)
+	if args.tickers_file:
+		tickers += read_tickers_file(args.tickers_file)
+	if not tickers:
+		tickers = list_summaries()
+	try:
+		write_screening_portal(list(dict.fromkeys(tickers)), args.output, assets=options_from_args(args),
+			open_browser=not args.no_browser)
+	except ValueError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
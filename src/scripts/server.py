@@ -0,0 +1,463 @@
+"""
+ローカル HTTP サーバ。ポータルを data/ 配下に書き出してブラウザで開く代わりに、リクエストのたびに
+メモリ上のデータから生成して返す (一括再生成を待たずに何百銘柄でも見て回れる)。
+
+URL (ポータルは書き出した場合と同じパス。共有アセットへの相対参照もそのまま解決する):
+ /                                                    銘柄一覧
+ /data/<ticker>/financial_analysis_portal.html        分析ポータル (同業統計があれば中央値・順位を重ねる)
+ /data/<ticker>/all_financials_summary_graph.html     損益/CF/BS グループ可視化
+ /data/<ticker>/statements_visualization.html        損益/BS/CF の代表項目の切替グラフ
+ /data/screening_portal.html                          スクリーニングポータル (全銘柄)
+ /api/tickers                                         銘柄一覧 (JSON)
+ /api/<ticker>/metrics                                指標 × 年度 (分析ポータルに埋め込むものと同じ形)
+ /api/<ticker>/statements/<financials|balance_sheet|cashflow>
+ /api/<ticker>/peers                                  セクター中央値・パーセンタイル・z スコア
+ /assets/...                                          --assets 時の共有 JS/CSS
+
+キャッシュ:
+ - 読み込んだ CSV は DataFrame のまま、ファイルの mtime / サイズが変わるまでメモリに保持する
+ - 生成した応答 (HTML / JSON) も元ファイルの mtime / サイズの組をキーに保持し、内容ハッシュの ETag を付ける。
+   If-None-Match が一致すれば 304 を返す。gzip を受け付けるクライアントには圧縮した本文を返す (圧縮は 1 回だけ)
+ - どちらも件数上限付きの LRU。パイプラインや取得でファイルが書き換わると次のリクエストで作り直す
+
+使い方:
+ uv run src\\scripts\\server.py --open
+ uv run src\\scripts\\server.py --port 8000 --assets --warm   (共有アセットを配信、起動時に全銘柄を読み込んでおく)
+"""
+
+import os
+import sys
+import json
+import gzip
+import hashlib
+import argparse
+import mimetypes
+import threading
+import urllib.parse
+import webbrowser
+from collections import OrderedDict
+from dataclasses import dataclass
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import numpy as np
+import pandas as pd
+
+import instrument
+import analysisdata2graph
+import alldata2visualization
+import screening_portal
+import peer_stats
+import company_info
+import statements2visualization
+from assets import AssetOptions, add_asset_args, options_from_args
+from columnar_store import STATEMENT_FILES
+
+DEFAULT_PORT = 8000
+MAX_ENTRIES = 2048
+GZIP_MIN_BYTES = 1024
+
+PORTAL_PAGE = os.path.basename(analysisdata2graph.portal_path('_'))
+GROUP_PAGE = os.path.basename(alldata2visualization.portal_path('_'))
+STATEMENTS_PAGE = statements2visualization.PAGE_NAME
+SCREENING_PAGE = os.path.basename(screening_portal.DEFAULT_OUTPUT)
+
+
+class NotFound(Exception):
+	pass
+
+
+@dataclass
+class Response:
+	body: bytes
+	content_type: str
+	etag: str
+	cache_control: str = 'no-cache'  # 毎回 ETag で再検証させる (元ファイルが変われば内容も変わる)
+	_gzip: bytes | None = None
+
+	def gzipped(self) -> bytes:
+		if self._gzip is None:
+			self._gzip = gzip.compress(self.body, compresslevel=6)
+		return self._gzip
+
+
+def make_response(body: bytes, content_type: str) -> Response:
+	return Response(body, content_type, '"' + hashlib.sha256(body).hexdigest()[:32] + '"')
+
+
+def json_response(value) -> Response:
+	return make_response(json.dumps(value, ensure_ascii=False, allow_nan=False, separators=(',', ':')).encode('utf-8'),
+		'application/json')
+
+
+def html_response(text: str) -> Response:
+	return make_response(text.encode('utf-8'), 'text/html')
+
+
+def _stat(path: str):
+	try:
+		st = os.stat(path)
+	except OSError:
+		return None
+	return st.st_mtime_ns, st.st_size
+
+
+def stamp(paths) -> tuple:
+	"""元ファイルの (mtime, サイズ) の組。キャッシュの有効性の判定に使う (無いファイルは None)。"""
+	return tuple(_stat(p) for p in paths)
+
+
+def _nullable(values) -> list:
+	return [None if v is None or (isinstance(v, float) and not np.isfinite(v)) else float(v) for v in values]
+
+
+class LRUCache:
+	"""key → (stamp, value)。stamp が変わった (元ファイルが書き換わった) エントリは作り直す。"""
+
+	def __init__(self, max_entries: int = MAX_ENTRIES):
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+		self._data = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, key, stamp, build):
+		with self._lock:
+			entry = self._data.get(key)
+			if entry is not None and entry[0] == stamp:
+				self._data.move_to_end(key)
+				self.hits += 1
+				return entry[1]
+			self.misses += 1
+		# 生成はロックの外で (遅いページの生成中も他のリクエストを止めない。同時に同じものを作っても結果は同じ)
+		value = build()
+		with self._lock:
+			self._data[key] = (stamp, value)
+			self._data.move_to_end(key)
+			while len(self._data) > self.max_entries:
+				self._data.popitem(last=False)
+		return value
+
+	def __len__(self):
+		return len(self._data)
+
+
+class PortalServer:
+	"""data/ 配下の CSV を読み込んで保持し、ポータルと JSON を生成する (HTTP 部分は make_server)。"""
+
+	def __init__(self, data_dir: str = 'data', assets: AssetOptions | None = None, peers: bool = True,
+			max_entries: int = MAX_ENTRIES):
+		self.data_dir = data_dir
+		self.assets = assets
+		self.frames = LRUCache(max_entries)     # 読み込んだ CSV
+		self.responses = LRUCache(max_entries)  # 生成した応答
+		self.peer_store = peer_stats.PeerStats(peer_stats.PEER_DIR, data_dir) if peers else None
+
+	# ---- データ -------------------------------------------------------------------
+
+	def _path(self, ticker: str, filename: str) -> str:
+		return os.path.join(self.data_dir, ticker, filename)
+
+	def frame(self, path: str) -> pd.DataFrame:
+		def build():
+			if not os.path.exists(path):
+				raise NotFound(path)
+			with instrument.span('read_csv', path=path):
+				return pd.read_csv(path, index_col=0)
+		return self.frames.get(path, stamp([path]), build)
+
+	def summary_path(self, ticker: str) -> str:
+		return screening_portal.summary_path(ticker, self.data_dir)
+
+	def summary(self, ticker: str) -> pd.DataFrame:
+		return self.frame(self.summary_path(ticker))
+
+	def statement(self, ticker: str, name: str) -> pd.DataFrame:
+		return self.frame(self._path(ticker, STATEMENT_FILES[name]))
+
+	def statements(self, ticker: str) -> dict[str, pd.DataFrame]:
+		return {name: self.statement(ticker, name) for name in ('financials', 'cashflow', 'balance_sheet')}
+
+	def info_table(self) -> company_info.CompanyInfo | None:
+		# 会社情報テーブル (index.json が書き換わったら開き直す)
+		index = os.path.join(company_info.DEFAULT_ROOT, 'index.json')
+		return self.frames.get(('company_info', index), stamp([index]), lambda: company_info.open_table(self.data_dir))
+
+	def company_name(self, ticker: str) -> str:
+		table = self.info_table()
+		if table is not None and table.is_current(ticker):
+			return table.name(ticker)
+		path = self._path(ticker, 'info.csv')
+		if not os.path.exists(path):
+			return ''
+		info = self.frames.get(('info', path), stamp([path]), lambda: pd.read_csv(path))  # 1 行 = 1 銘柄の横長形式
+		if info.empty:
+			return ''
+		row = info.iloc[0]
+		for key in ('shortName', 'longName'):
+			if key in row.index and pd.notna(row[key]):
+				return str(row[key])
+		return ''
+
+	def tickers(self) -> list[str]:
+		return screening_portal.list_summaries(self.data_dir)
+
+	def _peer_paths(self) -> list[str]:
+		root = self.peer_store.root
+		return [os.path.join(root, name) for name in ('meta.json', peer_stats.GROUP_STATS, peer_stats.MOMENTS)]
+
+	def peers(self, ticker: str, df: pd.DataFrame):
+		"""同業統計があればその銘柄の PeerSeries (無ければ None)。
+
+		サーバーは保存済みの統計を読むだけで書き換えない (他プロセスのパイプラインと競合しないよう、更新は peers ステージに任せる)。
+		"""
+		if self.peer_store is None or not self.peer_store.load():
+			return None
+		return self.peer_store.peer_series(ticker, df)
+
+	def warm(self, tickers: list[str] | None = None) -> int:
+		"""全銘柄のサマリーと 3 表を読み込んでおく (起動直後の最初の表示を待たせない)。"""
+		n = 0
+		for t in tickers or self.tickers():
+			try:
+				self.summary(t)
+				for name in STATEMENT_FILES:
+					if os.path.exists(self._path(t, STATEMENT_FILES[name])):
+						self.statement(t, name)
+			except (NotFound, OSError, ValueError):
+				continue
+			n += 1
+		return n
+
+	# ---- ルーティング ---------------------------------------------------------------
+
+	def _ticker(self, name: str) -> str:
+		# パスに使う部分なので ../ やドットファイルを通さない
+		if not name or name.startswith('.') or '/' in name or '\\' in name or not os.path.isdir(os.path.join(self.data_dir, name)):
+			raise NotFound(name)
+		return name
+
+	def _cached(self, key, paths, build) -> Response:
+		return self.responses.get(key, stamp(paths), build)
+
+	def handle(self, path: str) -> Response:
+		parts = [p for p in path.split('/') if p]
+		if not parts:
+			return self._index()
+		if parts[0] == 'api':
+			return self._api(parts[1:])
+		if parts[0] == 'data':
+			if parts[1:] == [SCREENING_PAGE]:
+				return self._screening()
+			if len(parts) == 3:
+				return self._page(self._ticker(parts[1]), parts[2])
+		if self.assets is not None and parts[0] == os.path.basename(os.path.normpath(self.assets.root)):
+			return self._asset(parts[1:])
+		raise NotFound(path)
+
+	def _page(self, ticker: str, filename: str) -> Response:
+		if filename == PORTAL_PAGE:
+			paths = [self.summary_path(ticker)] + (self._peer_paths() if self.peer_store is not None else [])
+
+			def build():
+				df = self.summary(ticker)
+				with instrument.span('portal_html', ticker):
+					return html_response(analysisdata2graph.build_portal_html(df, ticker, False, self.assets, self.peers(ticker, df)))
+			return self._cached(('portal', ticker), paths, build)
+		if filename == GROUP_PAGE:
+			def build():
+				fin_df, cash_df, bs_df = alldata2visualization.select_statements(self.statements(ticker))
+				with instrument.span('group_html', ticker):
+					return html_response(alldata2visualization.build_portal(fin_df, cash_df, bs_df, ticker, self.assets))
+			return self._cached(('group', ticker), [self._path(ticker, f) for f in STATEMENT_FILES.values()], build)
+		if filename == STATEMENTS_PAGE:
+			def build():
+				statements = self.statements(ticker)
+				with instrument.span('statements_html', ticker):
+					return html_response(statements2visualization.build_page(statements, ticker, self.assets))
+			return self._cached(('statements', ticker), [self._path(ticker, f) for f in STATEMENT_FILES.values()], build)
+		raise NotFound(filename)
+
+	def _screening(self) -> Response:
+		tickers = self.tickers()
+		paths = [p for t in tickers for p in (self.summary_path(t), self._path(t, 'info.csv'))]
+
+		def build():
+			with instrument.span('screening_html') as sp:
+				data = screening_portal.load_screening_data(tickers, self.data_dir, self.summary, self.company_name)
+				if not data['tickers']:
+					raise NotFound('サマリーのある銘柄がありません')
+				sp.count(rows=len(data['tickers']))
+				return html_response(screening_portal.build_screening_html(data, self.assets, self.data_dir))
+		return self._cached(('screening',), paths, build)
+
+	def _api(self, parts: list[str]) -> Response:
+		if parts == ['tickers']:
+			tickers = self.tickers()
+			return self._cached(('api', 'tickers'), [self.data_dir] + [self.summary_path(t) for t in tickers],
+				lambda: json_response(tickers))
+		if len(parts) < 2:
+			raise NotFound('/'.join(parts))
+		ticker = self._ticker(parts[0])
+		summary = self.summary_path(ticker)
+		if parts[1:] == ['metrics']:
+			return self._cached(('api', 'metrics', ticker), [summary],
+				lambda: json_response(analysisdata2graph.portal_payload(self.summary(ticker))))
+		if parts[1:] == ['peers'] and self.peer_store is not None:
+			def build():
+				df = self.summary(ticker)
+				peers = self.peers(ticker, df)
+				if peers is None:
+					raise NotFound('同業統計がありません (peer_stats.py build)')
+				return json_response({'sector': peers.sector, 'periods': [str(p) for p in df.index], **{
+					key: {m: _nullable(frame[m]) for m in frame.columns}
+					for key, frame in (('median', peers.median), ('pct', peers.pct), ('z', peers.z))
+				}})
+			return self._cached(('api', 'peers', ticker), [summary] + self._peer_paths(), build)
+		if len(parts) == 3 and parts[1] == 'statements' and parts[2] in STATEMENT_FILES:
+			name = parts[2]
+
+			def build():
+				df = self.statement(ticker, name).apply(pd.to_numeric, errors='coerce')
+				return json_response({'items': [str(i) for i in df.index], 'periods': [str(c) for c in df.columns],
+					'values': [_nullable(row) for row in df.to_numpy(dtype=np.float64)]})
+			return self._cached(('api', 'statement', ticker, name), [self._path(ticker, STATEMENT_FILES[name])], build)
+		raise NotFound('/'.join(parts))
+
+	def _asset(self, parts: list[str]) -> Response:
+		root = os.path.abspath(self.assets.root)
+		path = os.path.abspath(os.path.join(root, *parts))
+		if not path.startswith(root + os.sep) or not os.path.isfile(path):
+			raise NotFound('/'.join(parts))
+
+		def build():
+			with open(path, 'rb') as f:
+				resp = make_response(f.read(), mimetypes.guess_type(path)[0] or 'application/octet-stream')
+			resp.cache_control = 'public, max-age=31536000, immutable'  # パスに版が入っている
+			return resp
+		return self._cached(('asset', path), [path], build)
+
+	def _index(self) -> Response:
+		tickers = self.tickers()
+
+		def build():
+			rows = []
+			for t in tickers:
+				q = urllib.parse.quote(t)
+				links = [f'<a href="/data/{q}/{PORTAL_PAGE}">分析ポータル</a>', f'<a href="/data/{q}/{GROUP_PAGE}">グループ可視化</a>']
+				links += [f'<a href="/data/{q}/{STATEMENTS_PAGE}#{key}">{label}</a>' for key, label in statements2visualization.STATEMENTS]
+				links.append(f'<a href="/api/{q}/metrics">JSON</a>')
+				rows.append(f'<tr><td>{t}</td><td>{" / ".join(links)}</td></tr>')
+			text = '\n'.join([
+				'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8" /><title>財務分析サーバ</title>',
+				'<style>body{font-family:"Segoe UI","Helvetica Neue",Arial,sans-serif;margin:0;padding:18px;background:#111;color:#eee;}'
+				'a{color:#9d7bff;text-decoration:none;} a:hover{text-decoration:underline;} td{padding:3px 12px 3px 0;}'
+				'#filterBox{width:230px;padding:8px 10px;border-radius:10px;border:1px solid #444;background:#222;color:#eee;}</style>',
+				'</head><body>',
+				f'<h1>財務分析サーバ ({len(tickers):,} 銘柄)</h1>',
+				f'<p><a href="/data/{SCREENING_PAGE}">スクリーニングポータル</a> / <a href="/api/tickers">銘柄一覧 (JSON)</a></p>',
+				'<p>銘柄フィルタ: <input id="filterBox" type="text" placeholder="例: 7203" oninput="filterRows()" /></p>',
+				'<table id="tickers">', *rows, '</table>',
+				'<script>function filterRows(){const q=document.getElementById("filterBox").value.toLowerCase();'
+				'document.querySelectorAll("#tickers tr").forEach(r=>{r.style.display=r.firstChild.textContent.toLowerCase().includes(q)?"":"none";});}</script>',
+				'</body></html>',
+			])
+			return html_response(text)
+		return self._cached(('index',), [self.data_dir] + [self.summary_path(t) for t in tickers], build)
+
+
+def make_server(app: PortalServer, host: str = '127.0.0.1', port: int = DEFAULT_PORT, quiet: bool = True) -> ThreadingHTTPServer:
+	class Handler(BaseHTTPRequestHandler):
+		protocol_version = 'HTTP/1.1'  # keep-alive (ポータルと共有アセットを 1 接続で取得できる)
+
+		def do_GET(self):
+			self._respond(head=False)
+
+		def do_HEAD(self):
+			self._respond(head=True)
+
+		def _respond(self, head: bool):
+			path = urllib.parse.unquote(urllib.parse.urlparse(self.path).path)
+			try:
+				resp = app.handle(path)
+			except NotFound as e:
+				return self._send_plain(404, f'not found: {e}')
+			except Exception as e:
+				print(f'{path}: {type(e).__name__}: {e}', file=sys.stderr)
+				return self._send_plain(500, f'{type(e).__name__}: {e}')
+			etags = {t.strip() for t in self.headers.get('If-None-Match', '').split(',')}
+			if resp.etag in etags or '*' in etags:
+				self.send_response(304)
+				self.send_header('ETag', resp.etag)
+				self.send_header('Cache-Control', resp.cache_control)
+				self.end_headers()
+				return
+			body = resp.body
+			gzipped = len(body) >= GZIP_MIN_BYTES and 'gzip' in self.headers.get('Accept-Encoding', '')
+			if gzipped:
+				body = resp.gzipped()
+			self.send_response(200)
+			self.send_header('Content-Type', f'{resp.content_type}; charset=utf-8' if resp.content_type.startswith(('text/', 'application/json'))
+				else resp.content_type)
+			self.send_header('Content-Length', str(len(body)))
+			self.send_header('ETag', resp.etag)
+			self.send_header('Cache-Control', resp.cache_control)
+			self.send_header('Vary', 'Accept-Encoding')
+			if gzipped:
+				self.send_header('Content-Encoding', 'gzip')
+			self.end_headers()
+			if not head:
+				self.wfile.write(body)
+
+		def _send_plain(self, code: int, text: str):
+			body = text.encode('utf-8')
+			self.send_response(code)
+			self.send_header('Content-Type', 'text/plain; charset=utf-8')
+			self.send_header('Content-Length', str(len(body)))
+			self.end_headers()
+			self.wfile.write(body)
+
+		def log_message(self, format, *args):
+			if not quiet:
+				super().log_message(format, *args)
+
+	server = ThreadingHTTPServer((host, port), Handler)
+	server.daemon_threads = True
+	return server
+
+
+def main():
+	parser = argparse.ArgumentParser(description='ポータルと指標・財務データ (JSON) をリクエストごとに生成して配信するローカルサーバ')
+	parser.add_argument('--host', default='127.0.0.1')
+	parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+	parser.add_argument('--open', action='store_true', help='起動後に銘柄一覧をブラウザで開く')
+	parser.add_argument('--warm', action='store_true', help='起動時に全銘柄のサマリーと 3 表を読み込んでおく')
+	parser.add_argument('--no-peers', action='store_true', help='分析ポータルに同業比較 (セクター中央値・パーセンタイル) を重ねない')
+	parser.add_argument('--max-entries', type=int, default=MAX_ENTRIES, help='メモリに保持する表・応答の件数上限 (それぞれ)')
+	parser.add_argument('--verbose', action='store_true', help='リクエストごとのログを出す')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	app = PortalServer(assets=options_from_args(args), peers=not args.no_peers, max_entries=args.max_entries)
+	server = make_server(app, args.host, args.port, quiet=not args.verbose)
+	url = f'http://{args.host}:{server.server_port}/'
+	if args.warm:
+		def warm():
+			n = app.warm()
+			print(f'{n} 銘柄を読み込みました。', file=sys.stderr)
+		threading.Thread(target=warm, daemon=True).start()
+	print(f'{url} で配信中 (Ctrl+C で終了)', file=sys.stderr)
+	if args.open:
+		webbrowser.open(url)
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		instrument.finish()
+
+
+if __name__ == '__main__':
+	main()
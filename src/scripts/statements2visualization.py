@@ -0,0 +1,249 @@
+"""
+損益計算書 / 貸借対照表 / キャッシュフローの代表項目を 1 枚の HTML で切り替えて表示する。
+
+ - 1 銘柄につき 3 ステートメントを 1 回だけ読み込み、代表項目の値と前年比を JSON として埋め込む
+ - グラフは選んだステートメント・項目の分だけブラウザ側で生成する (項目ごとの trace を HTML に並べない)
+ - 出力は銘柄ごとに data/<ticker>/statements_visualization.html (複数銘柄を同時に描いても上書きし合わない)
+ - URL の #<ステートメント>/<項目番号> (例: #balance_sheet/0) で開く表示を指定できる
+使い方:
+ uv run src\\scripts\\statements2visualization.py 7203.T
+ uv run src\\scripts\\statements2visualization.py 7203.T 6758.T --assets
+ uv run src\\scripts\\statements2visualization.py --tickers-file tickers.txt --store store
+"""
+
+import os
+import sys
+import json
+import html
+import argparse
+import webbrowser
+
+import numpy as np
+import pandas as pd
+from plotly.offline import get_plotlyjs
+
+import instrument
+import schema
+from assets import AssetOptions, add_asset_args, options_from_args
+from analysisdata2graph import STYLE_BLOCK
+from columnar_store import read_statement_frame
+from alldata2analysisdata import list_tickers
+from yahoo2finance import read_tickers_file
+
+PAGE_NAME = 'statements_visualization.html'
+
+# (ステートメント, 表示名)。タブはこの順に並ぶ。代表項目とその並び・日本語ラベルは schema の定義を使う
+STATEMENTS = (
+	('financials', '損益計算書'),
+	('balance_sheet', '貸借対照表'),
+	('cashflow', 'キャッシュフロー'),
+)
+
+STATEMENTS_STYLE = """
+<style>
+#statementTabs button{opacity:.55;}
+#statementTabs button.active{opacity:1;box-shadow:0 0 0 2px var(--accent);}
+#itemSelect{padding:7px 10px;border-radius:10px;border:1px solid var(--panel-border);font-size:14px;min-width:260px;}
+</style>
+"""
+
+STATEMENTS_JS = """
+<script>
+// 代表項目の値と前年比は埋め込み JSON に 1 回だけ持ち、表示中の 1 項目のグラフだけを Plotly.react で描き直す
+const S = JSON.parse(document.getElementById('statementData').textContent);
+const COLORS = ["#00bfae", "#ff6f61", "#ffd600", "#8e24aa", "#43a047", "#039be5", "#f4511e", "#c0ca33", "#5e35b1", "#00897b"];
+const FONT = 'Meiryo, Yu Gothic, IPAexGothic, MS Gothic, sans-serif';
+let current = 0;
+
+function selectStatement(s, item) {
+  current = s;
+  document.querySelectorAll('#statementTabs button').forEach((b, i) => b.classList.toggle('active', i === s));
+  const sel = document.getElementById('itemSelect');
+  sel.innerHTML = '';
+  S.statements[s].items.forEach((it, i) => {
+    const o = document.createElement('option');
+    o.value = i; o.textContent = it.label;
+    sel.appendChild(o);
+  });
+  sel.value = (item >= 0 && item < S.statements[s].items.length) ? item : 0;
+  draw();
+}
+
+function draw() {
+  const st = S.statements[current];
+  const i = +document.getElementById('itemSelect').value;
+  const it = st.items[i];
+  const color = COLORS[i % COLORS.length];
+  // 前年比のない点は customdata を空にしておくと hovertemplate の既定の "-" になる
+  const trace = {
+    type: 'scatter', x: st.periods, y: it.values, customdata: it.change.map(c => c === null ? [] : [c]),
+    mode: 'lines+markers+text', name: it.label,
+    line: {width: 3, color: color}, marker: {size: 8, color: color, symbol: 'circle'},
+    texttemplate: '%{y:,.0f}', textposition: 'top center',
+    hovertemplate: it.label + '<br>年度: %{x|%Y-%m-%d}<br>金額: %{y:,.0f} 円<br>前年比: %{customdata[0]:+.2%}<extra></extra>',
+    hoverlabel: {bgcolor: color, font: {size: 14, family: FONT}},
+  };
+  const axis = {showgrid: true, gridcolor: '#444', zerolinecolor: '#888', color: '#fff', tickfont: {size: 12, color: '#fff'}};
+  const layout = {
+    title: {text: S.symbol + ' ' + it.label + ' 財務推移 (' + st.label + ')', font: {size: 22, color: '#ffd600'}},
+    height: 500, showlegend: false,
+    font: {family: FONT, color: '#fff'},
+    paper_bgcolor: '#222', plot_bgcolor: '#222',
+    margin: {t: 80, b: 40, l: 60, r: 40},
+    xaxis: Object.assign({title: {text: '年度'}}, axis),
+    yaxis: Object.assign({title: {text: '金額（円）', font: {size: 14, color: '#ffd600'}}, tickformat: ','}, axis),
+  };
+  Plotly.react('chart', [trace], layout, {responsive: true});
+  history.replaceState(null, '', '#' + st.key + '/' + i);
+}
+
+function toggleTheme() {
+  const b = document.body, btn = document.getElementById('themeBtn');
+  b.classList.toggle('dark');
+  btn.textContent = b.classList.contains('dark') ? 'LIGHT' : 'DARK';
+}
+
+(function () {
+  const [key, item] = decodeURIComponent(location.hash.slice(1)).split('/');
+  const s = S.statements.findIndex(st => st.key === key);
+  selectStatement(s >= 0 ? s : 0, parseInt(item, 10));
+})();
+</script>
+"""
+
+
+def output_path(symbol):
+	# 銘柄ごとの出力先 (同時に実行しても上書きし合わない)
+	return os.path.join('data', symbol, PAGE_NAME)
+
+
+def load_statements(symbol, data_dir='data', store_root=None):
+	# 3 ステートメントを 1 回ずつ読む ({'financials': df, 'balance_sheet': df, 'cashflow': df})
+	return {name: read_statement_frame(symbol, name, data_dir=data_dir, store_root=store_root) for name, _ in STATEMENTS}
+
+
+def yoy_change(values: np.ndarray) -> np.ndarray:
+	"""項目 × 年度 (古い順) の配列から前年比 (比率) をまとめて求める。前年が 0 / 欠損なら NaN。"""
+	prev = values[:, :-1]
+	change = np.full(values.shape, np.nan)
+	with np.errstate(divide='ignore', invalid='ignore'):
+		change[:, 1:] = np.where(prev != 0, (values[:, 1:] - prev) / prev, np.nan)
+	# 表示は小数第2位の % なので比率は 4 桁で十分 (HTML に埋め込む桁を減らす)
+	return change.round(4)
+
+
+def _json_row(row: np.ndarray) -> list:
+	return [None if np.isnan(v) else v for v in row.tolist()]
+
+
+def statements_payload(statements: dict[str, pd.DataFrame], symbol: str) -> dict:
+	"""ページに埋め込むデータ。ステートメントごとに年度 (古い順) と代表項目の値・前年比を持つ。"""
+	parts = []
+	for key, label in STATEMENTS:
+		df = statements.get(key)
+		if df is None:
+			continue
+		# 欠損値を除外して数値のみにし、CSV は新しい年度が先なので古い順に並べ替える
+		df = df.dropna(how='all', axis=1).dropna(how='all', axis=0).apply(pd.to_numeric, errors='coerce')
+		df = df[sorted(df.columns, key=str)]
+		# データに存在する代表項目のみ (別名の行も同じ項目として拾う)。代表項目がなければ最初の5項目
+		st = schema.Statement.from_frame(key, df)
+		ids = [item.id for item in schema.items_of(key) if item.id in st]
+		if ids:
+			keys = [schema.ITEMS[i].name for i in ids]
+			labels = [schema.ja_label(i) for i in ids]
+			values = st.take(ids)
+		else:
+			keys = labels = [str(item) for item in df.index[:5]]
+			values = df.iloc[:5].to_numpy(dtype=float)
+		if not keys:
+			continue
+		change = yoy_change(values)
+		parts.append({
+			'key': key,
+			'label': label,
+			'periods': [str(c) for c in df.columns],
+			'items': [{'key': k, 'label': labels[i], 'values': _json_row(values[i]), 'change': _json_row(change[i])}
+				for i, k in enumerate(keys)],
+		})
+	return {'symbol': symbol, 'statements': parts}
+
+
+def build_page(statements: dict[str, pd.DataFrame], symbol: str, assets: AssetOptions | None = None, out_dir: str | None = None) -> str:
+	payload = statements_payload(statements, symbol)
+	if not payload['statements']:
+		raise ValueError(f'{symbol}: 表示できる財務データがありません')
+	out_dir = os.path.dirname(output_path(symbol)) if out_dir is None else out_dir
+	data_json = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/')
+	plotly_tag = (f'<script type="text/javascript">{get_plotlyjs()}</script>' if assets is None
+		else f'<script src="{assets.plotly(out_dir)}"></script>')
+	tabs = ''.join(f'<button onclick="selectStatement({i})">{html.escape(st["label"])}</button>' for i, st in enumerate(payload['statements']))
+	html_parts = [
+		'<!DOCTYPE html><html lang="ja"><head><meta charset="utf-8" />',
+		f'<title>財務諸表 - {html.escape(symbol)}</title>',
+		plotly_tag,
+		STYLE_BLOCK,
+		STATEMENTS_STYLE,
+		'</head><body class="dark">',
+		'<div class="stars"></div>',
+		f'<h1>財務諸表 ({html.escape(symbol)})</h1>',
+		f'<div class="controls"><span id="statementTabs">{tabs}</span> 項目: <select id="itemSelect" onchange="draw()"></select>'
+		'<button class="theme-toggle" onclick="toggleTheme()" id="themeBtn">LIGHT</button></div>',
+		'<div class="chart-container"><div id="chart"></div></div>',
+		f'<script type="application/json" id="statementData">{data_json}</script>',
+		STATEMENTS_JS,
+		'</body></html>',
+	]
+	return '\n'.join(html_parts)
+
+
+def write_page(symbol, statements, assets=None, open_browser=False, html_path=None):
+	html_path = output_path(symbol) if html_path is None else html_path
+	with instrument.span('statements_html', symbol) as sp:
+		text = build_page(statements, symbol, assets, os.path.dirname(os.path.abspath(html_path)))
+		sp.count(rows=sum(len(df) for df in statements.values()))
+	with open(html_path, 'w', encoding='utf-8') as f:
+		f.write(text)
+	instrument.count(bytes=os.path.getsize(html_path))
+	print(f'財務諸表グラフを {html_path} に出力しました。')
+	if open_browser:
+		webbrowser.open('file://' + os.path.abspath(html_path))
+	return html_path
+
+
+def main():
+	parser = argparse.ArgumentParser(description='損益/BS/CF の代表項目を 1 枚で切り替えるグラフを銘柄ごとに生成')
+	parser.add_argument('symbols', nargs='*', help='ティッカー (例: 7203.T)。複数指定可')
+	parser.add_argument('--tickers-file', help='ティッカー一覧ファイル (1行1銘柄)')
+	parser.add_argument('--all', action='store_true', help='data/ 配下の全銘柄を対象にする')
+	parser.add_argument('--store', help='列指向ストアのディレクトリ (指定時は CSV の代わりに読み込む)')
+	parser.add_argument('--open', action='store_true', help='1 銘柄のときは出力後にブラウザで開く')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	tickers = list(args.symbols)
+	if args.tickers_file:
+		tickers += read_tickers_file(args.tickers_file)
+	if args.all:
+		tickers += list_tickers()
+	tickers = list(dict.fromkeys(tickers))
+	if not tickers:
+		parser.error('ティッカーを指定してください (または --tickers-file / --all)')
+
+	assets = options_from_args(args)
+	failed = []
+	for symbol in tickers:
+		# 1 銘柄の失敗で残りを止めない
+		try:
+			write_page(symbol, load_statements(symbol, store_root=args.store), assets, open_browser=args.open and len(tickers) == 1)
+		except (OSError, KeyError, ValueError) as e:
+			print(f'{symbol}: {type(e).__name__}: {e}', file=sys.stderr)
+			failed.append(symbol)
+	if failed:
+		sys.exit(f'{len(failed)} 銘柄の出力に失敗しました: {", ".join(failed)}')
+
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,245 @@
+"""
+グループ可視化と指標グラフの静的画像 (PNG/SVG) を一括出力する。
+
+kaleido の常駐サーバ (Chromium 1 プロセス + 複数タブ) を最初に 1 回だけ起動し、
+全銘柄の図をそこへ流し込む。図ごとに Chromium を起動しないので数千銘柄でも現実的な時間で終わる。
+各画像の元になった図 (データ + レイアウト + 出力設定) のハッシュを data/<ticker>/images/images.json に記録し、
+変わっていない画像は書き直さない。
+
+出力:
+ data/<ticker>/images/group_pl.png / group_cf.png / group_bs.png   (損益 / CF / BS)
+ data/<ticker>/images/metrics/<指標名>.png
+使い方:
+ uv run src\\scripts\\static_export.py 7203.T 6758.T
+ uv run src\\scripts\\static_export.py --all --format svg --concurrency 4 --jobs 8
+前提: kaleido 1.3 以降 (start_sync_server と write_fig_from_object_sync の cancel_on_error を使う)。Chrome/Chromium を使う。未導入なら `uv run kaleido_get_chrome` (または `plotly_get_chrome`) で取得する。
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import argparse
+from dataclasses import dataclass, field
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+import plotly.io as pio
+import plotly.graph_objs as go
+
+import manifest as mf
+import instrument
+import analysisdata2graph
+import alldata2visualization
+from assets import AssetOptions, add_asset_args, options_from_args, ensure_asset
+from columnar_store import STATEMENT_FILES
+from alldata2analysisdata import list_tickers
+from yahoo2finance import read_tickers_file
+
+try:
+	import kaleido
+except ImportError:  # pragma: no cover - kaleido は依存に含まれるが、念のため
+	kaleido = None
+
+IMAGE_DIR = 'images'
+STATE_NAME = 'images.json'
+FORMATS = ('png', 'svg')
+GROUP_KEYS = {'損益': 'pl', 'キャッシュフロー': 'cf', 'バランスシート': 'bs'}
+GROUP_SIZE = (1200, 640)
+METRIC_SIZE = (640, 400)
+
+
+@dataclass
+class ExportResult:
+	ticker: str
+	written: list = field(default_factory=list)
+	skipped: int = 0
+	elapsed: float = 0.0
+	error: str = ''
+
+
+def _safe_name(name: str) -> str:
+	return re.sub(r'[\\/:*?"<>|\s]', '_', name)
+
+
+def _fig_json(fig) -> str:
+	# ハッシュ用の図の JSON 表現 (dict はキー順を固定)
+	if isinstance(fig, dict):
+		return json.dumps(fig, ensure_ascii=False, sort_keys=True)
+	return pio.to_json(fig, validate=False, remove_uids=True)
+
+
+def group_figures(statements: dict[str, pd.DataFrame]) -> list[tuple[str, object, tuple[int, int]]]:
+	"""グループ可視化を損益/CF/BS ごとに 1 枚ずつ (そのグループの trace だけ表示)。"""
+	fig, groups = alldata2visualization.build_group_figure(*alldata2visualization.select_statements(statements))
+	out = []
+	start = 0
+	for name, end in groups:
+		g = go.Figure(fig)
+		for j, tr in enumerate(g.data):
+			tr.visible = start <= j < end
+		g.update_layout(title=f'主要財務指標 ({name})')
+		out.append((f'group_{GROUP_KEYS.get(name, _safe_name(name))}', g, GROUP_SIZE))
+		start = end
+	return out
+
+
+def metric_figures(summary: pd.DataFrame) -> list[tuple[str, object, tuple[int, int]]]:
+	payload = analysisdata2graph.portal_payload(summary)
+	return [(f'metrics/{_safe_name(m)}', analysisdata2graph.metric_figure(payload, i), METRIC_SIZE)
+		for i, m in enumerate(payload['metrics'])]
+
+
+class StaticExporter:
+	"""kaleido の常駐サーバを保持する。with ブロックの間は全銘柄・全スレッドで同じ Chromium を共有する。
+
+	concurrency: Chromium 内で同時に描画するタブ数
+	"""
+
+	def __init__(self, fmt: str = 'png', concurrency: int = 2, scale: float = 1.0, data_dir: str = 'data',
+			assets: AssetOptions | None = None, timeout: float = 90):
+		if kaleido is None:
+			raise ImportError('静的画像の出力には kaleido が必要です: uv add kaleido')
+		if fmt not in FORMATS:
+			raise ValueError(f'未対応の形式: {fmt}')
+		self.fmt = fmt
+		self.concurrency = concurrency
+		self.scale = scale
+		self.data_dir = data_dir
+		self.assets = assets
+		self.timeout = timeout
+
+	def __enter__(self):
+		kwargs = {'n': self.concurrency, 'timeout': self.timeout}
+		if self.assets is not None:
+			# 共有アセットの plotly.js を使わせる (描画時に CDN へ取りに行かない)
+			kwargs['plotlyjs'] = os.path.abspath(ensure_asset('plotly' if self.assets.plotly_bundle == 'full' else 'plotly-basic', self.assets.root))
+		kaleido.start_sync_server(silence_warnings=True, **kwargs)
+		return self
+
+	def __exit__(self, *exc):
+		kaleido.stop_sync_server(silence_warnings=True)
+
+	def _opts(self, size: tuple[int, int]) -> dict:
+		return {'format': self.fmt, 'width': size[0], 'height': size[1], 'scale': self.scale}
+
+	def export_ticker(self, ticker: str, statements: dict[str, pd.DataFrame] | None = None,
+			summary: pd.DataFrame | None = None, force: bool = False) -> ExportResult:
+		"""1 銘柄の画像を出力する。元の図が前回と同じ画像は飛ばす。"""
+		with instrument.span('images', ticker) as sp:
+			result = self._export_ticker(ticker, statements, summary, force)
+			sp.fields['written'] = len(result.written)
+		return result
+
+	def _export_ticker(self, ticker: str, statements, summary, force: bool) -> ExportResult:
+		start = time.perf_counter()
+		result = ExportResult(ticker)
+		base = os.path.join(self.data_dir, ticker)
+		image_dir = os.path.join(base, IMAGE_DIR)
+		try:
+			if statements is None:
+				statements = {name: pd.read_csv(os.path.join(base, filename), index_col=0) for name, filename in STATEMENT_FILES.items()}
+			if summary is None:
+				summary = pd.read_csv(os.path.join(base, 'financial_analysis_summary.csv'), index_col=0)
+			figures = group_figures(statements) + metric_figures(summary)
+		except (OSError, ValueError, KeyError) as e:
+			result.error = f'{type(e).__name__}: {e}'
+			result.elapsed = time.perf_counter() - start
+			return result
+
+		state = self._load_state(image_dir)
+		jobs = []
+		for name, fig, size in figures:
+			rel = f'{name}.{self.fmt}'
+			path = os.path.join(image_dir, rel)
+			opts = self._opts(size)
+			h = mf.sha256_bytes((_fig_json(fig) + json.dumps(opts, sort_keys=True)).encode('utf-8'))
+			if not force and state.get(rel) == h and os.path.exists(path):
+				result.skipped += 1
+				continue
+			os.makedirs(os.path.dirname(path), exist_ok=True)
+			if os.path.exists(path):
+				os.remove(path)  # 出力後の存在確認で成否を判定するため古い画像は消しておく
+			jobs.append((rel, path, h, {'fig': fig, 'path': path, 'opts': opts}))
+
+		if jobs:
+			with instrument.span('kaleido', figures=len(jobs)):
+				errors = kaleido.write_fig_from_object_sync([j[3] for j in jobs], cancel_on_error=False)
+			for rel, path, h, _ in jobs:
+				if os.path.exists(path):
+					state[rel] = h
+					result.written.append(rel)
+					instrument.count(bytes=os.path.getsize(path))
+				else:
+					state.pop(rel, None)
+			failed = len(jobs) - len(result.written)
+			if failed:
+				detail = '; '.join(str(e) for e in (errors or ())[:3])
+				result.error = f'{failed} 枚の出力に失敗' + (f' ({detail})' if detail else '')
+			os.makedirs(image_dir, exist_ok=True)
+			mf.atomic_write(os.path.join(image_dir, STATE_NAME), json.dumps(state, ensure_ascii=False, indent=2).encode('utf-8'))
+		result.elapsed = time.perf_counter() - start
+		return result
+
+	def _load_state(self, image_dir: str) -> dict:
+		try:
+			with open(os.path.join(image_dir, STATE_NAME), encoding='utf-8') as f:
+				state = json.load(f)
+		except (OSError, ValueError):
+			return {}
+		return state if isinstance(state, dict) else {}
+
+
+def export_many(tickers: list[str], exporter: StaticExporter, jobs: int = 4, force: bool = False) -> list[ExportResult]:
+	"""複数銘柄を並行して常駐レンダラへ流す (図の組み立てとファイル入出力をレンダリングと重ねる)。"""
+	tickers = list(dict.fromkeys(tickers))
+	with ThreadPoolExecutor(max_workers=jobs) as pool:
+		results = []
+		for r in pool.map(lambda t: exporter.export_ticker(t, force=force), tickers):
+			status = 'FAILED' if r.error else 'OK'
+			print(f'[{status}] {r.ticker} 出力 {len(r.written)} / スキップ {r.skipped} ({r.elapsed:.2f}s)' + (f' {r.error}' if r.error else ''))
+			results.append(r)
+	return results
+
+
+def main():
+	parser = argparse.ArgumentParser(description='グループ可視化・指標グラフの静的画像 (PNG/SVG) を一括出力')
+	parser.add_argument('tickers', nargs='*', help='ティッカー (例: 7203.T)')
+	parser.add_argument('--tickers-file', help='ティッカー一覧ファイル (1行1銘柄)')
+	parser.add_argument('--all', action='store_true', help='data/ 配下の全銘柄を対象にする')
+	parser.add_argument('--format', choices=FORMATS, default='png', help='画像形式')
+	parser.add_argument('--scale', type=float, default=1.0, help='解像度の倍率')
+	parser.add_argument('--concurrency', type=int, default=2, help='レンダラ (Chromium) の同時描画タブ数')
+	parser.add_argument('--jobs', type=int, default=4, help='図を組み立てて送り込むスレッド数')
+	parser.add_argument('--force', action='store_true', help='元データが変わっていない画像も出力し直す')
+	add_asset_args(parser)
+	instrument.add_instrument_args(parser)
+	args = parser.parse_args()
+	instrument.from_args(args)
+
+	tickers = list(args.tickers)
+	if args.tickers_file:
+		tickers += read_tickers_file(args.tickers_file)
+	if args.all:
+		tickers += list_tickers()
+	if not tickers:
+		parser.error('ティッカーを指定してください (または --tickers-file / --all)')
+
+	start = time.perf_counter()
+	try:
+		with StaticExporter(args.format, args.concurrency, args.scale, assets=options_from_args(args)) as exporter:
+			results = export_many(tickers, exporter, args.jobs, args.force)
+	except ImportError as e:
+		print(e, file=sys.stderr)
+		sys.exit(1)
+	written = sum(len(r.written) for r in results)
+	skipped = sum(r.skipped for r in results)
+	failed = [r for r in results if r.error]
+	print(f'\n画像: 出力 {written} / スキップ {skipped} 枚, 失敗 {len(failed)} 銘柄, 経過 {time.perf_counter() - start:.1f}s')
+	if failed:
+		sys.exit(1)
+
+
+if __name__ == '__main__':
+	main()
@@ -3,38 +3,340 @@ import yfinance as yf
 import pandas as pd
 import os
 import sys
+import time
+import random
+import threading
+from dataclasses import dataclass
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
-def fetch_fundamentals(ticker: str, output_dir: str = 'data'):
-	# ティッカーからyfinanceでデータ取得
-	stock = yf.Ticker(ticker)
-	print(f"Fetching data for {ticker}...")
-	print(stock)
-	# 財務諸表（損益計算書、貸借対照表、キャッシュフロー）取得
-	financials = stock.financials
-	print(financials)
-	balance_sheet = stock.balance_sheet
-	cashflow = stock.cashflow
-	info = stock.info
+import manifest as mf
+import instrument
+import providers
+import quarterly as qt
+import prices as px
+
+# 1銘柄あたりに取得するデータ (属性名, 保存ファイル名)
+STATEMENTS = [
+	('financials', 'financials.csv'),
+	('balance_sheet', 'balance_sheet.csv'),
+	('cashflow', 'cashflow.csv'),
+]
+# 四半期データ (yf.Ticker の属性名, 年次と同じキー)。data/<ticker>/quarterly/ に保存する
+QUARTERLY_STATEMENTS = [
+	('quarterly_financials', 'financials'),
+	('quarterly_balance_sheet', 'balance_sheet'),
+	('quarterly_cashflow', 'cashflow'),
+]
+
+
+class TokenBucket:
+	"""トークンバケット方式のレートリミッタ。複数スレッドから共有して使う。
+
+	rate: 1秒あたりに補充されるトークン数 (= 許容リクエスト数/秒)
+	capacity: バケット容量 (瞬間的に許容するバースト数)
+	"""
+
+	def __init__(self, rate: float, capacity: float | None = None):
+		if rate <= 0:
+			raise ValueError('rate は正の値を指定してください')
+		self.rate = rate
+		self.capacity = capacity if capacity is not None else max(1.0, rate)
+		self._tokens = self.capacity
+		self._updated = time.monotonic()
+		self._lock = threading.Lock()
+
+	def acquire(self, tokens: float = 1.0):
+		# トークンが溜まるまでブロックする (ロックは待機中に保持しない)
+		while True:
+			with self._lock:
+				now = time.monotonic()
+				self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+				self._updated = now
+				if self._tokens >= tokens:
+					self._tokens -= tokens
+					return
+				wait = (tokens - self._tokens) / self.rate
+			time.sleep(wait)
+
+
+@dataclass
+class FetchResult:
+	ticker: str
+	ok: bool
+	attempts: int
+	elapsed: float
+	error: str = ''
+	skipped: bool = False  # マニフェスト上まだ新しいため取得しなかった
+	changed: tuple[str, ...] = ()  # 内容が変わって書き換えたファイル
+
+
+def download_fundamentals(ticker: str, ticker_factory=yf.Ticker, limiter: TokenBucket | None = None,
+		quarterly: bool = False) -> dict:
+	# yfinance へのアクセスは属性参照ごとに HTTP リクエストが発生するため、都度レート制御する
+	# quarterly=True なら四半期の 3 表だけを取得する (キーは年次と同じ financials / balance_sheet / cashflow)
+	with instrument.span('yfinance', ticker, quarterly=quarterly) as sp:
+		stock = ticker_factory(ticker)
+		data = {}
+		for attr, key in QUARTERLY_STATEMENTS if quarterly else [(a, a) for a, _ in STATEMENTS]:
+			if limiter is not None:
+				with instrument.span('rate_limit'):
+					limiter.acquire()
+			data[key] = getattr(stock, attr)
+			sp.count(rows=len(data[key]))
+		if not quarterly:
+			if limiter is not None:
+				with instrument.span('rate_limit'):
+					limiter.acquire()
+			data['info'] = stock.info
+	return data
 
+
+def download_prices(ticker: str, ticker_factory=yf.Ticker, limiter: TokenBucket | None = None,
+		start: str | None = None) -> pd.DataFrame:
+	# 日足 (分割修正のみ・配当/分割つき)。start 省略時は全期間
+	with instrument.span('yfinance', ticker, prices=True) as sp:
+		stock = ticker_factory(ticker)
+		if limiter is not None:
+			with instrument.span('rate_limit'):
+				limiter.acquire()
+		if start:
+			hist = stock.history(start=start, auto_adjust=False, actions=True)
+		else:
+			hist = stock.history(period='max', auto_adjust=False, actions=True)
+		sp.count(rows=len(hist))
+	return hist
+
+
+def _periods(df: pd.DataFrame) -> list[str]:
+	# yfinance の列は決算期末日 (Timestamp)。CSV 上の表記に揃えて日付部分のみ記録
+	return [str(c)[:10] for c in df.columns]
+
+
+def as_saved_frame(df: pd.DataFrame) -> pd.DataFrame:
+	# 保存した CSV を pd.read_csv(index_col=0) で読み直したのと同じ形 (列=日付文字列, 値=float) に揃える
+	out = df.apply(pd.to_numeric, errors='coerce').astype('float64')
+	out.columns = _periods(df)
+	return out
+
+
+def is_fresh(ticker: str, output_dir: str = 'data', quarterly: bool = False, ttl: float | None = None) -> bool:
+	save_dir = qt.quarterly_dir(ticker, output_dir) if quarterly else os.path.join(output_dir, ticker)
+	return mf.is_fresh(mf.load_manifest(save_dir), ttl=ttl)
+
+
+def save_fundamentals(ticker: str, data: dict, output_dir: str = 'data', ttl: float = mf.DEFAULT_TTL) -> list[str]:
+	"""内容が変わったファイルだけを書き換え、manifest.json を更新する。書き換えたファイル名を返す。"""
+	with instrument.span('save_csv', ticker):
+		return _save_fundamentals(ticker, data, output_dir, ttl)
+
+
+def _save_fundamentals(ticker: str, data: dict, output_dir: str, ttl: float) -> list[str]:
 	# 保存先ディレクトリ（output_dir/ティッカー名）を作成
 	save_dir = os.path.join(output_dir, ticker)
 	os.makedirs(save_dir, exist_ok=True)
-	print(f"Saving data to {save_dir}...")
-
+	manifest = mf.load_manifest(save_dir)
+	changed = []
 	# CSV保存（ティッカー名ディレクトリ内に格納）
-	financials.to_csv(os.path.join(save_dir, 'financials.csv'))
-	balance_sheet.to_csv(os.path.join(save_dir, 'balance_sheet.csv'))
-	cashflow.to_csv(os.path.join(save_dir, 'cashflow.csv'))
+	for attr, filename in STATEMENTS:
+		df = data[attr]
+		if mf.write_if_changed(save_dir, filename, df.to_csv().encode('utf-8'), manifest, periods=_periods(df)):
+			changed.append(filename)
 	# infoはdictなのでDataFrame化
-	pd.DataFrame([info]).to_csv(os.path.join(save_dir, 'info.csv'), index=False)
+	info_csv = pd.DataFrame([data['info']]).to_csv(index=False).encode('utf-8')
+	if mf.write_if_changed(save_dir, 'info.csv', info_csv, manifest):
+		changed.append('info.csv')
+	manifest.update({
+		'ticker': ticker,
+		'fetched_at': mf.now_iso(),
+		'fetched_at_epoch': time.time(),
+		'ttl_seconds': ttl,
+	})
+	mf.write_manifest(save_dir, manifest)
+	return changed
+
+
+def fetch_fundamentals(ticker: str, output_dir: str = 'data', ticker_factory=yf.Ticker,
+		ttl: float = mf.DEFAULT_TTL, force: bool = False):
+	if not force and is_fresh(ticker, output_dir, ttl=ttl):
+		print(f"{ticker}のデータはまだ新しいため取得をスキップしました (--force で再取得)。")
+		return
+	# ティッカーからyfinanceでデータ取得
+	print(f"Fetching data for {ticker}...")
+	# 財務諸表（損益計算書、貸借対照表、キャッシュフロー）とinfoを取得
+	data = download_fundamentals(ticker, ticker_factory=ticker_factory)
+	print(data['financials'])
+
+	print(f"Saving data to {os.path.join(output_dir, ticker)}...")
+	changed = save_fundamentals(ticker, data, output_dir, ttl=ttl)
+
+	if changed:
+		print(f"{ticker}の財務データを{output_dir}に保存しました。(更新: {', '.join(changed)})")
+	else:
+		print(f"{ticker}の財務データに変更はありませんでした。")
+
+
+def retry_call(fn, retries: int = 3, backoff: float = 1.0):
+	"""fn() を失敗時にリトライする。(戻り値, 試行回数) を返し、最後の失敗はそのまま送出する。"""
+	for attempt in range(1, retries + 2):
+		try:
+			return fn(), attempt
+		except Exception as e:
+			if attempt > retries:
+				raise
+			# 指数バックオフ + ジッタ (同時リトライの集中を避ける)。取得元が待ち時間を指定したらそれ以上待つ
+			wait = backoff * (2 ** (attempt - 1)) * (1 + random.random())
+			time.sleep(max(wait, getattr(e, 'retry_after', None) or 0))
+
+
+def download_with_retry(ticker: str, ticker_factory=yf.Ticker, limiter: TokenBucket | None = None,
+		retries: int = 3, backoff: float = 1.0, quarterly: bool = False) -> tuple[dict, int]:
+	"""download_fundamentals を失敗時にリトライする。(データ, 試行回数) を返し、最後の失敗はそのまま送出する。"""
+	def download():
+		data = download_fundamentals(ticker, ticker_factory=ticker_factory, limiter=limiter, quarterly=quarterly)
+		# yfinance は失敗時に例外ではなく空の DataFrame を返すことがあるため失敗扱いにする
+		if all(data[attr].empty for attr, _ in STATEMENTS):
+			raise ValueError('財務データが空です')
+		return data
+	return retry_call(download, retries, backoff)
+
+
+def download_prices_with_retry(ticker: str, ticker_factory=yf.Ticker, limiter: TokenBucket | None = None,
+		retries: int = 3, backoff: float = 1.0, start: str | None = None) -> tuple[pd.DataFrame, int]:
+	"""download_prices を失敗時にリトライする。全期間の取得で空なら失敗扱い (追記時は新しい日が無いだけ)。"""
+	def download():
+		hist = download_prices(ticker, ticker_factory, limiter, start)
+		if hist.empty and not start:
+			raise ValueError('株価データが空です')
+		return hist
+	return retry_call(download, retries, backoff)
+
+
+def update_prices(ticker: str, output_dir: str = 'data', ticker_factory=yf.Ticker, limiter: TokenBucket | None = None,
+		retries: int = 3, backoff: float = 1.0, ttl: float = mf.DEFAULT_TTL) -> tuple[list[str], int, int]:
+	"""保存済みの最終日以降の日足を取得して追記する。戻り値: (書き換えたファイル名, 増えた日数, 試行回数)。
+
+	最終日も取り直す (取得時点で取引中だった日の終値を確定値で置き換える)。
+	"""
+	hist, attempts = download_prices_with_retry(ticker, ticker_factory, limiter, retries, backoff, start=px.last_date(ticker, output_dir))
+	changed, added = px.save_prices(ticker, hist, output_dir, ttl=ttl)
+	return changed, added, attempts
+
+
+def _fetch_with_retry(ticker: str, output_dir: str, ticker_factory, limiter: TokenBucket | None,
+		retries: int, backoff: float, ttl: float, force: bool, quarterly: bool = False, prices: bool = False) -> FetchResult:
+	start = time.perf_counter()
+	fresh = px.is_fresh(ticker, output_dir, ttl=ttl) if prices else is_fresh(ticker, output_dir, quarterly, ttl=ttl)
+	if not force and fresh:
+		return FetchResult(ticker, True, 0, 0.0, skipped=True)
+	try:
+		if prices:
+			changed, _, attempts = update_prices(ticker, output_dir, ticker_factory, limiter, retries, backoff, ttl)
+			return FetchResult(ticker, True, attempts, time.perf_counter() - start, changed=tuple(changed))
+		data, attempts = download_with_retry(ticker, ticker_factory, limiter, retries, backoff, quarterly)
+		if quarterly:
+			frames = {key: as_saved_frame(data[key]) for _, key in QUARTERLY_STATEMENTS}
+			changed, _ = qt.save_quarterly(ticker, frames, output_dir, ttl=ttl)
+		else:
+			changed = save_fundamentals(ticker, data, output_dir, ttl=ttl)
+	except Exception as e:
+		return FetchResult(ticker, False, retries + 1, time.perf_counter() - start, f'{type(e).__name__}: {e}')
+	return FetchResult(ticker, True, attempts, time.perf_counter() - start, changed=tuple(changed))
+
+
+def fetch_many(tickers: list[str], output_dir: str = 'data', max_workers: int = 8, rate: float = 2.0,
+		retries: int = 3, backoff: float = 1.0, ticker_factory=yf.Ticker,
+		ttl: float = mf.DEFAULT_TTL, force: bool = False, quarterly: bool = False, prices: bool = False) -> list[FetchResult]:
+	"""複数銘柄をスレッドプールで並列取得し、銘柄ごとの結果を入力順で返す。
+
+	rate は全スレッド合計の 1秒あたりリクエスト数の上限 (1銘柄あたり4リクエスト)。
+	manifest.json の TTL 内の銘柄は force=True でない限りスキップする。
+	quarterly=True なら四半期データを取得し、既存の四半期履歴に新しい四半期を追記する。
+	prices=True なら財務データの代わりに日次株価を取得し、保存済みの最終日以降を追記する (1銘柄あたり1リクエスト)。
+	"""
+	limiter = TokenBucket(rate) if rate else None
+	tickers = list(dict.fromkeys(tickers))  # 重複除去 (順序維持)
+	results = {}
+	total = len(tickers)
+	with ThreadPoolExecutor(max_workers=max_workers) as pool:
+		futures = {
+			pool.submit(_fetch_with_retry, t, output_dir, ticker_factory, limiter, retries, backoff, ttl, force, quarterly, prices): t
+			for t in tickers
+		}
+		for done, fut in enumerate(as_completed(futures), 1):
+			r = fut.result()
+			results[r.ticker] = r
+			if r.skipped:
+				status = 'SKIP (fresh)'
+			elif r.ok:
+				status = 'OK' + ('' if r.changed else ' (変更なし)')
+			else:
+				status = f'NG ({r.error})'
+			print(f"[{done}/{total}] {r.ticker}: {status} {r.elapsed:.1f}s")
+	return [results[t] for t in tickers]
+
+
+def print_summary(results: list[FetchResult]):
+	ok = [r for r in results if r.ok and not r.skipped]
+	skipped = [r for r in results if r.skipped]
+	ng = [r for r in results if not r.ok]
+	unchanged = [r for r in ok if not r.changed]
+	print(f"\n取得結果: 成功 {len(ok)} (うち変更なし {len(unchanged)}) / スキップ {len(skipped)} / 失敗 {len(ng)} / 合計 {len(results)}")
+	retried = [r for r in ok if r.attempts > 1]
+	if retried:
+		print(f"リトライ後に成功: {', '.join(r.ticker for r in retried)}")
+	for r in ng:
+		print(f"  失敗 {r.ticker} (試行{r.attempts}回): {r.error}")
+
+
+def read_tickers_file(path: str) -> list[str]:
+	# 1行1ティッカー。空行と # 以降のコメントは無視
+	tickers = []
+	with open(path, encoding='utf-8') as f:
+		for line in f:
+			t = line.split('#', 1)[0].strip()
+			if t:
+				tickers.append(t)
+	return tickers
 
-	print(f"{ticker}の財務データを{output_dir}に保存しました。")
 
 if __name__ == "__main__":
 	import argparse
 	parser = argparse.ArgumentParser(description="ヤフーファイナンスから財務データを取得してCSV保存")
-	parser.add_argument("ticker", type=str, help="取得したい銘柄のティッカー（例: 7203.T）")
+	parser.add_argument("ticker", type=str, nargs='*', help="取得したい銘柄のティッカー（例: 7203.T）。複数指定可")
 	parser.add_argument("--output_dir", type=str, default="data", help="CSV保存先ディレクトリ")
+	parser.add_argument("--tickers-file", type=str, help="ティッカー一覧ファイル (1行1銘柄) を指定してバッチ取得")
+	parser.add_argument("--workers", type=int, default=8, help="バッチ取得の並列スレッド数")
+	parser.add_argument("--rate", type=float, default=2.0, help="全体のリクエスト上限 (回/秒)")
+	parser.add_argument("--retries", type=int, default=3, help="失敗時のリトライ回数")
+	parser.add_argument("--backoff", type=float, default=1.0, help="リトライ待機の基準秒数 (指数的に増加)")
+	parser.add_argument("--ttl", type=float, default=24, help="取得データの有効期間 (時間)。期間内の銘柄は再取得しない")
+	parser.add_argument("--force", action="store_true", help="鮮度に関わらず再取得する")
+	mode = parser.add_mutually_exclusive_group()
+	mode.add_argument("--quarterly", action="store_true", help="四半期データを取得して data/<ticker>/quarterly/ に追記する")
+	mode.add_argument("--prices", action="store_true", help="日次株価を取得して data/<ticker>/prices/ に追記する")
+	providers.add_provider_args(parser)
+	instrument.add_instrument_args(parser)
 	args = parser.parse_args()
-	fetch_fundamentals(args.ticker, output_dir=args.output_dir)
-    # uv run scripts\yahoo2finance.py 7203.T --output_dir data
\ No newline at end of file
+	instrument.from_args(args)
+	tickers = list(args.ticker)
+	if args.tickers_file:
+		tickers += read_tickers_file(args.tickers_file)
+	if not tickers:
+		parser.error('ティッカーまたは --tickers-file を指定してください')
+	try:
+		ticker_factory = providers.provider_from_args(args)
+	except ValueError as e:
+		parser.error(str(e))
+	if len(tickers) == 1 and not args.tickers_file and not args.quarterly and not args.prices:
+		fetch_fundamentals(tickers[0], output_dir=args.output_dir, ticker_factory=ticker_factory, ttl=args.ttl * 3600, force=args.force)
+	else:
+		results = fetch_many(tickers, output_dir=args.output_dir, max_workers=args.workers, rate=args.rate,
+			retries=args.retries, backoff=args.backoff, ticker_factory=ticker_factory, ttl=args.ttl * 3600, force=args.force,
+			quarterly=args.quarterly, prices=args.prices)
+		print_summary(results)
+		sys.exit(0 if all(r.ok for r in results) else 1)
+    # uv run scripts\yahoo2finance.py 7203.T --output_dir data
+    # uv run scripts\yahoo2finance.py --tickers-file tickers.txt --workers 8 --rate 2
+    # uv run scripts\yahoo2finance.py --tickers-file tickers.txt --quarterly (四半期データを追記)
+    # uv run scripts\yahoo2finance.py --tickers-file tickers.txt --prices (日次株価を追記)
+    # uv run scripts\yahoo2finance.py --tickers-file tickers.txt --provider synthetic --latency 0.2 --error-rate 0.1 (オフライン負荷試験)
@@ -0,0 +1,115 @@
+"""
+alldata2analysisdata.update_analysis の指標の選択計算 (names / --metrics) と、
+入力の内容ハッシュによる差分再計算 (変わった表に依存する指標だけ) を確かめる。
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import metrics as mx
+
+import alldata2analysisdata as ad
+
+PERIODS = ['2024-03-31', '2023-03-31', '2022-03-31']
+STATEMENTS = {
+	'financials.csv': {
+		'Total Revenue': [1200.0, 1000.0, 900.0],
+		'Operating Income': [150.0, 120.0, 100.0],
+		'Net Income': [90.0, 80.0, 60.0],
+		'Interest Expense': [-5.0, -4.0, -4.0],
+	},
+	'balance_sheet.csv': {
+		'Total Assets': [5000.0, 4800.0, 4500.0],
+		'Stockholders Equity': [2000.0, 1900.0, 1800.0],
+		'Current Assets': [1500.0, 1400.0, 1300.0],
+		'Current Liabilities': [1000.0, 950.0, 900.0],
+	},
+	'cashflow.csv': {
+		'Operating Cash Flow': [200.0, 180.0, 150.0],
+		'Free Cash Flow': [80.0, 70.0, 50.0],
+	},
+}
+SUMMARY = os.path.join('data', 'AAA.T', 'financial_analysis_summary.csv')
+
+
+def _write(symbol: str, filename: str, items: dict[str, list[float]]):
+	pd.DataFrame(items, index=PERIODS).T.to_csv(os.path.join('data', symbol, filename))
+
+
+@pytest.fixture
+def symbol(tmp_path, monkeypatch):
+	# update_analysis は data/<symbol>/ を相対パスで読むため、一時ディレクトリに移って作る
+	monkeypatch.chdir(tmp_path)
+	os.makedirs(os.path.join('data', 'AAA.T'))
+	for filename, items in STATEMENTS.items():
+		_write('AAA.T', filename, items)
+	return 'AAA.T'
+
+
+def test_selected_metrics_read_only_needed_statements(symbol):
+	analysis, recompute = ad.update_analysis(symbol, names=['ROE(%)'])
+	assert recompute == ['ROE(%)']
+	assert list(analysis.columns) == ['ROE(%)']
+	assert analysis['ROE(%)'].tolist() == pytest.approx([4.5, 4.21, 3.33])
+
+
+def test_subset_run_keeps_other_columns(symbol):
+	full, _ = ad.update_analysis(symbol)
+	analysis, recompute = ad.update_analysis(symbol, names=['ROE(%)'])
+	assert recompute == []
+	pd.testing.assert_frame_equal(analysis, full)
+	pd.testing.assert_frame_equal(pd.read_csv(SUMMARY, index_col=0), full)
+
+	# 入力が変わったら、要求外の列も古い値のまま残さず計算し直す
+	_write(symbol, 'cashflow.csv', {**STATEMENTS['cashflow.csv'], 'Operating Cash Flow': [240.0, 180.0, 150.0]})
+	analysis, recompute = ad.update_analysis(symbol, names=['ROE(%)'])
+	assert '営業CFマージン(%)' in recompute and 'ROE(%)' not in recompute
+	assert list(analysis.columns) == list(full.columns)
+	assert analysis.loc['2024-03-31', '営業CFマージン(%)'] == 20.0
+	pd.testing.assert_frame_equal(ad.update_analysis(symbol, force=True)[0], analysis)
+
+
+def test_main_reports_skip_only_when_not_written(symbol, monkeypatch, capsys):
+	def run(*argv):
+		monkeypatch.setattr(sys, 'argv', ['alldata2analysisdata.py', symbol, *argv])
+		ad.main()
+		return capsys.readouterr().out
+
+	assert '再計算をスキップしました' not in run('--metrics', 'ROE(%)')
+	assert '再計算をスキップしました' in run('--metrics', 'ROE(%)')
+	# 再計算する指標は無いが列が増えるので書き換える
+	out = run()
+	assert '再計算をスキップしました' not in out and '保存しました' in out
+	assert list(pd.read_csv(SUMMARY, index_col=0).columns) == list(ad.update_analysis(symbol, force=True)[0].columns)
+
+
+def test_unchanged_inputs_skip_recompute(symbol):
+	ad.update_analysis(symbol)
+	mtime = os.stat(SUMMARY).st_mtime_ns
+	analysis, recompute = ad.update_analysis(symbol)
+	assert recompute == []
+	assert os.stat(SUMMARY).st_mtime_ns == mtime
+
+
+def test_cashflow_change_recomputes_dependent_metrics_only(symbol):
+	ad.update_analysis(symbol)
+	_write(symbol, 'cashflow.csv', {**STATEMENTS['cashflow.csv'], 'Operating Cash Flow': [240.0, 180.0, 150.0]})
+	analysis, recompute = ad.update_analysis(symbol)
+	assert recompute and all(mx.statements_of(n) & {'cashflow'} for n in recompute)
+	assert analysis.loc['2024-03-31', '営業CFマージン(%)'] == 20.0
+
+	full, _ = ad.update_analysis(symbol, force=True)
+	pd.testing.assert_frame_equal(analysis, full)
+	assert not np.isnan(analysis.loc['2024-03-31', 'ROE(%)'])
+
+
+def test_financials_change_recomputes_everything(symbol):
+	ad.update_analysis(symbol)
+	_write(symbol, 'financials.csv', {**STATEMENTS['financials.csv'], 'Net Income': [100.0, 80.0, 60.0]})
+	analysis, recompute = ad.update_analysis(symbol)
+	assert recompute == mx.metric_names()
+	assert analysis.loc['2024-03-31', 'ROE(%)'] == 5.0
@@ -0,0 +1,64 @@
+"""
+列指向ストア (columnar_store) の CSV ⇔ ストアの往復、銘柄の差し替え、項目の絞り込みを確かめる。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar_store as cs
+
+pytest.importorskip('pyarrow')
+
+
+def _frame(scale: float) -> pd.DataFrame:
+	return pd.DataFrame({
+		'2024-03-31': [1200.0 * scale, 90.0 * scale, np.nan],
+		'2023-03-31': [1000.0 * scale, -80.5 * scale, 3.25],
+		'2022-03-31': [900.0 * scale, 60.0 * scale, 1e-9],
+	}, index=['Total Revenue', 'Net Income', 'Interest Expense'])
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+	d = tmp_path / 'data'
+	for i, t in enumerate(['AAA.T', 'BBB.T']):
+		os.makedirs(d / t)
+		for filename in cs.STATEMENT_FILES.values():
+			_frame(i + 1).to_csv(d / t / filename)
+	return d
+
+
+def test_csv_round_trip(data_dir, tmp_path):
+	store = str(tmp_path / 'store')
+	assert cs.import_csv_tree(str(data_dir), store) == 2
+	assert cs.export_csv_tree(store, str(tmp_path / 'out')) == 2
+	for t in ('AAA.T', 'BBB.T'):
+		for name, filename in cs.STATEMENT_FILES.items():
+			original = pd.read_csv(data_dir / t / filename, index_col=0)
+			pd.testing.assert_frame_equal(cs.read_statement_frame(t, name, store_root=store), original)
+			assert (tmp_path / 'out' / t / filename).read_bytes() == (data_dir / t / filename).read_bytes()
+
+
+def test_replace_ticker_and_filter_items(data_dir, tmp_path):
+	root = str(tmp_path / 'store')
+	cs.import_csv_tree(str(data_dir), root)
+	store = cs.ColumnarStore(root)
+	extra = pd.concat([_frame(10), pd.DataFrame({c: [7.0] for c in _frame(1).columns}, index=['EBITDA'])])
+	store.write_statement('financials', {'BBB.T': extra})
+	assert store.tickers('financials') == ['AAA.T', 'BBB.T']
+	pd.testing.assert_frame_equal(store.read_wide('BBB.T', 'financials'), extra)
+	pd.testing.assert_frame_equal(store.read_wide('AAA.T', 'financials'), pd.read_csv(data_dir / 'AAA.T' / 'financials.csv', index_col=0))
+
+	table = store.read('financials', tickers=['BBB.T', 'ZZZ.T'], items=['EBITDA', 'No Such Item'])
+	assert table.num_rows == 3
+	assert set(table.column('item').to_pylist()) == {'EBITDA'}
+	with pytest.raises(FileNotFoundError):
+		store.read_wide('ZZZ.T', 'financials')
+
+
+def test_store_rejects_quarterly(data_dir, tmp_path):
+	with pytest.raises(ValueError):
+		cs.read_statement_frame('AAA.T', 'financials', store_root=str(tmp_path / 'store'), quarterly=True)
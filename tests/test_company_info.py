@@ -0,0 +1,121 @@
+"""
+company_info.CompanyInfo の列の型推定と、差分更新 (update) が作り直し (build) と同じ値を返すことを確かめる。
+分類列の辞書は update では末尾に足すだけなので、符号ではなく値で比べる。
+"""
+
+import os
+import csv
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import company_info as ci
+
+SECTORS = ['Technology', 'Energy', 'Industrials']
+
+
+def _write(data_dir, symbol: str, i: int, **extra):
+	row = {
+		'symbol': symbol, 'shortName': f'Company {i}', 'sector': SECTORS[i % len(SECTORS)],
+		'industry': f'{SECTORS[i % len(SECTORS)]} {i % 2}', 'fullTimeEmployees': str(1000 + i),
+		'marketCap': str(10 ** 12 + i), 'beta': f'{0.5 + i / 100:g}', 'isEsgPopulated': str(i % 2 == 0),
+		'tradeable': 'False', 'quoteSourceName': ['Delayed Quote', 'Nasdaq Real Time Price'][i % 2],
+	}
+	row.update(extra)
+	row = {k: v for k, v in row.items() if v is not None}
+	os.makedirs(os.path.join(data_dir, symbol), exist_ok=True)
+	with open(ci.info_path(symbol, data_dir), 'w', newline='', encoding='utf-8') as f:
+		w = csv.writer(f)
+		w.writerow(row)
+		w.writerow(row.values())
+	# 同じ時刻に書き直しても差分として拾われるように mtime をずらす
+	st = os.stat(ci.info_path(symbol, data_dir))
+	os.utime(ci.info_path(symbol, data_dir), ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+
+
+@pytest.mark.parametrize('name, values, kind', [
+	('sector', ['Energy'], 'category'),
+	('shortName', ['A', 'A', 'A'], 'text'),
+	('beta', [], 'text'),
+	('isEsgPopulated', ['True', 'False'], 'bool'),
+	('fullTimeEmployees', ['1000', '-5', '+7'], 'int'),
+	('marketCap', ['1', str(2 ** 53 + 1)], 'float'),
+	('beta', ['0.5', '1', '1e-3'], 'float'),
+	('quoteSourceName', ['Delayed Quote'] * 3 + ['Real Time'], 'category'),
+	('uuid', ['a', 'b', 'c', 'd'], 'text'),
+])
+def test_infer_kind(name, values, kind):
+	assert ci.infer_kind(name, values) == kind
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+	for i in range(20):
+		_write(str(tmp_path / 'data'), f'{1000 + i}.T', i)
+	return str(tmp_path / 'data')
+
+
+def test_build_types(tmp_path, data_dir):
+	table = ci.CompanyInfo(str(tmp_path / 'table'), data_dir)
+	assert table.build() == 20
+	assert table.kinds['fullTimeEmployees'] == 'int' and table.kinds['isEsgPopulated'] == 'bool'
+	assert table.kinds['beta'] == 'float' and table.kinds['quoteSourceName'] == 'category'
+	frame = table.frame()
+	assert str(frame['fullTimeEmployees'].dtype) == 'Int64'
+	assert str(frame['isEsgPopulated'].dtype) == 'boolean'
+	assert isinstance(frame['sector'].dtype, pd.CategoricalDtype)
+	assert table.get('1003.T', 'marketCap') == 10 ** 12 + 3
+	assert table.get('1003.T', 'isEsgPopulated') is False
+	assert table.name('1003.T') == 'Company 3'
+	assert table.peers('1003.T', 'sector') == [f'{1000 + i}.T' for i in range(0, 20, 3) if i != 3]
+
+
+def _assert_same(table: ci.CompanyInfo, fresh: ci.CompanyInfo):
+	assert sorted(table.tickers) == sorted(fresh.tickers)
+	for t in fresh.tickers:
+		assert table.row(t) == fresh.row(t), t
+	for column in ('sector', 'industry'):
+		for value in fresh.categories[column]:
+			assert sorted(table.members(column, value)) == sorted(fresh.members(column, value))
+	got, want = table.frame().sort_index(), fresh.frame().sort_index()
+	assert dict(got.dtypes.astype(str)) == dict(want.dtypes.astype(str))
+	pd.testing.assert_frame_equal(got.astype(object), want.astype(object))
+
+
+def test_update_matches_build(tmp_path, data_dir):
+	table = ci.CompanyInfo(str(tmp_path / 'table'), data_dir)
+	table.build()
+	# 値と分類が変わる銘柄・新しい分類値・欠損になる列・新しい銘柄
+	_write(data_dir, '1002.T', 2, sector='Utilities', beta='1.25')
+	_write(data_dir, '1005.T', 5, fullTimeEmployees=None)
+	_write(data_dir, '9000.T', 9)
+	updated, rebuilt = table.update()
+	assert updated == ['1002.T', '1005.T', '9000.T'] and not rebuilt
+	assert table.get('1005.T', 'fullTimeEmployees') is None
+
+	reopened = ci.CompanyInfo(str(tmp_path / 'table'), data_dir)
+	assert reopened.load()
+	fresh = ci.CompanyInfo(str(tmp_path / 'fresh'), data_dir)
+	fresh.build()
+	_assert_same(reopened, fresh)
+
+
+def test_update_rebuilds_on_misfit_and_removal(tmp_path, data_dir):
+	table = ci.CompanyInfo(str(tmp_path / 'table'), data_dir)
+	table.build()
+	assert table.update() == ([], False)
+
+	_write(data_dir, '1001.T', 1, fullTimeEmployees='1.5')  # 整数列に実数
+	updated, rebuilt = table.update(['1001.T'])
+	assert updated == ['1001.T'] and rebuilt
+	assert table.kinds['fullTimeEmployees'] == 'float'
+
+	os.remove(ci.info_path('1004.T', data_dir))
+	updated, rebuilt = table.update()
+	assert updated == ['1004.T'] and rebuilt and '1004.T' not in table
+
+	fresh = ci.CompanyInfo(str(tmp_path / 'fresh'), data_dir)
+	fresh.build()
+	_assert_same(table, fresh)
+	assert np.isclose(table.get('1001.T', 'fullTimeEmployees'), 1.5)
@@ -0,0 +1,126 @@
+"""
+yahoo2finance.fetch_many をスタブの取得元 (ticker_factory) で動かし、リトライ・バックオフ・失敗の集計・
+保存される CSV と manifest.json の形を確かめる (ネットワークには出ない)。
+"""
+
+import os
+import json
+
+import pandas as pd
+import pytest
+
+import manifest as mf
+import yahoo2finance as y2f
+
+PERIODS = pd.to_datetime(['2024-03-31', '2023-03-31'])
+
+
+def _statement(items: dict[str, list[float]]) -> pd.DataFrame:
+	return pd.DataFrame(items, index=PERIODS).T
+
+
+class StubTicker:
+	"""yf.Ticker の代わり。failures[symbol] 回までは financials の参照で例外を出し、その後は固定の財務データを返す。"""
+
+	def __init__(self, symbol: str, failures: dict[str, int], calls: dict[str, int]):
+		self.symbol = symbol
+		self._failures = failures
+		self._calls = calls
+
+	def _check(self):
+		self._calls[self.symbol] = self._calls.get(self.symbol, 0) + 1
+		if self._failures.get(self.symbol, 0) > 0:
+			self._failures[self.symbol] -= 1
+			raise ConnectionError(f'{self.symbol}: 一時的なエラー')
+
+	@property
+	def financials(self):
+		self._check()
+		return _statement({'Total Revenue': [120.0, 100.0], 'Net Income': [12.0, 10.0]})
+
+	@property
+	def balance_sheet(self):
+		return _statement({'Total Assets': [500.0, 450.0], 'Stockholders Equity': [200.0, 180.0]})
+
+	@property
+	def cashflow(self):
+		return _statement({'Operating Cash Flow': [30.0, 25.0]})
+
+	@property
+	def info(self):
+		return {'symbol': self.symbol, 'shortName': f'Stub {self.symbol}', 'sector': 'Technology'}
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+	# バックオフの待ちを記録するだけにする (ジッタは 0 に固定)
+	waits = []
+	monkeypatch.setattr(y2f.time, 'sleep', waits.append)
+	monkeypatch.setattr(y2f.random, 'random', lambda: 0.0)
+	return waits
+
+
+def _factory(failures: dict[str, int], calls: dict[str, int]):
+	return lambda symbol: StubTicker(symbol, failures, calls)
+
+
+def test_retry_with_exponential_backoff(tmp_path, sleeps):
+	calls = {}
+	results = y2f.fetch_many(['AAA.T'], str(tmp_path), max_workers=1, rate=0, retries=3, backoff=0.5,
+		ticker_factory=_factory({'AAA.T': 2}, calls))
+	r = results[0]
+	assert r.ok and not r.skipped
+	assert r.attempts == 3
+	assert calls['AAA.T'] == 3
+	assert sleeps == [0.5, 1.0]  # backoff × 2^(試行-1)
+
+
+def test_failure_summary(tmp_path, sleeps, capsys):
+	calls = {}
+	results = y2f.fetch_many(['OK.T', 'NG.T'], str(tmp_path), max_workers=2, rate=0, retries=1, backoff=1.0,
+		ticker_factory=_factory({'NG.T': 99}, calls))
+	assert [r.ticker for r in results] == ['OK.T', 'NG.T']  # 入力順
+	ok, ng = results
+	assert ok.ok and ok.attempts == 1
+	assert not ng.ok and ng.attempts == 2 and calls['NG.T'] == 2
+	assert ng.error.startswith('ConnectionError')
+	assert not os.path.exists(tmp_path / 'NG.T' / 'financials.csv')
+	capsys.readouterr()
+	y2f.print_summary(results)
+	out = capsys.readouterr().out
+	assert '成功 1' in out and '失敗 1' in out and '合計 2' in out
+	assert '失敗 NG.T (試行2回): ConnectionError' in out
+
+
+def test_csv_and_manifest_layout(tmp_path, sleeps):
+	calls = {}
+	y2f.fetch_many(['AAA.T'], str(tmp_path), max_workers=1, rate=0, ticker_factory=_factory({}, calls), ttl=3600)
+	save_dir = tmp_path / 'AAA.T'
+	assert sorted(os.listdir(save_dir)) == ['balance_sheet.csv', 'cashflow.csv', 'financials.csv', 'info.csv', 'manifest.json']
+	fin = pd.read_csv(save_dir / 'financials.csv', index_col=0)
+	assert list(fin.columns) == ['2024-03-31', '2023-03-31']
+	assert fin.loc['Total Revenue'].tolist() == [120.0, 100.0]
+	info = pd.read_csv(save_dir / 'info.csv')
+	assert len(info) == 1 and info.loc[0, 'shortName'] == 'Stub AAA.T'
+
+	with open(save_dir / 'manifest.json', encoding='utf-8') as f:
+		manifest = json.load(f)
+	assert manifest['ticker'] == 'AAA.T' and manifest['ttl_seconds'] == 3600
+	assert set(manifest['files']) == {'financials.csv', 'balance_sheet.csv', 'cashflow.csv', 'info.csv'}
+	for name, entry in manifest['files'].items():
+		assert entry['sha256'] == mf.file_sha256(save_dir / name)
+	assert manifest['files']['financials.csv']['periods'] == ['2024-03-31', '2023-03-31']
+
+	# TTL 内の再実行は取得しない
+	again = y2f.fetch_many(['AAA.T'], str(tmp_path), max_workers=1, rate=0, ticker_factory=_factory({}, calls), ttl=3600)
+	assert again[0].skipped and calls['AAA.T'] == 1
+
+
+def test_ttl_of_this_run_overrides_stored_ttl(tmp_path, sleeps):
+	calls = {}
+	y2f.fetch_many(['AAA.T'], str(tmp_path), max_workers=1, rate=0, ticker_factory=_factory({}, calls), ttl=3600)
+	# 保存時の ttl_seconds ではなく、今回の実行の ttl で鮮度を判定する
+	assert y2f.is_fresh('AAA.T', str(tmp_path))
+	assert not y2f.is_fresh('AAA.T', str(tmp_path), ttl=0)
+	again = y2f.fetch_many(['AAA.T'], str(tmp_path), max_workers=1, rate=0, ticker_factory=_factory({}, calls), ttl=0)
+	assert not again[0].skipped and calls['AAA.T'] == 2
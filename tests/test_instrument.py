@@ -0,0 +1,30 @@
+"""
+instrument.span が計測の有無にかかわらず同じように使えることを確かめる。
+"""
+
+import instrument
+
+
+def test_span_fields_without_recorder(monkeypatch):
+	monkeypatch.setattr(instrument, '_recorder', None)
+	with instrument.span('stage', 'AAA.T') as sp:
+		sp.count(rows=3)
+		sp.fields['result'] = 'ran'
+	assert not instrument.enabled()
+	with instrument.span('stage') as sp:
+		assert sp.fields == {}
+
+
+def test_span_fields_are_recorded(monkeypatch):
+	monkeypatch.setattr(instrument, '_recorder', None)
+	rec = instrument.configure()
+	try:
+		start = len(instrument.take_events())
+		with instrument.span('stage', 'AAA.T', kind='x') as sp:
+			sp.count(rows=3)
+			sp.fields['result'] = 'ran'
+		event = instrument.take_events(start)[-1]
+		assert (event['name'], event['ticker'], event['rows'], event['kind'], event['result']) == ('stage', 'AAA.T', 3, 'x', 'ran')
+	finally:
+		rec.close()
+		monkeypatch.setattr(instrument, '_recorder', None)
@@ -0,0 +1,144 @@
+"""
+jobqueue.JobQueue の取り出し (依存・排他ステージ)・リースの期限切れと取り直し・再試行・blocked の扱いを、
+時計を差し替えて確かめる (ワーカーやパイプラインは動かさない)。
+"""
+
+import pytest
+
+import jobqueue as jq
+import pipeline
+
+
+class Clock:
+	def __init__(self):
+		self.now = 1_000_000.0
+
+	def time(self) -> float:
+		return self.now
+
+	def sleep(self, seconds: float):
+		self.now += seconds
+
+
+def _stages() -> list[pipeline.Stage]:
+	noop = lambda ticker, inputs: None
+	return [
+		pipeline.Stage('fetch', noop),
+		pipeline.Stage('analyze', noop, deps=('fetch',)),
+		pipeline.Stage('peers', noop, deps=('analyze',)),
+	]
+
+
+CONFIG = dict.fromkeys(jq.CONFIG_KEYS, True)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+	c = Clock()
+	monkeypatch.setattr(jq, 'time', c)
+	return c
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+	q = jq.JobQueue(str(tmp_path / 'jobqueue.sqlite'))
+	yield q
+	q.close()
+
+
+def _finish(queue: jq.JobQueue, owner: str, n: int) -> list[tuple[str, str]]:
+	done = []
+	for _ in range(n):
+		task = queue.claim(owner)
+		assert queue.complete(task, owner, 'ran', 0.1)
+		done.append((task.ticker, task.stage))
+	return done
+
+
+def test_enqueue_is_idempotent_and_reset(queue):
+	assert queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG) == 6
+	assert queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG) == 0
+	assert queue.stage_order() == ['fetch', 'analyze', 'peers']
+	_finish(queue, 'w1', 2)
+	assert queue.enqueue(['A.T'], _stages(), CONFIG, names=['fetch'], reset=True) == 1
+
+
+def test_claim_follows_dependencies(queue):
+	queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG)
+	first = queue.claim('w1')
+	assert (first.ticker, first.stage, first.attempt) == ('A.T', 'fetch', 1)
+	second = queue.claim('w1')
+	assert (second.ticker, second.stage) == ('B.T', 'fetch')
+	assert queue.claim('w1') is None  # analyze は fetch が済むまで取り出さない
+	assert queue.complete(second, 'w1', 'ran', 0.1)
+	third = queue.claim('w1')
+	assert (third.ticker, third.stage) == ('B.T', 'analyze')
+
+
+def test_exclusive_stage_runs_once_across_workers(queue):
+	queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG, names=['fetch', 'analyze'])
+	_finish(queue, 'w1', 4)
+	assert queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG, names=['peers']) == 2
+	peers = queue.claim('w1')
+	assert peers.stage == 'peers'
+	assert queue.claim('w2') is None  # もう 1 銘柄の peers は w1 が終わるまで待つ
+	assert queue.complete(peers, 'w1', 'ran', 0.1)
+	assert queue.claim('w2').stage == 'peers'
+
+
+def test_expired_lease_is_reclaimed(queue, clock):
+	queue.enqueue(['A.T'], _stages(), CONFIG, names=['fetch'])
+	task = queue.claim('w1', lease=60)
+	clock.sleep(40)
+	assert queue.renew('w1', lease=60) == 1
+	clock.sleep(40)
+	assert queue.claim('w2', lease=60) is None  # 延長したリースはまだ有効
+	clock.sleep(30)
+	again = queue.claim('w2', lease=60)
+	assert (again.id, again.attempt) == (task.id, 2)
+	assert not queue.complete(task, 'w1', 'ran', 1.0)  # リースを失ったワーカーの結果は捨てる
+	assert queue.fail(task, 'w1', 'err', 1.0) == 'lost'
+	assert queue.complete(again, 'w2', 'ran', 1.0)
+
+
+def test_lease_expiry_counts_as_attempt(queue, clock):
+	queue.enqueue(['A.T'], _stages(), CONFIG, names=['fetch'], max_attempts=2)
+	for owner in ('w1', 'w2'):
+		assert queue.claim(owner, lease=10) is not None
+		clock.sleep(20)
+	assert queue.claim('w3') is None
+	assert queue.snapshot()['failed'][0]['error'].startswith('リースの期限切れ')
+
+
+def test_release_does_not_count_attempt(queue):
+	queue.enqueue(['A.T'], _stages(), CONFIG, names=['fetch'])
+	queue.claim('w1')
+	assert queue.release('w1') == 1
+	assert queue.claim('w2').attempt == 1
+
+
+def test_retry_backoff_failed_and_blocked(queue, clock):
+	queue.enqueue(['A.T', 'B.T'], _stages(), CONFIG, max_attempts=2)
+	task = queue.claim('w1')
+	assert queue.fail(task, 'w1', 'ConnectionError', 0.5, backoff=30) == 'pending'
+	other = queue.claim('w1')
+	assert other.ticker == 'B.T'  # A.T は再試行の待ち
+	assert queue.complete(other, 'w1', 'ran', 0.1)
+	_finish(queue, 'w1', 2)  # B.T の analyze と peers
+	assert queue.claim('w1') is None
+	clock.sleep(31)
+	task = queue.claim('w1')
+	assert (task.ticker, task.attempt) == ('A.T', 2)
+	assert queue.fail(task, 'w1', 'ConnectionError', 0.5, backoff=30) == 'failed'
+
+	snap = queue.snapshot()
+	assert snap['stages']['fetch']['failed'] == 1
+	assert snap['stages']['analyze']['blocked'] == 1 and snap['stages']['peers']['blocked'] == 1
+	assert queue.outstanding() == 0
+	assert queue.try_finalize()
+	assert not queue.try_finalize()  # 同じ状態に対しては 1 回だけ
+
+	assert queue.retry(['A.T']) == 1
+	task = queue.claim('w1')
+	assert (task.ticker, task.stage, task.attempt) == ('A.T', 'fetch', 1)
+	assert queue.snapshot()['stages']['analyze']['blocked'] == 0
@@ -0,0 +1,94 @@
+"""
+peer_stats.PeerStats の差分更新 (update) が、同じデータから作り直した (build) 統計と同じ中央値・
+パーセンタイル・z スコアになることを確かめる。z スコアは件数・合計・二乗和の差分更新なので誤差の範囲で比べる。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import peer_stats as ps
+
+SECTORS = ['Technology', 'Energy', 'Consumer Cyclical']
+TICKERS = [f'T{i:03d}.T' for i in range(30)]
+YEARS = ['2024-03-31', '2023-03-31', '2022-03-31', '2021-03-31']
+
+
+def _write(data_dir, symbol: str, seed: int):
+	rng = np.random.default_rng(seed)
+	os.makedirs(os.path.join(data_dir, symbol), exist_ok=True)
+	pd.DataFrame({'ROE(%)': rng.normal(8, 3, len(YEARS)), '営業利益率(%)': rng.normal(10, 4, len(YEARS))},
+		index=YEARS).to_csv(ps.summary_path(symbol, data_dir))
+	sector = SECTORS[seed % len(SECTORS)]
+	pd.DataFrame([{'symbol': symbol, 'sector': sector, 'industry': f'{sector} {seed % 2}'}]).to_csv(
+		ps.info_path(symbol, data_dir), index=False)
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+	for i, t in enumerate(TICKERS):
+		_write(str(tmp_path / 'data'), t, i)
+	return str(tmp_path / 'data')
+
+
+def _assert_same(stats: ps.PeerStats, fresh: ps.PeerStats, tickers: list[str]):
+	assert stats.tickers == fresh.tickers
+	key = ['level', 'group', 'year']
+	pd.testing.assert_frame_equal(
+		stats.group_stats().sort_values(key).reset_index(drop=True),
+		fresh.group_stats().sort_values(key).reset_index(drop=True), check_dtype=False)
+	for t in tickers:
+		x, y = stats.peer_series(t), fresh.peer_series(t)
+		assert x.sector == y.sector
+		pd.testing.assert_frame_equal(x.median, y.median)
+		pd.testing.assert_frame_equal(x.pct, y.pct)
+		pd.testing.assert_frame_equal(x.z, y.z, rtol=1e-9, atol=1e-9)
+	pd.testing.assert_frame_equal(stats.ranks().reset_index(drop=True), fresh.ranks().reset_index(drop=True),
+		check_dtype=False, rtol=1e-9)
+
+
+def _fresh(tmp_path, data_dir) -> ps.PeerStats:
+	fresh = ps.PeerStats(str(tmp_path / 'fresh'), data_dir)
+	fresh.build()
+	return fresh
+
+
+def test_update_matches_build(tmp_path, data_dir):
+	stats = ps.PeerStats(str(tmp_path / 'peer'), data_dir)
+	stats.build()
+	# 値だけ変わる銘柄・セクター/業種も変わる銘柄・新しい銘柄・消えた銘柄
+	_write(data_dir, TICKERS[0], 300)
+	_write(data_dir, TICKERS[4], 101)
+	_write(data_dir, 'NEW.T', 7)
+	os.remove(ps.summary_path(TICKERS[9], data_dir))
+	changed = [TICKERS[0], TICKERS[4], 'NEW.T', TICKERS[9]]
+	assert stats.update(changed + [TICKERS[1]]) == sorted(changed)
+	assert TICKERS[9] not in stats.tickers
+
+	tickers = [t for t in TICKERS if t != TICKERS[9]] + ['NEW.T']
+	_assert_same(stats, _fresh(tmp_path, data_dir), tickers)
+	# 保存した状態を別インスタンスで開いても同じ
+	reopened = ps.PeerStats(str(tmp_path / 'peer'), data_dir)
+	assert reopened.load()
+	_assert_same(reopened, _fresh(tmp_path, data_dir), tickers[:5])
+
+
+def test_update_skips_unchanged(tmp_path, data_dir):
+	stats = ps.PeerStats(str(tmp_path / 'peer'), data_dir)
+	stats.build()
+	assert stats.is_current(TICKERS[0])
+	assert stats.update(TICKERS[:3]) == []
+
+
+def test_update_by_another_instance_is_seen(tmp_path, data_dir):
+	stats = ps.PeerStats(str(tmp_path / 'peer'), data_dir)
+	stats.build()
+	before = stats.peer_series(TICKERS[1]).digest()
+	other = ps.PeerStats(str(tmp_path / 'peer'), data_dir)
+	_write(data_dir, TICKERS[4], 555)
+	assert other.update([TICKERS[4]]) == [TICKERS[4]]
+	after = stats.peer_series(TICKERS[1]).digest()
+	assert after != before
+	assert after == other.peer_series(TICKERS[1]).digest()
@@ -0,0 +1,123 @@
+"""
+pipeline.Pipeline のスキップ判定 (入力フィンガープリント・出力ファイル・version・fresh) と、
+スキップしたステージの値を後続が必要としたときだけ読み込むこと、失敗時の blocked を確かめる。
+"""
+
+import os
+
+import pytest
+
+import pipeline
+
+
+class Stages:
+	"""fetch → analyze → portal の 3 ステージ。run / load の呼び出しを記録する。"""
+
+	def __init__(self, data_dir, fetched: bool = True, analyze_version: str = '1', fail: str = ''):
+		self.data_dir = str(data_dir)
+		self.fetched = fetched
+		self.analyze_version = analyze_version
+		self.fail = fail
+		self.calls = []
+
+	def _path(self, ticker: str, name: str) -> str:
+		return os.path.join(self.data_dir, ticker, name)
+
+	def _write(self, ticker: str, name: str, text: str):
+		os.makedirs(os.path.join(self.data_dir, ticker), exist_ok=True)
+		with open(self._path(ticker, name), 'w', encoding='utf-8') as f:
+			f.write(text)
+
+	def _read(self, ticker: str, name: str) -> str:
+		with open(self._path(ticker, name), encoding='utf-8') as f:
+			return f.read()
+
+	def _run(self, name: str, ticker: str, inputs):
+		self.calls.append(('run', name, ticker))
+		if name == self.fail:
+			raise RuntimeError(f'{name} が失敗')
+		if name == 'fetch':
+			return self._read(ticker, 'raw.txt')
+		if name == 'analyze':
+			value = inputs['fetch'].upper()
+			self._write(ticker, 'analysis.txt', value)
+			return value
+		if name == 'portal':
+			self._write(ticker, 'portal.html', f'<p>{inputs["analyze"]}</p>')
+
+	def _load(self, name: str, ticker: str):
+		self.calls.append(('load', name, ticker))
+		return self._read(ticker, {'fetch': 'raw.txt', 'analyze': 'analysis.txt'}[name])
+
+	def build(self) -> list[pipeline.Stage]:
+		return [
+			pipeline.Stage('fetch', lambda t, i: self._run('fetch', t, i), load=lambda t: self._load('fetch', t),
+				fresh=lambda t: self.fetched, fingerprint=lambda t: self._read(t, 'raw.txt')),
+			pipeline.Stage('analyze', lambda t, i: self._run('analyze', t, i), deps=('fetch',),
+				load=lambda t: self._load('analyze', t), outputs=('analysis.txt',), version=self.analyze_version),
+			pipeline.Stage('portal', lambda t, i: self._run('portal', t, i), deps=('analyze',), outputs=('portal.html',)),
+		]
+
+	def run(self, tickers=('A.T',), force: bool = False) -> dict[tuple[str, str], str]:
+		self.calls.clear()
+		results = pipeline.Pipeline(self.build(), self.data_dir, jobs=2, force=force).run(list(tickers))
+		return {(r.ticker, r.stage): r.status for r in results}
+
+
+@pytest.fixture
+def stages(tmp_path, capsys):
+	s = Stages(tmp_path)
+	for t in ('A.T', 'B.T'):
+		s._write(t, 'raw.txt', f'raw {t}')
+	assert set(s.run(['A.T', 'B.T']).values()) == {'skipped', 'ran'}  # fetch は fresh なのでスキップ
+	return s
+
+
+def test_second_run_skips_without_loading(stages):
+	assert stages.run(['A.T', 'B.T']) == {(t, n): 'skipped' for t in ('A.T', 'B.T') for n in ('fetch', 'analyze', 'portal')}
+	assert stages.calls == []  # 後続もスキップなので値は読み込まない
+
+
+def test_changed_fetch_output_reruns_dependents(stages):
+	stages._write('A.T', 'raw.txt', 'new data')
+	assert stages.run(['A.T', 'B.T']) == {
+		('A.T', 'fetch'): 'skipped', ('A.T', 'analyze'): 'ran', ('A.T', 'portal'): 'ran',
+		('B.T', 'fetch'): 'skipped', ('B.T', 'analyze'): 'skipped', ('B.T', 'portal'): 'skipped',
+	}
+	assert ('load', 'fetch', 'A.T') in stages.calls
+	assert stages._read('A.T', 'portal.html') == '<p>NEW DATA</p>'
+
+
+def test_missing_output_reruns_only_that_stage(stages):
+	os.remove(stages._path('A.T', 'portal.html'))
+	assert stages.run() == {('A.T', 'fetch'): 'skipped', ('A.T', 'analyze'): 'skipped', ('A.T', 'portal'): 'ran'}
+	assert sorted(stages.calls) == [('load', 'analyze', 'A.T'), ('run', 'portal', 'A.T')]  # fetch は読まない
+
+
+def test_version_bump_and_force(stages):
+	stages.analyze_version = '2'
+	assert stages.run() == {('A.T', 'fetch'): 'skipped', ('A.T', 'analyze'): 'ran', ('A.T', 'portal'): 'ran'}
+	assert stages.run()[('A.T', 'analyze')] == 'skipped'
+	assert set(stages.run(force=True).values()) == {'ran'}
+
+
+def test_stale_fetch_runs(stages):
+	stages.fetched = False
+	assert stages.run()[('A.T', 'fetch')] == 'ran'
+	# 取得結果の内容が同じなら後続はスキップ
+	assert stages.run()[('A.T', 'analyze')] == 'skipped'
+
+
+def test_failure_blocks_dependents(stages):
+	stages.fail = 'analyze'
+	stages._write('A.T', 'raw.txt', 'changed')
+	assert stages.run() == {('A.T', 'fetch'): 'skipped', ('A.T', 'analyze'): 'failed', ('A.T', 'portal'): 'blocked'}
+
+
+def test_run_one_runs_lineage(stages):
+	stages._write('A.T', 'raw.txt', 'changed')
+	stages.calls.clear()
+	runner = pipeline.Pipeline(stages.build(), stages.data_dir)
+	assert runner.lineage('portal') == ['fetch', 'analyze', 'portal']
+	assert runner.run_one('A.T', 'analyze').status == 'ran'
+	assert ('run', 'portal', 'A.T') not in stages.calls
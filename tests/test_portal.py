@@ -0,0 +1,42 @@
+"""
+分析ポータル (analysisdata2graph) の埋め込みデータが、NaN・±inf を含むサマリーでも JSON にできることを確かめる。
+"""
+
+import os
+import json
+
+import numpy as np
+import pandas as pd
+
+import analysisdata2graph
+import server
+
+
+def _summary() -> pd.DataFrame:
+	# 支払利息 0 の年はインタレストガバレッジが inf になる
+	return pd.DataFrame({
+		'ROE(%)': [8.5, np.nan, 7.25],
+		'インタレストガバレッジレシオ': [np.inf, 12.0, -np.inf],
+		'PER(倍)': [np.inf, np.nan, np.nan],
+	}, index=['2024-03-31', '2023-03-31', '2022-03-31'])
+
+
+def test_payload_maps_non_finite_to_null():
+	payload = analysisdata2graph.portal_payload(_summary())
+	assert payload['metrics'] == ['ROE(%)', 'インタレストガバレッジレシオ']  # 有限値の無い指標は除く
+	assert payload['values'] == [[8.5, None, 7.25], [None, 12.0, None]]
+	json.dumps(payload, allow_nan=False)
+
+
+def test_portal_html_with_inf_cell():
+	page = analysisdata2graph.build_portal_html(_summary(), 'AAA.T')
+	assert '[null,12.0,null]' in page
+
+
+def test_server_metrics_api_with_inf_cell(tmp_path):
+	os.makedirs(tmp_path / 'AAA.T')
+	_summary().to_csv(tmp_path / 'AAA.T' / 'financial_analysis_summary.csv')
+	app = server.PortalServer(str(tmp_path), peers=False)
+	body = json.loads(app.handle('/api/AAA.T/metrics').body)
+	assert body['values'][1] == [None, 12.0, None]
+	assert b'<html' in app.handle('/data/AAA.T/financial_analysis_portal.html').body
@@ -0,0 +1,72 @@
+"""
+quarterly.update_ttm の差分計算が、全四半期からの計算 (force=True) と同じ結果になることを確かめる。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import quarterly as qt
+from columnar_store import STATEMENT_FILES
+
+
+def _quarters(n: int) -> list[str]:
+	# 新しい順の四半期末
+	return [d.strftime('%Y-%m-%d') for d in pd.date_range(end='2024-12-31', periods=n, freq='QE')[::-1]]
+
+
+def _write(data_dir: str, symbol: str, periods: list[str], bump: dict[str, float] | None = None):
+	save_dir = qt.quarterly_dir(symbol, data_dir)
+	os.makedirs(save_dir, exist_ok=True)
+	rng = np.random.default_rng(0)
+	base = {p: rng.normal(1, 0.1) for p in sorted(periods)}  # 四半期ごとに固定の揺らぎ (追加しても既存の値は変わらない)
+	scale = [base[p] * (1 + (bump or {}).get(p, 0)) for p in periods]
+	items = {
+		'financials': {'Total Revenue': 1000, 'Operating Income': 120, 'Net Income': 70, 'Interest Expense': -5},
+		'balance_sheet': {'Total Assets': 9000, 'Stockholders Equity': 4000, 'Current Assets': 3000, 'Current Liabilities': 2000},
+		'cashflow': {'Operating Cash Flow': 150, 'Free Cash Flow': 60},
+	}
+	for name, filename in STATEMENT_FILES.items():
+		df = pd.DataFrame({p: {k: v * s for k, v in items[name].items()} for p, s in zip(periods, scale)})
+		df.to_csv(os.path.join(save_dir, filename))
+
+
+def _assert_same_as_full(data_dir: str, symbol: str):
+	incremental, recomputed = qt.update_ttm(symbol, data_dir)
+	full, _ = qt.update_ttm(symbol, data_dir, force=True)
+	incremental.index = incremental.index.astype(str)
+	full.index = full.index.astype(str)
+	pd.testing.assert_frame_equal(incremental, full)
+	return recomputed
+
+
+def test_incremental_ttm_matches_full_recompute(tmp_path):
+	data_dir, symbol = str(tmp_path), 'AAA.T'
+	periods = _quarters(14)
+	_write(data_dir, symbol, periods[1:])
+	qt.update_ttm(symbol, data_dir)
+
+	# 新しい四半期の追記: 最新行と、その 1 つ前の行 (売上高成長率) だけを計算し直す
+	_write(data_dir, symbol, periods)
+	recomputed = _assert_same_as_full(data_dir, symbol)
+	assert recomputed == periods[:2]
+
+	# 古い四半期の修正: その四半期を含む窓の行と、1 つ新しい行の成長率
+	_write(data_dir, symbol, periods, bump={periods[8]: 0.2})
+	recomputed = _assert_same_as_full(data_dir, symbol)
+	assert recomputed == periods[5:10]
+
+	# 何も変わらなければ計算しない
+	assert qt.update_ttm(symbol, data_dir)[1] == []
+
+
+@pytest.mark.parametrize('q', [0, 3, 10, 13])
+def test_revised_quarter_at_any_position(tmp_path, q):
+	data_dir, symbol = str(tmp_path), 'AAA.T'
+	periods = _quarters(14)
+	_write(data_dir, symbol, periods)
+	qt.update_ttm(symbol, data_dir)
+	_write(data_dir, symbol, periods, bump={periods[q]: -0.3})
+	_assert_same_as_full(data_dir, symbol)
@@ -0,0 +1,62 @@
+"""
+schema の項目名 → ID の解決 (別名・表記ゆれ)、Statement.from_frame の決算期の揃え方、take の欠損行を確かめる。
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import schema
+
+PERIODS = ['2024-03-31', '2023-03-31', '2022-03-31']
+
+
+def test_synonyms_resolve_to_canonical_id():
+	i = schema.item_id('balance_sheet', 'Stockholders Equity')
+	assert i is not None and schema.ITEMS[i].name == 'Stockholders Equity'
+	assert schema.item_id('balance_sheet', 'Total Stockholder Equity') == i
+	assert schema.item_id('balance_sheet', 'stockholders_equity') == i  # 大文字小文字・記号の違い
+	# 同じラベルでも表が違えば別の項目
+	assert schema.item_id('financials', 'Net Income') != schema.item_id('cashflow', 'Net Income')
+	assert schema.item_id('financials', 'No Such Item') is None
+	assert schema.item_id('prices', 'Close') is None
+
+	ids, ranks = schema.resolve('balance_sheet', ['Shareholders Equity', 'Stockholders Equity', 'Unknown'])
+	assert ids.tolist() == [i, i, -1]
+	assert ranks.tolist()[:2] == [1, 0]
+
+
+def test_from_frame_prefers_canonical_over_synonym():
+	df = pd.DataFrame({p: [1.0, 2.0, 3.0] for p in PERIODS},
+		index=['Shareholders Equity', 'Stockholders Equity', 'Unmapped']).mul([1, 10, 100], axis=0)
+	st = schema.Statement.from_frame('balance_sheet', df)
+	assert len(st) == 1
+	assert st.row('Total Stockholder Equity').tolist() == [20.0, 20.0, 20.0]
+	assert 'Unmapped' not in st
+
+
+def test_from_frame_aligns_to_periods_with_missing_columns():
+	df = pd.DataFrame({'2024-03-31': [100.0], '2022-03-31': [80.0], '2021-03-31': [70.0]}, index=['Total Revenue'])
+	st = schema.Statement.from_frame('financials', df, PERIODS)
+	assert st.periods == tuple(PERIODS)
+	np.testing.assert_array_equal(st.row('Total Revenue'), [100.0, np.nan, 80.0])
+
+
+@pytest.mark.parametrize('df', [pd.DataFrame(), pd.DataFrame(index=['Total Revenue'], dtype=np.float64)])
+def test_from_frame_with_empty_frame(df):
+	# update_analysis は計算に不要な表を空の DataFrame で渡す
+	st = schema.Statement.from_frame('financials', df, PERIODS)
+	assert st.values.shape == (len(st), len(PERIODS))
+	assert np.isnan(st.values).all()
+	assert st.row('Operating Income') is None
+
+
+def test_take_fills_missing_and_negative_ids():
+	df = pd.DataFrame({p: [10.0, 20.0] for p in PERIODS}, index=['Total Revenue', 'Net Income'])
+	st = schema.Statement.from_frame('financials', df)
+	revenue, ni = schema.item_id('financials', 'Total Revenue'), schema.item_id('financials', 'Net Income')
+	absent = schema.item_id('financials', 'EBITDA')
+	out = st.take([ni, -1, absent, revenue])
+	assert out.shape == (4, len(PERIODS))
+	assert out[0].tolist() == [20.0] * 3 and out[3].tolist() == [10.0] * 3
+	assert np.isnan(out[1:3]).all()
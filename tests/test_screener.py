@@ -0,0 +1,103 @@
+"""
+screener.ScreenerIndex の差分更新 (update) が、同じサマリーから作り直した (build) インデックスと
+同じ検索結果を返すことを確かめる。値の無い (NaN) 銘柄は末尾に来るが、その中の並びは問わない。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import screener
+
+METRICS = ['ROE(%)', '自己資本比率(%)', 'PER(倍)']
+TICKERS = [f'{1000 + i}.T' for i in range(40)]
+
+
+def _write(data_dir, symbol: str, rng, nan_rate: float = 0.2):
+	values = rng.normal(10, 5, size=(2, len(METRICS)))
+	values[rng.random(values.shape) < nan_rate] = np.nan
+	path = os.path.join(data_dir, symbol, screener.SUMMARY_NAME)
+	os.makedirs(os.path.dirname(path), exist_ok=True)
+	pd.DataFrame(values, index=['2024-03-31', '2023-03-31'], columns=METRICS).to_csv(path)
+	# 同じ時刻に書き直しても差分として拾われるように mtime をずらす
+	st = os.stat(path)
+	os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))
+
+
+def _rows(out: pd.DataFrame, metric: str) -> tuple[list, set]:
+	# 値のある行は並び順どおり、NaN の行は集合として比べる
+	nan = out[metric].isna()
+	return out.loc[~nan].values.tolist(), {tuple(r) for r in out.loc[nan, ['ticker', 'period']].values.tolist()}
+
+
+def _assert_same(index: screener.ScreenerIndex, fresh: screener.ScreenerIndex):
+	assert sorted(index.tickers) == sorted(fresh.tickers)
+	for metric in METRICS:
+		for descending in (True, False):
+			got, total = index.query(sort=metric, descending=descending, top=None)
+			want, want_total = fresh.query(sort=metric, descending=descending, top=None)
+			assert total == want_total
+			assert _rows(got, metric) == _rows(want, metric)
+	for text in ('ROE(%) > 10', 'ROE(%) > 8, 自己資本比率(%) <= 12', 'PER(倍) >= 5 and ROE(%) < 15'):
+		conditions = screener.parse_conditions(text)
+		got, total = index.query(conditions, sort='ROE(%)', top=None)
+		want, want_total = fresh.query(conditions, sort='ROE(%)', top=None)
+		assert total == want_total
+		assert _rows(got, 'ROE(%)') == _rows(want, 'ROE(%)')
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+	rng = np.random.default_rng(0)
+	for t in TICKERS:
+		_write(tmp_path / 'data', t, rng)
+	return tmp_path / 'data'
+
+
+def _fresh(tmp_path, data_dir) -> screener.ScreenerIndex:
+	fresh = screener.ScreenerIndex(str(tmp_path / 'fresh'), str(data_dir))
+	fresh.build()
+	return fresh
+
+
+def test_update_changed_and_new_tickers_matches_build(tmp_path, data_dir):
+	index = screener.ScreenerIndex(str(tmp_path / 'index'), str(data_dir))
+	index.build()
+	rng = np.random.default_rng(1)
+	changed = TICKERS[3:9] + ['9001.T', '9002.T']
+	for t in changed:
+		_write(data_dir, t, rng, nan_rate=0.3)
+	updated, rebuilt = index.update()
+	assert updated == sorted(changed) and not rebuilt
+
+	reopened = screener.ScreenerIndex(str(tmp_path / 'index'), str(data_dir))
+	assert reopened.load()
+	_assert_same(reopened, _fresh(tmp_path, data_dir))
+
+
+def test_update_skips_touched_and_unchanged(tmp_path, data_dir):
+	index = screener.ScreenerIndex(str(tmp_path / 'index'), str(data_dir))
+	index.build()
+	path = screener.summary_path(TICKERS[0], str(data_dir))
+	st = os.stat(path)
+	os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10_000_000))  # 内容は同じ
+	assert index.update() == ([], False)
+	assert index.update([TICKERS[1]]) == ([], False)
+
+
+def test_update_rebuilds_on_removal_and_many_changes(tmp_path, data_dir):
+	index = screener.ScreenerIndex(str(tmp_path / 'index'), str(data_dir))
+	index.build()
+	os.remove(screener.summary_path(TICKERS[0], str(data_dir)))
+	updated, rebuilt = index.update()
+	assert rebuilt and TICKERS[0] in updated
+	_assert_same(index, _fresh(tmp_path, data_dir))
+
+	rng = np.random.default_rng(2)
+	for t in TICKERS[1:1 + int(len(TICKERS) * screener.REBUILD_FRACTION) + 2]:
+		_write(data_dir, t, rng)
+	assert index.update()[1]
+	_assert_same(index, _fresh(tmp_path, data_dir))
+
@@ -0,0 +1,46 @@
+"""
+ローカルサーバ (server.PortalServer) が同業統計を読むだけで書き換えないことを確かめる。
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+import manifest as mf
+import peer_stats
+import server
+
+
+def _summary(symbol: str, seed: int):
+	r = np.random.default_rng(seed)
+	df = pd.DataFrame({'ROE(%)': r.normal(8, 3, 3), '営業利益率(%)': r.normal(10, 4, 3)},
+		index=['2024-03-31', '2023-03-31', '2022-03-31'])
+	df.to_csv(peer_stats.summary_path(symbol))
+	pd.DataFrame([{'symbol': symbol, 'sector': 'Technology', 'industry': 'Software'}]).to_csv(peer_stats.info_path(symbol), index=False)
+
+
+def _peer_files() -> dict[str, str]:
+	out = {}
+	for base, _, files in os.walk(peer_stats.PEER_DIR):
+		for name in files:
+			path = os.path.join(base, name)
+			out[path] = mf.file_sha256(path)
+	return out
+
+
+def test_peer_routes_do_not_write_peer_stats(tmp_path, monkeypatch):
+	monkeypatch.chdir(tmp_path)
+	tickers = [f'T{i}.T' for i in range(5)]
+	for i, t in enumerate(tickers):
+		os.makedirs(os.path.join('data', t))
+		_summary(t, i)
+	peer_stats.PeerStats().build()
+	before = _peer_files()
+
+	_summary(tickers[0], 99)  # 統計に未反映のサマリー
+	app = server.PortalServer('data')
+	assert b'<html' in app.handle(f'/data/{tickers[0]}/financial_analysis_portal.html').body
+	assert app.handle(f'/api/{tickers[0]}/peers').content_type == 'application/json'
+	assert _peer_files() == before
+	assert not app.peer_store.is_current(tickers[0])